@@ -76,7 +76,11 @@ from octoprint_octolapse.settings import OctolapseSettings, PrinterProfile, Stab
     CameraProfile, RenderingProfile, LoggingProfile, SlicerSettings, CuraSettings, OtherSlicerSettings, \
     Simplify3dSettings, Slic3rPeSettings, SettingsJsonEncoder, MjpgStreamer, MainSettings
 from octoprint_octolapse.timelapse import Timelapse, TimelapseState, TimelapseStartException
-from octoprint_octolapse.stabilization_preprocessing import StabilizationPreprocessingThread
+from octoprint_octolapse.hook_metrics import HookMetrics
+from octoprint_octolapse.stabilization_preprocessing import (
+    StabilizationPreprocessingThread, BackgroundPreprocessingWorker
+)
+from octoprint_octolapse.snapshot_plan_cache import SnapshotPlanCache
 from octoprint_octolapse.messenger_worker import MessengerWorker, PluginMessage
 from octoprint_octolapse.settings_external import ExternalSettings, ExternalSettingsError
 from octoprint_octolapse.render import RenderError, RenderingProcessor, RenderingCallbackArgs, RenderJobInfo
@@ -140,6 +144,8 @@ class OctolapsePlugin(
         self._timelapse = None  # type: Timelapse
         self.gcode_preprocessor = None
         self._stabilization_preprocessor_thread = None
+        self._snapshot_plan_cache = None
+        self._background_preprocessor = None
         self._preprocessing_cancel_event = threading.Event()
 
         self._plugin_message_queue = queue.Queue()
@@ -764,6 +770,17 @@ class OctolapsePlugin(
             data["snapshot_plan_preview"] = self.get_snapshot_plan_preview_dict()
         return data
 
+    @octoprint.plugin.BlueprintPlugin.route("/loadHookMetrics", methods=["POST"])
+    @restricted_access
+    def load_hook_metrics_request(self):
+        if self._timelapse is None:
+            message = "Unable to load the gcode hook metrics, Octolapse.Timelapse hasn't been initialized yet."
+            return jsonify({"error": True, "error_message": message}), 500
+        return jsonify({
+            "success": True,
+            "hook_metrics": self._timelapse.hook_metrics.to_dict()
+        })
+
     @octoprint.plugin.BlueprintPlugin.route("/loadSettingsAndState", methods=["POST"])
     @restricted_access
     def load_settings_and_state_request(self):
@@ -2006,6 +2023,13 @@ class OctolapsePlugin(
             self.get_log_file_path(), self._octolapse_settings.profiles.current_logging_profile()
         )
 
+    def configure_snapshot_plan_cache(self):
+        if self._snapshot_plan_cache is None:
+            return
+        main_settings = self._octolapse_settings.main_settings
+        self._snapshot_plan_cache.max_entries = main_settings.snapshot_plan_cache_max_entries
+        self._snapshot_plan_cache.max_size_bytes = main_settings.snapshot_plan_cache_max_size_mb * 1024 * 1024
+
     def load_settings(self, force_defaults=False):
 
         if force_defaults:
@@ -2104,6 +2128,7 @@ class OctolapsePlugin(
             self._octolapse_settings.main_settings.git_version = __git_version__
             self._octolapse_settings.save(self.get_settings_file_path())
             self.configure_loggers()
+            self.configure_snapshot_plan_cache()
         except Exception as e:
             logger.exception("Failed to save settings.")
             raise e
@@ -2337,6 +2362,21 @@ class OctolapsePlugin(
             # create our timelapse object
             self.create_timelapse_object()
 
+            # create the snapshot plan cache, which lets us skip preprocessing files that have not changed
+            self._snapshot_plan_cache = SnapshotPlanCache(
+                os.path.join(self.get_plugin_data_folder(), "snapshot_plan_cache"), plugin_version=self._plugin_version
+            )
+            self.configure_snapshot_plan_cache()
+
+            # create the background preprocessor, which fills the cache when gcode files are added or selected
+            self._background_preprocessor = BackgroundPreprocessingWorker(
+                lambda gcode_file_path: self.get_timelapse_settings(
+                    gcode_file_path=gcode_file_path, save_detected_slicer_settings=False
+                ),
+                self._snapshot_plan_cache
+            )
+            self._background_preprocessor.start()
+
             # create our message worker
             self._message_worker = MessengerWorker(
                 self._plugin_message_queue, self._plugin_manager, self._identifier, update_period_seconds=1
@@ -2384,12 +2424,19 @@ class OctolapsePlugin(
 
     def on_shutdown(self):
         logger.info("Octolapse is shutting down.")
+        if self._timelapse is not None:
+            self._timelapse.shutdown()
 
     # Event Mixin Handler
     def on_event(self, event, payload):
         try:
             # If we haven't loaded our settings yet, return.
-            if self._octolapse_settings is None or self._timelapse is None or self._timelapse.get_current_state() == TimelapseState.Idle:
+            if self._octolapse_settings is None or self._timelapse is None:
+                return
+            if event in [Events.FILE_ADDED, Events.FILE_SELECTED]:
+                self.on_gcode_file_available(event, payload)
+                return
+            if self._timelapse.get_current_state() == TimelapseState.Idle:
                 return
             if event == Events.PRINTER_STATE_CHANGED:
                 self.send_state_changed_message({"status": self.get_status_dict()})
@@ -2433,10 +2480,44 @@ class OctolapsePlugin(
     def on_print_paused(self):
         self._timelapse.on_print_paused()
 
+    def on_gcode_file_available(self, event, payload):
+        # queue the file for background preprocessing if possible
+        if (
+            self._background_preprocessor is None or
+            not self._octolapse_settings.main_settings.is_octolapse_enabled or
+            not self._octolapse_settings.main_settings.preprocess_on_file_added
+        ):
+            return
+        if event == Events.FILE_ADDED:
+            if payload.get("storage") != octoprint.filemanager.FileDestinations.LOCAL or "gcode" not in payload.get("type", []):
+                return
+        elif payload.get("origin") != octoprint.filemanager.FileDestinations.LOCAL:
+            return
+        # don't compete with the current print
+        if self._printer.is_printing() or self._printer.is_paused():
+            return
+        current_printer = self._octolapse_settings.profiles.current_printer()
+        if (
+            current_printer is None or
+            not (current_printer.has_been_saved_by_user or current_printer.slicer_type == "automatic")
+        ):
+            return
+        current_trigger = self._octolapse_settings.profiles.current_trigger()
+        if current_trigger.trigger_type not in TriggerProfile.get_precalculated_trigger_types():
+            return
+        self._background_preprocessor.add(
+            self._file_manager.path_on_disk(octoprint.filemanager.FileDestinations.LOCAL, payload["path"])
+        )
+
     def on_print_start(self, parsed_command):
         logger.info(
             "Print start detected, attempting to start timelapse."
         )
+        # stop any background preprocessing so that it doesn't slow down the print or compete with the preprocessing
+        # started below.  If the current file was already preprocessed, the results will be loaded from the snapshot
+        # plan cache.
+        if self._background_preprocessor is not None:
+            self._background_preprocessor.cancel()
         # check for problems starting the timelapse
         try:
             results = self.test_timelapse_config()
@@ -2660,10 +2741,12 @@ class OctolapsePlugin(
     def get_octoprint_printer_profile(self):
         return self._printer_profile_manager.get_current()
 
-    def get_timelapse_settings(self):
+    def get_timelapse_settings(self, gcode_file_path=None, save_detected_slicer_settings=True):
         # Create a copy of the settings to send to the Timelapse object.
         # We make this copy here so that editing settings vis the GUI won't affect the
         # current timelapse.
+        # If no gcode file path is supplied, the currently printing file is used.  Detected slicer settings are
+        # only saved (and sent to the client) if save_detected_slicer_settings is True.
         logger.debug("Getting timelapse settings.")
         settings_clone = self._octolapse_settings.clone()
         current_printer_clone = settings_clone.profiles.current_printer()
@@ -2680,14 +2763,15 @@ class OctolapsePlugin(
             "help_link": None
         }
 
-        path = utility.get_currently_printing_file_path(self._printer)
-        if path is not None:
-            gcode_file_path = self._file_manager.path_on_disk(octoprint.filemanager.FileDestinations.LOCAL, path)
-        else:
-            error = error_messages.get_error(["init", "no_gcode_filepath_found"])
-            logger.error(error["description"])
-            return_value["errors"].append(error)
-            return return_value
+        if gcode_file_path is None:
+            path = utility.get_currently_printing_file_path(self._printer)
+            if path is not None:
+                gcode_file_path = self._file_manager.path_on_disk(octoprint.filemanager.FileDestinations.LOCAL, path)
+            else:
+                error = error_messages.get_error(["init", "no_gcode_filepath_found"])
+                logger.error(error["description"])
+                return_value["errors"].append(error)
+                return return_value
 
         # check the ffmpeg path
         try:
@@ -2716,27 +2800,30 @@ class OctolapsePlugin(
             # extract any slicer settings if possible.  This must be done before any calls to the printer profile
             # info that includes slicer setting
             try:
-                success, error_type, error_list = current_printer_clone.get_gcode_settings_from_file(gcode_file_path)
+                success, error_type, error_list = current_printer_clone.get_gcode_settings_from_file(
+                    gcode_file_path, settings_cache=self._snapshot_plan_cache
+                )
             except error_messages.OctolapseException as e:
                 logger.error(str(e))
                 return_value["errors"].append(e.to_dict())
                 return return_value
             if success:
-                # Save the profile changes
-                # get the extracted slicer settings
-                extracted_slicer_settings = current_printer_clone.get_current_slicer_settings()
-                # Apply the extracted settings to to the live settings
-                self._octolapse_settings.profiles.current_printer().get_slicer_settings_by_type(
-                    current_printer_clone.slicer_type
-                ).update(extracted_slicer_settings.to_dict())
-                self._octolapse_settings.profiles.current_printer().has_been_saved_by_user = True
-                # save the live settings
-                self.save_settings()
-                printer_profile = self._octolapse_settings.profiles.current_printer().clone()
-                printer_profile.slicer_type = PrinterProfile.slicer_type = 'automatic'
-                settings_saved = True
-                updated_profile_json = printer_profile.to_json()
-                self.send_slicer_settings_detected_message(settings_saved, updated_profile_json)
+                if save_detected_slicer_settings:
+                    # Save the profile changes
+                    # get the extracted slicer settings
+                    extracted_slicer_settings = current_printer_clone.get_current_slicer_settings()
+                    # Apply the extracted settings to to the live settings
+                    self._octolapse_settings.profiles.current_printer().get_slicer_settings_by_type(
+                        current_printer_clone.slicer_type
+                    ).update(extracted_slicer_settings.to_dict())
+                    self._octolapse_settings.profiles.current_printer().has_been_saved_by_user = True
+                    # save the live settings
+                    self.save_settings()
+                    printer_profile = self._octolapse_settings.profiles.current_printer().clone()
+                    printer_profile.slicer_type = PrinterProfile.slicer_type = 'automatic'
+                    settings_saved = True
+                    updated_profile_json = printer_profile.to_json()
+                    self.send_slicer_settings_detected_message(settings_saved, updated_profile_json)
             else:
                 if self._octolapse_settings.main_settings.cancel_print_on_startup_error:
                     if error_type == "no-settings-detected":
@@ -2913,7 +3000,12 @@ class OctolapsePlugin(
             self._preprocessing_cancel_event,
             parsed_command,
             notification_period_seconds=self.PREPROCESSING_NOTIFICATION_PERIOD_SECONDS,
-
+            snapshot_plan_cache=self._snapshot_plan_cache,
+            # stream the plans to the preview while preprocessing so that a bad plan can be cancelled early
+            preview_callback=(
+                self.send_snapshot_plan_preview_chunk
+                if timelapse_settings["settings"].main_settings.preview_snapshot_plans else None
+            )
         )
         self._stabilization_preprocessor_thread.daemon = True
         self._stabilization_preprocessor_thread.start()
@@ -2952,6 +3044,8 @@ class OctolapsePlugin(
         # signal complete to the UI (will close the progress popup
         self.send_pre_processing_progress_message(
             100, 0, 0, 0, 0)
+        # close any preview that was streamed while preprocessing
+        self.send_snapshot_preview_complete_message()
         self.preprocessing_job_guid = None
 
     def pre_processing_failed(self, preprocessing_issues):
@@ -2967,6 +3061,8 @@ class OctolapsePlugin(
         # close the UI progress popup
         self.send_pre_processing_progress_message(
             100, 0, 0, 0, 0)
+        # close any preview that was streamed while preprocessing
+        self.send_snapshot_preview_complete_message()
         self.preprocessing_job_guid = None
 
     def pre_processing_success(
@@ -3034,13 +3130,7 @@ class OctolapsePlugin(
         snapshot_plans = []
         total_travel_distance = 0
         total_saved_travel_distance = 0
-        octoprint_printer_profile = self.get_octoprint_printer_profile()
-        current_printer_profile = self.saved_timelapse_settings["settings"].profiles.current_printer()
-        overridable_printer_profile_settings = current_printer_profile.get_overridable_profile_settings(
-            self.get_octoprint_g90_influences_extruder(),
-            octoprint_printer_profile
-        )
-        printer_volume = overridable_printer_profile_settings["volume"]
+        printer_volume = self.get_printer_volume(self.saved_timelapse_settings)
         for plan in self.saved_snapshot_plans:
             snapshot_plans.append(plan.to_dict())
             total_travel_distance += plan.travel_distance
@@ -3064,6 +3154,26 @@ class OctolapsePlugin(
 
         return data
 
+    def get_printer_volume(self, timelapse_settings):
+        current_printer_profile = timelapse_settings["settings"].profiles.current_printer()
+        overridable_printer_profile_settings = current_printer_profile.get_overridable_profile_settings(
+            self.get_octoprint_g90_influences_extruder(),
+            self.get_octoprint_printer_profile()
+        )
+        return overridable_printer_profile_settings["volume"]
+
+    def send_snapshot_plan_preview_chunk(self, snapshot_plans, plans_dropped, timelapse_settings):
+        # sends the plans created since the last chunk while preprocessing is still running.  The complete
+        # preview is sent by send_snapshot_plan_preview once preprocessing has finished.
+        data = {
+            "type": "snapshot-plan-preview-chunk",
+            "preprocessing_job_guid": str(self.preprocessing_job_guid),
+            "snapshot_plans": [plan.to_dict() for plan in snapshot_plans],
+            "printer_volume": self.get_printer_volume(timelapse_settings),
+            "plans_dropped": plans_dropped
+        }
+        self._plugin_manager.send_plugin_message(self._identifier, data)
+
     def accept_snapshot_plan_preview(self, preprocessing_job_guid=None):
         # use a lock
         with self.autoclose_snapshot_preview_thread_lock:
@@ -3475,33 +3585,42 @@ class OctolapsePlugin(
 
     # noinspection PyUnusedLocal
     def on_gcode_queuing(self, comm_instance, phase, cmd, cmd_type, gcode, *args, **kwargs):
+        start = HookMetrics.now()
         try:
             if self._timelapse is not None:
-                return self._timelapse.on_gcode_queuing(cmd, cmd_type, gcode, kwargs["tags"])
+                return_value = self._timelapse.on_gcode_queuing(cmd, cmd_type, gcode, kwargs["tags"])
+                self._timelapse.hook_metrics.record(HookMetrics.ON_GCODE_QUEUING, start)
+                return return_value
         except Exception as e:
             logger.exception("on_gcode_queuing failed..")
 
     # noinspection PyUnusedLocal
     def on_gcode_sending(self, comm_instance, phase, cmd, cmd_type, gcode, *args, **kwargs):
+        start = HookMetrics.now()
         try:
             if self._timelapse is not None:
                 self._timelapse.on_gcode_sending(cmd, kwargs["tags"])
+                self._timelapse.hook_metrics.record(HookMetrics.ON_GCODE_SENDING, start)
         except Exception as e:
             logger.exception("on_gcode_sending failed.")
 
     # noinspection PyUnusedLocal
     def on_gcode_sent(self, comm_instance, phase, cmd, cmd_type, gcode, *args, **kwargs):
+        start = HookMetrics.now()
         try:
             if self._timelapse is not None:
                 self._timelapse.on_gcode_sent(cmd, cmd_type, gcode, kwargs["tags"])
+                self._timelapse.hook_metrics.record(HookMetrics.ON_GCODE_SENT, start)
         except Exception as e:
             logger.exception("on_gcode_sent failed.")
 
     # noinspection PyUnusedLocal
     def on_gcode_received(self, comm, line, *args, **kwargs):
+        start = HookMetrics.now()
         try:
             if self._timelapse is not None:
                 self._timelapse.on_gcode_received(line)
+                self._timelapse.hook_metrics.record(HookMetrics.ON_GCODE_RECEIVED, start)
         except Exception as e:
             logger.exception("on_gcode_received failed.")
         return line
@@ -3510,7 +3629,12 @@ class OctolapsePlugin(
         state_change_dict = {
             "state": args[0]
         }
-        self.queue_plugin_message(PluginMessage(state_change_dict, "state-changed", rate_limit_seconds=1))
+        # Rate limited messages replace any queued message of the same type, but each delta must reach the client.
+        # The timelapse already limits how often the state changed messages are sent.
+        rate_limit_seconds = 0 if args[0].get("is_delta", False) else 1
+        self.queue_plugin_message(
+            PluginMessage(state_change_dict, "state-changed", rate_limit_seconds=rate_limit_seconds)
+        )
 
     def _get_rendering_settings(self):
         return {
@@ -0,0 +1,247 @@
+# coding=utf-8
+##################################################################################
+# Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+# Copyright (C) 2023  Brad Hochgesang
+##################################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see the following:
+# https://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+#
+# You can contact the author either through the git-hub repository, or at the
+# following email address: FormerLurker@pm.me
+##################################################################################
+# Writes synthetic gcode in the format Cura creates, so that preprocessing can be measured on files of any size
+# without keeping large prints in the repository.  For example:
+#
+#   python -m octoprint_octolapse.benchmark.gcode_generator output.gcode --layers 200 --moves-per-layer 1000 --arcs
+import argparse
+import math
+import random
+
+
+class SyntheticGcode(object):
+    # the print is centered on the bed
+    CENTER_X = 100.0
+    CENTER_Y = 100.0
+    LAYER_HEIGHT = 0.2
+    RETRACTION_LENGTH = 1.0
+    # the number of segments in each outer wall loop
+    WALL_SEGMENTS = 36
+    # the number of solid bottom layers printed before the spiral starts in vase mode
+    VASE_BOTTOM_LAYERS = 3
+    SNAPSHOT_COMMAND = "@OCTOLAPSE TAKE-SNAPSHOT"
+
+    def __init__(
+        self,
+        layers=100,
+        moves_per_layer=500,
+        vase_mode=False,
+        tools=1,
+        firmware_retraction=False,
+        arcs=False,
+        snapshot_commands=True,
+        seed=0
+    ):
+        self.layers = layers
+        self.moves_per_layer = moves_per_layer
+        self.vase_mode = vase_mode
+        self.tools = max(1, tools)
+        self.firmware_retraction = firmware_retraction
+        self.arcs = arcs
+        # add a snapshot command to the end of every layer, which the smart gcode trigger needs
+        self.snapshot_commands = snapshot_commands
+        self.seed = seed
+
+    def to_dict(self):
+        return {
+            "layers": self.layers,
+            "moves_per_layer": self.moves_per_layer,
+            "vase_mode": self.vase_mode,
+            "tools": self.tools,
+            "firmware_retraction": self.firmware_retraction,
+            "arcs": self.arcs,
+            "snapshot_commands": self.snapshot_commands,
+            "seed": self.seed
+        }
+
+    def write(self, file_path):
+        """Writes the gcode to file_path and returns the number of lines written."""
+        num_lines = 0
+        with open(file_path, 'w', encoding='utf-8', newline='\n') as gcode_file:
+            for line in self.get_lines():
+                gcode_file.write(line)
+                gcode_file.write('\n')
+                num_lines += 1
+        return num_lines
+
+    def get_lines(self):
+        rnd = random.Random(self.seed)
+        for line in self._get_header():
+            yield line
+        tool = 0
+        z = 0.0
+        for layer in range(self.layers):
+            yield ";LAYER:{0}".format(layer)
+            is_spiral = self.vase_mode and layer >= SyntheticGcode.VASE_BOTTOM_LAYERS
+            if self.tools > 1 and layer % 2 == 1:
+                # change tools every other layer
+                tool = (tool + 1) % self.tools
+                yield "T{0}".format(tool)
+            if is_spiral:
+                for line in self._get_spiral(z):
+                    yield line
+                z += SyntheticGcode.LAYER_HEIGHT
+            else:
+                z += SyntheticGcode.LAYER_HEIGHT
+                for line in self._get_retract():
+                    yield line
+                yield "G0 F9000 Z{0:.3f}".format(z)
+                for line in self._get_wall(z):
+                    yield line
+                for line in self._get_infill(rnd):
+                    yield line
+            if self.snapshot_commands:
+                yield SyntheticGcode.SNAPSHOT_COMMAND
+        for line in self._get_footer():
+            yield line
+
+    def _get_header(self):
+        return [
+            ";FLAVOR:Marlin",
+            ";Generated with Cura_SteamEngine 5.2.1",
+            ";LAYER_COUNT:{0}".format(self.layers),
+            ";Layer height: {0}".format(SyntheticGcode.LAYER_HEIGHT),
+            "M140 S60",
+            "M104 S200",
+            "M190 S60",
+            "M109 S200",
+            "G21",
+            "G90",
+            "M83",
+            "G28 ;Home",
+            "G1 Z15.0 F6000",
+            "G92 E0",
+            "T0",
+        ]
+
+    def _get_footer(self):
+        lines = list(self._get_retract())
+        lines.extend([
+            "G0 F9000 Z{0:.3f}".format(self.layers * SyntheticGcode.LAYER_HEIGHT + 10),
+            "M140 S0",
+            "M104 S0",
+            "M84",
+            ";End of Gcode",
+        ])
+        return lines
+
+    def _get_retract(self):
+        if self.firmware_retraction:
+            yield "G10"
+        else:
+            yield "G1 F2400 E-{0:.5f}".format(SyntheticGcode.RETRACTION_LENGTH)
+
+    def _get_deretract(self):
+        if self.firmware_retraction:
+            yield "G11"
+        else:
+            yield "G1 F2400 E{0:.5f}".format(SyntheticGcode.RETRACTION_LENGTH)
+
+    @staticmethod
+    def _get_wall_point(index, radius):
+        angle = 2 * math.pi * index / SyntheticGcode.WALL_SEGMENTS
+        return (
+            SyntheticGcode.CENTER_X + radius * math.cos(angle),
+            SyntheticGcode.CENTER_Y + radius * math.sin(angle)
+        )
+
+    def _get_wall(self, z, radius=40.0):
+        start_x, start_y = self._get_wall_point(0, radius)
+        yield "G0 F9000 X{0:.3f} Y{1:.3f}".format(start_x, start_y)
+        for line in self._get_deretract():
+            yield line
+        yield ";TYPE:WALL-OUTER"
+        if self.arcs:
+            # four counter-clockwise quarter circles
+            x, y = start_x, start_y
+            for quarter in range(1, 5):
+                end_x, end_y = self._get_wall_point(quarter * SyntheticGcode.WALL_SEGMENTS / 4, radius)
+                yield "G3 F1800 X{0:.3f} Y{1:.3f} I{2:.3f} J{3:.3f} E{4:.5f}".format(
+                    end_x, end_y, SyntheticGcode.CENTER_X - x, SyntheticGcode.CENTER_Y - y, radius * math.pi / 2 * 0.033
+                )
+                x, y = end_x, end_y
+            return
+        segment_extrusion = 2 * math.pi * radius / SyntheticGcode.WALL_SEGMENTS * 0.033
+        for index in range(1, SyntheticGcode.WALL_SEGMENTS + 1):
+            x, y = self._get_wall_point(index, radius)
+            yield "G1 F1800 X{0:.3f} Y{1:.3f} E{2:.5f}".format(x, y, segment_extrusion)
+
+    def _get_spiral(self, z, radius=40.0):
+        # The spiral raises z continuously throughout the layer and never retracts
+        yield ";TYPE:WALL-OUTER"
+        segments = max(SyntheticGcode.WALL_SEGMENTS, self.moves_per_layer)
+        segment_extrusion = 2 * math.pi * radius / segments * 0.033
+        for index in range(1, segments + 1):
+            angle = 2 * math.pi * index / segments
+            yield "G1 F1800 X{0:.3f} Y{1:.3f} Z{2:.3f} E{3:.5f}".format(
+                SyntheticGcode.CENTER_X + radius * math.cos(angle),
+                SyntheticGcode.CENTER_Y + radius * math.sin(angle),
+                z + SyntheticGcode.LAYER_HEIGHT * index / segments,
+                segment_extrusion
+            )
+
+    def _get_infill(self, rnd, radius=38.0):
+        yield ";TYPE:FILL"
+        for move in range(self.moves_per_layer):
+            x = SyntheticGcode.CENTER_X + rnd.uniform(-radius, radius) * 0.7
+            y = SyntheticGcode.CENTER_Y + rnd.uniform(-radius, radius) * 0.7
+            if move % 25 == 0:
+                # travel to a new island of infill
+                for line in self._get_retract():
+                    yield line
+                yield "G0 F9000 X{0:.3f} Y{1:.3f}".format(x, y)
+                for line in self._get_deretract():
+                    yield line
+            elif self.arcs and move % 10 == 5:
+                yield "G2 F2700 X{0:.3f} Y{1:.3f} R{2:.3f} E{3:.5f}".format(x, y, radius, rnd.uniform(0.05, 0.5))
+            else:
+                yield "G1 F2700 X{0:.3f} Y{1:.3f} E{2:.5f}".format(x, y, rnd.uniform(0.05, 0.5))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic gcode for preprocessing benchmarks.")
+    parser.add_argument("file_path")
+    parser.add_argument("--layers", type=int, default=100)
+    parser.add_argument("--moves-per-layer", type=int, default=500)
+    parser.add_argument("--vase-mode", action="store_true")
+    parser.add_argument("--tools", type=int, default=1)
+    parser.add_argument("--firmware-retraction", action="store_true")
+    parser.add_argument("--arcs", action="store_true")
+    parser.add_argument("--no-snapshot-commands", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    gcode = SyntheticGcode(
+        layers=args.layers,
+        moves_per_layer=args.moves_per_layer,
+        vase_mode=args.vase_mode,
+        tools=args.tools,
+        firmware_retraction=args.firmware_retraction,
+        arcs=args.arcs,
+        snapshot_commands=not args.no_snapshot_commands,
+        seed=args.seed
+    )
+    print("Wrote {0} lines to {1}.".format(gcode.write(args.file_path), args.file_path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+# coding=utf-8
+##################################################################################
+# Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+# Copyright (C) 2023  Brad Hochgesang
+##################################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see the following:
+# https://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+#
+# You can contact the author either through the git-hub repository, or at the
+# following email address: FormerLurker@pm.me
+##################################################################################
+# Measures gcode preprocessing throughput, peak memory and plan counts for each precalculated trigger on synthetic
+# gcode, and compares the results with a stored baseline.  Each scenario runs in a new process so that the peak
+# memory of one scenario does not hide the peak memory of the next.  For example:
+#
+#   python -m octoprint_octolapse.benchmark.preprocessing
+#   python -m octoprint_octolapse.benchmark.preprocessing --layers 400 --moves-per-layer 2000 --scenario vase
+#   python -m octoprint_octolapse.benchmark.preprocessing --save-baseline
+#
+# Lines per second depend on the machine, so save a new baseline before comparing changes on another machine.
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from octoprint_octolapse.benchmark.gcode_generator import SyntheticGcode
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "preprocessing_baseline.json")
+BASELINE_VERSION = 1
+DEFAULT_LAYERS = 300
+DEFAULT_MOVES_PER_LAYER = 1000
+# each scenario is preprocessed this many times, and the fastest run is reported
+DEFAULT_REPEAT = 3
+# the fraction lines per second may drop, or peak memory may rise, before it is reported as a regression
+DEFAULT_TOLERANCE = 0.2
+
+# the synthetic gcode variants, which are combined with every trigger
+GCODE_VARIANTS = [
+    ("standard", {}),
+    ("vase_mode", {"vase_mode": True}),
+    ("multi_tool", {"tools": 2}),
+    ("firmware_retraction", {"firmware_retraction": True}),
+    ("arcs", {"arcs": True}),
+]
+
+# (name, trigger_subtype, smart_layer_trigger_type)
+TRIGGERS = [
+    ("smart_layer_snap_to_print", "layer", 0),
+    ("smart_layer_fast", "layer", 1),
+    ("smart_layer_compatibility", "layer", 2),
+    ("smart_layer_high_quality", "layer", 3),
+    ("smart_gcode", "gcode", None),
+]
+
+OCTOPRINT_PRINTER_PROFILE = {
+    "volume": {
+        "width": 200, "depth": 200, "height": 200, "origin": "lowerleft", "formFactor": "rectangular",
+        "custom_box": False
+    }
+}
+
+
+def get_scenarios(name_filter=None):
+    scenarios = []
+    for variant_name, variant in GCODE_VARIANTS:
+        for trigger_name, trigger_subtype, smart_layer_trigger_type in TRIGGERS:
+            name = "{0}/{1}".format(variant_name, trigger_name)
+            if name_filter and name_filter not in name:
+                continue
+            scenarios.append((name, variant_name, trigger_subtype, smart_layer_trigger_type))
+    return scenarios
+
+
+def get_peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        # resource is not available on windows, but the peak working set is
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1048576.0
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, and in kilobytes everywhere else
+    if sys.platform == "darwin":
+        return peak_rss / 1048576.0
+    return peak_rss / 1024.0
+
+
+def get_timelapse_settings(gcode_file_path, variant, trigger_subtype, smart_layer_trigger_type):
+    import octoprint_octolapse
+    from octoprint_octolapse.settings import OctolapseSettings, PrinterProfile, TriggerProfile, CuraExtruder
+
+    default_settings_path = os.path.join(
+        os.path.dirname(octoprint_octolapse.__file__), "data",
+        octoprint_octolapse.OctolapsePlugin.get_default_settings_filename()
+    )
+    with open(default_settings_path, 'r') as settings_file:
+        data = json.load(settings_file)
+    settings = OctolapseSettings.create_from_iterable(octoprint_octolapse.__version__, data)
+
+    printer = PrinterProfile("Benchmark Printer")
+    printer.slicer_type = "cura"
+    printer.snapshot_command = SyntheticGcode.SNAPSHOT_COMMAND
+    tools = variant.get("tools", 1)
+    if tools > 1:
+        printer.num_extruders = tools
+        printer.shared_extruder = True
+    slicer_settings = printer.get_current_slicer_settings()
+    slicer_settings.layer_height = SyntheticGcode.LAYER_HEIGHT
+    slicer_settings.smooth_spiralized_contours = variant.get("vase_mode", False)
+    slicer_settings.machine_extruder_count = tools
+    slicer_settings.extruders = []
+    for _ in range(tools):
+        extruder = CuraExtruder()
+        extruder.retraction_enable = True
+        extruder.retraction_amount = SyntheticGcode.RETRACTION_LENGTH
+        extruder.retraction_retract_speed = 40
+        extruder.retraction_prime_speed = 40
+        extruder.speed_travel = 150
+        slicer_settings.extruders.append(extruder)
+    printer.default_firmware_retractions = variant.get("firmware_retraction", False)
+    printer.gcode_generation_settings = slicer_settings.get_gcode_generation_settings(slicer_type=printer.slicer_type)
+    settings.profiles.printers[printer.guid] = printer
+    settings.profiles.current_printer_profile_guid = printer.guid
+
+    trigger = TriggerProfile("Benchmark Trigger")
+    trigger.trigger_type = TriggerProfile.TRIGGER_TYPE_SMART
+    trigger.trigger_subtype = trigger_subtype
+    if smart_layer_trigger_type is not None:
+        trigger.smart_layer_trigger_type = smart_layer_trigger_type
+    settings.profiles.triggers[trigger.guid] = trigger
+    settings.profiles.current_trigger_profile_guid = trigger.guid
+
+    return {
+        "success": True,
+        "settings": settings,
+        "gcode_file_path": gcode_file_path,
+        "overridable_printer_profile_settings": printer.get_overridable_profile_settings(
+            False, OCTOPRINT_PRINTER_PROFILE
+        )
+    }
+
+
+def run_scenario(gcode_file_path, variant, trigger_subtype, smart_layer_trigger_type, processing_threads, repeat):
+    """Preprocesses the gcode file in this process and returns the measurements."""
+    # import octolapse before GcodePositionProcessor, which imports the octolapse logging module when initialized
+    from octoprint_octolapse.log import LoggingConfigurator
+    from octoprint_octolapse.stabilization_preprocessing import StabilizationPreprocessingThread
+
+    timelapse_settings = get_timelapse_settings(gcode_file_path, variant, trigger_subtype, smart_layer_trigger_type)
+    # log the way the plugin does with the default settings, since debug logging slows preprocessing considerably
+    LoggingConfigurator().configure_loggers(
+        logging_settings=timelapse_settings["settings"].profiles.current_logging_profile()
+    )
+    results = {}
+
+    def on_complete(
+        success, is_cancelled, snapshot_plans, seconds_elapsed, gcodes_processed, lines_processed,
+        missed_snapshots, quality_issues, processing_issues, timelapse_settings, parsed_command
+    ):
+        results.update({
+            "success": success,
+            "plans": len(snapshot_plans),
+            "gcodes_processed": gcodes_processed,
+            "lines_processed": lines_processed,
+            "missed_snapshots": missed_snapshots,
+        })
+
+    peak_rss_before_mb = get_peak_rss_mb()
+    seconds_elapsed = None
+    for _ in range(max(1, repeat)):
+        preprocessor = StabilizationPreprocessingThread(
+            timelapse_settings,
+            lambda *args: None,
+            lambda: None,
+            on_complete,
+            threading.Event(),
+            None
+        )
+        if processing_threads:
+            preprocessor.processing_threads = processing_threads
+        start_time = time.perf_counter()
+        # run the preprocessor on this thread
+        preprocessor.run()
+        run_seconds = time.perf_counter() - start_time
+        if seconds_elapsed is None or run_seconds < seconds_elapsed:
+            seconds_elapsed = run_seconds
+    results["processing_threads"] = preprocessor.processing_threads
+    results["seconds_elapsed"] = seconds_elapsed
+    results["lines_per_second"] = results["lines_processed"] / seconds_elapsed if seconds_elapsed else 0
+    results["peak_rss_mb"] = get_peak_rss_mb()
+    # how far preprocessing raised the peak above the interpreter, octolapse and the settings
+    results["peak_rss_increase_mb"] = results["peak_rss_mb"] - peak_rss_before_mb
+    return results
+
+
+def run(layers, moves_per_layer, processing_threads=None, name_filter=None, repeat=DEFAULT_REPEAT):
+    scenarios = get_scenarios(name_filter)
+    variants = dict(GCODE_VARIANTS)
+    results = {}
+    # spawn a new interpreter for every scenario so the peak memory only includes that scenario
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as temp_directory:
+        gcode_file_paths = {}
+        for name, variant_name, trigger_subtype, smart_layer_trigger_type in scenarios:
+            variant = variants[variant_name]
+            if variant_name not in gcode_file_paths:
+                gcode_file_path = os.path.join(temp_directory, "{0}.gcode".format(variant_name))
+                SyntheticGcode(layers=layers, moves_per_layer=moves_per_layer, **variant).write(gcode_file_path)
+                gcode_file_paths[variant_name] = gcode_file_path
+            with context.Pool(1) as pool:
+                result = pool.apply(
+                    run_scenario,
+                    (gcode_file_paths[variant_name], variant, trigger_subtype, smart_layer_trigger_type,
+                     processing_threads, repeat)
+                )
+            results[name] = result
+            print_result(name, result)
+    return results
+
+
+def print_result(name, result):
+    print("{0:<45} {1:>7} plans {2:>9.0f} lines/sec {3:>7.1f} MB peak (+{4:.1f} MB) {5:>6.2f} sec{6}".format(
+        name, result["plans"], result["lines_per_second"], result["peak_rss_mb"], result["peak_rss_increase_mb"],
+        result["seconds_elapsed"], "" if result["success"] else " FAILED"
+    ))
+
+
+def load_baseline(baseline_path):
+    if not os.path.isfile(baseline_path):
+        return None
+    with open(baseline_path, 'r') as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get("version") != BASELINE_VERSION:
+        return None
+    return baseline
+
+
+def save_baseline(baseline_path, layers, moves_per_layer, results):
+    baseline = {
+        "version": BASELINE_VERSION,
+        "layers": layers,
+        "moves_per_layer": moves_per_layer,
+        "scenarios": results
+    }
+    with open(baseline_path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write("\n")
+
+
+def compare(results, baseline, tolerance):
+    """Returns a list of regressions compared with the baseline.  The plan and line counts must match exactly, since
+    they do not depend on the machine."""
+    regressions = []
+    for name, result in sorted(results.items()):
+        expected = baseline["scenarios"].get(name)
+        if expected is None:
+            continue
+        for key in ("success", "plans", "gcodes_processed", "lines_processed", "missed_snapshots"):
+            if result[key] != expected[key]:
+                regressions.append("{0}: {1} is {2}, the baseline is {3}.".format(name, key, result[key], expected[key]))
+        if result["lines_per_second"] < expected["lines_per_second"] * (1 - tolerance):
+            regressions.append("{0}: {1:.0f} lines/sec is slower than the baseline of {2:.0f} lines/sec.".format(
+                name, result["lines_per_second"], expected["lines_per_second"]
+            ))
+        if result["peak_rss_mb"] > expected["peak_rss_mb"] * (1 + tolerance):
+            regressions.append("{0}: {1:.1f} MB peak is more than the baseline of {2:.1f} MB.".format(
+                name, result["peak_rss_mb"], expected["peak_rss_mb"]
+            ))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gcode preprocessing on synthetic gcode.")
+    parser.add_argument("--layers", type=int, default=DEFAULT_LAYERS)
+    parser.add_argument("--moves-per-layer", type=int, default=DEFAULT_MOVES_PER_LAYER)
+    parser.add_argument("--threads", type=int, default=None, help="The number of processing threads to use.")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--scenario", default=None, help="Only run the scenarios whose names contain this text.")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    results = run(args.layers, args.moves_per_layer, args.threads, args.scenario, args.repeat)
+    if args.save_baseline:
+        save_baseline(args.baseline, args.layers, args.moves_per_layer, results)
+        print("Saved the baseline to {0}.".format(args.baseline))
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print("There is no baseline to compare with.")
+        return 0
+    if baseline["layers"] != args.layers or baseline["moves_per_layer"] != args.moves_per_layer:
+        print("The baseline was created with {0} layers and {1} moves per layer, so it can't be compared.".format(
+            baseline["layers"], baseline["moves_per_layer"]
+        ))
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(regression)
+    if regressions:
+        return 1
+    print("No regressions compared with the baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
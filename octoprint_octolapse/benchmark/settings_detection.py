@@ -0,0 +1,146 @@
+# coding=utf-8
+##################################################################################
+# Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+# Copyright (C) 2023  Brad Hochgesang
+##################################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see the following:
+# https://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+#
+# You can contact the author either through the git-hub repository, or at the
+# following email address: FormerLurker@pm.me
+##################################################################################
+# Measures how many lines per second the slicer settings processors can match.  Pass the paths of gcode files created
+# by the slicers to measure real output, for example:
+#
+#   python -m octoprint_octolapse.benchmark.settings_detection cura.gcode prusaslicer.gcode
+#
+# Without any paths, the benchmark uses generated gcode with a settings block in the format of each slicer.
+import re
+import sys
+import time
+from octoprint_octolapse.settings_preprocessor import (
+    Slic3rSettingsProcessor, Simplify3dSettingsProcessor, CuraSettingsProcessor
+)
+
+
+def get_processors():
+    return [Slic3rSettingsProcessor(), Simplify3dSettingsProcessor(), CuraSettingsProcessor()]
+
+
+# Settings blocks in the format each slicer writes them
+SLICER_HEADERS = [
+    [
+        u"; generated by PrusaSlicer 2.5.0 on 2023-01-01 at 10:11:12",
+        u"; external perimeters extrusion width = 0.45mm",
+        u"; perimeters extrusion width = 0.45mm",
+    ],
+    [
+        u"; G-Code generated by Simplify3D(R) Version 4.1.2",
+        u"; Sep 12, 2019 at 9:41:18 PM",
+        u";   extruderToolheadNumber,0",
+        u";   extruderRetractionDistance,1",
+        u";   extruderRetractionZLift,0.3",
+        u";   extruderRetractionSpeed,1800",
+        u";   rapidXYspeed,4800",
+        u";   layerHeight,0.2",
+        u";   spiralVaseMode,0",
+    ],
+    [
+        u";FLAVOR:Marlin",
+        u";Generated with Cura_SteamEngine 5.2.1",
+        u";Layer height: 0.2",
+        u";Filament used: 1.5m",
+    ],
+]
+SLICER_TAILS = [
+    [
+        u"; retract_length = 0.8",
+        u"; retract_lift = 0.4",
+        u"; retract_speed = 35",
+        u"; deretract_speed = 0",
+        u"; travel_speed = 180",
+        u"; first_layer_speed = 50%",
+        u"; layer_height = 0.2",
+        u"; spiral_vase = 0",
+        u"; wipe = 1",
+    ],
+    [],
+    [
+        u"; speed_travel = 150",
+        u"; retraction_amount = 6.5",
+        u"; retraction_speed = 25",
+        u"; layer_height = 0.2",
+    ],
+]
+
+
+def get_generated_lines(num_gcodes=500):
+    lines = []
+    for header, tail in zip(SLICER_HEADERS, SLICER_TAILS):
+        lines.extend(header)
+        # mix in some gcode, which makes up most of the lines the processors search
+        for index in range(num_gcodes):
+            lines.append(u"G1 X{0:.3f} Y{1:.3f} E{2:.5f}".format(index % 200, index % 150, index * 0.01))
+        lines.extend(tail)
+    return lines
+
+
+def read_lines(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as gcode_file:
+        return gcode_file.readlines()
+
+
+def process_line_sequential(processor, line):
+    # The settings processors tried each regex in turn before the regexes were combined.
+    line = line.strip()
+    for regex_definition in list(processor.active_regex_definitions.values()):
+        if not regex_definition.try_match():
+            continue
+        match = re.search(regex_definition.regex, line)
+        if not match:
+            continue
+        regex_definition.has_matched = True
+        processor.process_match(match, line, regex_definition)
+        break
+
+
+def run(lines, process_line, repeat):
+    lines_processed = 0
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        processors = get_processors()
+        for processor in processors:
+            processor.on_before_start()
+            processor.on_apply_filter(None)
+        for line_number, line in enumerate(lines, 1):
+            for processor in processors:
+                process_line(processor, line, line_number)
+        lines_processed += len(lines) * len(processors)
+    return lines_processed / (time.perf_counter() - start_time)
+
+
+def benchmark(name, lines, repeat=5):
+    combined = run(lines, lambda processor, line, line_number: processor.process_line(line, line_number, u'forward'), repeat)
+    sequential = run(lines, lambda processor, line, line_number: process_line_sequential(processor, line), repeat)
+    print(u"{0}: {1} lines, {2:.0f} lines/sec combined, {3:.0f} lines/sec sequential ({4:.2f}x)".format(
+        name, len(lines), combined, sequential, combined / sequential
+    ))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            benchmark(path, read_lines(path))
+    else:
+        benchmark(u"generated", get_generated_lines())
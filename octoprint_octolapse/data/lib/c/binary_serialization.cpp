@@ -0,0 +1,386 @@
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+// Copyright(C) 2019  Brad Hochgesang
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// This program is free software : you can redistribute it and/or modify
+// it under the terms of the GNU Affero General Public License as published
+// by the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.See the
+// GNU Affero General Public License for more details.
+//
+// You should have received a copy of the GNU Affero General Public License
+// along with this program.If not, see the following :
+// https ://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+//
+// You can contact the author either through the git - hub repository, or at the
+// following email address : FormerLurker@pm.me
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+#include "binary_serialization.h"
+#include <cstring>
+#include <stdint.h>
+
+binary_writer::binary_writer()
+{
+}
+
+void binary_writer::write_bytes(const void* data, const size_t size)
+{
+  buffer_.append(static_cast<const char*>(data), size);
+}
+
+void binary_writer::write_bool(const bool value)
+{
+  write_char(value ? 1 : 0);
+}
+
+void binary_writer::write_char(const char value)
+{
+  write_bytes(&value, sizeof(value));
+}
+
+void binary_writer::write_int(const int value)
+{
+  const int32_t fixed_value = static_cast<int32_t>(value);
+  write_bytes(&fixed_value, sizeof(fixed_value));
+}
+
+void binary_writer::write_long(const long value)
+{
+  const int64_t fixed_value = static_cast<int64_t>(value);
+  write_bytes(&fixed_value, sizeof(fixed_value));
+}
+
+void binary_writer::write_size(const size_t value)
+{
+  const uint64_t fixed_value = static_cast<uint64_t>(value);
+  write_bytes(&fixed_value, sizeof(fixed_value));
+}
+
+void binary_writer::write_double(const double value)
+{
+  write_bytes(&value, sizeof(value));
+}
+
+void binary_writer::write_string(const std::string& value)
+{
+  write_size(value.size());
+  write_bytes(value.data(), value.size());
+}
+
+void binary_writer::write_parsed_command(const parsed_command& command)
+{
+  write_string(command.command);
+  write_string(command.gcode);
+  write_string(command.comment);
+  write_bool(command.is_empty);
+  write_bool(command.is_known_command);
+  write_size(command.parameters.size());
+  for (std::vector<parsed_command_parameter>::const_iterator it = command.parameters.begin();
+       it != command.parameters.end(); ++it)
+  {
+    write_string(it->name);
+    write_char(it->value_type);
+    write_double(it->double_value);
+    write_size(it->unsigned_long_value);
+    write_string(it->string_value);
+  }
+}
+
+void binary_writer::write_position(const position& pos)
+{
+  write_parsed_command(pos.command);
+  write_int(pos.feature_type_tag);
+  write_double(pos.f);
+  write_bool(pos.f_null);
+  write_double(pos.x);
+  write_bool(pos.x_null);
+  write_double(pos.x_offset);
+  write_double(pos.x_firmware_offset);
+  write_bool(pos.x_homed);
+  write_double(pos.y);
+  write_bool(pos.y_null);
+  write_double(pos.y_offset);
+  write_double(pos.y_firmware_offset);
+  write_bool(pos.y_homed);
+  write_double(pos.z);
+  write_bool(pos.z_null);
+  write_double(pos.z_offset);
+  write_double(pos.z_firmware_offset);
+  write_bool(pos.z_homed);
+  write_bool(pos.is_metric);
+  write_bool(pos.is_metric_null);
+  write_double(pos.last_extrusion_height);
+  write_bool(pos.last_extrusion_height_null);
+  write_long(pos.layer);
+  write_double(pos.height);
+  write_int(pos.height_increment);
+  write_int(pos.height_increment_change_count);
+  write_bool(pos.is_printer_primed);
+  write_bool(pos.has_definite_position);
+  write_double(pos.z_relative);
+  write_bool(pos.is_relative);
+  write_bool(pos.is_relative_null);
+  write_bool(pos.is_extruder_relative);
+  write_bool(pos.is_extruder_relative_null);
+  write_bool(pos.is_layer_change);
+  write_bool(pos.is_height_change);
+  write_bool(pos.is_height_increment_change);
+  write_bool(pos.is_xy_travel);
+  write_bool(pos.is_xyz_travel);
+  write_bool(pos.is_zhop);
+  write_bool(pos.has_position_changed);
+  write_bool(pos.has_xy_position_changed);
+  write_bool(pos.has_received_home_command);
+  write_bool(pos.is_in_position);
+  write_bool(pos.in_path_position);
+  write_long(pos.file_line_number);
+  write_long(pos.gcode_number);
+  write_long(pos.file_position);
+  write_bool(pos.gcode_ignored);
+  write_bool(pos.is_in_bounds);
+  write_bool(pos.is_empty);
+  write_int(pos.current_tool);
+  write_int(pos.num_extruders);
+  for (int index = 0; index < pos.num_extruders; index++)
+  {
+    const extruder& current_extruder = pos.p_extruders[index];
+    write_double(current_extruder.x_firmware_offset);
+    write_double(current_extruder.y_firmware_offset);
+    write_double(current_extruder.z_firmware_offset);
+    write_double(current_extruder.e);
+    write_double(current_extruder.e_offset);
+    write_double(current_extruder.e_relative);
+    write_double(current_extruder.extrusion_length);
+    write_double(current_extruder.extrusion_length_total);
+    write_double(current_extruder.retraction_length);
+    write_double(current_extruder.deretraction_length);
+    write_bool(current_extruder.is_extruding_start);
+    write_bool(current_extruder.is_extruding);
+    write_bool(current_extruder.is_primed);
+    write_bool(current_extruder.is_retracting_start);
+    write_bool(current_extruder.is_retracting);
+    write_bool(current_extruder.is_retracted);
+    write_bool(current_extruder.is_partially_retracted);
+    write_bool(current_extruder.is_deretracting_start);
+    write_bool(current_extruder.is_deretracting);
+    write_bool(current_extruder.is_deretracted);
+  }
+}
+
+void binary_writer::write_buffer(const std::string& buffer)
+{
+  buffer_.append(buffer);
+}
+
+const std::string& binary_writer::get_buffer() const
+{
+  return buffer_;
+}
+
+size_t binary_writer::size() const
+{
+  return buffer_.size();
+}
+
+binary_reader::binary_reader(const char* data, const size_t size)
+{
+  data_ = data;
+  size_ = size;
+  offset_ = 0;
+}
+
+bool binary_reader::read_bytes(void* data, const size_t size)
+{
+  if (size > size_ - offset_)
+    return false;
+  memcpy(data, data_ + offset_, size);
+  offset_ += size;
+  return true;
+}
+
+bool binary_reader::read_bool(bool& value)
+{
+  char char_value;
+  if (!read_char(char_value))
+    return false;
+  value = char_value != 0;
+  return true;
+}
+
+bool binary_reader::read_char(char& value)
+{
+  return read_bytes(&value, sizeof(value));
+}
+
+bool binary_reader::read_int(int& value)
+{
+  int32_t fixed_value;
+  if (!read_bytes(&fixed_value, sizeof(fixed_value)))
+    return false;
+  value = static_cast<int>(fixed_value);
+  return true;
+}
+
+bool binary_reader::read_long(long& value)
+{
+  int64_t fixed_value;
+  if (!read_bytes(&fixed_value, sizeof(fixed_value)))
+    return false;
+  value = static_cast<long>(fixed_value);
+  return true;
+}
+
+bool binary_reader::read_size(size_t& value)
+{
+  uint64_t fixed_value;
+  if (!read_bytes(&fixed_value, sizeof(fixed_value)))
+    return false;
+  value = static_cast<size_t>(fixed_value);
+  return true;
+}
+
+bool binary_reader::read_double(double& value)
+{
+  return read_bytes(&value, sizeof(value));
+}
+
+bool binary_reader::read_string(std::string& value)
+{
+  size_t size;
+  if (!read_size(size) || size > size_ - offset_)
+    return false;
+  value.assign(data_ + offset_, size);
+  offset_ += size;
+  return true;
+}
+
+bool binary_reader::read_parsed_command(parsed_command& command)
+{
+  size_t num_parameters;
+  if (
+    !read_string(command.command) ||
+    !read_string(command.gcode) ||
+    !read_string(command.comment) ||
+    !read_bool(command.is_empty) ||
+    !read_bool(command.is_known_command) ||
+    !read_size(num_parameters)
+  )
+    return false;
+  command.parameters.clear();
+  for (size_t index = 0; index < num_parameters; index++)
+  {
+    parsed_command_parameter parameter;
+    size_t unsigned_long_value;
+    if (
+      !read_string(parameter.name) ||
+      !read_char(parameter.value_type) ||
+      !read_double(parameter.double_value) ||
+      !read_size(unsigned_long_value) ||
+      !read_string(parameter.string_value)
+    )
+      return false;
+    parameter.unsigned_long_value = static_cast<unsigned long>(unsigned_long_value);
+    command.parameters.push_back(parameter);
+  }
+  return true;
+}
+
+bool binary_reader::read_position(position& pos)
+{
+  int num_extruders;
+  if (
+    !read_parsed_command(pos.command) ||
+    !read_int(pos.feature_type_tag) ||
+    !read_double(pos.f) ||
+    !read_bool(pos.f_null) ||
+    !read_double(pos.x) ||
+    !read_bool(pos.x_null) ||
+    !read_double(pos.x_offset) ||
+    !read_double(pos.x_firmware_offset) ||
+    !read_bool(pos.x_homed) ||
+    !read_double(pos.y) ||
+    !read_bool(pos.y_null) ||
+    !read_double(pos.y_offset) ||
+    !read_double(pos.y_firmware_offset) ||
+    !read_bool(pos.y_homed) ||
+    !read_double(pos.z) ||
+    !read_bool(pos.z_null) ||
+    !read_double(pos.z_offset) ||
+    !read_double(pos.z_firmware_offset) ||
+    !read_bool(pos.z_homed) ||
+    !read_bool(pos.is_metric) ||
+    !read_bool(pos.is_metric_null) ||
+    !read_double(pos.last_extrusion_height) ||
+    !read_bool(pos.last_extrusion_height_null) ||
+    !read_long(pos.layer) ||
+    !read_double(pos.height) ||
+    !read_int(pos.height_increment) ||
+    !read_int(pos.height_increment_change_count) ||
+    !read_bool(pos.is_printer_primed) ||
+    !read_bool(pos.has_definite_position) ||
+    !read_double(pos.z_relative) ||
+    !read_bool(pos.is_relative) ||
+    !read_bool(pos.is_relative_null) ||
+    !read_bool(pos.is_extruder_relative) ||
+    !read_bool(pos.is_extruder_relative_null) ||
+    !read_bool(pos.is_layer_change) ||
+    !read_bool(pos.is_height_change) ||
+    !read_bool(pos.is_height_increment_change) ||
+    !read_bool(pos.is_xy_travel) ||
+    !read_bool(pos.is_xyz_travel) ||
+    !read_bool(pos.is_zhop) ||
+    !read_bool(pos.has_position_changed) ||
+    !read_bool(pos.has_xy_position_changed) ||
+    !read_bool(pos.has_received_home_command) ||
+    !read_bool(pos.is_in_position) ||
+    !read_bool(pos.in_path_position) ||
+    !read_long(pos.file_line_number) ||
+    !read_long(pos.gcode_number) ||
+    !read_long(pos.file_position) ||
+    !read_bool(pos.gcode_ignored) ||
+    !read_bool(pos.is_in_bounds) ||
+    !read_bool(pos.is_empty) ||
+    !read_int(pos.current_tool) ||
+    !read_int(num_extruders) ||
+    num_extruders < 0
+  )
+    return false;
+  pos.set_num_extruders(num_extruders);
+  for (int index = 0; index < num_extruders; index++)
+  {
+    extruder& current_extruder = pos.p_extruders[index];
+    if (
+      !read_double(current_extruder.x_firmware_offset) ||
+      !read_double(current_extruder.y_firmware_offset) ||
+      !read_double(current_extruder.z_firmware_offset) ||
+      !read_double(current_extruder.e) ||
+      !read_double(current_extruder.e_offset) ||
+      !read_double(current_extruder.e_relative) ||
+      !read_double(current_extruder.extrusion_length) ||
+      !read_double(current_extruder.extrusion_length_total) ||
+      !read_double(current_extruder.retraction_length) ||
+      !read_double(current_extruder.deretraction_length) ||
+      !read_bool(current_extruder.is_extruding_start) ||
+      !read_bool(current_extruder.is_extruding) ||
+      !read_bool(current_extruder.is_primed) ||
+      !read_bool(current_extruder.is_retracting_start) ||
+      !read_bool(current_extruder.is_retracting) ||
+      !read_bool(current_extruder.is_retracted) ||
+      !read_bool(current_extruder.is_partially_retracted) ||
+      !read_bool(current_extruder.is_deretracting_start) ||
+      !read_bool(current_extruder.is_deretracting) ||
+      !read_bool(current_extruder.is_deretracted)
+    )
+      return false;
+  }
+  return true;
+}
+
+bool binary_reader::is_complete() const
+{
+  return offset_ == size_;
+}
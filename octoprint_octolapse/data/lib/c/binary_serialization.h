@@ -0,0 +1,80 @@
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+// Copyright(C) 2019  Brad Hochgesang
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// This program is free software : you can redistribute it and/or modify
+// it under the terms of the GNU Affero General Public License as published
+// by the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.See the
+// GNU Affero General Public License for more details.
+//
+// You should have received a copy of the GNU Affero General Public License
+// along with this program.If not, see the following :
+// https ://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+//
+// You can contact the author either through the git - hub repository, or at the
+// following email address : FormerLurker@pm.me
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+#ifndef BINARY_SERIALIZATION_H
+#define BINARY_SERIALIZATION_H
+#include <string>
+#include "parsed_command.h"
+#include "position.h"
+
+/**
+ * \brief Appends values to a byte buffer in a fixed width format, so that native state can be saved and restored
+ * later by a binary_reader.  The buffer is only meant to be read by the same build on the same machine.
+ */
+class binary_writer
+{
+public:
+  binary_writer();
+  void write_bool(bool value);
+  void write_char(char value);
+  void write_int(int value);
+  void write_long(long value);
+  void write_size(size_t value);
+  void write_double(double value);
+  void write_string(const std::string& value);
+  void write_parsed_command(const parsed_command& command);
+  void write_position(const position& pos);
+  /**
+   * \brief Appends the contents of a buffer returned by get_buffer.
+   */
+  void write_buffer(const std::string& buffer);
+  const std::string& get_buffer() const;
+  size_t size() const;
+private:
+  void write_bytes(const void* data, size_t size);
+  std::string buffer_;
+};
+
+/**
+ * \brief Reads the values written by a binary_writer, in the same order.  Every read returns false, and leaves the
+ * value unchanged, if there is not enough data left.
+ */
+class binary_reader
+{
+public:
+  binary_reader(const char* data, size_t size);
+  bool read_bool(bool& value);
+  bool read_char(char& value);
+  bool read_int(int& value);
+  bool read_long(long& value);
+  bool read_size(size_t& value);
+  bool read_double(double& value);
+  bool read_string(std::string& value);
+  bool read_parsed_command(parsed_command& command);
+  bool read_position(position& pos);
+  bool is_complete() const;
+private:
+  bool read_bytes(void* data, size_t size);
+  const char* data_;
+  size_t size_;
+  size_t offset_;
+};
+#endif
@@ -0,0 +1,224 @@
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+// Copyright(C) 2019  Brad Hochgesang
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// This program is free software : you can redistribute it and/or modify
+// it under the terms of the GNU Affero General Public License as published
+// by the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.See the
+// GNU Affero General Public License for more details.
+//
+// You should have received a copy of the GNU Affero General Public License
+// along with this program.If not, see the following :
+// https ://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+//
+// You can contact the author either through the git - hub repository, or at the
+// following email address : FormerLurker@pm.me
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+#include "gcode_chunk_reader.h"
+
+const long gcode_chunk_reader::DEFAULT_CHUNK_SIZE;
+
+gcode_chunk::gcode_chunk()
+{
+  num_commands = 0;
+  start = 0;
+  end = 0;
+  is_parsed = false;
+  is_valid = true;
+}
+
+void gcode_chunk::reset(long start_, long end_)
+{
+  start = start_;
+  end = end_;
+  num_commands = 0;
+  is_parsed = false;
+  is_valid = true;
+}
+
+gcode_chunk_reader::gcode_chunk_reader(std::string file_path, long file_size, unsigned int num_threads,
+                                       long chunk_size, long start_offset)
+{
+  file_path_ = file_path;
+  file_size_ = file_size;
+  start_offset_ = start_offset < 0 ? 0 : start_offset;
+  chunk_size_ = chunk_size < 1 ? DEFAULT_CHUNK_SIZE : chunk_size;
+  num_chunks_ = file_size_ <= start_offset_ ? 0 : (file_size_ - start_offset_ + chunk_size_ - 1) / chunk_size_;
+  next_chunk_index_ = 0;
+  num_threads_ = num_threads < 1 ? 1 : num_threads;
+  // Keep a couple of parsed chunks ready for each worker plus the one being processed, but don't hold the whole
+  // file in memory.
+  max_chunks_in_memory_ = num_threads_ * 2 + 1;
+  is_stopped_ = false;
+  current_chunk_ = NULL;
+}
+
+gcode_chunk_reader::gcode_chunk_reader(const gcode_chunk_reader& source)
+{
+  // Private copy constructor, don't copy me!
+  throw std::exception();
+}
+
+gcode_chunk_reader::~gcode_chunk_reader()
+{
+  stop();
+  for (std::vector<std::thread>::iterator it = threads_.begin(); it != threads_.end(); ++it)
+  {
+    if (it->joinable())
+      it->join();
+  }
+  if (current_chunk_ != NULL)
+  {
+    delete current_chunk_;
+    current_chunk_ = NULL;
+  }
+  while (!chunks_.empty())
+  {
+    delete chunks_.front();
+    chunks_.pop_front();
+  }
+  for (std::vector<gcode_chunk*>::iterator it = free_chunks_.begin(); it != free_chunks_.end(); ++it)
+  {
+    delete *it;
+  }
+  free_chunks_.clear();
+}
+
+long gcode_chunk_reader::get_num_chunks() const
+{
+  return num_chunks_;
+}
+
+void gcode_chunk_reader::start()
+{
+  for (unsigned int index = 0; index < num_threads_; index++)
+  {
+    threads_.push_back(std::thread(&gcode_chunk_reader::read_chunks, this));
+  }
+}
+
+void gcode_chunk_reader::stop()
+{
+  std::lock_guard<std::mutex> lock(mutex_);
+  is_stopped_ = true;
+  chunk_parsed_.notify_all();
+  chunk_released_.notify_all();
+}
+
+unsigned int gcode_chunk_reader::get_num_chunks_in_memory() const
+{
+  return static_cast<unsigned int>(chunks_.size()) + (current_chunk_ == NULL ? 0 : 1);
+}
+
+gcode_chunk* gcode_chunk_reader::get_next_chunk()
+{
+  // The workers may need the GIL in order to log parser warnings, so release it while waiting.
+  PyThreadState* thread_state = NULL;
+  if (Py_IsInitialized() && PyGILState_Check())
+    thread_state = PyEval_SaveThread();
+  {
+    std::unique_lock<std::mutex> lock(mutex_);
+    if (current_chunk_ != NULL)
+    {
+      free_chunks_.push_back(current_chunk_);
+      current_chunk_ = NULL;
+      chunk_released_.notify_all();
+    }
+    while (
+      !is_stopped_ &&
+      !(chunks_.empty() && next_chunk_index_ >= num_chunks_) &&
+      (chunks_.empty() || !chunks_.front()->is_parsed)
+    )
+    {
+      chunk_parsed_.wait(lock);
+    }
+    if (!is_stopped_ && !chunks_.empty())
+    {
+      current_chunk_ = chunks_.front();
+      chunks_.pop_front();
+    }
+  }
+  if (thread_state != NULL)
+    PyEval_RestoreThread(thread_state);
+  return current_chunk_;
+}
+
+void gcode_chunk_reader::read_chunks()
+{
+  gcode_parser parser;
+  // Each worker maps the file once and reads all of its chunks from the mapping.
+  gcode_line_scanner scanner;
+  scanner.open(file_path_);
+  while (true)
+  {
+    gcode_chunk* chunk;
+    {
+      std::unique_lock<std::mutex> lock(mutex_);
+      while (
+        !is_stopped_ &&
+        next_chunk_index_ < num_chunks_ &&
+        get_num_chunks_in_memory() >= max_chunks_in_memory_
+      )
+      {
+        chunk_released_.wait(lock);
+      }
+      if (is_stopped_ || next_chunk_index_ >= num_chunks_)
+        return;
+      long start = start_offset_ + next_chunk_index_ * chunk_size_;
+      long end = start + chunk_size_;
+      if (end > file_size_)
+        end = file_size_;
+      next_chunk_index_++;
+      if (free_chunks_.empty())
+      {
+        chunk = new gcode_chunk();
+      }
+      else
+      {
+        chunk = free_chunks_.back();
+        free_chunks_.pop_back();
+      }
+      chunk->reset(start, end);
+      // Add the chunk now so that the chunks stay in file order
+      chunks_.push_back(chunk);
+    }
+
+    const bool is_valid = read_chunk(chunk, parser, scanner);
+
+    std::lock_guard<std::mutex> lock(mutex_);
+    chunk->is_valid = is_valid;
+    chunk->is_parsed = true;
+    chunk_parsed_.notify_all();
+  }
+}
+
+bool gcode_chunk_reader::read_chunk(gcode_chunk* chunk, gcode_parser& parser, gcode_line_scanner& scanner) const
+{
+  if (!scanner.is_open())
+    return false;
+  // The line that contains the start of the chunk belongs to the previous chunk unless it starts exactly at the
+  // beginning of this one.
+  if (!scanner.seek_to_line_start(chunk->start))
+    return false;
+  const char* line;
+  while (scanner.get_offset() < chunk->end && scanner.get_next_line(line))
+  {
+    if (chunk->num_commands == chunk->commands.size())
+    {
+      chunk->commands.push_back(parsed_command());
+      chunk->found_commands.push_back(false);
+      chunk->file_positions.push_back(0);
+    }
+    parsed_command& cmd = chunk->commands[chunk->num_commands];
+    cmd.clear();
+    chunk->found_commands[chunk->num_commands] = parser.try_parse_gcode(line, cmd);
+    chunk->file_positions[chunk->num_commands] = scanner.get_position();
+    chunk->num_commands++;
+  }
+  return true;
+}
@@ -0,0 +1,116 @@
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+// Copyright(C) 2019  Brad Hochgesang
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// This program is free software : you can redistribute it and/or modify
+// it under the terms of the GNU Affero General Public License as published
+// by the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.See the
+// GNU Affero General Public License for more details.
+//
+// You should have received a copy of the GNU Affero General Public License
+// along with this program.If not, see the following :
+// https ://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+//
+// You can contact the author either through the git - hub repository, or at the
+// following email address : FormerLurker@pm.me
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+#ifndef GCODE_CHUNK_READER_H
+#define GCODE_CHUNK_READER_H
+#include <string>
+#include <vector>
+#include <deque>
+#include <thread>
+#include <mutex>
+#include <condition_variable>
+#include "parsed_command.h"
+#include "gcode_parser.h"
+#include "gcode_line_scanner.h"
+
+/**
+ * \brief A range of lines from a gcode file along with the parsed commands for each line.
+ */
+struct gcode_chunk
+{
+  gcode_chunk();
+  /**
+   * \brief Prepares the chunk to be read again.  The parsed commands are kept so that their memory can be reused.
+   */
+  void reset(long start_, long end_);
+  /**
+   * \brief The byte range of the chunk.  A chunk contains every line that starts within [start, end).
+   */
+  long start;
+  long end;
+  /**
+   * \brief The number of lines that were read.  The vectors below may be larger than this if the chunk is reused.
+   */
+  size_t num_commands;
+  std::vector<parsed_command> commands;
+  /**
+   * \brief The result of gcode_parser::try_parse_gcode for each command.
+   */
+  std::vector<bool> found_commands;
+  /**
+   * \brief The file position after each line was read, see gcode_line_scanner::get_position.
+   */
+  std::vector<long> file_positions;
+  bool is_parsed;
+  bool is_valid;
+};
+
+/**
+ * \brief Parses a gcode file on multiple worker threads.  The file is split into byte ranges that are aligned
+ * to line boundaries, and each range is parsed by a worker with its own parser.  The parsed chunks are returned in
+ * file order, so that the position tracking can be done on a single thread and produce exactly the same results as
+ * reading the file line by line.  The number of chunks held in memory is limited.
+ */
+class gcode_chunk_reader
+{
+public:
+  static const long DEFAULT_CHUNK_SIZE = 262144;
+  /**
+   * \brief Creates a reader for the lines that start at or after start_offset, which must be the start of a line.
+   */
+  gcode_chunk_reader(std::string file_path, long file_size, unsigned int num_threads,
+                     long chunk_size = DEFAULT_CHUNK_SIZE, long start_offset = 0);
+  ~gcode_chunk_reader();
+  void start();
+  /**
+   * \brief Gets the next parsed chunk in file order, waiting for it to be parsed if necessary.  The returned chunk
+   * is owned by the reader and is deleted by the next call.  Returns NULL after the last chunk, or if the reader was
+   * stopped.
+   */
+  gcode_chunk* get_next_chunk();
+  void stop();
+  long get_num_chunks() const;
+private:
+  gcode_chunk_reader(const gcode_chunk_reader& source); // don't copy me!
+  void read_chunks();
+  bool read_chunk(gcode_chunk* chunk, gcode_parser& parser, gcode_line_scanner& scanner) const;
+  unsigned int get_num_chunks_in_memory() const;
+  std::string file_path_;
+  long file_size_;
+  long start_offset_;
+  long chunk_size_;
+  long num_chunks_;
+  long next_chunk_index_;
+  unsigned int num_threads_;
+  unsigned int max_chunks_in_memory_;
+  bool is_stopped_;
+  // The chunks that are being parsed or are waiting to be processed, in file order.  The chunk being processed
+  // is held in current_chunk_.
+  std::deque<gcode_chunk*> chunks_;
+  gcode_chunk* current_chunk_;
+  // Processed chunks that can be reused
+  std::vector<gcode_chunk*> free_chunks_;
+  std::vector<std::thread> threads_;
+  std::mutex mutex_;
+  std::condition_variable chunk_parsed_;
+  std::condition_variable chunk_released_;
+};
+#endif
@@ -17,6 +17,28 @@ comment_process_type gcode_comment_processor::get_comment_process_type()
 	return processing_type_;
 }
 
+void gcode_comment_processor::write_state(binary_writer& writer) const
+{
+	writer.write_int(current_section_);
+	writer.write_int(current_subsection_);
+	writer.write_int(processing_type_);
+}
+
+bool gcode_comment_processor::read_state(binary_reader& reader)
+{
+	int current_section, current_subsection, processing_type;
+	if (
+		!reader.read_int(current_section) ||
+		!reader.read_int(current_subsection) ||
+		!reader.read_int(processing_type)
+	)
+		return false;
+	current_section_ = static_cast<section_type>(current_section);
+	current_subsection_ = static_cast<subsection_type>(current_subsection);
+	processing_type_ = static_cast<comment_process_type>(processing_type);
+	return true;
+}
+
 void gcode_comment_processor::update(position& pos)
 {
 	if (processing_type_ == comment_process_type_off)
@@ -1,5 +1,6 @@
 #pragma once
 #include "position.h"
+#include "binary_serialization.h"
 #define NUM_FEATURE_TYPES 12
 
 static const std::string feature_type_name[NUM_FEATURE_TYPES] = {
@@ -85,6 +86,11 @@ public:
   void update(position& pos);
   void update(std::string& comment);
   comment_process_type get_comment_process_type();
+  /**
+   * \brief Writes the current section and processing type so that they can be restored by read_state.
+   */
+  void write_state(binary_writer& writer) const;
+  bool read_state(binary_reader& reader);
 
 private:
   section_type current_section_;
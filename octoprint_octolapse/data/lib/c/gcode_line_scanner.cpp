@@ -0,0 +1,392 @@
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+// Copyright(C) 2019  Brad Hochgesang
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// This program is free software : you can redistribute it and/or modify
+// it under the terms of the GNU Affero General Public License as published
+// by the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.See the
+// GNU Affero General Public License for more details.
+//
+// You should have received a copy of the GNU Affero General Public License
+// along with this program.If not, see the following :
+// https ://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+//
+// You can contact the author either through the git - hub repository, or at the
+// following email address : FormerLurker@pm.me
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+#include "gcode_line_scanner.h"
+#include "utilities.h"
+#include <cstring>
+#ifdef _MSC_VER
+#ifndef WIN32_LEAN_AND_MEAN
+#define WIN32_LEAN_AND_MEAN
+#endif
+#ifndef NOMINMAX
+#define NOMINMAX
+#endif
+#include <windows.h>
+#else
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
+
+const size_t gcode_line_scanner::BUFFER_SIZE;
+
+gcode_line_scanner::gcode_line_scanner()
+{
+  file_size_ = 0;
+  offset_ = 0;
+  is_last_line_unterminated_ = false;
+  p_mapped_file_ = NULL;
+#ifdef _MSC_VER
+  file_handle_ = NULL;
+  mapping_handle_ = NULL;
+#endif
+  p_file_ = NULL;
+  buffer_start_ = 0;
+  buffer_end_ = 0;
+  is_buffer_eof_ = false;
+}
+
+gcode_line_scanner::gcode_line_scanner(const gcode_line_scanner& source)
+{
+  // Private copy constructor, don't copy me!
+  throw std::exception();
+}
+
+gcode_line_scanner::~gcode_line_scanner()
+{
+  close();
+}
+
+bool gcode_line_scanner::open(const std::string& file_path)
+{
+  close();
+  if (!map_file(file_path))
+  {
+    // Fall back to reading the file in blocks.  This is used for empty files, and if the file cannot be mapped
+    // (for example, if there isn't enough address space for a very large file).
+#ifdef _MSC_VER
+    std::wstring wpath = utilities::ToUtf16(file_path);
+    p_file_ = _wfopen(wpath.c_str(), L"rb");
+#else
+    p_file_ = fopen(file_path.c_str(), "rb");
+#endif
+    if (p_file_ == NULL)
+      return false;
+    fseek(p_file_, 0, SEEK_END);
+    file_size_ = ftell(p_file_);
+    fseek(p_file_, 0, SEEK_SET);
+    // leave room for a null terminator after the last line
+    buffer_.resize(BUFFER_SIZE + 1);
+  }
+  seek(0);
+  return true;
+}
+
+void gcode_line_scanner::close()
+{
+  unmap_file();
+  if (p_file_ != NULL)
+  {
+    fclose(p_file_);
+    p_file_ = NULL;
+  }
+  buffer_.clear();
+  last_line_.clear();
+  file_size_ = 0;
+  offset_ = 0;
+  buffer_start_ = 0;
+  buffer_end_ = 0;
+  is_buffer_eof_ = false;
+  is_last_line_unterminated_ = false;
+}
+
+bool gcode_line_scanner::is_open() const
+{
+  return p_mapped_file_ != NULL || p_file_ != NULL;
+}
+
+bool gcode_line_scanner::is_memory_mapped() const
+{
+  return p_mapped_file_ != NULL;
+}
+
+long gcode_line_scanner::get_file_size() const
+{
+  return file_size_;
+}
+
+long gcode_line_scanner::get_position() const
+{
+  return is_last_line_unterminated_ ? -1 : offset_;
+}
+
+long gcode_line_scanner::get_offset() const
+{
+  return offset_;
+}
+
+bool gcode_line_scanner::map_file(const std::string& file_path)
+{
+#ifdef _MSC_VER
+  std::wstring wpath = utilities::ToUtf16(file_path);
+  HANDLE file_handle = CreateFileW(
+    wpath.c_str(), GENERIC_READ, FILE_SHARE_READ | FILE_SHARE_WRITE, NULL, OPEN_EXISTING, FILE_FLAG_SEQUENTIAL_SCAN,
+    NULL
+  );
+  if (file_handle == INVALID_HANDLE_VALUE)
+    return false;
+  LARGE_INTEGER file_size;
+  if (!GetFileSizeEx(file_handle, &file_size) || file_size.QuadPart <= 0)
+  {
+    CloseHandle(file_handle);
+    return false;
+  }
+  HANDLE mapping_handle = CreateFileMappingW(file_handle, NULL, PAGE_READONLY, 0, 0, NULL);
+  if (mapping_handle == NULL)
+  {
+    CloseHandle(file_handle);
+    return false;
+  }
+  void* p_view = MapViewOfFile(mapping_handle, FILE_MAP_READ, 0, 0, 0);
+  if (p_view == NULL)
+  {
+    CloseHandle(mapping_handle);
+    CloseHandle(file_handle);
+    return false;
+  }
+  file_handle_ = file_handle;
+  mapping_handle_ = mapping_handle;
+  p_mapped_file_ = static_cast<const char*>(p_view);
+  file_size_ = static_cast<long>(file_size.QuadPart);
+  return true;
+#else
+  const int file_descriptor = ::open(file_path.c_str(), O_RDONLY);
+  if (file_descriptor < 0)
+    return false;
+  struct stat file_stat;
+  // Empty files cannot be mapped
+  if (fstat(file_descriptor, &file_stat) != 0 || file_stat.st_size <= 0)
+  {
+    ::close(file_descriptor);
+    return false;
+  }
+  void* p_map = mmap(NULL, static_cast<size_t>(file_stat.st_size), PROT_READ, MAP_PRIVATE, file_descriptor, 0);
+  // The mapping keeps the file open
+  ::close(file_descriptor);
+  if (p_map == MAP_FAILED)
+    return false;
+  madvise(p_map, static_cast<size_t>(file_stat.st_size), MADV_SEQUENTIAL);
+  p_mapped_file_ = static_cast<const char*>(p_map);
+  file_size_ = static_cast<long>(file_stat.st_size);
+  return true;
+#endif
+}
+
+void gcode_line_scanner::unmap_file()
+{
+  if (p_mapped_file_ == NULL)
+    return;
+#ifdef _MSC_VER
+  UnmapViewOfFile(p_mapped_file_);
+  CloseHandle(mapping_handle_);
+  CloseHandle(file_handle_);
+  mapping_handle_ = NULL;
+  file_handle_ = NULL;
+#else
+  munmap(const_cast<char*>(p_mapped_file_), static_cast<size_t>(file_size_));
+#endif
+  p_mapped_file_ = NULL;
+}
+
+bool gcode_line_scanner::seek(long offset)
+{
+  if (offset < 0)
+    offset = 0;
+  if (offset > file_size_)
+    offset = file_size_;
+  offset_ = offset;
+  is_last_line_unterminated_ = false;
+  if (p_file_ != NULL)
+  {
+    buffer_start_ = 0;
+    buffer_end_ = 0;
+    is_buffer_eof_ = false;
+    return fseek(p_file_, offset, SEEK_SET) == 0;
+  }
+  return is_open();
+}
+
+bool gcode_line_scanner::seek_to_line_start(long offset)
+{
+  if (offset <= 0)
+    return seek(0);
+  // Read the rest of the line that contains the previous byte.  If the previous byte is a newline, this reads an
+  // empty line that ends exactly at the offset.
+  if (!seek(offset - 1))
+    return false;
+  const char* line;
+  get_next_line(line);
+  return true;
+}
+
+bool gcode_line_scanner::get_next_line(const char*& line)
+{
+  if (p_mapped_file_ != NULL)
+    return get_next_mapped_line(line);
+  if (p_file_ != NULL)
+    return get_next_buffered_line(line);
+  return false;
+}
+
+bool gcode_line_scanner::get_next_mapped_line(const char*& line)
+{
+  if (offset_ >= file_size_)
+    return false;
+  const char* p_start = p_mapped_file_ + offset_;
+  const size_t remaining = static_cast<size_t>(file_size_ - offset_);
+  const char* p_newline = static_cast<const char*>(memchr(p_start, '\n', remaining));
+  if (p_newline != NULL)
+  {
+    line = p_start;
+    offset_ += static_cast<long>(p_newline - p_start) + 1;
+    is_last_line_unterminated_ = false;
+    return true;
+  }
+  // The mapping isn't null terminated, so copy the final line.
+  last_line_.assign(p_start, remaining);
+  line = last_line_.c_str();
+  offset_ = file_size_;
+  is_last_line_unterminated_ = true;
+  return true;
+}
+
+void gcode_line_scanner::fill_buffer()
+{
+  // Move the unread bytes to the start of the buffer, then fill the rest.
+  const size_t remaining = buffer_end_ - buffer_start_;
+  if (buffer_start_ > 0 && remaining > 0)
+    memmove(&buffer_[0], &buffer_[buffer_start_], remaining);
+  buffer_start_ = 0;
+  buffer_end_ = remaining;
+  // Make room for lines that are longer than the buffer
+  if (buffer_end_ + 1 >= buffer_.size())
+    buffer_.resize(buffer_.size() * 2);
+  const size_t bytes_read = fread(&buffer_[buffer_end_], 1, buffer_.size() - 1 - buffer_end_, p_file_);
+  buffer_end_ += bytes_read;
+  if (bytes_read == 0)
+    is_buffer_eof_ = true;
+}
+
+bool gcode_line_scanner::get_next_buffered_line(const char*& line)
+{
+  while (true)
+  {
+    char* p_start = &buffer_[buffer_start_];
+    const size_t remaining = buffer_end_ - buffer_start_;
+    char* p_newline = static_cast<char*>(memchr(p_start, '\n', remaining));
+    if (p_newline != NULL)
+    {
+      const size_t length = static_cast<size_t>(p_newline - p_start) + 1;
+      line = p_start;
+      buffer_start_ += length;
+      offset_ += static_cast<long>(length);
+      is_last_line_unterminated_ = false;
+      return true;
+    }
+    if (is_buffer_eof_)
+    {
+      if (remaining == 0)
+        return false;
+      // null terminate the final line
+      buffer_[buffer_end_] = '\0';
+      line = p_start;
+      buffer_start_ = buffer_end_;
+      offset_ += static_cast<long>(remaining);
+      is_last_line_unterminated_ = true;
+      return true;
+    }
+    fill_buffer();
+  }
+}
+
+bool gcode_line_scanner::read_first_lines(const size_t max_lines, std::vector<std::string>& lines)
+{
+  lines.clear();
+  if (!seek(0))
+    return false;
+  read_lines(max_lines, lines);
+  return true;
+}
+
+bool gcode_line_scanner::read_last_lines(const size_t max_lines, std::vector<std::string>& lines, const long max_bytes)
+{
+  lines.clear();
+  if (!is_open())
+    return false;
+  const long min_offset = max_bytes > 0 && max_bytes < file_size_ ? file_size_ - max_bytes : 0;
+  const long start = find_start_of_last_lines(max_lines, min_offset);
+  // If the byte limit was reached before enough lines were found, skip the line the limit cuts off.
+  if (!(start == min_offset ? seek_to_line_start(start) : seek(start)))
+    return false;
+  read_lines(max_lines, lines);
+  return true;
+}
+
+void gcode_line_scanner::read_lines(const size_t max_lines, std::vector<std::string>& lines)
+{
+  const char* line;
+  while (lines.size() < max_lines && get_next_line(line))
+  {
+    size_t length = 0;
+    while (line[length] != '\0' && line[length] != '\n')
+      length++;
+    if (length > 0 && line[length - 1] == '\r')
+      length--;
+    lines.push_back(std::string(line, length));
+  }
+}
+
+long gcode_line_scanner::find_start_of_last_lines(const size_t num_lines, const long min_offset)
+{
+  static const long block_size = 65536;
+  if (num_lines == 0)
+    return file_size_;
+  std::vector<char> block;
+  size_t newlines_found = 0;
+  long position = file_size_;
+  while (position > min_offset)
+  {
+    const long block_start = position - min_offset > block_size ? position - block_size : min_offset;
+    const size_t length = static_cast<size_t>(position - block_start);
+    const char* p_block;
+    if (p_mapped_file_ != NULL)
+    {
+      p_block = p_mapped_file_ + block_start;
+    }
+    else
+    {
+      block.resize(length);
+      if (fseek(p_file_, block_start, SEEK_SET) != 0 || fread(&block[0], 1, length, p_file_) != length)
+        return 0;
+      p_block = &block[0];
+    }
+    for (size_t index = length; index > 0; index--)
+    {
+      const long offset = block_start + static_cast<long>(index) - 1;
+      // A newline at the very end of the file ends the last line rather than starting a new one.
+      if (p_block[index - 1] == '\n' && offset != file_size_ - 1 && ++newlines_found == num_lines)
+        return offset + 1;
+    }
+    position = block_start;
+  }
+  return min_offset;
+}
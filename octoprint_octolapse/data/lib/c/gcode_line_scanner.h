@@ -0,0 +1,100 @@
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+// Copyright(C) 2019  Brad Hochgesang
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// This program is free software : you can redistribute it and/or modify
+// it under the terms of the GNU Affero General Public License as published
+// by the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.See the
+// GNU Affero General Public License for more details.
+//
+// You should have received a copy of the GNU Affero General Public License
+// along with this program.If not, see the following :
+// https ://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+//
+// You can contact the author either through the git - hub repository, or at the
+// following email address : FormerLurker@pm.me
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+#ifndef GCODE_LINE_SCANNER_H
+#define GCODE_LINE_SCANNER_H
+#include <string>
+#include <vector>
+#include <cstdio>
+
+/**
+ * \brief Reads the lines of a gcode file without copying them.  The file is memory mapped if possible, otherwise it
+ * is read into a buffer in large blocks.  The returned lines point into the mapped file or buffer and end at a
+ * newline (or a null terminator for the last line), which gcode_parser::try_parse_gcode treats as the end of the
+ * line.  Byte offsets are tracked as the lines are scanned, so there is no need to ask the stream for its position.
+ */
+class gcode_line_scanner
+{
+public:
+  static const size_t BUFFER_SIZE = 1048576;
+  gcode_line_scanner();
+  ~gcode_line_scanner();
+  bool open(const std::string& file_path);
+  void close();
+  bool is_open() const;
+  bool is_memory_mapped() const;
+  long get_file_size() const;
+  /**
+   * \brief Gets the next line.  The line is only valid until the next call.  Returns false at the end of the file.
+   */
+  bool get_next_line(const char*& line);
+  /**
+   * \brief Gets the file position after the most recent line, which matches what std::istream::tellg returns after
+   * std::getline:  -1 if the line was the last one in the file and did not end with a newline.
+   */
+  long get_position() const;
+  /**
+   * \brief Gets the offset of the next unread byte.
+   */
+  long get_offset() const;
+  /**
+   * \brief Moves to the first line that starts at or after the offset.
+   */
+  bool seek_to_line_start(long offset);
+  /**
+   * \brief Reads up to max_lines lines from the start of the file, without line endings.
+   */
+  bool read_first_lines(size_t max_lines, std::vector<std::string>& lines);
+  /**
+   * \brief Reads up to max_lines lines from the end of the file, in file order and without line endings.  No more
+   * than max_bytes are read from the end of the file (0 for no limit), and a line that is cut off by the limit is
+   * skipped.
+   */
+  bool read_last_lines(size_t max_lines, std::vector<std::string>& lines, long max_bytes = 0);
+private:
+  gcode_line_scanner(const gcode_line_scanner& source); // don't copy me!
+  bool map_file(const std::string& file_path);
+  void unmap_file();
+  bool seek(long offset);
+  void fill_buffer();
+  bool get_next_mapped_line(const char*& line);
+  bool get_next_buffered_line(const char*& line);
+  long find_start_of_last_lines(size_t num_lines, long min_offset);
+  void read_lines(size_t max_lines, std::vector<std::string>& lines);
+  long file_size_;
+  long offset_;
+  bool is_last_line_unterminated_;
+  // memory mapped file
+  const char* p_mapped_file_;
+#ifdef _MSC_VER
+  void* file_handle_;
+  void* mapping_handle_;
+#endif
+  // The last line of a mapped file is copied here if it doesn't end with a newline
+  std::string last_line_;
+  // buffered fallback
+  FILE* p_file_;
+  std::vector<char> buffer_;
+  size_t buffer_start_;
+  size_t buffer_end_;
+  bool is_buffer_eof_;
+};
+#endif
@@ -121,7 +121,7 @@ bool gcode_parser::try_parse_gcode(const char* gcode, parsed_command& command)
     while (true)
     {
       char c = *p_gcode;
-      if (c == '\0' || c == ';' || c == ' ' || c == '\t')
+      if (is_end_of_line(c) || c == ';' || c == ' ' || c == '\t')
         break;
       else if (c > 31)
       {
@@ -143,7 +143,7 @@ bool gcode_parser::try_parse_gcode(const char* gcode, parsed_command& command)
   while (true)
   {
     char cur_char = *p_gcode;
-    if (cur_char == '\0' || cur_char == ';')
+    if (is_end_of_line(cur_char) || cur_char == ';')
       break;
     else if (cur_char > 32 || cur_char == ' ' && has_seen_character)
     {
@@ -177,7 +177,7 @@ bool gcode_parser::try_parse_gcode(const char* gcode, parsed_command& command)
       if (!try_extract_octolapse_parameter(&p, &octolapse_parameter))
       {
         std::string message = "Unable to extract an octolapse parameter from: ";
-        message += p;
+        message.append(gcode, get_line_length(gcode));
         octolapse_log(octolapse_log::GCODE_PARSER, octolapse_log::WARNING, message);
         return true;
       }
@@ -208,7 +208,7 @@ bool gcode_parser::try_parse_gcode(const char* gcode, parsed_command& command)
       if (!try_extract_text_parameter(&p, &(text_command.string_value)))
       {
         std::string message = "Unable to extract a text parameter from: ";
-        message += p;
+        message.append(gcode, get_line_length(gcode));
         octolapse_log(octolapse_log::GCODE_PARSER, octolapse_log::WARNING, message);
         return true;
       }
@@ -225,7 +225,7 @@ bool gcode_parser::try_parse_gcode(const char* gcode, parsed_command& command)
         if (!try_extract_t_parameter(&p, &param))
         {
           std::string message = "Unable to extract a parameter from the T command: ";
-          message += gcode;
+          message.append(gcode, get_line_length(gcode));
           octolapse_log(octolapse_log::GCODE_PARSER, octolapse_log::ERROR, message);
         }
         else
@@ -360,7 +360,7 @@ bool gcode_parser::try_extract_gcode_command(char** p_p_gcode, std::string* p_co
         {
           p_t++;
         }
-        if (*p_t == ';' || *p_t == '\0')
+        if (*p_t == ';' || is_end_of_line(*p_t))
           found_command = true;
       }
       else if (t_param >= '0' && t_param <= '9')
@@ -377,7 +377,7 @@ bool gcode_parser::try_extract_at_command(char** p_p_gcode, std::string* p_comma
 {
   char* p = *p_p_gcode;
   bool found_command = false;
-  while (*p != '\0' && *p != ';' && *p != ' ')
+  while (!is_end_of_line(*p) && *p != ';' && *p != ' ')
   {
     if (!found_command)
     {
@@ -512,7 +512,7 @@ bool gcode_parser::try_extract_text_parameter(char** p_p_gcode, std::string* p_p
   }
   // Add all values, stop at end of string or when we hit a ';'
 
-  while (*p != '\0' && *p != ';')
+  while (!is_end_of_line(*p) && *p != ';')
   {
     (*p_parameter).push_back(*p++);
   }
@@ -534,7 +534,7 @@ bool gcode_parser::try_extract_octolapse_parameter(char** p_p_gcode, parsed_comm
     p++;
   }
   // extract name, make all caps.
-  while (*p != '\0' && *p != ';' && *p != ' ')
+  while (!is_end_of_line(*p) && *p != ';' && *p != ' ')
   {
     if (!has_found_parameter)
     {
@@ -559,7 +559,7 @@ bool gcode_parser::try_extract_octolapse_parameter(char** p_p_gcode, parsed_comm
   }
   // Extract the value (we may do this per command in the future).  This will output mixed case.
   bool has_parameter_value = false;
-  while (*p != '\0' && *p != ';')
+  while (!is_end_of_line(*p) && *p != ';')
   {
     if (!has_parameter_value)
     {
@@ -669,7 +669,7 @@ bool gcode_parser::try_extract_comment(char** p_p_gcode, std::string* p_comment)
   char* p = *p_p_gcode;
 
   // Ignore Leading Spaces
-  while (*p != '\0' && *p != ';')
+  while (!is_end_of_line(*p) && *p != ';')
   {
     p++;
   }
@@ -679,12 +679,9 @@ bool gcode_parser::try_extract_comment(char** p_p_gcode, std::string* p_comment)
   {
     p++;
   }
-  while (*p != '\0')
+  while (!is_end_of_line(*p))
   {
-    if (*p != '\r' && *p != '\n')
-      (*p_comment).push_back(*p++);
-    else
-      p++;
+    (*p_comment).push_back(*p++);
   }
   *p_p_gcode = p;
   return p_comment->length() != 0;
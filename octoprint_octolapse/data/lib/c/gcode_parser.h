@@ -42,6 +42,24 @@ private:
   std::set<std::string> text_only_functions_;
   std::set<std::string> parsable_commands_;
   // Functions
+  /**
+   * \brief Lines end with a null terminator or a line break, so that lines can be parsed in place from a file buffer.
+   */
+  static bool is_end_of_line(const char c)
+  {
+    return c == '\0' || c == '\n' || c == '\r';
+  }
+  /**
+   * \brief Returns the number of characters before the end of the line.  Lines read from a mapped file are not null
+   * terminated, so messages must only copy this many characters.
+   */
+  static size_t get_line_length(const char* p)
+  {
+    const char* p_end = p;
+    while (!is_end_of_line(*p_end))
+      p_end++;
+    return p_end - p;
+  }
   bool try_extract_double(char** p_p_gcode, double* p_double) const;
   static bool try_extract_gcode_command(char** p_p_gcode, std::string* p_command);
   static bool try_extract_text_parameter(char** p_p_gcode, std::string* p_parameter);
@@ -1409,3 +1409,27 @@ gcode_comment_processor* gcode_position::get_gcode_comment_processor()
 {
   return &comment_processor_;
 }
+
+void gcode_position::write_state(binary_writer& writer) const
+{
+  writer.write_int(cur_pos_);
+  for (int index = 0; index < NUM_POSITIONS; index++)
+  {
+    writer.write_position(positions_[index]);
+  }
+  comment_processor_.write_state(writer);
+}
+
+bool gcode_position::read_state(binary_reader& reader)
+{
+  int cur_pos;
+  if (!reader.read_int(cur_pos) || cur_pos < -1 || cur_pos >= NUM_POSITIONS)
+    return false;
+  for (int index = 0; index < NUM_POSITIONS; index++)
+  {
+    if (!reader.read_position(positions_[index]) || positions_[index].num_extruders != num_extruders_)
+      return false;
+  }
+  cur_pos_ = cur_pos;
+  return comment_processor_.read_state(reader);
+}
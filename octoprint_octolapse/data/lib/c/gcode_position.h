@@ -27,6 +27,7 @@
 #include "gcode_parser.h"
 #include "position.h"
 #include "gcode_comment_processor.h"
+#include "binary_serialization.h"
 #define NUM_POSITIONS 10
 
 struct gcode_position_args
@@ -146,6 +147,12 @@ public:
   position* get_current_position_ptr();
   position* get_previous_position_ptr();
   gcode_comment_processor* get_gcode_comment_processor();
+  /**
+   * \brief Writes the tracked positions and comment processing state.  Everything else comes from the args, so the
+   * state can only be read by a gcode_position created with the same args.
+   */
+  void write_state(binary_writer& writer) const;
+  bool read_state(binary_reader& reader);
 private:
   gcode_position(const gcode_position& source);
   position positions_[static_cast<int>(NUM_POSITIONS)];
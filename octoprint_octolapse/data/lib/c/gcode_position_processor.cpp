@@ -29,6 +29,9 @@
 #include "stabilization.h"
 #include "logging.h"
 #include "python_helpers.h"
+#include "stabilization_progress.h"
+#include "snapshot_plan_list.h"
+#include "gcode_line_scanner.h"
 
 #ifdef _DEBUG
 #include "test.h"
@@ -107,10 +110,49 @@ static PyMethodDef GcodePositionProcessorMethods[] = {
   {"Initialize", (PyCFunction)Initialize, METH_VARARGS, "Initialize the internal shared position processor."},
   {"Undo", (PyCFunction)Undo, METH_VARARGS, "Undo an update made to the current position.  You can only undo once."},
   {
-	"Update", (PyCFunction)Update, METH_VARARGS, "Undo an update made to the current position.  You can only undo once."
+	"Update", (PyCFunction)Update, METH_VARARGS,
+	"Update the current position from gcode and return it as a Pos.  If a Pos is supplied it will be overwritten."
+  },
+  {
+	"UpdateMany", (PyCFunction)UpdateMany, METH_VARARGS,
+	"Update the current position from a sequence of gcodes.  Returns one byte of result flags per gcode.  The "
+	"positions after the final gcodes are copied into the supplied Pos targets (oldest first)."
+  },
+  {
+	"InitializeTriggers", (PyCFunction)InitializeTriggers, METH_VARARGS,
+	"Creates the native realtime triggers for the position processor with the given key from a list of trigger "
+	"args dicts."
+  },
+  {
+	"UpdateTriggers", (PyCFunction)UpdateTriggers, METH_VARARGS,
+	"Updates the native realtime triggers from the current position.  Returns None if no trigger state has changed, "
+	"else a tuple containing the new state of each trigger (or None if it has not changed)."
+  },
+  {
+	"PauseTriggers", (PyCFunction)PauseTriggers, METH_VARARGS,
+	"Pauses any timer triggers.  Returns a tuple containing the state of each trigger."
+  },
+  {
+	"ResumeTriggers", (PyCFunction)ResumeTriggers, METH_VARARGS,
+	"Resumes any timer triggers.  Returns a tuple containing the state of each trigger."
+  },
+  {
+	"UpdatePosition", (PyCFunction)UpdatePosition, METH_VARARGS,
+	"Update x,y,z,e and f for the given position key.  If a Pos is supplied it will be overwritten."
   },
-  {"UpdatePosition", (PyCFunction)UpdatePosition, METH_VARARGS, "Update x,y,z,e and f for the given position key."},
   {"Parse", (PyCFunction)Parse, METH_VARARGS, "Parse gcode text into a ParsedCommand."},
+  {
+	"SetPosType", (PyCFunction)SetPosType, METH_VARARGS,
+	"Sets the Pos subclass that will be used when creating new position objects."
+  },
+  {
+	"GetCurrentPosition", (PyCFunction)GetCurrentPosition, METH_VARARGS,
+	"Returns a copy of the current position of the global GcodePosition tracker as a Pos."
+  },
+  {
+	"GetPreviousPosition", (PyCFunction)GetPreviousPosition, METH_VARARGS,
+	"Returns a copy of the previous position of the global GcodePosition tracker as a Pos."
+  },
   {
 	"GetCurrentPositionTuple", (PyCFunction)GetCurrentPositionTuple, METH_VARARGS,
 	"Returns the current position of the global GcodePosition tracker in a faster but harder to handle tuple form."
@@ -129,12 +171,25 @@ static PyMethodDef GcodePositionProcessorMethods[] = {
   },
   {
 	"GetSnapshotPlans_SmartLayer", (PyCFunction)GetSnapshotPlans_SmartLayer, METH_VARARGS,
-	"Parses a gcode file and returns snapshot plans for a 'SmartLayer' stabilization."
+	"Parses a gcode file and returns snapshot plans for a 'SmartLayer' stabilization.  If 'record_layer_candidates' "
+	"is set in the smart layer args, the layer candidates (bytes, or None if they could not be recorded) are added to "
+	"the end of the results."
+  },
+  {
+	"GetSnapshotPlans_SmartLayerCandidates", (PyCFunction)GetSnapshotPlans_SmartLayerCandidates, METH_VARARGS,
+	"Returns snapshot plans for a 'SmartLayer' stabilization from recorded layer candidates, parsing only the parts of "
+	"the gcode file needed to find the selected positions, or None if the layer candidates can't be used with the "
+	"supplied args."
   },
   {
 	"GetSnapshotPlans_SmartGcode", (PyCFunction)GetSnapshotPlans_SmartGcode, METH_VARARGS,
 	"Parses a gcode file and returns snapshot plans for a 'SmartGcode' stabilization."
   },
+  {
+	"GetHeaderAndTailLines", (PyCFunction)GetHeaderAndTailLines, METH_VARARGS,
+	"Reads the first and last lines of a gcode file in a single pass, returning a tuple of (header lines, tail lines).  "
+	"An optional byte limit restricts how far from the end of the file the tail lines are read."
+  },
   {NULL, NULL, 0, NULL}
 };
 
@@ -182,6 +237,21 @@ PyInit_GcodePositionProcessor(void)
 		Py_DECREF(module);
 		INITERROR;
 	}
+	if (!python_position::initialize_type(module))
+	{
+		Py_DECREF(module);
+		INITERROR;
+	}
+	if (!python_stabilization_progress::initialize_type(module))
+	{
+		Py_DECREF(module);
+		INITERROR;
+	}
+	if (!python_snapshot_plan_list::initialize_type(module))
+	{
+		Py_DECREF(module);
+		INITERROR;
+	}
 	octolapse_initialize_loggers();
 	gpp::parser = new gcode_parser();
 
@@ -248,7 +318,12 @@ extern "C" {
 			pythonProgressCallback(ExecuteStabilizationProgressCallback),
 			py_progress_received_callback
 		);
-		stabilization_results results = stabilization.process_file();
+		// Release the GIL while the file is processed so that other python threads can run.  Anything that calls into
+		// python while processing (logging and the callbacks) acquires the GIL first.
+		stabilization_results results;
+		Py_BEGIN_ALLOW_THREADS
+		results = stabilization.process_file();
+		Py_END_ALLOW_THREADS
 		set_internal_log_levels(true);
 
 
@@ -257,6 +332,40 @@ extern "C" {
 		{
 			return NULL;
 		}
+		if (mt_args.record_layer_candidates)
+		{
+			PyObject* py_layer_candidates;
+			std::string layer_candidates;
+			if (stabilization.get_layer_candidates(layer_candidates))
+				py_layer_candidates = PyBytes_FromStringAndSize(layer_candidates.data(), layer_candidates.size());
+			else
+			{
+				Py_INCREF(Py_None);
+				py_layer_candidates = Py_None;
+			}
+			if (py_layer_candidates == NULL)
+			{
+				Py_DECREF(py_results);
+				return NULL;
+			}
+			PyObject* py_extended_results = Py_BuildValue("(O)", py_layer_candidates);
+			Py_DECREF(py_layer_candidates);
+			if (py_extended_results == NULL)
+			{
+				Py_DECREF(py_results);
+				return NULL;
+			}
+			PyObject* py_all_results = PySequence_Concat(py_results, py_extended_results);
+			Py_DECREF(py_results);
+			Py_DECREF(py_extended_results);
+			if (py_all_results == NULL)
+			{
+				std::string message = "GcodePositionProcessor.GetSnapshotPlans_SmartLayer - Unable to add the layer candidates to the results.";
+				octolapse_log_exception(octolapse_log::SNAPSHOT_PLAN, message);
+				return NULL;
+			}
+			py_results = py_all_results;
+		}
 		//Py_DECREF(py_position_args);
 		//Py_DECREF(py_stabilization_args);
 		//Py_DECREF(py_stabilization_type_args);
@@ -266,6 +375,69 @@ extern "C" {
 		return py_results;
 	}
 
+	static PyObject* GetSnapshotPlans_SmartLayerCandidates(PyObject* self, PyObject* args)
+	{
+		set_internal_log_levels(true);
+		octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO, "Creating smart layer snapshot plans from layer candidates.");
+		PyObject* py_layer_candidates;
+		PyObject* py_position_args;
+		PyObject* py_stabilization_args;
+		PyObject* py_stabilization_type_args;
+		char* layer_candidates;
+		Py_ssize_t layer_candidates_size;
+		if (!PyArg_ParseTuple(
+			args,
+			"OOOO",
+			&py_layer_candidates,
+			&py_position_args,
+			&py_stabilization_args,
+			&py_stabilization_type_args) ||
+			PyBytes_AsStringAndSize(py_layer_candidates, &layer_candidates, &layer_candidates_size) < 0)
+		{
+			std::string message = "GcodePositionProcessor.GetSnapshotPlans_SmartLayerCandidates - Error parsing parameters.";
+			octolapse_log_exception(octolapse_log::SNAPSHOT_PLAN, message);
+			return NULL;
+		}
+
+		// The position args are needed to find the positions of the selected candidates in the file.
+		gcode_position_args p_args;
+		if (!ParsePositionArgs(py_position_args, &p_args))
+		{
+			return NULL;
+		}
+		stabilization_args s_args;
+		PyObject* py_progress_received_callback = NULL;
+		PyObject* py_snapshot_position_callback = NULL;
+		if (!ParseStabilizationArgs(py_stabilization_args, &s_args, &py_progress_received_callback,
+			&py_snapshot_position_callback))
+		{
+			return NULL;
+		}
+		smart_layer_args mt_args;
+		if (!ParseStabilizationArgs_SmartLayer(py_stabilization_type_args, &mt_args))
+		{
+			return NULL;
+		}
+		stabilization_smart_layer stabilization(
+			p_args,
+			s_args,
+			mt_args,
+			pythonGetCoordinatesCallback(ExecuteGetSnapshotPositionCallback),
+			py_snapshot_position_callback,
+			pythonProgressCallback(ExecuteStabilizationProgressCallback),
+			py_progress_received_callback
+		);
+		stabilization_results results;
+		if (!stabilization.process_layer_candidates(std::string(layer_candidates, layer_candidates_size), results))
+		{
+			if (PyErr_Occurred())
+				return NULL;
+			octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO, "The layer candidates can't be used with the current settings.");
+			Py_RETURN_NONE;
+		}
+		return results.to_py_object();
+	}
+
 	static PyObject* GetSnapshotPlans_SmartGcode(PyObject* self, PyObject* args)
 	{
 		set_internal_log_levels(true);
@@ -323,7 +495,12 @@ extern "C" {
 			pythonProgressCallback(ExecuteStabilizationProgressCallback),
 			py_progress_received_callback
 		);
-		stabilization_results results = stabilization.process_file();
+		// Release the GIL while the file is processed so that other python threads can run.  Anything that calls into
+		// python while processing (logging and the callbacks) acquires the GIL first.
+		stabilization_results results;
+		Py_BEGIN_ALLOW_THREADS
+		results = stabilization.process_file();
+		Py_END_ALLOW_THREADS
 		set_internal_log_levels(true);
 
 
@@ -426,7 +603,8 @@ extern "C" {
 		);
 		const char* key;
 		const char* gcode;
-		if (!PyArg_ParseTuple(args, "ss", &key, &gcode))
+		PyObject* py_target = NULL;
+		if (!PyArg_ParseTuple(args, "ss|O", &key, &gcode, &py_target))
 		{
 			std::string message = "GcodePositionProcessor.Update - Error parsing parameters.";
 			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
@@ -448,7 +626,285 @@ extern "C" {
 		gpp::parser->try_parse_gcode(gcode, command);
 		p_gcode_position->update(command, -1, -1, -1);
 
-		return p_gcode_position->get_current_position_ptr()->to_py_tuple();
+		return BuildPositionResult(p_gcode_position->get_current_position_ptr(), py_target);
+	}
+
+	static PyObject* UpdateMany(PyObject* self, PyObject* args)
+	{
+		set_internal_log_levels(true);
+		octolapse_log(
+			octolapse_log::GCODE_POSITION, octolapse_log::VERBOSE,
+			"Updating current position from multiple gcodes."
+		);
+		const char* key;
+		PyObject* py_gcodes;
+		PyObject* py_file_line_numbers;
+		PyObject* py_targets;
+		if (!PyArg_ParseTuple(args, "sOOO", &key, &py_gcodes, &py_file_line_numbers, &py_targets))
+		{
+			std::string message = "GcodePositionProcessor.UpdateMany - Error parsing parameters.";
+			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+			return NULL;
+		}
+
+		// Get the parser
+		std::map<std::string, gcode_position*>::iterator gcode_position_iterator = gpp::gcode_positions.find(key);
+		if (gcode_position_iterator == gpp::gcode_positions.end())
+		{
+			std::string message = "GcodePositionProcessor.UpdateMany - No position processor was found for the given key: ";
+			message += key;
+			octolapse_log(octolapse_log::GCODE_POSITION, octolapse_log::ERROR, message);
+			return Py_BuildValue("O", Py_False);
+		}
+		gcode_position* p_gcode_position = gcode_position_iterator->second;
+
+		PyObject* py_gcodes_fast = PySequence_Fast(py_gcodes, "The gcodes must be a sequence.");
+		if (py_gcodes_fast == NULL)
+		{
+			std::string message = "GcodePositionProcessor.UpdateMany - Unable to read the gcode sequence.";
+			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+			return NULL;
+		}
+		PyObject* py_file_line_numbers_fast = PySequence_Fast(
+			py_file_line_numbers, "The file line numbers must be a sequence.");
+		PyObject* py_targets_fast = PySequence_Fast(py_targets, "The targets must be a sequence.");
+		if (py_file_line_numbers_fast == NULL || py_targets_fast == NULL)
+		{
+			Py_DECREF(py_gcodes_fast);
+			Py_XDECREF(py_file_line_numbers_fast);
+			Py_XDECREF(py_targets_fast);
+			std::string message = "GcodePositionProcessor.UpdateMany - Unable to read the file line number or target sequences.";
+			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+			return NULL;
+		}
+
+		const Py_ssize_t num_gcodes = PySequence_Fast_GET_SIZE(py_gcodes_fast);
+		const Py_ssize_t num_targets = PySequence_Fast_GET_SIZE(py_targets_fast);
+		const Py_ssize_t first_target_index = num_gcodes - num_targets;
+		if (PySequence_Fast_GET_SIZE(py_file_line_numbers_fast) != num_gcodes)
+		{
+			Py_DECREF(py_gcodes_fast);
+			Py_DECREF(py_file_line_numbers_fast);
+			Py_DECREF(py_targets_fast);
+			PyErr_SetString(PyExc_ValueError, "The number of file line numbers must match the number of gcodes.");
+			std::string message = "GcodePositionProcessor.UpdateMany - The number of file line numbers must match the number of gcodes.";
+			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+			return NULL;
+		}
+
+		parsed_command command;
+		bool success = true;
+		for (Py_ssize_t index = 0; index < num_gcodes && success; index++)
+		{
+			const char* gcode = PyUnicode_AsUTF8(PySequence_Fast_GET_ITEM(py_gcodes_fast, index));
+			if (gcode == NULL)
+			{
+				success = false;
+				break;
+			}
+			long file_line_number = -1;
+			PyObject* py_file_line_number = PySequence_Fast_GET_ITEM(py_file_line_numbers_fast, index);
+			const bool has_file_line_number = py_file_line_number != Py_None;
+			if (has_file_line_number)
+			{
+				file_line_number = PyLong_AsLong(py_file_line_number);
+				if (file_line_number == -1 && PyErr_Occurred())
+				{
+					success = false;
+					break;
+				}
+			}
+
+			command.clear();
+			gpp::parser->try_parse_gcode(gcode, command);
+			p_gcode_position->update(command, file_line_number, -1, -1);
+			position* p_current_position = p_gcode_position->get_current_position_ptr();
+
+			// Only the final positions are copied into python objects
+			if (index >= first_target_index)
+			{
+				PyObject* py_target = PySequence_Fast_GET_ITEM(py_targets_fast, index - first_target_index);
+				if (!python_position::copy_to(py_target, *p_current_position))
+				{
+					success = false;
+					break;
+				}
+				if (has_file_line_number)
+				{
+					reinterpret_cast<py_pos_object*>(py_target)->p_position->file_line_number = file_line_number;
+				}
+			}
+		}
+		Py_DECREF(py_gcodes_fast);
+		Py_DECREF(py_file_line_numbers_fast);
+		Py_DECREF(py_targets_fast);
+		if (!success)
+		{
+			std::string message = "GcodePositionProcessor.UpdateMany - An error occurred while updating the position.";
+			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+			return NULL;
+		}
+		return Py_BuildValue("O", Py_True);
+	}
+
+	static PyObject* InitializeTriggers(PyObject* self, PyObject* args)
+	{
+		set_internal_log_levels(true);
+		octolapse_log(octolapse_log::GCODE_POSITION, octolapse_log::INFO, "Initializing the realtime triggers.");
+		const char* key;
+		PyObject* py_trigger_args_list;
+		if (!PyArg_ParseTuple(args, "sO", &key, &py_trigger_args_list))
+		{
+			std::string message = "GcodePositionProcessor.InitializeTriggers - Error parsing parameters.";
+			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+			return NULL;
+		}
+		if (!PyList_Check(py_trigger_args_list))
+		{
+			std::string message = "GcodePositionProcessor.InitializeTriggers - The trigger args must be a list.";
+			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+			return NULL;
+		}
+
+		std::vector<realtime_trigger_args> trigger_args;
+		const Py_ssize_t num_triggers = PyList_Size(py_trigger_args_list);
+		for (Py_ssize_t index = 0; index < num_triggers; index++)
+		{
+			realtime_trigger_args current_args;
+			if (!ParseTriggerArgs(PyList_GetItem(py_trigger_args_list, index), &current_args))
+			{
+				return NULL; // ParseTriggerArgs has taken care of the error message
+			}
+			trigger_args.push_back(current_args);
+		}
+
+		DeleteTriggers(key);
+		std::vector<realtime_trigger*> triggers;
+		for (unsigned int index = 0; index < trigger_args.size(); index++)
+		{
+			triggers.push_back(new realtime_trigger(trigger_args[index]));
+		}
+		gpp::realtime_triggers.insert(std::pair<std::string, std::vector<realtime_trigger*> >(key, triggers));
+		return Py_BuildValue("O", Py_True);
+	}
+
+	static PyObject* UpdateTriggers(PyObject* self, PyObject* args)
+	{
+		set_internal_log_levels(true);
+		const char* key;
+		int is_in_position;
+		int in_path_position;
+		if (!PyArg_ParseTuple(args, "spp", &key, &is_in_position, &in_path_position))
+		{
+			std::string message = "GcodePositionProcessor.UpdateTriggers - Error parsing parameters.";
+			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+			return NULL;
+		}
+
+		std::map<std::string, gcode_position*>::iterator gcode_position_iterator = gpp::gcode_positions.find(key);
+		std::map<std::string, std::vector<realtime_trigger*> >::iterator triggers_iterator =
+			gpp::realtime_triggers.find(key);
+		if (gcode_position_iterator == gpp::gcode_positions.end() || triggers_iterator == gpp::realtime_triggers.end())
+		{
+			std::string message = "GcodePositionProcessor.UpdateTriggers - No position processor or triggers were found for the given key: ";
+			message += key;
+			octolapse_log(octolapse_log::GCODE_POSITION, octolapse_log::ERROR, message);
+			return Py_BuildValue("O", Py_False);
+		}
+		gcode_position* p_gcode_position = gcode_position_iterator->second;
+		std::vector<realtime_trigger*>& triggers = triggers_iterator->second;
+		const position& current = p_gcode_position->get_current_position();
+		const position& previous = p_gcode_position->get_previous_position();
+
+		// Most updates don't change anything, so only build the results if we have to.
+		std::vector<bool> has_changed(triggers.size(), false);
+		bool has_any_changed = false;
+		for (unsigned int index = 0; index < triggers.size(); index++)
+		{
+			has_changed[index] = triggers[index]->update(current, previous, is_in_position != 0, in_path_position != 0);
+			has_any_changed = has_any_changed || has_changed[index];
+		}
+		if (!has_any_changed)
+		{
+			Py_RETURN_NONE;
+		}
+
+		PyObject* py_states = PyTuple_New(triggers.size());
+		if (py_states == NULL)
+		{
+			std::string message = "GcodePositionProcessor.UpdateTriggers - Unable to create the trigger state tuple.";
+			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+			return NULL;
+		}
+		for (unsigned int index = 0; index < triggers.size(); index++)
+		{
+			PyObject* py_state;
+			if (has_changed[index])
+			{
+				py_state = triggers[index]->to_py_tuple();
+				if (py_state == NULL)
+				{
+					Py_DECREF(py_states);
+					return NULL;
+				}
+			}
+			else
+			{
+				py_state = Py_None;
+				Py_INCREF(py_state);
+			}
+			// PyTuple_SET_ITEM steals the reference
+			PyTuple_SET_ITEM(py_states, index, py_state);
+		}
+		return py_states;
+	}
+
+	static PyObject* PauseTriggers(PyObject* self, PyObject* args)
+	{
+		set_internal_log_levels(true);
+		const char* key;
+		if (!PyArg_ParseTuple(args, "s", &key))
+		{
+			std::string message = "GcodePositionProcessor.PauseTriggers - Error parsing parameters.";
+			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+			return NULL;
+		}
+		std::map<std::string, std::vector<realtime_trigger*> >::iterator triggers_iterator =
+			gpp::realtime_triggers.find(key);
+		if (triggers_iterator == gpp::realtime_triggers.end())
+		{
+			return Py_BuildValue("O", Py_False);
+		}
+		const double current_time = realtime_trigger::get_current_time();
+		for (unsigned int index = 0; index < triggers_iterator->second.size(); index++)
+		{
+			triggers_iterator->second[index]->pause(current_time);
+		}
+		return BuildTriggerStates(triggers_iterator->second);
+	}
+
+	static PyObject* ResumeTriggers(PyObject* self, PyObject* args)
+	{
+		set_internal_log_levels(true);
+		const char* key;
+		if (!PyArg_ParseTuple(args, "s", &key))
+		{
+			std::string message = "GcodePositionProcessor.ResumeTriggers - Error parsing parameters.";
+			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+			return NULL;
+		}
+		std::map<std::string, std::vector<realtime_trigger*> >::iterator triggers_iterator =
+			gpp::realtime_triggers.find(key);
+		if (triggers_iterator == gpp::realtime_triggers.end())
+		{
+			return Py_BuildValue("O", Py_False);
+		}
+		const double current_time = realtime_trigger::get_current_time();
+		for (unsigned int index = 0; index < triggers_iterator->second.size(); index++)
+		{
+			triggers_iterator->second[index]->resume(current_time);
+		}
+		return BuildTriggerStates(triggers_iterator->second);
 	}
 
 	static PyObject* UpdatePosition(PyObject* self, PyObject* args)
@@ -469,9 +925,10 @@ extern "C" {
 		long update_e;
 		double f;
 		long update_f;
+		PyObject* py_target = NULL;
 
 		if (!PyArg_ParseTuple(
-			args, "sdldldldldl",
+			args, "sdldldldldl|O",
 			&key,
 			&x,
 			&update_x,
@@ -482,7 +939,8 @@ extern "C" {
 			&e,
 			&update_e,
 			&f,
-			&update_f
+			&update_f,
+			&py_target
 		))
 		{
 			std::string message = "GcodePositionProcessor.UpdatePosition - Error parsing parameters.";
@@ -515,7 +973,50 @@ extern "C" {
 			true,
 			false);
 
-		return p_gcode_position->get_current_position_ptr()->to_py_tuple();
+		return BuildPositionResult(p_gcode_position->get_current_position_ptr(), py_target);
+	}
+
+	static PyObject* GetHeaderAndTailLines(PyObject* self, PyObject* args)
+	{
+		set_internal_log_levels(true);
+		const char* file_path;
+		Py_ssize_t max_header_lines;
+		Py_ssize_t max_tail_lines;
+		Py_ssize_t max_tail_bytes = 0;
+		if (!PyArg_ParseTuple(args, "snn|n", &file_path, &max_header_lines, &max_tail_lines, &max_tail_bytes))
+		{
+			std::string message = "GcodePositionProcessor.GetHeaderAndTailLines - Error parsing parameters.";
+			octolapse_log_exception(octolapse_log::SNAPSHOT_PLAN, message);
+			return NULL;
+		}
+		std::vector<std::string> header_lines;
+		std::vector<std::string> tail_lines;
+		bool success;
+		// Only the start and end of the file are read, so the rest of a large file is never touched.
+		Py_BEGIN_ALLOW_THREADS
+		gcode_line_scanner scanner;
+		success = scanner.open(file_path)
+			&& scanner.read_first_lines(max_header_lines > 0 ? max_header_lines : 0, header_lines)
+			&& scanner.read_last_lines(max_tail_lines > 0 ? max_tail_lines : 0, tail_lines, static_cast<long>(max_tail_bytes));
+		scanner.close();
+		Py_END_ALLOW_THREADS
+		if (!success)
+		{
+			std::string message = "GcodePositionProcessor.GetHeaderAndTailLines - Unable to read the gcode file.";
+			octolapse_log_exception(octolapse_log::SNAPSHOT_PLAN, message);
+			PyErr_Format(PyExc_IOError, "Unable to read the gcode file at %s.", file_path);
+			return NULL;
+		}
+		PyObject* py_header_lines = BuildLineList(header_lines);
+		if (py_header_lines == NULL)
+			return NULL;
+		PyObject* py_tail_lines = BuildLineList(tail_lines);
+		if (py_tail_lines == NULL)
+		{
+			Py_DECREF(py_header_lines);
+			return NULL;
+		}
+		return Py_BuildValue("NN", py_header_lines, py_tail_lines);
 	}
 
 	static PyObject* Parse(PyObject* self, PyObject* args)
@@ -537,6 +1038,77 @@ extern "C" {
 		return command.to_py_object();
 	}
 
+	static PyObject* SetPosType(PyObject* self, PyObject* args)
+	{
+		set_internal_log_levels(true);
+		PyObject* py_type;
+		if (!PyArg_ParseTuple(args, "O", &py_type))
+		{
+			std::string message = "GcodePositionProcessor.SetPosType - Error parsing parameters.";
+			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+			return NULL;
+		}
+		if (!python_position::set_pos_type(py_type))
+		{
+			std::string message = "GcodePositionProcessor.SetPosType - The supplied type is not a Pos subclass.";
+			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+			return NULL;
+		}
+		return Py_BuildValue("O", Py_True);
+	}
+
+	static PyObject* GetCurrentPosition(PyObject* self, PyObject* args)
+	{
+		set_internal_log_levels(true);
+		octolapse_log(
+			octolapse_log::GCODE_POSITION, octolapse_log::VERBOSE,
+			"Getting current position."
+		);
+		const char* key;
+		if (!PyArg_ParseTuple(args, "s", &key))
+		{
+			std::string message = "GcodePositionProcessor.GetCurrentPosition - Error parsing parameters.";
+			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+			return NULL;
+		}
+		// Get the parser
+		std::map<std::string, gcode_position*>::iterator gcode_position_iterator = gpp::gcode_positions.find(key);
+		if (gcode_position_iterator == gpp::gcode_positions.end())
+		{
+			octolapse_log(octolapse_log::GCODE_POSITION, octolapse_log::ERROR,
+				"Could not find a position processor with the given key.");
+			return Py_BuildValue("O", Py_False);
+		}
+		gcode_position* p_gcode_position = gcode_position_iterator->second;
+		return python_position::create(p_gcode_position->get_current_position());
+	}
+
+	static PyObject* GetPreviousPosition(PyObject* self, PyObject* args)
+	{
+		set_internal_log_levels(true);
+		octolapse_log(
+			octolapse_log::GCODE_POSITION, octolapse_log::VERBOSE,
+			"Getting previous position."
+		);
+		const char* key;
+		if (!PyArg_ParseTuple(args, "s", &key))
+		{
+			std::string message = "GcodePositionProcessor.GetPreviousPosition - Error parsing parameters.";
+			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+			return NULL;
+		}
+		// Get the parser
+		std::map<std::string, gcode_position*>::iterator gcode_position_iterator = gpp::gcode_positions.find(key);
+		if (gcode_position_iterator == gpp::gcode_positions.end())
+		{
+			octolapse_log(octolapse_log::GCODE_POSITION, octolapse_log::ERROR,
+				"Could not find a position processor with the given key.");
+			return Py_BuildValue("O", Py_False);
+		}
+		gcode_position* p_gcode_position = gcode_position_iterator->second;
+		return python_position::create(p_gcode_position->get_previous_position());
+	}
+
 	static PyObject* GetCurrentPositionTuple(PyObject* self, PyObject* args)
 	{
 		set_internal_log_levels(true);
@@ -651,20 +1223,19 @@ static bool ExecuteStabilizationProgressCallback(PyObject* progress_callback, co
 	const int gcodes_processed, const int lines_processed)
 {
 	//octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::VERBOSE, "Executing the stabilization progress callback.");
+	// This is called while the GIL is released, so acquire it before touching any python objects.
+	PyGILState_STATE gstate = PyGILState_Ensure();
 	PyObject* funcArgs = Py_BuildValue("(d,d,d,i,i)", percent_complete, seconds_elapsed, estimated_seconds_remaining,
 		gcodes_processed, lines_processed);
 	if (funcArgs == NULL)
 	{
 		std::string message = "GcodePositionProcessor.ExecuteStabilizationProgressCallback - Error parsing parameters.";
 		octolapse_log_exception(octolapse_log::SNAPSHOT_PLAN, message);
+		PyGILState_Release(gstate);
 		return false;
 	}
 
-
-	PyGILState_STATE gstate = PyGILState_Ensure();
 	PyObject* pContinueProcessing = PyObject_CallObject(progress_callback, funcArgs);
-	PyGILState_Release(gstate);
-
 	Py_DECREF(funcArgs);
 
 	if (pContinueProcessing == NULL)
@@ -672,11 +1243,13 @@ static bool ExecuteStabilizationProgressCallback(PyObject* progress_callback, co
 		std::string message =
 			"GcodePositionProcessor.ExecuteStabilizationProgressCallback - Failed to call python progress callback.";
 		octolapse_log_exception(octolapse_log::SNAPSHOT_PLAN, message);
+		PyGILState_Release(gstate);
 		return false;
 	}
 
 	bool continue_processing = PyLong_AsLong(pContinueProcessing) > 0;
 	Py_DECREF(pContinueProcessing);
+	PyGILState_Release(gstate);
 	return continue_processing;
 }
 
@@ -684,19 +1257,18 @@ static bool ExecuteGetSnapshotPositionCallback(PyObject* py_get_snapshot_positio
 	double y_initial, double& x_result, double& y_result)
 {
 	//octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::VERBOSE, "Executing the get_snapshot_position callback.");
+	// This is called while the GIL is released, so acquire it before touching any python objects.
+	PyGILState_STATE gstate = PyGILState_Ensure();
 	PyObject* funcArgs = Py_BuildValue("(d,d)", x_initial, y_initial);
 	if (funcArgs == NULL)
 	{
 		std::string message = "GcodePositionProcessor.ExecuteGetSnapshotPositionCallback - Error parsing parameters.";
 		octolapse_log_exception(octolapse_log::SNAPSHOT_PLAN, message);
+		PyGILState_Release(gstate);
 		return false;
 	}
 
-
-	PyGILState_STATE gstate = PyGILState_Ensure();
 	PyObject* pyCoordinates = PyObject_CallObject(py_get_snapshot_position_callback, funcArgs);
-	PyGILState_Release(gstate);
-
 	Py_DECREF(funcArgs);
 
 	if (pyCoordinates == NULL)
@@ -704,6 +1276,7 @@ static bool ExecuteGetSnapshotPositionCallback(PyObject* py_get_snapshot_positio
 		std::string message =
 			"GcodePositionProcessor.ExecuteGetSnapshotPositionCallback - Failed to call python get stabilization position callback.";
 		octolapse_log_exception(octolapse_log::SNAPSHOT_PLAN, message);
+		PyGILState_Release(gstate);
 		return false;
 	}
 	PyObject* pyX = PyDict_GetItemString(pyCoordinates, "x");
@@ -712,6 +1285,8 @@ static bool ExecuteGetSnapshotPositionCallback(PyObject* py_get_snapshot_positio
 		std::string message =
 			"GcodePositionProcessor.ExecuteGetSnapshotPositionCallback - Failed to parse the return x value.";
 		octolapse_log_exception(octolapse_log::SNAPSHOT_PLAN, message);
+		Py_DECREF(pyCoordinates);
+		PyGILState_Release(gstate);
 		return false;
 	}
 	x_result = PyFloatOrInt_AsDouble(pyX);
@@ -721,14 +1296,164 @@ static bool ExecuteGetSnapshotPositionCallback(PyObject* py_get_snapshot_positio
 		std::string message =
 			"GcodePositionProcessor.ExecuteGetSnapshotPositionCallback - Failed to parse the return y value.";
 		octolapse_log_exception(octolapse_log::SNAPSHOT_PLAN, message);
+		Py_DECREF(pyCoordinates);
+		PyGILState_Release(gstate);
 		return false;
 	}
 	y_result = PyFloatOrInt_AsDouble(pyY);
 	Py_DECREF(pyCoordinates);
+	PyGILState_Release(gstate);
 	return true;
 }
 
 /// Argument Parsing
+static PyObject* BuildPositionResult(position* p_position, PyObject* py_target)
+{
+	// Copy the position into the supplied Pos if there is one so that no new python objects are created.
+	if (py_target == NULL || py_target == Py_None)
+	{
+		return python_position::create(*p_position);
+	}
+	if (!python_position::copy_to(py_target, *p_position))
+	{
+		std::string message = "GcodePositionProcessor.BuildPositionResult - Unable to copy the position to the target.";
+		octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+		return NULL;
+	}
+	Py_INCREF(py_target);
+	return py_target;
+}
+
+static void DeleteTriggers(const std::string& key)
+{
+	std::map<std::string, std::vector<realtime_trigger*> >::iterator triggers_iterator =
+		gpp::realtime_triggers.find(key);
+	if (triggers_iterator == gpp::realtime_triggers.end())
+		return;
+	for (unsigned int index = 0; index < triggers_iterator->second.size(); index++)
+	{
+		delete triggers_iterator->second[index];
+	}
+	gpp::realtime_triggers.erase(triggers_iterator);
+}
+
+static PyObject* BuildTriggerStates(std::vector<realtime_trigger*>& triggers)
+{
+	PyObject* py_states = PyTuple_New(triggers.size());
+	if (py_states == NULL)
+	{
+		std::string message = "GcodePositionProcessor.BuildTriggerStates - Unable to create the trigger state tuple.";
+		octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+		return NULL;
+	}
+	for (unsigned int index = 0; index < triggers.size(); index++)
+	{
+		PyObject* py_state = triggers[index]->to_py_tuple();
+		if (py_state == NULL)
+		{
+			Py_DECREF(py_states);
+			return NULL;
+		}
+		// PyTuple_SET_ITEM steals the reference
+		PyTuple_SET_ITEM(py_states, index, py_state);
+	}
+	return py_states;
+}
+
+static bool ParseExtruderTriggerOption(PyObject* py_option, int* p_option)
+{
+	// None means the extruder state is ignored, True that it is required and False that it is forbidden
+	if (py_option == Py_None)
+	{
+		*p_option = extruder_trigger_option_ignore;
+		return true;
+	}
+	const int is_true = PyObject_IsTrue(py_option);
+	if (is_true < 0)
+		return false;
+	*p_option = is_true ? extruder_trigger_option_required : extruder_trigger_option_forbidden;
+	return true;
+}
+
+static bool ParseTriggerArgs(PyObject* py_args, realtime_trigger_args* args)
+{
+	octolapse_log(
+		octolapse_log::GCODE_POSITION, octolapse_log::DEBUG,
+		"Parsing Trigger Args."
+	);
+	if (!PyDict_Check(py_args))
+	{
+		std::string message = "GcodePositionProcessor.ParseTriggerArgs - The trigger args must be a dict.";
+		octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+		return false;
+	}
+	PyObject* py_type = PyDict_GetItemString(py_args, "type");
+	PyObject* py_require_zhop = PyDict_GetItemString(py_args, "require_zhop");
+	PyObject* py_height_increment = PyDict_GetItemString(py_args, "height_increment");
+	PyObject* py_interval_seconds = PyDict_GetItemString(py_args, "interval_seconds");
+	PyObject* py_extruder_triggers = PyDict_GetItemString(py_args, "extruder_triggers");
+	PyObject* py_snapshot_command_gcode = PyDict_GetItemString(py_args, "snapshot_command_gcode");
+	if (
+		py_type == NULL || py_require_zhop == NULL || py_height_increment == NULL || py_interval_seconds == NULL ||
+		py_extruder_triggers == NULL || py_snapshot_command_gcode == NULL
+	)
+	{
+		std::string message =
+			"GcodePositionProcessor.ParseTriggerArgs - Unable to retrieve type, require_zhop, height_increment, "
+			"interval_seconds, extruder_triggers or snapshot_command_gcode from the trigger args dict.";
+		octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+		return false;
+	}
+
+	const char* type = PyUnicode_SafeAsString(py_type);
+	if (type != NULL && strcmp(type, "gcode") == 0)
+		args->type = realtime_trigger_type_gcode;
+	else if (type != NULL && strcmp(type, "layer") == 0)
+		args->type = realtime_trigger_type_layer;
+	else if (type != NULL && strcmp(type, "timer") == 0)
+		args->type = realtime_trigger_type_timer;
+	else
+	{
+		std::string message = "GcodePositionProcessor.ParseTriggerArgs - Unknown trigger type.";
+		octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+		return false;
+	}
+
+	args->require_zhop = PyObject_IsTrue(py_require_zhop) == 1;
+	args->height_increment = py_height_increment == Py_None ? 0 : PyFloatOrInt_AsDouble(py_height_increment);
+	args->interval_seconds = py_interval_seconds == Py_None ? 0 : PyFloatOrInt_AsDouble(py_interval_seconds);
+	const char* snapshot_command_gcode = py_snapshot_command_gcode == Py_None
+		? NULL : PyUnicode_SafeAsString(py_snapshot_command_gcode);
+	args->snapshot_command_gcode = snapshot_command_gcode == NULL ? "" : snapshot_command_gcode;
+
+	args->has_extruder_triggers = py_extruder_triggers != Py_None;
+	if (args->has_extruder_triggers)
+	{
+		if (!PyTuple_Check(py_extruder_triggers) || PyTuple_Size(py_extruder_triggers) != 10)
+		{
+			std::string message = "GcodePositionProcessor.ParseTriggerArgs - The extruder triggers must be a tuple with 10 items.";
+			octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+			return false;
+		}
+		extruder_triggers& options = args->extruder_trigger_options;
+		int* p_options[] = {
+			&options.on_extruding_start, &options.on_extruding, &options.on_primed, &options.on_retracting_start,
+			&options.on_retracting, &options.on_partially_retracted, &options.on_retracted,
+			&options.on_deretracting_start, &options.on_deretracting, &options.on_deretracted
+		};
+		for (int index = 0; index < 10; index++)
+		{
+			if (!ParseExtruderTriggerOption(PyTuple_GetItem(py_extruder_triggers, index), p_options[index]))
+			{
+				std::string message = "GcodePositionProcessor.ParseTriggerArgs - Unable to parse an extruder trigger option.";
+				octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+				return false;
+			}
+		}
+	}
+	return true;
+}
+
 static bool ParsePositionArgs(PyObject* py_args, gcode_position_args* args)
 {
 	octolapse_log(
@@ -1474,6 +2199,29 @@ static bool ParseStabilizationArgs(PyObject* py_args, stabilization_args* args,
 	}
 	args->notification_period_seconds = PyFloatOrInt_AsDouble(py_notification_period_seconds);
 
+	// processing_threads (optional)
+	PyObject* py_processing_threads = PyDict_GetItemString(py_args, "processing_threads");
+	if (py_processing_threads != NULL)
+	{
+		const long processing_threads = PyLong_AsLong(py_processing_threads);
+		args->processing_threads = processing_threads > 1 ? static_cast<unsigned int>(processing_threads) : 1;
+	}
+
+	// progress (optional).  If supplied, progress is published here instead of through on_progress_received.
+	PyObject* py_progress = PyDict_GetItemString(py_args, "progress");
+	if (py_progress != NULL && py_progress != Py_None)
+	{
+		if (!python_stabilization_progress::check(py_progress))
+		{
+			PyErr_SetString(PyExc_TypeError, "The progress must be a GcodePositionProcessor.StabilizationProgress.");
+			std::string message =
+				"GcodePositionProcessor.ParseStabilizationArgs - The progress stabilization arg has the wrong type.";
+			octolapse_log_exception(octolapse_log::SNAPSHOT_PLAN, message);
+			return false;
+		}
+		args->progress = python_stabilization_progress::get_progress(py_progress);
+	}
+
 
 	// file_path
 	PyObject* py_dict_key = PyString_SafeFromString("file_path");
@@ -1499,6 +2247,20 @@ static bool ParseStabilizationArgs(PyObject* py_args, stabilization_args* args,
 
 	args->file_path = PyUnicode_SafeAsString(py_dict_item);
 
+	// checkpoint_file_path (optional).  If supplied, the processing state is saved here periodically and when cancelled.
+	PyObject* py_checkpoint_file_path = PyDict_GetItemString(py_args, "checkpoint_file_path");
+	if (py_checkpoint_file_path != NULL && py_checkpoint_file_path != Py_None)
+	{
+		args->checkpoint_file_path = PyUnicode_SafeAsString(py_checkpoint_file_path);
+	}
+
+	// checkpoint_period_seconds (optional)
+	PyObject* py_checkpoint_period_seconds = PyDict_GetItemString(py_args, "checkpoint_period_seconds");
+	if (py_checkpoint_period_seconds != NULL)
+	{
+		args->checkpoint_period_seconds = PyFloatOrInt_AsDouble(py_checkpoint_period_seconds);
+	}
+
 	args->snapshot_command.clear();
 
 	// Extract the snapshot_command
@@ -1571,6 +2333,20 @@ static bool ParseStabilizationArgs_SmartLayer(PyObject* py_args, smart_layer_arg
 	}
 	args->snap_to_print_smooth = PyLong_AsLong(py_snap_to_print_smooth) > 0;
 
+	// snap_to_print_split_extrusions (optional)
+	PyObject* py_snap_to_print_split_extrusions = PyDict_GetItemString(py_args, "snap_to_print_split_extrusions");
+	if (py_snap_to_print_split_extrusions != NULL)
+	{
+		args->snap_to_print_split_extrusions = PyLong_AsLong(py_snap_to_print_split_extrusions) > 0;
+	}
+
+	// record_layer_candidates (optional)
+	PyObject* py_record_layer_candidates = PyDict_GetItemString(py_args, "record_layer_candidates");
+	if (py_record_layer_candidates != NULL)
+	{
+		args->record_layer_candidates = PyLong_AsLong(py_record_layer_candidates) > 0;
+	}
+
 	return true;
 }
 
@@ -1585,3 +2361,22 @@ static bool ParseStabilizationArgs_SmartGcode(PyObject* py_args, smart_gcode_arg
 
 	return true;
 }
+
+static PyObject* BuildLineList(const std::vector<std::string>& lines)
+{
+	PyObject* py_lines = PyList_New(lines.size());
+	if (py_lines == NULL)
+		return NULL;
+	for (size_t index = 0; index < lines.size(); index++)
+	{
+		// Gcode files aren't guaranteed to be valid utf-8, so replace any bad bytes rather than failing.
+		PyObject* py_line = PyUnicode_DecodeUTF8(lines[index].c_str(), lines[index].size(), "replace");
+		if (py_line == NULL)
+		{
+			Py_DECREF(py_lines);
+			return NULL;
+		}
+		PyList_SET_ITEM(py_lines, index, py_line);
+	}
+	return py_lines;
+}
@@ -35,10 +35,15 @@
 #include "stabilization.h"
 #include "stabilization_smart_layer.h"
 #include "stabilization_smart_gcode.h"
+#include "python_position.h"
+#include "realtime_trigger.h"
+#include <vector>
 
 namespace gpp
 {
 	static std::map<std::string, gcode_position*> gcode_positions;
+	// The realtime triggers for each gcode position key
+	static std::map<std::string, std::vector<realtime_trigger*> > realtime_triggers;
 	static gcode_parser* parser;
 }
 
@@ -49,17 +54,32 @@ extern "C" {
 	static PyObject* Initialize(PyObject* self, PyObject* args);
 	static PyObject* Undo(PyObject* self, PyObject* args);
 	static PyObject* Update(PyObject* self, PyObject* args);
+	static PyObject* UpdateMany(PyObject* self, PyObject* args);
 	static PyObject* UpdatePosition(PyObject* self, PyObject* args);
+	static PyObject* InitializeTriggers(PyObject* self, PyObject* args);
+	static PyObject* UpdateTriggers(PyObject* self, PyObject* args);
+	static PyObject* PauseTriggers(PyObject* self, PyObject* args);
+	static PyObject* ResumeTriggers(PyObject* self, PyObject* args);
 	static PyObject* Parse(PyObject* self, PyObject* args);
+	static PyObject* SetPosType(PyObject* self, PyObject* args);
+	static PyObject* GetCurrentPosition(PyObject* self, PyObject* args);
+	static PyObject* GetPreviousPosition(PyObject* self, PyObject* args);
 	static PyObject* GetCurrentPositionTuple(PyObject* self, PyObject* args);
 	static PyObject* GetCurrentPositionDict(PyObject* self, PyObject* args);
 	static PyObject* GetPreviousPositionTuple(PyObject* self, PyObject* args);
 	static PyObject* GetPreviousPositionDict(PyObject* self, PyObject* args);
 	static PyObject* GetSnapshotPlans_SmartLayer(PyObject* self, PyObject* args);
+	static PyObject* GetSnapshotPlans_SmartLayerCandidates(PyObject* self, PyObject* args);
 	static PyObject* GetSnapshotPlans_SmartGcode(PyObject* self, PyObject* args);
+	static PyObject* GetHeaderAndTailLines(PyObject* self, PyObject* args);
 }
 
 static bool ParsePositionArgs(PyObject* py_args, gcode_position_args* args);
+static PyObject* BuildPositionResult(position* p_position, PyObject* py_target);
+static bool ParseTriggerArgs(PyObject* py_args, realtime_trigger_args* args);
+static void DeleteTriggers(const std::string& key);
+static PyObject* BuildTriggerStates(std::vector<realtime_trigger*>& triggers);
+static PyObject* BuildLineList(const std::vector<std::string>& lines);
 static bool ParseStabilizationArgs(PyObject* py_args, stabilization_args* args, PyObject** p_py_progress_callback,
 	PyObject** p_py_snapshot_position_callback);
 static bool ParseStabilizationArgs_SmartLayer(PyObject* py_args, smart_layer_args* args);
@@ -8,19 +8,22 @@
 #endif
 #include "logging.h"
 #include <string>
+#include <atomic>
 #include "python_helpers.h"
 
-static bool octolapse_loggers_created = false;
-static bool check_log_levels_real_time = true;
+// The log levels are read by the stabilization while the GIL is released, and can be changed by any thread that calls
+// set_internal_log_levels at the same time, so they are atomic.
+static std::atomic<bool> octolapse_loggers_created(false);
+static std::atomic<bool> check_log_levels_real_time(true);
 static PyObject* py_logging_module = NULL;
 static PyObject* py_logging_configurator_name = NULL;
 static PyObject* py_logging_configurator = NULL;
 static PyObject* py_octolapse_gcode_parser_logger = NULL;
-static long gcode_parser_log_level = 0;
+static std::atomic<long> gcode_parser_log_level(0);
 static PyObject* py_octolapse_gcode_position_logger = NULL;
-static long gcode_position_log_level = 0;
+static std::atomic<long> gcode_position_log_level(0);
 static PyObject* py_octolapse_snapshot_plan_logger = NULL;
-static long snapshot_plan_log_level = 0;
+static std::atomic<long> snapshot_plan_log_level(0);
 static PyObject* py_info_function_name = NULL;
 static PyObject* py_warn_function_name = NULL;
 static PyObject* py_error_function_name = NULL;
@@ -99,8 +102,11 @@ void octolapse_initialize_loggers()
 
 void set_internal_log_levels(bool check_real_time)
 {
-  check_log_levels_real_time = check_real_time;
-  if (!check_log_levels_real_time)
+  if (check_real_time)
+  {
+    check_log_levels_real_time = true;
+  }
+  else
   {
     PyObject* py_gcode_parser_log_level = PyObject_CallMethodObjArgs(py_octolapse_gcode_parser_logger,
                                                                      py_get_effective_level_function_name, NULL);
@@ -135,12 +141,14 @@ void set_internal_log_levels(bool check_real_time)
     Py_XDECREF(py_gcode_parser_log_level);
     Py_XDECREF(py_gcode_position_log_level);
     Py_XDECREF(py_snapshot_plan_log_level);
+    // Only stop checking the levels in real time once the cached levels are current.
+    check_log_levels_real_time = false;
   }
 }
 
 bool octolapse_may_be_logged(const int logger_type, const int log_level)
 {
-  int current_log_level;
+  long current_log_level;
   switch (logger_type)
   {
   case octolapse_log::GCODE_PARSER:
@@ -201,8 +209,12 @@ void octolapse_log(const int logger_type, const int log_level, const std::string
     current_log_level = snapshot_plan_log_level;
     break;
   default:
-    PyErr_SetString(PyExc_ValueError, "Logging.octolapse_log - unknown logger_type.");
-    return;
+    {
+      PyGILState_STATE state = PyGILState_Ensure();
+      PyErr_SetString(PyExc_ValueError, "Logging.octolapse_log - unknown logger_type.");
+      PyGILState_Release(state);
+      return;
+    }
   }
 
   if (!check_log_levels_real_time)
@@ -215,6 +227,9 @@ void octolapse_log(const int logger_type, const int log_level, const std::string
     }
   }
 
+  // Logging may happen while the GIL is released (during stabilization), so acquire it before touching any python
+  // objects.
+  PyGILState_STATE state = PyGILState_Ensure();
   PyObject* pyFunctionName = NULL;
 
   PyObject* error_type = NULL;
@@ -255,6 +270,7 @@ void octolapse_log(const int logger_type, const int log_level, const std::string
       pyFunctionName = py_critical_function_name;
       break;
     default:
+      PyGILState_Release(state);
       return;
     }
   }
@@ -263,13 +279,12 @@ void octolapse_log(const int logger_type, const int log_level, const std::string
   {
     PyErr_Format(PyExc_ValueError,
                  "Unable to convert the log message '%s' to a PyString/Unicode message.", message.c_str());
+    PyGILState_Release(state);
     return;
   }
-  PyGILState_STATE state = PyGILState_Ensure();
   PyObject* ret_val = PyObject_CallMethodObjArgs(py_logger, pyFunctionName, pyMessage, NULL);
   // We need to decref our message so that the GC can remove it.  Maybe?
   Py_DECREF(pyMessage);
-  PyGILState_Release(state);
   if (ret_val == NULL)
   {
     if (!PyErr_Occurred())
@@ -295,4 +310,5 @@ void octolapse_log(const int logger_type, const int log_level, const std::string
     }
   }
   Py_XDECREF(ret_val);
+  PyGILState_Release(state);
 }
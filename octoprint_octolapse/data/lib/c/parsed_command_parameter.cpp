@@ -28,6 +28,8 @@
 parsed_command_parameter::parsed_command_parameter()
 {
   value_type = 'N';
+  double_value = 0;
+  unsigned_long_value = 0;
   name.reserve(1);
 }
 
@@ -35,18 +37,22 @@ parsed_command_parameter::
 parsed_command_parameter(const std::string name, double value) : name(name), double_value(value)
 {
   value_type = 'F';
+  unsigned_long_value = 0;
 }
 
 parsed_command_parameter::
 parsed_command_parameter(const std::string name, const std::string value) : name(name), string_value(value)
 {
   value_type = 'S';
+  double_value = 0;
+  unsigned_long_value = 0;
 }
 
 parsed_command_parameter::
 parsed_command_parameter(const std::string name, const unsigned long value) : name(name), unsigned_long_value(value)
 {
   value_type = 'U';
+  double_value = 0;
 }
 
 parsed_command_parameter::~parsed_command_parameter()
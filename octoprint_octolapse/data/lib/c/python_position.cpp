@@ -0,0 +1,619 @@
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+// Copyright(C) 2019  Brad Hochgesang
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// This program is free software : you can redistribute it and/or modify
+// it under the terms of the GNU Affero General Public License as published
+// by the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.See the
+// GNU Affero General Public License for more details.
+//
+// You should have received a copy of the GNU Affero General Public License
+// along with this program.If not, see the following :
+// https ://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+//
+// You can contact the author either through the git - hub repository, or at the
+// following email address : FormerLurker@pm.me
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+
+#include "python_position.h"
+#include "logging.h"
+
+namespace python_position
+{
+  // The type used when creating new position objects.  Python may register a subclass of the native Pos type so
+  // that positions created here (current/previous positions, snapshot plan positions) have the python helpers.
+  static PyObject* py_registered_type = NULL;
+
+  // Field descriptors, passed to the getters and setters via the PyGetSetDef closure.
+  struct double_field
+  {
+    double position::* value;
+    bool position::* is_null;
+  };
+
+  struct long_field
+  {
+    long position::* value;
+  };
+
+  struct int_field
+  {
+    int position::* value;
+  };
+
+  struct bool_field
+  {
+    bool position::* value;
+    bool position::* is_null;
+  };
+
+  static double_field x_field = { &position::x, &position::x_null };
+  static double_field y_field = { &position::y, &position::y_null };
+  static double_field z_field = { &position::z, &position::z_null };
+  static double_field f_field = { &position::f, &position::f_null };
+  static double_field last_extrusion_height_field = {
+    &position::last_extrusion_height, &position::last_extrusion_height_null
+  };
+  static double_field x_offset_field = { &position::x_offset, NULL };
+  static double_field y_offset_field = { &position::y_offset, NULL };
+  static double_field z_offset_field = { &position::z_offset, NULL };
+  static double_field x_firmware_offset_field = { &position::x_firmware_offset, NULL };
+  static double_field y_firmware_offset_field = { &position::y_firmware_offset, NULL };
+  static double_field z_firmware_offset_field = { &position::z_firmware_offset, NULL };
+  static double_field z_relative_field = { &position::z_relative, NULL };
+  static double_field height_field = { &position::height, NULL };
+
+  static long_field layer_field = { &position::layer };
+  static long_field file_line_number_field = { &position::file_line_number };
+  static long_field gcode_number_field = { &position::gcode_number };
+  static long_field file_position_field = { &position::file_position };
+
+  static int_field height_increment_field = { &position::height_increment };
+  static int_field height_increment_change_count_field = { &position::height_increment_change_count };
+  static int_field current_tool_field = { &position::current_tool };
+  static int_field num_extruders_field = { &position::num_extruders };
+
+  static bool_field is_relative_field = { &position::is_relative, &position::is_relative_null };
+  static bool_field is_extruder_relative_field = {
+    &position::is_extruder_relative, &position::is_extruder_relative_null
+  };
+  static bool_field is_metric_field = { &position::is_metric, &position::is_metric_null };
+  static bool_field x_homed_field = { &position::x_homed, NULL };
+  static bool_field y_homed_field = { &position::y_homed, NULL };
+  static bool_field z_homed_field = { &position::z_homed, NULL };
+  static bool_field is_printer_primed_field = { &position::is_printer_primed, NULL };
+  static bool_field has_definite_position_field = { &position::has_definite_position, NULL };
+  static bool_field is_layer_change_field = { &position::is_layer_change, NULL };
+  static bool_field is_height_change_field = { &position::is_height_change, NULL };
+  static bool_field is_height_increment_change_field = { &position::is_height_increment_change, NULL };
+  static bool_field is_xy_travel_field = { &position::is_xy_travel, NULL };
+  static bool_field is_xyz_travel_field = { &position::is_xyz_travel, NULL };
+  static bool_field is_zhop_field = { &position::is_zhop, NULL };
+  static bool_field has_xy_position_changed_field = { &position::has_xy_position_changed, NULL };
+  static bool_field has_position_changed_field = { &position::has_position_changed, NULL };
+  static bool_field has_received_home_command_field = { &position::has_received_home_command, NULL };
+  static bool_field is_in_position_field = { &position::is_in_position, NULL };
+  static bool_field is_in_bounds_field = { &position::is_in_bounds, NULL };
+
+  static void clear_cache(py_pos_object* self)
+  {
+    Py_CLEAR(self->py_parsed_command);
+    Py_CLEAR(self->py_extruders);
+    Py_CLEAR(self->py_in_path_position);
+  }
+
+  static bool check_delete(PyObject* value)
+  {
+    if (value == NULL)
+    {
+      PyErr_SetString(PyExc_AttributeError, "Pos attributes cannot be deleted.");
+      return false;
+    }
+    return true;
+  }
+
+  static PyObject* get_double(py_pos_object* self, void* closure)
+  {
+    const double_field* field = static_cast<double_field*>(closure);
+    if (field->is_null != NULL && self->p_position->*(field->is_null))
+    {
+      Py_RETURN_NONE;
+    }
+    return PyFloat_FromDouble(self->p_position->*(field->value));
+  }
+
+  static int set_double(py_pos_object* self, PyObject* value, void* closure)
+  {
+    if (!check_delete(value))
+      return -1;
+    const double_field* field = static_cast<double_field*>(closure);
+    if (value == Py_None)
+    {
+      if (field->is_null == NULL)
+      {
+        PyErr_SetString(PyExc_TypeError, "This Pos attribute cannot be set to None.");
+        return -1;
+      }
+      self->p_position->*(field->is_null) = true;
+      return 0;
+    }
+    const double double_value = PyFloat_AsDouble(value);
+    if (double_value == -1.0 && PyErr_Occurred())
+      return -1;
+    self->p_position->*(field->value) = double_value;
+    if (field->is_null != NULL)
+      self->p_position->*(field->is_null) = false;
+    return 0;
+  }
+
+  static PyObject* get_long(py_pos_object* self, void* closure)
+  {
+    const long_field* field = static_cast<long_field*>(closure);
+    return PyLong_FromLong(self->p_position->*(field->value));
+  }
+
+  static int set_long(py_pos_object* self, PyObject* value, void* closure)
+  {
+    if (!check_delete(value))
+      return -1;
+    const long long_value = PyLong_AsLong(value);
+    if (long_value == -1 && PyErr_Occurred())
+      return -1;
+    const long_field* field = static_cast<long_field*>(closure);
+    self->p_position->*(field->value) = long_value;
+    return 0;
+  }
+
+  static PyObject* get_int(py_pos_object* self, void* closure)
+  {
+    const int_field* field = static_cast<int_field*>(closure);
+    return PyLong_FromLong(self->p_position->*(field->value));
+  }
+
+  static int set_int(py_pos_object* self, PyObject* value, void* closure)
+  {
+    if (!check_delete(value))
+      return -1;
+    const long long_value = PyLong_AsLong(value);
+    if (long_value == -1 && PyErr_Occurred())
+      return -1;
+    const int_field* field = static_cast<int_field*>(closure);
+    self->p_position->*(field->value) = static_cast<int>(long_value);
+    return 0;
+  }
+
+  static PyObject* get_bool(py_pos_object* self, void* closure)
+  {
+    const bool_field* field = static_cast<bool_field*>(closure);
+    if (field->is_null != NULL && self->p_position->*(field->is_null))
+    {
+      Py_RETURN_NONE;
+    }
+    return PyBool_FromLong(self->p_position->*(field->value) ? 1 : 0);
+  }
+
+  static int set_bool(py_pos_object* self, PyObject* value, void* closure)
+  {
+    if (!check_delete(value))
+      return -1;
+    const bool_field* field = static_cast<bool_field*>(closure);
+    if (value == Py_None && field->is_null != NULL)
+    {
+      self->p_position->*(field->is_null) = true;
+      return 0;
+    }
+    const int is_true = PyObject_IsTrue(value);
+    if (is_true < 0)
+      return -1;
+    self->p_position->*(field->value) = is_true > 0;
+    if (field->is_null != NULL)
+      self->p_position->*(field->is_null) = false;
+    return 0;
+  }
+
+  static PyObject* get_none(py_pos_object* self, void* closure)
+  {
+    // Firmware retraction is not tracked by the native position, so these values are always unknown.
+    Py_RETURN_NONE;
+  }
+
+  static PyObject* get_in_path_position(py_pos_object* self, void* closure)
+  {
+    if (self->py_in_path_position != NULL)
+    {
+      Py_INCREF(self->py_in_path_position);
+      return self->py_in_path_position;
+    }
+    return PyBool_FromLong(self->p_position->in_path_position ? 1 : 0);
+  }
+
+  static int set_in_path_position(py_pos_object* self, PyObject* value, void* closure)
+  {
+    if (!check_delete(value))
+      return -1;
+    const int is_true = PyObject_IsTrue(value);
+    if (is_true < 0)
+      return -1;
+    self->p_position->in_path_position = is_true > 0;
+    Py_CLEAR(self->py_in_path_position);
+    if (!PyBool_Check(value))
+    {
+      // keep the intersection info around for python
+      Py_INCREF(value);
+      self->py_in_path_position = value;
+    }
+    return 0;
+  }
+
+  // Calls an optional factory defined on the (python) subclass to convert a tuple into a python object.
+  // If no factory exists the tuple itself is returned.  Steals the reference to py_tuple.
+  static PyObject* materialize(PyObject* py_factory, PyObject* py_tuple)
+  {
+    if (py_factory == NULL || py_tuple == NULL)
+      return py_tuple;
+    PyObject* py_result = PyObject_CallFunctionObjArgs(py_factory, py_tuple, NULL);
+    Py_DECREF(py_tuple);
+    return py_result;
+  }
+
+  static PyObject* get_factory(py_pos_object* self, const char* factory_name)
+  {
+    PyObject* py_factory = PyObject_GetAttrString(reinterpret_cast<PyObject*>(Py_TYPE(self)), factory_name);
+    if (py_factory == NULL)
+    {
+      PyErr_Clear();
+    }
+    return py_factory;
+  }
+
+  static PyObject* get_parsed_command(py_pos_object* self, void* closure)
+  {
+    if (self->py_parsed_command == NULL)
+    {
+      if (self->p_position->command.is_empty)
+      {
+        Py_INCREF(Py_None);
+        self->py_parsed_command = Py_None;
+      }
+      else
+      {
+        PyObject* py_factory = get_factory(self, "_create_parsed_command");
+        self->py_parsed_command = materialize(py_factory, self->p_position->command.to_py_object());
+        Py_XDECREF(py_factory);
+        if (self->py_parsed_command == NULL)
+        {
+          return NULL;
+        }
+      }
+    }
+    Py_INCREF(self->py_parsed_command);
+    return self->py_parsed_command;
+  }
+
+  static int set_parsed_command(py_pos_object* self, PyObject* value, void* closure)
+  {
+    if (!check_delete(value))
+      return -1;
+    Py_INCREF(value);
+    Py_XSETREF(self->py_parsed_command, value);
+    return 0;
+  }
+
+  static PyObject* get_extruders(py_pos_object* self, void* closure)
+  {
+    if (self->py_extruders == NULL)
+    {
+      PyObject* py_extruders = PyList_New(self->p_position->num_extruders);
+      if (py_extruders == NULL)
+      {
+        return NULL;
+      }
+      PyObject* py_factory = get_factory(self, "_create_extruder");
+      for (int index = 0; index < self->p_position->num_extruders; index++)
+      {
+        PyObject* py_extruder = materialize(py_factory, self->p_position->p_extruders[index].to_py_tuple());
+        if (py_extruder == NULL)
+        {
+          Py_XDECREF(py_factory);
+          Py_DECREF(py_extruders);
+          return NULL;
+        }
+        // reference to py_extruder stolen
+        PyList_SET_ITEM(py_extruders, index, py_extruder);
+      }
+      Py_XDECREF(py_factory);
+      self->py_extruders = py_extruders;
+    }
+    Py_INCREF(self->py_extruders);
+    return self->py_extruders;
+  }
+
+  static PyGetSetDef py_pos_getset[] = {
+    {(char*)"x", (getter)get_double, (setter)set_double, NULL, &x_field},
+    {(char*)"y", (getter)get_double, (setter)set_double, NULL, &y_field},
+    {(char*)"z", (getter)get_double, (setter)set_double, NULL, &z_field},
+    {(char*)"f", (getter)get_double, (setter)set_double, NULL, &f_field},
+    {(char*)"x_offset", (getter)get_double, (setter)set_double, NULL, &x_offset_field},
+    {(char*)"y_offset", (getter)get_double, (setter)set_double, NULL, &y_offset_field},
+    {(char*)"z_offset", (getter)get_double, (setter)set_double, NULL, &z_offset_field},
+    {(char*)"x_firmware_offset", (getter)get_double, (setter)set_double, NULL, &x_firmware_offset_field},
+    {(char*)"y_firmware_offset", (getter)get_double, (setter)set_double, NULL, &y_firmware_offset_field},
+    {(char*)"z_firmware_offset", (getter)get_double, (setter)set_double, NULL, &z_firmware_offset_field},
+    {(char*)"z_relative", (getter)get_double, (setter)set_double, NULL, &z_relative_field},
+    {(char*)"last_extrusion_height", (getter)get_double, (setter)set_double, NULL, &last_extrusion_height_field},
+    {(char*)"height", (getter)get_double, (setter)set_double, NULL, &height_field},
+    {(char*)"firmware_retraction_length", (getter)get_none, NULL, NULL, NULL},
+    {(char*)"firmware_unretraction_additional_length", (getter)get_none, NULL, NULL, NULL},
+    {(char*)"firmware_retraction_feedrate", (getter)get_none, NULL, NULL, NULL},
+    {(char*)"firmware_unretraction_feedrate", (getter)get_none, NULL, NULL, NULL},
+    {(char*)"firmware_z_lift", (getter)get_none, NULL, NULL, NULL},
+    {(char*)"layer", (getter)get_long, (setter)set_long, NULL, &layer_field},
+    {(char*)"height_increment", (getter)get_int, (setter)set_int, NULL, &height_increment_field},
+    {
+      (char*)"height_increment_change_count", (getter)get_int, (setter)set_int, NULL,
+      &height_increment_change_count_field
+    },
+    {(char*)"current_tool", (getter)get_int, (setter)set_int, NULL, &current_tool_field},
+    {(char*)"num_extruders", (getter)get_int, NULL, NULL, &num_extruders_field},
+    {(char*)"x_homed", (getter)get_bool, (setter)set_bool, NULL, &x_homed_field},
+    {(char*)"y_homed", (getter)get_bool, (setter)set_bool, NULL, &y_homed_field},
+    {(char*)"z_homed", (getter)get_bool, (setter)set_bool, NULL, &z_homed_field},
+    {(char*)"is_relative", (getter)get_bool, (setter)set_bool, NULL, &is_relative_field},
+    {(char*)"is_extruder_relative", (getter)get_bool, (setter)set_bool, NULL, &is_extruder_relative_field},
+    {(char*)"is_metric", (getter)get_bool, (setter)set_bool, NULL, &is_metric_field},
+    {(char*)"is_printer_primed", (getter)get_bool, (setter)set_bool, NULL, &is_printer_primed_field},
+    {(char*)"has_definite_position", (getter)get_bool, (setter)set_bool, NULL, &has_definite_position_field},
+    {(char*)"is_layer_change", (getter)get_bool, (setter)set_bool, NULL, &is_layer_change_field},
+    {(char*)"is_height_change", (getter)get_bool, (setter)set_bool, NULL, &is_height_change_field},
+    {
+      (char*)"is_height_increment_change", (getter)get_bool, (setter)set_bool, NULL,
+      &is_height_increment_change_field
+    },
+    {(char*)"is_xy_travel", (getter)get_bool, (setter)set_bool, NULL, &is_xy_travel_field},
+    {(char*)"is_xyz_travel", (getter)get_bool, (setter)set_bool, NULL, &is_xyz_travel_field},
+    {(char*)"is_zhop", (getter)get_bool, (setter)set_bool, NULL, &is_zhop_field},
+    {(char*)"has_xy_position_changed", (getter)get_bool, (setter)set_bool, NULL, &has_xy_position_changed_field},
+    {(char*)"has_position_changed", (getter)get_bool, (setter)set_bool, NULL, &has_position_changed_field},
+    {
+      (char*)"has_received_home_command", (getter)get_bool, (setter)set_bool, NULL,
+      &has_received_home_command_field
+    },
+    {(char*)"is_in_position", (getter)get_bool, (setter)set_bool, NULL, &is_in_position_field},
+    {(char*)"in_path_position", (getter)get_in_path_position, (setter)set_in_path_position, NULL, NULL},
+    {(char*)"is_in_bounds", (getter)get_bool, (setter)set_bool, NULL, &is_in_bounds_field},
+    {(char*)"file_line_number", (getter)get_long, (setter)set_long, NULL, &file_line_number_field},
+    {(char*)"gcode_number", (getter)get_long, (setter)set_long, NULL, &gcode_number_field},
+    {(char*)"file_position", (getter)get_long, (setter)set_long, NULL, &file_position_field},
+    {(char*)"parsed_command", (getter)get_parsed_command, (setter)set_parsed_command, NULL, NULL},
+    {(char*)"extruders", (getter)get_extruders, NULL, NULL, NULL},
+    {NULL}
+  };
+
+  // Pickle support.  The state contains every attribute that can be set, the extruders, and the native fields that
+  // are not exposed as attributes.
+  static PyObject* py_pos_getstate(py_pos_object* self, PyObject* unused)
+  {
+    PyObject* py_attributes = PyDict_New();
+    if (py_attributes == NULL)
+    {
+      return NULL;
+    }
+    for (PyGetSetDef* p_def = py_pos_getset; p_def->name != NULL; p_def++)
+    {
+      if (p_def->set == NULL)
+        continue;
+      PyObject* py_value = p_def->get(reinterpret_cast<PyObject*>(self), p_def->closure);
+      if (py_value == NULL)
+      {
+        Py_DECREF(py_attributes);
+        return NULL;
+      }
+      const int result = PyDict_SetItemString(py_attributes, p_def->name, py_value);
+      Py_DECREF(py_value);
+      if (result < 0)
+      {
+        Py_DECREF(py_attributes);
+        return NULL;
+      }
+    }
+    const position* p_position = self->p_position;
+    PyObject* py_extruders = PyTuple_New(p_position->num_extruders);
+    if (py_extruders == NULL)
+    {
+      Py_DECREF(py_attributes);
+      return NULL;
+    }
+    for (int index = 0; index < p_position->num_extruders; index++)
+    {
+      PyObject* py_extruder = p_position->p_extruders[index].to_py_tuple();
+      if (py_extruder == NULL)
+      {
+        Py_DECREF(py_attributes);
+        Py_DECREF(py_extruders);
+        return NULL;
+      }
+      // reference to py_extruder stolen
+      PyTuple_SET_ITEM(py_extruders, index, py_extruder);
+    }
+    // The attributes and extruders references are stolen
+    return Py_BuildValue(
+      "(NNiii)", py_attributes, py_extruders, p_position->feature_type_tag, p_position->gcode_ignored ? 1 : 0,
+      p_position->is_empty ? 1 : 0
+    );
+  }
+
+  static PyObject* py_pos_setstate(py_pos_object* self, PyObject* py_state)
+  {
+    PyObject* py_attributes;
+    PyObject* py_extruders;
+    int feature_type_tag;
+    int gcode_ignored;
+    int is_empty;
+    if (!PyArg_ParseTuple(
+      py_state, "O!O!iii", &PyDict_Type, &py_attributes, &PyTuple_Type, &py_extruders, &feature_type_tag,
+      &gcode_ignored, &is_empty
+    ))
+    {
+      return NULL;
+    }
+    clear_cache(self);
+    position* p_position = self->p_position;
+    p_position->set_num_extruders(static_cast<int>(PyTuple_GET_SIZE(py_extruders)));
+    for (int index = 0; index < p_position->num_extruders; index++)
+    {
+      extruder& current = p_position->p_extruders[index];
+      int flags[10];
+      if (!PyArg_ParseTuple(
+        PyTuple_GET_ITEM(py_extruders, index), "ddddddddddpppppppppp", &current.x_firmware_offset,
+        &current.y_firmware_offset, &current.z_firmware_offset, &current.e, &current.e_offset, &current.e_relative,
+        &current.extrusion_length, &current.extrusion_length_total, &current.retraction_length,
+        &current.deretraction_length, &flags[0], &flags[1], &flags[2], &flags[3], &flags[4], &flags[5], &flags[6],
+        &flags[7], &flags[8], &flags[9]
+      ))
+      {
+        return NULL;
+      }
+      current.is_extruding_start = flags[0] > 0;
+      current.is_extruding = flags[1] > 0;
+      current.is_primed = flags[2] > 0;
+      current.is_retracting_start = flags[3] > 0;
+      current.is_retracting = flags[4] > 0;
+      current.is_retracted = flags[5] > 0;
+      current.is_partially_retracted = flags[6] > 0;
+      current.is_deretracting_start = flags[7] > 0;
+      current.is_deretracting = flags[8] > 0;
+      current.is_deretracted = flags[9] > 0;
+    }
+    for (PyGetSetDef* p_def = py_pos_getset; p_def->name != NULL; p_def++)
+    {
+      if (p_def->set == NULL)
+        continue;
+      PyObject* py_value = PyDict_GetItemString(py_attributes, p_def->name);
+      if (py_value != NULL && p_def->set(reinterpret_cast<PyObject*>(self), py_value, p_def->closure) < 0)
+      {
+        return NULL;
+      }
+    }
+    p_position->feature_type_tag = feature_type_tag;
+    p_position->gcode_ignored = gcode_ignored > 0;
+    p_position->is_empty = is_empty > 0;
+    Py_RETURN_NONE;
+  }
+
+  static PyMethodDef py_pos_methods[] = {
+    {"__getstate__", (PyCFunction)py_pos_getstate, METH_NOARGS, "Gets the state of the position for pickling."},
+    {"__setstate__", (PyCFunction)py_pos_setstate, METH_O, "Restores the state of a pickled position."},
+    {NULL}
+  };
+
+  static PyObject* py_pos_new(PyTypeObject* type, PyObject* args, PyObject* kwds)
+  {
+    py_pos_object* self = reinterpret_cast<py_pos_object*>(type->tp_alloc(type, 0));
+    if (self == NULL)
+    {
+      return NULL;
+    }
+    self->p_position = new position();
+    self->py_parsed_command = NULL;
+    self->py_extruders = NULL;
+    self->py_in_path_position = NULL;
+    return reinterpret_cast<PyObject*>(self);
+  }
+
+  static void py_pos_dealloc(py_pos_object* self)
+  {
+    clear_cache(self);
+    if (self->p_position != NULL)
+    {
+      delete self->p_position;
+      self->p_position = NULL;
+    }
+    Py_TYPE(self)->tp_free(reinterpret_cast<PyObject*>(self));
+  }
+
+  PyTypeObject py_pos_type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "GcodePositionProcessor.Pos"
+  };
+
+  bool initialize_type(PyObject* module)
+  {
+    py_pos_type.tp_basicsize = sizeof(py_pos_object);
+    py_pos_type.tp_itemsize = 0;
+    py_pos_type.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE;
+    py_pos_type.tp_doc = "A gcode position backed by the native position struct.";
+    py_pos_type.tp_new = py_pos_new;
+    py_pos_type.tp_dealloc = reinterpret_cast<destructor>(py_pos_dealloc);
+    py_pos_type.tp_getset = py_pos_getset;
+    py_pos_type.tp_methods = py_pos_methods;
+    if (PyType_Ready(&py_pos_type) < 0)
+    {
+      return false;
+    }
+    Py_INCREF(&py_pos_type);
+    if (PyModule_AddObject(module, "Pos", reinterpret_cast<PyObject*>(&py_pos_type)) < 0)
+    {
+      Py_DECREF(&py_pos_type);
+      return false;
+    }
+    return true;
+  }
+
+  bool check(PyObject* py_object)
+  {
+    return PyObject_TypeCheck(py_object, &py_pos_type);
+  }
+
+  bool set_pos_type(PyObject* py_type)
+  {
+    if (
+      !PyType_Check(py_type) ||
+      !PyType_IsSubtype(reinterpret_cast<PyTypeObject*>(py_type), &py_pos_type)
+    )
+    {
+      PyErr_SetString(PyExc_TypeError, "The position type must be a subclass of GcodePositionProcessor.Pos.");
+      return false;
+    }
+    Py_INCREF(py_type);
+    Py_XSETREF(py_registered_type, py_type);
+    return true;
+  }
+
+  PyObject* create(const position& pos)
+  {
+    PyObject* py_type = py_registered_type != NULL
+                          ? py_registered_type
+                          : reinterpret_cast<PyObject*>(&py_pos_type);
+    PyObject* py_pos = PyObject_CallObject(py_type, NULL);
+    if (py_pos == NULL)
+    {
+      std::string message = "python_position.create: Unable to create a Pos object.";
+      octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+      return NULL;
+    }
+    if (!copy_to(py_pos, pos))
+    {
+      Py_DECREF(py_pos);
+      return NULL;
+    }
+    return py_pos;
+  }
+
+  bool copy_to(PyObject* py_pos, const position& pos)
+  {
+    if (!check(py_pos))
+    {
+      PyErr_SetString(PyExc_TypeError, "The target must be a GcodePositionProcessor.Pos object.");
+      return false;
+    }
+    py_pos_object* self = reinterpret_cast<py_pos_object*>(py_pos);
+    *self->p_position = pos;
+    clear_cache(self);
+    return true;
+  }
+}
@@ -0,0 +1,56 @@
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+// Copyright(C) 2019  Brad Hochgesang
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// This program is free software : you can redistribute it and/or modify
+// it under the terms of the GNU Affero General Public License as published
+// by the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.See the
+// GNU Affero General Public License for more details.
+//
+// You should have received a copy of the GNU Affero General Public License
+// along with this program.If not, see the following :
+// https ://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+//
+// You can contact the author either through the git - hub repository, or at the
+// following email address : FormerLurker@pm.me
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+
+#ifndef PYTHON_POSITION_H
+#define PYTHON_POSITION_H
+#ifdef _DEBUG
+//#undef _DEBUG
+#include <Python.h>
+//python311_d.lib
+#else
+#include <Python.h>
+#endif
+#include "position.h"
+
+// A python object that owns a copy of a native position.  Attribute access reads directly from the position struct,
+// and the parsed command and extruders are only converted into python objects when they are requested.
+struct py_pos_object
+{
+  PyObject_HEAD
+  position* p_position;
+  // Cached (lazily created) python objects.  These are cleared every time the position is replaced.
+  PyObject* py_parsed_command;
+  PyObject* py_extruders;
+  // in_path_position can hold intersection information that is calculated in python.
+  PyObject* py_in_path_position;
+};
+
+namespace python_position
+{
+  extern PyTypeObject py_pos_type;
+  bool initialize_type(PyObject* module);
+  bool check(PyObject* py_object);
+  bool set_pos_type(PyObject* py_type);
+  PyObject* create(const position& pos);
+  bool copy_to(PyObject* py_pos, const position& pos);
+}
+#endif
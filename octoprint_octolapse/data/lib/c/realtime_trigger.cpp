@@ -0,0 +1,463 @@
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+// Copyright(C) 2019  Brad Hochgesang
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// This program is free software : you can redistribute it and/or modify
+// it under the terms of the GNU Affero General Public License as published
+// by the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.See the
+// GNU Affero General Public License for more details.
+//
+// You should have received a copy of the GNU Affero General Public License
+// along with this program.If not, see the following :
+// https ://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+//
+// You can contact the author either through the git - hub repository, or at the
+// following email address : FormerLurker@pm.me
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+#include "realtime_trigger.h"
+#include "utilities.h"
+#include "logging.h"
+#include <chrono>
+#include <cmath>
+
+extruder_triggers::extruder_triggers()
+{
+  on_extruding_start = extruder_trigger_option_ignore;
+  on_extruding = extruder_trigger_option_ignore;
+  on_primed = extruder_trigger_option_ignore;
+  on_retracting_start = extruder_trigger_option_ignore;
+  on_retracting = extruder_trigger_option_ignore;
+  on_partially_retracted = extruder_trigger_option_ignore;
+  on_retracted = extruder_trigger_option_ignore;
+  on_deretracting_start = extruder_trigger_option_ignore;
+  on_deretracting = extruder_trigger_option_ignore;
+  on_deretracted = extruder_trigger_option_ignore;
+}
+
+bool extruder_triggers::is_triggered(const extruder& extruder_state) const
+{
+  // Matches the extruder trigger options to the extruder state, exactly like Position._is_extruder_triggered.
+  // Any forbidden state prevents triggering.  Otherwise at least one required state must be present, unless
+  // every option is ignored.
+  const int options[] = {
+    on_extruding_start, on_extruding, on_primed, on_retracting_start, on_retracting,
+    on_partially_retracted, on_retracted, on_deretracting_start, on_deretracting, on_deretracted
+  };
+  const bool states[] = {
+    extruder_state.is_extruding_start, extruder_state.is_extruding, extruder_state.is_primed,
+    extruder_state.is_retracting_start, extruder_state.is_retracting, extruder_state.is_partially_retracted,
+    extruder_state.is_retracted, extruder_state.is_deretracting_start, extruder_state.is_deretracting,
+    extruder_state.is_deretracted
+  };
+  bool all_ignored = true;
+  bool has_required_state = false;
+  for (int index = 0; index < 10; index++)
+  {
+    if (options[index] == extruder_trigger_option_ignore)
+      continue;
+    all_ignored = false;
+    if (!states[index])
+      continue;
+    if (options[index] == extruder_trigger_option_forbidden)
+      return false;
+    has_required_state = true;
+  }
+  return has_required_state || all_ignored;
+}
+
+realtime_trigger_args::realtime_trigger_args()
+{
+  type = realtime_trigger_type_layer;
+  require_zhop = false;
+  height_increment = 0;
+  interval_seconds = 0;
+  has_extruder_triggers = false;
+  snapshot_command_gcode = "";
+}
+
+realtime_trigger_state::realtime_trigger_state()
+{
+  is_triggered = false;
+  trigger_type = realtime_trigger_result_none;
+  is_in_position = false;
+  in_path_position = false;
+  is_waiting = false;
+  is_home_position_wait = false;
+  is_waiting_on_zhop = false;
+  is_waiting_on_extruder = false;
+  has_definite_position = false;
+  current_increment = 0;
+  is_layer_change_wait = false;
+  is_height_change = false;
+  is_height_change_wait = false;
+  layer = 0;
+  is_layer_change = false;
+  seconds_to_trigger = 0;
+  seconds_to_trigger_null = true;
+  trigger_start_time = 0;
+  trigger_start_time_null = true;
+  pause_time = 0;
+  pause_time_null = true;
+}
+
+void realtime_trigger_state::reset_state()
+{
+  is_triggered = false;
+  in_path_position = false;
+  is_in_position = false;
+  trigger_type = realtime_trigger_result_none;
+  is_height_change = false;
+  is_layer_change = false;
+}
+
+bool realtime_trigger_state::is_equal(const realtime_trigger_state& state) const
+{
+  return is_triggered == state.is_triggered
+    && trigger_type == state.trigger_type
+    && is_in_position == state.is_in_position
+    && in_path_position == state.in_path_position
+    && is_waiting == state.is_waiting
+    && is_home_position_wait == state.is_home_position_wait
+    && is_waiting_on_zhop == state.is_waiting_on_zhop
+    && is_waiting_on_extruder == state.is_waiting_on_extruder
+    && has_definite_position == state.has_definite_position
+    && current_increment == state.current_increment
+    && is_layer_change_wait == state.is_layer_change_wait
+    && is_height_change == state.is_height_change
+    && is_height_change_wait == state.is_height_change_wait
+    && layer == state.layer
+    && seconds_to_trigger_null == state.seconds_to_trigger_null
+    && (seconds_to_trigger_null || seconds_to_trigger == state.seconds_to_trigger)
+    && trigger_start_time_null == state.trigger_start_time_null
+    && (trigger_start_time_null || trigger_start_time == state.trigger_start_time)
+    && pause_time_null == state.pause_time_null
+    && (pause_time_null || pause_time == state.pause_time);
+}
+
+realtime_trigger::realtime_trigger(const realtime_trigger_args& args)
+{
+  args_ = args;
+  trigger_count_ = 0;
+  snapshots_enabled_ = true;
+}
+
+double realtime_trigger::get_current_time()
+{
+  // Seconds since the epoch, which matches python's time.time()
+  return std::chrono::duration<double>(std::chrono::system_clock::now().time_since_epoch()).count();
+}
+
+const realtime_trigger_state& realtime_trigger::get_state() const
+{
+  return state_;
+}
+
+bool realtime_trigger::update(
+  const position& current, const position& previous, bool is_in_position, bool in_path_position
+)
+{
+  double current_time = 0;
+  if (args_.type == realtime_trigger_type_timer)
+    current_time = get_current_time();
+  return update(current, previous, is_in_position, in_path_position, current_time);
+}
+
+bool realtime_trigger::update(
+  const position& current, const position& previous, bool is_in_position, bool in_path_position,
+  double current_time
+)
+{
+  const bool snapshots_enabled = snapshots_enabled_;
+  update_snapshots_enabled(current.command);
+
+  realtime_trigger_state state = state_;
+  state.reset_state();
+
+  // The trigger position is the previous position, not the current
+  const position& trigger_position = previous;
+  if (!trigger_position.has_definite_position)
+  {
+    // Don't update the trigger if we don't have a homed axis
+    state.is_triggered = false;
+    state.has_definite_position = false;
+  }
+  else
+  {
+    state.has_definite_position = true;
+    state.is_in_position = is_in_position && trigger_position.is_in_bounds;
+    // the in path position is the CURRENT position, not the trigger position
+    state.in_path_position = in_path_position;
+    switch (args_.type)
+    {
+    case realtime_trigger_type_gcode:
+      update_gcode(state, current, trigger_position);
+      break;
+    case realtime_trigger_type_layer:
+      update_layer(state, current, trigger_position);
+      break;
+    case realtime_trigger_type_timer:
+      update_timer(state, trigger_position, current_time);
+      break;
+    }
+  }
+
+  // A change to snapshots_enabled must also be reported, else python will never see it
+  const bool has_changed = !state.is_equal(state_) || snapshots_enabled != snapshots_enabled_;
+  state_ = state;
+  return has_changed;
+}
+
+bool realtime_trigger::pause(double current_time)
+{
+  state_.pause_time = current_time;
+  state_.pause_time_null = false;
+  return true;
+}
+
+bool realtime_trigger::resume(double current_time)
+{
+  if (state_.pause_time_null || state_.trigger_start_time_null)
+    return false;
+  // Keep the proper interval if the print is paused
+  state_.trigger_start_time = current_time - (state_.pause_time - state_.trigger_start_time);
+  state_.pause_time_null = true;
+  state_.pause_time = 0;
+  return true;
+}
+
+void realtime_trigger::update_snapshots_enabled(const parsed_command& command)
+{
+  if (command.command != "@OCTOLAPSE" || command.parameters.size() != 1)
+    return;
+  if (command.parameters[0].name == "STOP-SNAPSHOTS")
+    snapshots_enabled_ = false;
+  else if (command.parameters[0].name == "START-SNAPSHOTS")
+    snapshots_enabled_ = true;
+}
+
+bool realtime_trigger::is_snapshot_command(const parsed_command& command) const
+{
+  // This matches PrinterProfile.is_snapshot_command
+  const std::string& gcode = command.gcode;
+  if (gcode.length() == 0)
+    return false;
+  return (
+    (args_.snapshot_command_gcode.length() > 0 && args_.snapshot_command_gcode == gcode) ||
+    gcode.compare(0, 24, "@OCTOLAPSE TAKE-SNAPSHOT") == 0 ||
+    gcode == "SNAP"
+  );
+}
+
+void realtime_trigger::update_gcode(
+  realtime_trigger_state& state, const position& current, const position& trigger_position
+)
+{
+  if (is_snapshot_command(current.command))
+  {
+    if (snapshots_enabled_)
+      state.is_waiting = true;
+    else
+      octolapse_log(
+        octolapse_log::GCODE_POSITION, octolapse_log::INFO,
+        "GcodeTrigger - A snapshot was detected, but snapshots were disabled via @Octolapse stop-snapshots."
+      );
+  }
+  if (state.is_waiting)
+    try_trigger(state, trigger_position);
+}
+
+void realtime_trigger::update_layer(
+  realtime_trigger_state& state, const position& current, const position& trigger_position
+)
+{
+  if (args_.height_increment > 0)
+  {
+    // calculate height increment changed
+    if (
+      current.is_layer_change &&
+      (state.current_increment * args_.height_increment < trigger_position.height || state.current_increment == 0)
+    )
+    {
+      const int new_increment = static_cast<int>(std::ceil(trigger_position.height / args_.height_increment));
+      if (new_increment <= state.current_increment)
+      {
+        octolapse_log(
+          octolapse_log::GCODE_POSITION, octolapse_log::WARNING,
+          "Layer Trigger - Warning - The height increment was expected to increase, but it did not."
+        );
+      }
+      else
+      {
+        // if the current increment is below one here, set it to one.  This is not normal, but can happen
+        // if extrusion is detected at height 0.
+        state.current_increment = new_increment < 1 ? 1 : new_increment;
+        state.is_height_change = true;
+      }
+    }
+    if (state.is_height_change)
+    {
+      state.is_height_change_wait = true;
+      state.is_waiting = true;
+    }
+  }
+  else if (current.is_layer_change)
+  {
+    // see if the CURRENT position is a layer change
+    state.layer = trigger_position.layer;
+    state.is_layer_change_wait = true;
+    state.is_layer_change = true;
+    state.is_waiting = true;
+  }
+
+  if (state.is_height_change_wait || state.is_layer_change_wait || state.is_waiting)
+  {
+    state.is_waiting = true;
+    if (try_trigger(state, trigger_position))
+    {
+      state.is_layer_change_wait = false;
+      state.is_layer_change = false;
+      state.is_height_change_wait = false;
+    }
+  }
+}
+
+void realtime_trigger::update_timer(
+  realtime_trigger_state& state, const position& trigger_position, double current_time
+)
+{
+  // if the trigger start time is null, set it now.
+  if (state.trigger_start_time_null)
+  {
+    state.trigger_start_time = current_time;
+    state.trigger_start_time_null = false;
+  }
+  // round to the nearest 1 second, like utility.round_to
+  const double seconds_to_trigger = args_.interval_seconds - (current_time - state.trigger_start_time);
+  state.seconds_to_trigger = static_cast<double>(
+    static_cast<long>(seconds_to_trigger + (seconds_to_trigger >= 0 ? 0.5 : -0.5))
+  );
+  state.seconds_to_trigger_null = false;
+
+  // see if enough time has elapsed since the last trigger
+  if (state.seconds_to_trigger <= 0)
+  {
+    state.is_waiting = true;
+    if (try_trigger(state, trigger_position))
+    {
+      state.trigger_start_time_null = true;
+      state.trigger_start_time = 0;
+    }
+  }
+}
+
+bool realtime_trigger::try_trigger(realtime_trigger_state& state, const position& trigger_position)
+{
+  if (
+    args_.has_extruder_triggers &&
+    !args_.extruder_trigger_options.is_triggered(trigger_position.get_current_extruder())
+  )
+  {
+    state.is_waiting_on_extruder = true;
+    return false;
+  }
+  if (args_.require_zhop && !trigger_position.is_zhop)
+  {
+    state.is_waiting_on_zhop = true;
+    return false;
+  }
+  if (
+    // Wait for an in-bounds position
+    !trigger_position.is_in_bounds ||
+    // Make sure the previous X,Y is in position
+    (!state.is_in_position && !state.in_path_position) ||
+    // Wait for at least one extrusion on a previous layer
+    trigger_position.last_extrusion_height_null || trigger_position.last_extrusion_height == 0 ||
+    // Do not take a snapshot if the extruder is below the last extrusion height, else we might run into the part!
+    utilities::less_than(trigger_position.z, trigger_position.last_extrusion_height) ||
+    // Snapshots have been disabled by an octolapse gcode command
+    !snapshots_enabled_
+  )
+  {
+    return false;
+  }
+
+  trigger_count_++;
+  if (state.is_in_position)
+    state.trigger_type = realtime_trigger_result_default;
+  else if (state.in_path_position)
+    state.trigger_type = realtime_trigger_result_in_path;
+  else
+    state.trigger_type = realtime_trigger_result_none;
+  state.is_triggered = true;
+  state.is_waiting = false;
+  state.is_waiting_on_zhop = false;
+  state.is_waiting_on_extruder = false;
+  octolapse_log(octolapse_log::GCODE_POSITION, octolapse_log::INFO, "Realtime trigger - Triggering.");
+  return true;
+}
+
+PyObject* realtime_trigger::to_py_tuple() const
+{
+  PyObject* py_seconds_to_trigger;
+  if (state_.seconds_to_trigger_null)
+  {
+    py_seconds_to_trigger = Py_None;
+    Py_INCREF(py_seconds_to_trigger);
+  }
+  else
+    py_seconds_to_trigger = PyFloat_FromDouble(state_.seconds_to_trigger);
+
+  PyObject* py_trigger_start_time;
+  if (state_.trigger_start_time_null)
+  {
+    py_trigger_start_time = Py_None;
+    Py_INCREF(py_trigger_start_time);
+  }
+  else
+    py_trigger_start_time = PyFloat_FromDouble(state_.trigger_start_time);
+
+  PyObject* py_pause_time;
+  if (state_.pause_time_null)
+  {
+    py_pause_time = Py_None;
+    Py_INCREF(py_pause_time);
+  }
+  else
+    py_pause_time = PyFloat_FromDouble(state_.pause_time);
+
+  // The tuple layout must match TriggerState.update_from_native in trigger.py
+  PyObject* py_state = Py_BuildValue(
+    "(NlNNNNNNNlNNNlNNNNlN)",
+    PyBool_FromLong(state_.is_triggered),
+    (long)state_.trigger_type,
+    PyBool_FromLong(state_.is_in_position),
+    PyBool_FromLong(state_.in_path_position),
+    PyBool_FromLong(state_.is_waiting),
+    PyBool_FromLong(state_.is_home_position_wait),
+    PyBool_FromLong(state_.is_waiting_on_zhop),
+    PyBool_FromLong(state_.is_waiting_on_extruder),
+    PyBool_FromLong(state_.has_definite_position),
+    (long)state_.current_increment,
+    PyBool_FromLong(state_.is_layer_change_wait),
+    PyBool_FromLong(state_.is_height_change),
+    PyBool_FromLong(state_.is_height_change_wait),
+    state_.layer,
+    PyBool_FromLong(state_.is_layer_change),
+    py_seconds_to_trigger,
+    py_trigger_start_time,
+    py_pause_time,
+    (long)trigger_count_,
+    PyBool_FromLong(snapshots_enabled_)
+  );
+  if (py_state == NULL)
+  {
+    std::string message = "realtime_trigger.to_py_tuple - Unable to build the trigger state tuple.";
+    octolapse_log_exception(octolapse_log::GCODE_POSITION, message);
+  }
+  return py_state;
+}
@@ -0,0 +1,144 @@
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+// Copyright(C) 2019  Brad Hochgesang
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// This program is free software : you can redistribute it and/or modify
+// it under the terms of the GNU Affero General Public License as published
+// by the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.See the
+// GNU Affero General Public License for more details.
+//
+// You should have received a copy of the GNU Affero General Public License
+// along with this program.If not, see the following :
+// https ://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+//
+// You can contact the author either through the git - hub repository, or at the
+// following email address : FormerLurker@pm.me
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+#ifndef REALTIME_TRIGGER_H
+#define REALTIME_TRIGGER_H
+#include <string>
+#include "position.h"
+#ifdef _DEBUG
+#include <Python.h>
+#else
+#include <Python.h>
+#endif
+
+enum realtime_trigger_type
+{
+  realtime_trigger_type_gcode,
+  realtime_trigger_type_layer,
+  realtime_trigger_type_timer
+};
+
+// These match Triggers.TRIGGER_TYPE_* in trigger.py
+enum realtime_trigger_result_type
+{
+  realtime_trigger_result_none,
+  realtime_trigger_result_default,
+  realtime_trigger_result_in_path
+};
+
+// Each extruder trigger option can require a state, forbid a state, or ignore it.
+enum extruder_trigger_option
+{
+  extruder_trigger_option_ignore = -1,
+  extruder_trigger_option_forbidden = 0,
+  extruder_trigger_option_required = 1
+};
+
+struct extruder_triggers
+{
+  extruder_triggers();
+  int on_extruding_start;
+  int on_extruding;
+  int on_primed;
+  int on_retracting_start;
+  int on_retracting;
+  int on_partially_retracted;
+  int on_retracted;
+  int on_deretracting_start;
+  int on_deretracting;
+  int on_deretracted;
+  bool is_triggered(const extruder& extruder_state) const;
+};
+
+struct realtime_trigger_args
+{
+  realtime_trigger_args();
+  realtime_trigger_type type;
+  bool require_zhop;
+  // A height increment of 0 means that the layer trigger will trigger on every layer change
+  double height_increment;
+  double interval_seconds;
+  bool has_extruder_triggers;
+  extruder_triggers extruder_trigger_options;
+  std::string snapshot_command_gcode;
+};
+
+struct realtime_trigger_state
+{
+  realtime_trigger_state();
+  void reset_state();
+  bool is_equal(const realtime_trigger_state& state) const;
+  bool is_triggered;
+  realtime_trigger_result_type trigger_type;
+  bool is_in_position;
+  bool in_path_position;
+  bool is_waiting;
+  bool is_home_position_wait;
+  bool is_waiting_on_zhop;
+  bool is_waiting_on_extruder;
+  bool has_definite_position;
+  // Layer trigger state
+  int current_increment;
+  bool is_layer_change_wait;
+  bool is_height_change;
+  bool is_height_change_wait;
+  long layer;
+  bool is_layer_change;
+  // Timer trigger state
+  double seconds_to_trigger;
+  bool seconds_to_trigger_null;
+  double trigger_start_time;
+  bool trigger_start_time_null;
+  double pause_time;
+  bool pause_time_null;
+};
+
+class realtime_trigger
+{
+public:
+  realtime_trigger(const realtime_trigger_args& args);
+  /// Updates the trigger state from the current and previous positions.  The position restrictions are
+  /// calculated in python, so the in position values for the trigger position are supplied.
+  /// Returns true if the state has changed.
+  bool update(const position& current, const position& previous, bool is_in_position, bool in_path_position);
+  bool update(
+    const position& current, const position& previous, bool is_in_position, bool in_path_position, double current_time
+  );
+  bool pause(double current_time);
+  bool resume(double current_time);
+  const realtime_trigger_state& get_state() const;
+  PyObject* to_py_tuple() const;
+  static double get_current_time();
+private:
+  void update_snapshots_enabled(const parsed_command& command);
+  bool is_snapshot_command(const parsed_command& command) const;
+  void update_gcode(realtime_trigger_state& state, const position& current, const position& trigger_position);
+  void update_layer(realtime_trigger_state& state, const position& current, const position& trigger_position);
+  void update_timer(
+    realtime_trigger_state& state, const position& trigger_position, double current_time
+  );
+  bool try_trigger(realtime_trigger_state& state, const position& trigger_position);
+  realtime_trigger_args args_;
+  realtime_trigger_state state_;
+  int trigger_count_;
+  bool snapshots_enabled_;
+};
+#endif
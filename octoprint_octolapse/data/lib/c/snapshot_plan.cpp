@@ -21,6 +21,7 @@
 ////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
 #include "snapshot_plan.h"
 #include "logging.h"
+#include "python_position.h"
 
 snapshot_plan::snapshot_plan()
 {
@@ -34,6 +35,96 @@ snapshot_plan::snapshot_plan()
   has_initial_position = false;
 }
 
+static void write_step_value(binary_writer& writer, const double* p_value)
+{
+  writer.write_bool(p_value != NULL);
+  if (p_value != NULL)
+    writer.write_double(*p_value);
+}
+
+static bool read_step_value(binary_reader& reader, double& value, double*& p_value)
+{
+  bool has_value;
+  if (!reader.read_bool(has_value) || (has_value && !reader.read_double(value)))
+    return false;
+  p_value = has_value ? &value : NULL;
+  return true;
+}
+
+void snapshot_plan::write(binary_writer& writer) const
+{
+  writer.write_long(file_line);
+  writer.write_long(file_gcode_number);
+  writer.write_long(file_position);
+  writer.write_int(triggering_command_type);
+  writer.write_int(triggering_command_feature_type);
+  writer.write_parsed_command(triggering_command);
+  writer.write_parsed_command(start_command);
+  writer.write_position(initial_position);
+  writer.write_bool(has_initial_position);
+  writer.write_size(steps.size());
+  for (std::vector<snapshot_plan_step>::const_iterator it = steps.begin(); it != steps.end(); ++it)
+  {
+    write_step_value(writer, it->p_x);
+    write_step_value(writer, it->p_y);
+    write_step_value(writer, it->p_z);
+    write_step_value(writer, it->p_e);
+    write_step_value(writer, it->p_f);
+    writer.write_string(it->action);
+  }
+  writer.write_position(return_position);
+  writer.write_parsed_command(end_command);
+  writer.write_double(distance_from_stabilization_point);
+  writer.write_double(total_travel_distance);
+  writer.write_double(saved_travel_distance);
+}
+
+bool snapshot_plan::read(binary_reader& reader)
+{
+  int command_type, command_feature_type;
+  size_t num_steps;
+  if (
+    !reader.read_long(file_line) ||
+    !reader.read_long(file_gcode_number) ||
+    !reader.read_long(file_position) ||
+    !reader.read_int(command_type) ||
+    !reader.read_int(command_feature_type) ||
+    !reader.read_parsed_command(triggering_command) ||
+    !reader.read_parsed_command(start_command) ||
+    !reader.read_position(initial_position) ||
+    !reader.read_bool(has_initial_position) ||
+    !reader.read_size(num_steps)
+  )
+    return false;
+  triggering_command_type = static_cast<position_type>(command_type);
+  triggering_command_feature_type = static_cast<feature_type>(command_feature_type);
+
+  steps.clear();
+  for (size_t index = 0; index < num_steps; index++)
+  {
+    double x, y, z, e, f;
+    double *p_x, *p_y, *p_z, *p_e, *p_f;
+    std::string action;
+    if (
+      !read_step_value(reader, x, p_x) ||
+      !read_step_value(reader, y, p_y) ||
+      !read_step_value(reader, z, p_z) ||
+      !read_step_value(reader, e, p_e) ||
+      !read_step_value(reader, f, p_f) ||
+      !reader.read_string(action)
+    )
+      return false;
+    steps.push_back(snapshot_plan_step(p_x, p_y, p_z, p_e, p_f, action));
+  }
+  return (
+    reader.read_position(return_position) &&
+    reader.read_parsed_command(end_command) &&
+    reader.read_double(distance_from_stabilization_point) &&
+    reader.read_double(total_travel_distance) &&
+    reader.read_double(saved_travel_distance)
+  );
+}
+
 
 PyObject* snapshot_plan::build_py_object(std::vector<snapshot_plan>& p_plans)
 {
@@ -112,7 +203,7 @@ PyObject* snapshot_plan::to_py_object()
   }
   else
   {
-    py_initial_position = initial_position.to_py_tuple();
+    py_initial_position = python_position::create(initial_position);
     if (py_initial_position == NULL)
     {
       return NULL;
@@ -152,7 +243,7 @@ PyObject* snapshot_plan::to_py_object()
   }
   else
   {
-    py_return_position = return_position.to_py_tuple();
+    py_return_position = python_position::create(return_position);
     if (py_return_position == NULL)
     {
       return NULL;
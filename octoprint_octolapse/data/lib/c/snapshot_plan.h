@@ -33,6 +33,11 @@ struct snapshot_plan
   snapshot_plan();
   PyObject* to_py_object();
   static PyObject* build_py_object(std::vector<snapshot_plan>& plans);
+  void write(binary_writer& writer) const;
+  /**
+   * \brief Reads a plan written by write.  Returns false if there was not enough data.
+   */
+  bool read(binary_reader& reader);
   long file_line;
   long file_gcode_number;
   long file_position;
@@ -0,0 +1,236 @@
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+// Copyright(C) 2019  Brad Hochgesang
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// This program is free software : you can redistribute it and/or modify
+// it under the terms of the GNU Affero General Public License as published
+// by the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.See the
+// GNU Affero General Public License for more details.
+//
+// You should have received a copy of the GNU Affero General Public License
+// along with this program.If not, see the following :
+// https ://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+//
+// You can contact the author either through the git - hub repository, or at the
+// following email address : FormerLurker@pm.me
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+#include "snapshot_plan_list.h"
+#include "logging.h"
+#include <algorithm>
+
+static bool compare_file_gcode_numbers(const snapshot_plan& left, const snapshot_plan& right)
+{
+  return left.file_gcode_number < right.file_gcode_number;
+}
+
+snapshot_plan_list::snapshot_plan_list()
+{
+  step_offsets_.push_back(0);
+}
+
+snapshot_plan_list::snapshot_plan_list(std::vector<snapshot_plan>& plans)
+{
+  std::stable_sort(plans.begin(), plans.end(), compare_file_gcode_numbers);
+  step_offsets_.reserve(plans.size() + 1);
+  step_offsets_.push_back(0);
+  for (std::vector<snapshot_plan>::const_iterator it = plans.begin(); it != plans.end(); ++it)
+  {
+    add(*it);
+  }
+  std::vector<snapshot_plan>().swap(plans);
+}
+
+void snapshot_plan_list::add(const snapshot_plan& plan)
+{
+  file_lines_.push_back(plan.file_line);
+  file_gcode_numbers_.push_back(plan.file_gcode_number);
+  file_positions_.push_back(plan.file_position);
+  triggering_command_types_.push_back(plan.triggering_command_type);
+  triggering_command_feature_types_.push_back(plan.triggering_command_feature_type);
+  triggering_commands_.push_back(plan.triggering_command);
+  start_commands_.push_back(plan.start_command);
+  initial_positions_.push_back(plan.initial_position);
+  has_initial_positions_.push_back(plan.has_initial_position);
+  return_positions_.push_back(plan.return_position);
+  end_commands_.push_back(plan.end_command);
+  distances_from_stabilization_point_.push_back(plan.distance_from_stabilization_point);
+  total_travel_distances_.push_back(plan.total_travel_distance);
+  saved_travel_distances_.push_back(plan.saved_travel_distance);
+  for (std::vector<snapshot_plan_step>::const_iterator it = plan.steps.begin(); it != plan.steps.end(); ++it)
+  {
+    const double* values[] = {it->p_x, it->p_y, it->p_z, it->p_e, it->p_f};
+    const unsigned char flags[] = {HAS_X, HAS_Y, HAS_Z, HAS_E, HAS_F};
+    unsigned char value_flags = 0;
+    for (int value_index = 0; value_index < 5; value_index++)
+    {
+      step_values_.push_back(values[value_index] != NULL ? *values[value_index] : 0);
+      if (values[value_index] != NULL)
+        value_flags |= flags[value_index];
+    }
+    step_actions_.push_back(it->action);
+    step_value_flags_.push_back(value_flags);
+  }
+  step_offsets_.push_back(step_actions_.size());
+}
+
+size_t snapshot_plan_list::size() const
+{
+  return file_gcode_numbers_.size();
+}
+
+long snapshot_plan_list::get_file_gcode_number(const size_t index) const
+{
+  return file_gcode_numbers_[index];
+}
+
+snapshot_plan snapshot_plan_list::get_plan(const size_t index) const
+{
+  snapshot_plan plan;
+  plan.file_line = file_lines_[index];
+  plan.file_gcode_number = file_gcode_numbers_[index];
+  plan.file_position = file_positions_[index];
+  plan.triggering_command_type = triggering_command_types_[index];
+  plan.triggering_command_feature_type = triggering_command_feature_types_[index];
+  plan.triggering_command = triggering_commands_[index];
+  plan.start_command = start_commands_[index];
+  plan.initial_position = initial_positions_[index];
+  plan.has_initial_position = has_initial_positions_[index];
+  plan.return_position = return_positions_[index];
+  plan.end_command = end_commands_[index];
+  plan.distance_from_stabilization_point = distances_from_stabilization_point_[index];
+  plan.total_travel_distance = total_travel_distances_[index];
+  plan.saved_travel_distance = saved_travel_distances_[index];
+  for (size_t step_index = step_offsets_[index]; step_index < step_offsets_[index + 1]; step_index++)
+  {
+    double values[5];
+    double* p_values[5];
+    const unsigned char flags[] = {HAS_X, HAS_Y, HAS_Z, HAS_E, HAS_F};
+    for (int value_index = 0; value_index < 5; value_index++)
+    {
+      values[value_index] = step_values_[step_index * 5 + value_index];
+      p_values[value_index] = (step_value_flags_[step_index] & flags[value_index]) ? &values[value_index] : NULL;
+    }
+    plan.steps.push_back(snapshot_plan_step(
+      p_values[0], p_values[1], p_values[2], p_values[3], p_values[4], step_actions_[step_index]
+    ));
+  }
+  return plan;
+}
+
+namespace python_snapshot_plan_list
+{
+  static snapshot_plan_list* get_self_plans(PyObject* self)
+  {
+    return reinterpret_cast<py_snapshot_plan_list_object*>(self)->p_plans;
+  }
+
+  static Py_ssize_t py_snapshot_plan_list_length(PyObject* self)
+  {
+    return static_cast<Py_ssize_t>(get_self_plans(self)->size());
+  }
+
+  static PyObject* py_snapshot_plan_list_item(PyObject* self, Py_ssize_t index)
+  {
+    snapshot_plan_list* p_plans = get_self_plans(self);
+    if (index < 0 || static_cast<size_t>(index) >= p_plans->size())
+    {
+      PyErr_SetString(PyExc_IndexError, "SnapshotPlans index out of range");
+      return NULL;
+    }
+    return p_plans->get_plan(static_cast<size_t>(index)).to_py_object();
+  }
+
+  static PyObject* py_snapshot_plan_list_get_file_gcode_numbers(PyObject* self, PyObject* args)
+  {
+    snapshot_plan_list* p_plans = get_self_plans(self);
+    PyObject* py_file_gcode_numbers = PyList_New(p_plans->size());
+    if (py_file_gcode_numbers == NULL)
+    {
+      return NULL;
+    }
+    for (size_t index = 0; index < p_plans->size(); index++)
+    {
+      PyObject* py_file_gcode_number = PyLong_FromLong(p_plans->get_file_gcode_number(index));
+      if (py_file_gcode_number == NULL)
+      {
+        Py_DECREF(py_file_gcode_numbers);
+        return NULL;
+      }
+      PyList_SET_ITEM(py_file_gcode_numbers, index, py_file_gcode_number);
+    }
+    return py_file_gcode_numbers;
+  }
+
+  static PySequenceMethods py_snapshot_plan_list_sequence_methods = {
+    py_snapshot_plan_list_length, // sq_length
+    NULL, // sq_concat
+    NULL, // sq_repeat
+    py_snapshot_plan_list_item, // sq_item
+  };
+
+  static PyMethodDef py_snapshot_plan_list_methods[] = {
+    {
+      "get_file_gcode_numbers", (PyCFunction)py_snapshot_plan_list_get_file_gcode_numbers, METH_NOARGS,
+      "Returns a list of the file_gcode_number of every plan, in ascending order."
+    },
+    {NULL}
+  };
+
+  static void py_snapshot_plan_list_dealloc(py_snapshot_plan_list_object* self)
+  {
+    if (self->p_plans != NULL)
+    {
+      delete self->p_plans;
+      self->p_plans = NULL;
+    }
+    Py_TYPE(self)->tp_free(reinterpret_cast<PyObject*>(self));
+  }
+
+  PyTypeObject py_snapshot_plan_list_type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "GcodePositionProcessor.SnapshotPlans"
+  };
+
+  bool initialize_type(PyObject* module)
+  {
+    py_snapshot_plan_list_type.tp_basicsize = sizeof(py_snapshot_plan_list_object);
+    py_snapshot_plan_list_type.tp_itemsize = 0;
+    py_snapshot_plan_list_type.tp_flags = Py_TPFLAGS_DEFAULT;
+    py_snapshot_plan_list_type.tp_doc =
+      "The snapshot plans created by a stabilization, sorted by file_gcode_number.  Each plan is only converted to a "
+      "python tuple when it is indexed.";
+    py_snapshot_plan_list_type.tp_dealloc = reinterpret_cast<destructor>(py_snapshot_plan_list_dealloc);
+    py_snapshot_plan_list_type.tp_as_sequence = &py_snapshot_plan_list_sequence_methods;
+    py_snapshot_plan_list_type.tp_methods = py_snapshot_plan_list_methods;
+    if (PyType_Ready(&py_snapshot_plan_list_type) < 0)
+    {
+      return false;
+    }
+    Py_INCREF(&py_snapshot_plan_list_type);
+    if (PyModule_AddObject(
+      module, "SnapshotPlans", reinterpret_cast<PyObject*>(&py_snapshot_plan_list_type)) < 0)
+    {
+      Py_DECREF(&py_snapshot_plan_list_type);
+      return false;
+    }
+    return true;
+  }
+
+  PyObject* create(std::vector<snapshot_plan>& plans)
+  {
+    py_snapshot_plan_list_object* self = PyObject_New(py_snapshot_plan_list_object, &py_snapshot_plan_list_type);
+    if (self == NULL)
+    {
+      std::string message = "python_snapshot_plan_list.create - Unable to create a SnapshotPlans object.";
+      octolapse_log_exception(octolapse_log::SNAPSHOT_PLAN, message);
+      return NULL;
+    }
+    self->p_plans = new snapshot_plan_list(plans);
+    return reinterpret_cast<PyObject*>(self);
+  }
+}
@@ -0,0 +1,97 @@
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+// Copyright(C) 2019  Brad Hochgesang
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// This program is free software : you can redistribute it and/or modify
+// it under the terms of the GNU Affero General Public License as published
+// by the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.See the
+// GNU Affero General Public License for more details.
+//
+// You should have received a copy of the GNU Affero General Public License
+// along with this program.If not, see the following :
+// https ://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+//
+// You can contact the author either through the git - hub repository, or at the
+// following email address : FormerLurker@pm.me
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+#ifndef SNAPSHOT_PLAN_LIST_H
+#define SNAPSHOT_PLAN_LIST_H
+#ifdef _DEBUG
+//#undef _DEBUG
+#include <Python.h>
+//python311_d.lib
+#else
+#include <Python.h>
+#endif
+#include "snapshot_plan.h"
+#include <vector>
+#include <string>
+
+/**
+ * \brief Stores snapshot plans as a struct of arrays, sorted by file_gcode_number.  Each field has its own array, and
+ * the steps of every plan share a single set of arrays instead of allocating each step value separately.  A
+ * snapshot_plan is only rebuilt when one is requested.
+ */
+class snapshot_plan_list
+{
+public:
+  snapshot_plan_list();
+  /**
+   * \brief Moves the plans into the list, sorting them by file_gcode_number.  The plans vector is emptied.
+   */
+  explicit snapshot_plan_list(std::vector<snapshot_plan>& plans);
+  size_t size() const;
+  long get_file_gcode_number(size_t index) const;
+  snapshot_plan get_plan(size_t index) const;
+private:
+  static const unsigned char HAS_X = 1;
+  static const unsigned char HAS_Y = 2;
+  static const unsigned char HAS_Z = 4;
+  static const unsigned char HAS_E = 8;
+  static const unsigned char HAS_F = 16;
+  void add(const snapshot_plan& plan);
+  std::vector<long> file_lines_;
+  std::vector<long> file_gcode_numbers_;
+  std::vector<long> file_positions_;
+  std::vector<position_type> triggering_command_types_;
+  std::vector<feature_type> triggering_command_feature_types_;
+  std::vector<parsed_command> triggering_commands_;
+  std::vector<parsed_command> start_commands_;
+  std::vector<position> initial_positions_;
+  std::vector<bool> has_initial_positions_;
+  std::vector<position> return_positions_;
+  std::vector<parsed_command> end_commands_;
+  std::vector<double> distances_from_stabilization_point_;
+  std::vector<double> total_travel_distances_;
+  std::vector<double> saved_travel_distances_;
+  // The steps of plan n are steps [step_offsets_[n], step_offsets_[n + 1]).
+  std::vector<size_t> step_offsets_;
+  std::vector<std::string> step_actions_;
+  // The x, y, z, e and f values of each step, and a flag for each value that is set.
+  std::vector<double> step_values_;
+  std::vector<unsigned char> step_value_flags_;
+};
+
+// A python sequence that owns a snapshot_plan_list.  Indexing it returns the snapshot plan tuple that
+// snapshot_plan::to_py_object creates.
+struct py_snapshot_plan_list_object
+{
+  PyObject_HEAD
+  snapshot_plan_list* p_plans;
+};
+
+namespace python_snapshot_plan_list
+{
+  extern PyTypeObject py_snapshot_plan_list_type;
+  bool initialize_type(PyObject* module);
+  /**
+   * \brief Creates a python SnapshotPlans object, moving the plans into it.  Returns a new reference, or NULL on error.
+   */
+  PyObject* create(std::vector<snapshot_plan>& plans);
+}
+#endif
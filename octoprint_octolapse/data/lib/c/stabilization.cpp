@@ -20,13 +20,23 @@
 // following email address : FormerLurker@pm.me
 ////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
 #include "stabilization.h"
-#include <ctime>
+#include <chrono>
 #include <vector>
 #include <sstream>
 #include "logging.h"
 #include "utilities.h"
 #include <iostream>
+#include "gcode_chunk_reader.h"
+#include "gcode_line_scanner.h"
 #include <fstream>
+#include <iterator>
+#include <cstdio>
+#include <atomic>
+
+// Incremented whenever the checkpoint format changes, so that older checkpoints are ignored
+static const int CHECKPOINT_FORMAT_VERSION = 2;
+// Numbers the temporary checkpoint files so that two stabilizations of the same file never write to the same one
+static std::atomic<unsigned long> checkpoint_temp_file_count(0);
 
 stabilization::stabilization(gcode_position_args position_args, stabilization_args stab_args,
 	pythonGetCoordinatesCallback get_coordinates_callback,
@@ -56,6 +66,11 @@ stabilization::stabilization(gcode_position_args position_args, stabilization_ar
 	lines_processed_ = 0;
 	gcodes_processed_ = 0;
 	file_position_ = 0;
+	start_file_position_ = 0;
+	start_clock_ = 0;
+	next_update_time_ = 0;
+	next_checkpoint_time_ = 0;
+	num_stabilization_points_ = 0;
 	missed_snapshots_ = 0;
 	snapshots_enabled_ = true;
 	stabilization_x_ = 0;
@@ -78,6 +93,11 @@ stabilization::stabilization()
 	lines_processed_ = 0;
 	gcodes_processed_ = 0;
 	file_position_ = 0;
+	start_file_position_ = 0;
+	start_clock_ = 0;
+	next_update_time_ = 0;
+	next_checkpoint_time_ = 0;
+	num_stabilization_points_ = 0;
 	missed_snapshots_ = 0;
 	stabilization_x_ = 0;
 	stabilization_y_ = 0;
@@ -105,6 +125,11 @@ stabilization::stabilization(gcode_position_args position_args, stabilization_ar
 	lines_processed_ = 0;
 	gcodes_processed_ = 0;
 	file_position_ = 0;
+	start_file_position_ = 0;
+	start_clock_ = 0;
+	next_update_time_ = 0;
+	next_checkpoint_time_ = 0;
+	num_stabilization_points_ = 0;
 	missed_snapshots_ = 0;
 	stabilization_x_ = 0;
 	stabilization_y_ = 0;
@@ -154,25 +179,19 @@ void stabilization::delete_gcode_position()
 	}
 }
 
-long stabilization::get_file_size(const std::string& file_path)
+double stabilization::get_clock_seconds()
 {
-	// Todo:  Fix this function.  This is a pretty weak implementation :(
-	std::ifstream file(file_path.c_str(), std::ios::in | std::ios::binary);
-	const long l = (long)file.tellg();
-	file.seekg(0, std::ios::end);
-	const long m = (long)file.tellg();
-	file.close();
-	return (m - l);
+	return std::chrono::duration<double>(std::chrono::steady_clock::now().time_since_epoch()).count();
 }
 
 double stabilization::get_next_update_time() const
 {
-	return clock() + (stabilization_args_.notification_period_seconds * CLOCKS_PER_SEC);
+	return get_clock_seconds() + stabilization_args_.notification_period_seconds;
 }
 
 double stabilization::get_time_elapsed(double start_clock, double end_clock)
 {
-	return static_cast<double>(end_clock - start_clock) / CLOCKS_PER_SEC;
+	return end_clock - start_clock;
 }
 
 stabilization_results stabilization::process_file()
@@ -195,148 +214,62 @@ stabilization_results stabilization::process_file()
 	std::stringstream stream;
 	// Make sure snapshots are enabled at the start of the process.
 	snapshots_enabled_ = true;
-	int read_lines_before_clock_check = 2000;
 	std::cout << "stabilization::process_file - Processing file.\r\n";
 	stream << "Stabilizing file at: " << stabilization_args_.file_path;
 	octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO, stream.str());
 	is_running_ = true;
 
-	double next_update_time = get_next_update_time();
-	const clock_t start_clock = clock();
-	file_size_ = get_file_size(stabilization_args_.file_path);
-
-	std::string path = stabilization_args_.file_path;
-
-
-#ifdef _MSC_VER
-
-
-	std::wstring wpath = utilities::ToUtf16(path);
-	stream << "Windows detected, encoding file as UTF16";
-	octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO, stream.str());
-	std::ifstream gcodeFile(wpath.c_str());
-
-
-#else
-	std::ifstream gcodeFile(path.c_str());
-#endif
-
-
-
-	std::string line;
-	int lines_with_no_commands = 0;
-	if (gcodeFile.is_open())
+	next_update_time_ = get_next_update_time();
+	next_checkpoint_time_ = get_next_checkpoint_time();
+	start_clock_ = get_clock_seconds();
+	const double start_clock = start_clock_;
+	start_file_position_ = 0;
+	gcode_line_scanner scanner;
+	if (scanner.open(stabilization_args_.file_path))
 	{
+		file_size_ = scanner.get_file_size();
 		stream.clear();
 		stream.str("");
-		stream << "Opened file for reading.  File Size: " << utilities::to_string(file_size_);
+		stream << "Opened file for reading.  File Size: " << utilities::to_string(file_size_) <<
+			(scanner.is_memory_mapped() ? ", memory mapped." : ", buffered.");
 		octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO, stream.str());
-		parsed_command cmd;
-		// Communicate every second
-		while (std::getline(gcodeFile, line) && is_running_)
+		if (is_checkpoint_enabled() && try_resume_from_checkpoint())
+			start_file_position_ = file_position_;
+		if (
+			stabilization_args_.processing_threads > 1 &&
+			file_size_ - start_file_position_ > gcode_chunk_reader::DEFAULT_CHUNK_SIZE
+		)
 		{
-			file_position_ = static_cast<long>(gcodeFile.tellg());
-			lines_processed_++;
-
-			cmd.clear();
-			bool found_command = gcode_parser_->try_parse_gcode(line.c_str(), cmd);
-			bool has_gcode = false;
-			if (cmd.gcode.length() > 0)
+			// The chunk reader opens the file on each worker thread.
+			scanner.close();
+			process_file_chunks(start_file_position_);
+		}
+		else if (scanner.seek_to_line_start(start_file_position_))
+		{
+			const char* line;
+			parsed_command cmd;
+			while (scanner.get_next_line(line) && is_running_)
 			{
-				has_gcode = true;
-				gcodes_processed_++;
+				file_position_ = scanner.get_position();
+				cmd.clear();
+				bool found_command = gcode_parser_->try_parse_gcode(line, cmd);
+				process_command(cmd, found_command);
 			}
+		}
+		else
+		{
+			octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::ERROR, "Unable to seek to the checkpoint file position.");
+			is_running_ = false;
+		}
+		if (is_checkpoint_enabled())
+		{
+			// Save the state if processing was cancelled so that the next run can pick up where this one stopped.
+			if (is_running_)
+				delete_checkpoint();
 			else
-			{
-				lines_with_no_commands++;
-			}
-			// If the current command is an @Octolapse command, check the paramaters and update any state as necessary
-			if (cmd.command == "@OCTOLAPSE")
-			{
-				if (cmd.parameters.size() == 1)
-				{
-					parsed_command_parameter param = cmd.parameters[0];
-					if (param.name == "STOP-SNAPSHOTS")
-					{
-						if (snapshots_enabled_)
-						{
-							octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO,
-								"@Octolapse command detected - STOP-SNAPSHOTS - snapshots stopped.");
-							snapshots_enabled_ = false;
-						}
-						else
-						{
-							octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO,
-								"@Octolapse command detected - STOP-SNAPSHOTS - snapshots already stopped, command ignored.");
-						}
-					}
-					else if (param.name == "START-SNAPSHOTS")
-					{
-						if (!snapshots_enabled_)
-						{
-							octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO,
-								"@Octolapse command detected - START-SNAPSHOTS - snapshots started.");
-							snapshots_enabled_ = true;
-						}
-						else
-						{
-							octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO,
-								"@Octolapse command detected - START-SNAPSHOTS - snapshots already started, command ignored.");
-						}
-					}
-				}
-			}
-
-			// Always process the command through the printer, even if no command is found
-			// This is important so that comments can be analyzed
-			//std::cout << "stabilization::process_file - updating position...";
-			gcode_position_->update(cmd, lines_processed_, gcodes_processed_, file_position_);
-
-			// Only continue to process if we've found a command.
-			if (has_gcode)
-			{
-				if (snapshots_enabled_)
-				{
-					position* currentPositionPtr = gcode_position_->get_current_position_ptr();
-					if (stabilization_args_.allow_snapshot_commands && process_snapshot_command(currentPositionPtr) && currentPositionPtr->can_take_snapshot())
-					{
-						// If we've received a snapshot command, and this isn't the smart gcode stabilizastion, add the snapshot
-						add_plan_plan_from_snapshot_command(currentPositionPtr);
-					}
-					else
-					{
-						// process the position as usual
-						process_pos(currentPositionPtr, gcode_position_->get_previous_position_ptr(), found_command);
-					}
-
-				}
-
-				if ((lines_processed_ % read_lines_before_clock_check) == 0 && next_update_time < clock())
-				{
-					// ToDo: tellg does not do what I think it does, but why?
-					long bytesRemaining = file_size_ - file_position_;
-					double percentProgress = static_cast<double>(file_position_) / static_cast<double>(file_size_) * 100.0;
-					double secondsElapsed = get_time_elapsed(start_clock, clock());
-					double bytesPerSecond = static_cast<double>(file_position_) / secondsElapsed;
-					double secondsToComplete = bytesRemaining / bytesPerSecond;
-					//std::cout << "stabilization::process_file - notifying progress...";
-
-					stream.clear();
-					stream.str("");
-					stream << "Stabilization Progress - Bytes Remaining: " << bytesRemaining <<
-						", Seconds Elapsed: " << utilities::to_string(secondsElapsed) << ", Percent Progress:" << utilities::
-						to_string(percentProgress);
-					octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::DEBUG, stream.str());
-					notify_progress(percentProgress, secondsElapsed, secondsToComplete, gcodes_processed_,
-						lines_processed_);
-					//std::cout << "Complete.\r\n";
-					next_update_time = get_next_update_time();
-				}
-			}
+				write_checkpoint();
 		}
-		// deallocate the parsed_command object
-
-		gcodeFile.close();
+		scanner.close();
 		on_processing_complete();
 		//std::cout << "stabilization::process_file - Completed Processing file.\r\n";
 	}
@@ -344,8 +277,7 @@ stabilization_results stabilization::process_file()
 	{
 		octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::ERROR, "Unable to open the gcode file for processing.");
 	}
-	const clock_t end_clock = clock();
-	const double total_seconds = static_cast<double>(end_clock - start_clock) / CLOCKS_PER_SEC;
+	const double total_seconds = get_time_elapsed(start_clock, get_clock_seconds());
 	stabilization_results results;
 	results.seconds_elapsed = total_seconds;
 	results.gcodes_processed = gcodes_processed_;
@@ -403,11 +335,157 @@ stabilization_results stabilization::process_file()
 	return results;
 }
 
+void stabilization::process_command(parsed_command& cmd, const bool found_command)
+{
+	static const int read_lines_before_clock_check = 2000;
+	lines_processed_++;
+	bool has_gcode = false;
+	if (cmd.gcode.length() > 0)
+	{
+		has_gcode = true;
+		gcodes_processed_++;
+	}
+	// If the current command is an @Octolapse command, check the paramaters and update any state as necessary
+	if (cmd.command == "@OCTOLAPSE")
+	{
+		if (cmd.parameters.size() == 1)
+		{
+			parsed_command_parameter param = cmd.parameters[0];
+			if (param.name == "STOP-SNAPSHOTS")
+			{
+				if (snapshots_enabled_)
+				{
+					octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO,
+						"@Octolapse command detected - STOP-SNAPSHOTS - snapshots stopped.");
+					snapshots_enabled_ = false;
+				}
+				else
+				{
+					octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO,
+						"@Octolapse command detected - STOP-SNAPSHOTS - snapshots already stopped, command ignored.");
+				}
+			}
+			else if (param.name == "START-SNAPSHOTS")
+			{
+				if (!snapshots_enabled_)
+				{
+					octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO,
+						"@Octolapse command detected - START-SNAPSHOTS - snapshots started.");
+					snapshots_enabled_ = true;
+				}
+				else
+				{
+					octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO,
+						"@Octolapse command detected - START-SNAPSHOTS - snapshots already started, command ignored.");
+				}
+			}
+		}
+	}
+
+	// Always process the command through the printer, even if no command is found
+	// This is important so that comments can be analyzed
+	gcode_position_->update(cmd, lines_processed_, gcodes_processed_, file_position_);
+
+	// Only continue to process if we've found a command.
+	if (has_gcode)
+	{
+		if (snapshots_enabled_)
+		{
+			position* currentPositionPtr = gcode_position_->get_current_position_ptr();
+			if (stabilization_args_.allow_snapshot_commands && process_snapshot_command(currentPositionPtr) && currentPositionPtr->can_take_snapshot())
+			{
+				// If we've received a snapshot command, and this isn't the smart gcode stabilizastion, add the snapshot
+				add_plan_plan_from_snapshot_command(currentPositionPtr);
+			}
+			else
+			{
+				// process the position as usual
+				process_pos(currentPositionPtr, gcode_position_->get_previous_position_ptr(), found_command);
+			}
+
+		}
+
+		// checking for cancellation is cheap, so don't wait for the next progress update
+		if (
+			stabilization_args_.progress != NULL &&
+			(lines_processed_ % read_lines_before_clock_check) == 0 &&
+			stabilization_args_.progress->is_cancelled())
+		{
+			is_running_ = false;
+		}
+		if ((lines_processed_ % read_lines_before_clock_check) == 0 && next_update_time_ < get_clock_seconds())
+		{
+			// ToDo: tellg does not do what I think it does, but why?
+			long bytesRemaining = file_size_ - file_position_;
+			double percentProgress = static_cast<double>(file_position_) / static_cast<double>(file_size_) * 100.0;
+			double secondsElapsed = get_time_elapsed(start_clock_, get_clock_seconds());
+			double bytesPerSecond = static_cast<double>(file_position_ - start_file_position_) / secondsElapsed;
+			double secondsToComplete = bytesRemaining / bytesPerSecond;
+
+			std::stringstream stream;
+			stream << "Stabilization Progress - Bytes Remaining: " << bytesRemaining <<
+				", Seconds Elapsed: " << utilities::to_string(secondsElapsed) << ", Percent Progress:" << utilities::
+				to_string(percentProgress);
+			octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::DEBUG, stream.str());
+			notify_progress(percentProgress, secondsElapsed, secondsToComplete, gcodes_processed_,
+				lines_processed_);
+			next_update_time_ = get_next_update_time();
+		}
+		if (
+			is_running_ &&
+			is_checkpoint_enabled() &&
+			(lines_processed_ % read_lines_before_clock_check) == 0 &&
+			next_checkpoint_time_ < get_clock_seconds()
+		)
+		{
+			write_checkpoint();
+			next_checkpoint_time_ = get_next_checkpoint_time();
+		}
+	}
+}
+
+void stabilization::process_file_chunks(const long start_offset)
+{
+	// The position must be tracked in file order, so the current thread processes the parsed commands while the
+	// remaining threads parse the upcoming chunks.
+	gcode_chunk_reader reader(
+		stabilization_args_.file_path, file_size_, stabilization_args_.processing_threads - 1,
+		gcode_chunk_reader::DEFAULT_CHUNK_SIZE, start_offset
+	);
+	std::stringstream stream;
+	stream << "Processing the file in " << reader.get_num_chunks() << " chunks with " <<
+		stabilization_args_.processing_threads - 1 << " parser threads.";
+	octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO, stream.str());
+	reader.start();
+	gcode_chunk* p_chunk;
+	while (is_running_ && (p_chunk = reader.get_next_chunk()) != NULL)
+	{
+		if (!p_chunk->is_valid)
+		{
+			octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::ERROR, "Unable to open the gcode file for processing.");
+			break;
+		}
+		const size_t num_commands = p_chunk->num_commands;
+		for (size_t index = 0; index < num_commands && is_running_; index++)
+		{
+			file_position_ = p_chunk->file_positions[index];
+			process_command(p_chunk->commands[index], p_chunk->found_commands[index]);
+		}
+	}
+	reader.stop();
+}
+
 void stabilization::notify_progress(const double percent_progress, const double seconds_elapsed,
 	const double seconds_to_complete,
 	const int gcodes_processed, const int lines_processed)
 {
-	if (has_python_callbacks_)
+	if (stabilization_args_.progress != NULL)
+	{
+		stabilization_args_.progress->update(percent_progress, seconds_elapsed, seconds_to_complete, gcodes_processed,
+			lines_processed);
+		is_running_ = !stabilization_args_.progress->is_cancelled();
+	}
+	else if (has_python_callbacks_)
 	{
 		is_running_ = progress_callback_(py_on_progress_received, percent_progress, seconds_elapsed, seconds_to_complete,
 			gcodes_processed, lines_processed);
@@ -419,6 +497,169 @@ void stabilization::notify_progress(const double percent_progress, const double
 	}
 }
 
+bool stabilization::is_checkpoint_enabled() const
+{
+	return !stabilization_args_.checkpoint_file_path.empty();
+}
+
+double stabilization::get_next_checkpoint_time() const
+{
+	return get_clock_seconds() + stabilization_args_.checkpoint_period_seconds;
+}
+
+void stabilization::write_checkpoint()
+{
+	// The file position is -1 after an unterminated last line, but there is nothing left to resume then.
+	if (file_position_ < 0)
+		return;
+	binary_writer writer;
+	writer.write_int(CHECKPOINT_FORMAT_VERSION);
+	writer.write_long(file_size_);
+	writer.write_long(file_position_);
+	writer.write_int(lines_processed_);
+	writer.write_int(gcodes_processed_);
+	writer.write_int(missed_snapshots_);
+	writer.write_bool(snapshots_enabled_);
+	writer.write_int(num_stabilization_points_);
+	writer.write_double(stabilization_x_);
+	writer.write_double(stabilization_y_);
+	gcode_position_->write_state(writer);
+	writer.write_size(p_snapshot_plans_.size());
+	for (std::vector<snapshot_plan>::const_iterator it = p_snapshot_plans_.begin(); it != p_snapshot_plans_.end(); ++it)
+	{
+		it->write(writer);
+	}
+	write_checkpoint_state(writer);
+
+	// Write to a temporary file first so that an interrupted write never replaces a good checkpoint.  The name is
+	// unique so that another stabilization of the same file can't write to it at the same time.
+	std::stringstream temp_file_path_stream;
+	temp_file_path_stream << stabilization_args_.checkpoint_file_path << "." <<
+		std::chrono::steady_clock::now().time_since_epoch().count() << "." << checkpoint_temp_file_count++ << ".tmp";
+	const std::string temp_file_path = temp_file_path_stream.str();
+	std::ofstream checkpoint_file(temp_file_path.c_str(), std::ios::out | std::ios::binary | std::ios::trunc);
+	if (!checkpoint_file.is_open())
+	{
+		octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::ERROR, "Unable to create the checkpoint file.");
+		return;
+	}
+	checkpoint_file.write(writer.get_buffer().data(), static_cast<std::streamsize>(writer.size()));
+	checkpoint_file.close();
+	if (checkpoint_file.fail())
+	{
+		octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::ERROR, "Unable to write the checkpoint file.");
+		std::remove(temp_file_path.c_str());
+		return;
+	}
+	// rename does not replace an existing file on Windows
+	std::remove(stabilization_args_.checkpoint_file_path.c_str());
+	if (std::rename(temp_file_path.c_str(), stabilization_args_.checkpoint_file_path.c_str()) != 0)
+	{
+		octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::ERROR, "Unable to replace the checkpoint file.");
+		std::remove(temp_file_path.c_str());
+		return;
+	}
+	std::stringstream stream;
+	stream << "Saved a checkpoint at file position " << file_position_ << " with " << p_snapshot_plans_.size() <<
+		" snapshot plans.";
+	octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::DEBUG, stream.str());
+}
+
+void stabilization::delete_checkpoint() const
+{
+	std::remove(stabilization_args_.checkpoint_file_path.c_str());
+}
+
+bool stabilization::try_resume_from_checkpoint()
+{
+	std::ifstream checkpoint_file(stabilization_args_.checkpoint_file_path.c_str(), std::ios::in | std::ios::binary);
+	if (!checkpoint_file.is_open())
+		return false;
+	const std::string buffer(
+		(std::istreambuf_iterator<char>(checkpoint_file)), std::istreambuf_iterator<char>()
+	);
+	checkpoint_file.close();
+
+	binary_reader reader(buffer.data(), buffer.size());
+	int format_version, lines_processed, gcodes_processed, missed_snapshots, num_stabilization_points;
+	long file_size, file_position;
+	bool snapshots_enabled;
+	double stabilization_x, stabilization_y;
+	size_t num_snapshot_plans;
+	// Read into a new gcode_position so that the current one is untouched if the checkpoint is invalid.
+	gcode_position* p_position = new gcode_position(gcode_position_args_);
+	std::vector<snapshot_plan> snapshot_plans;
+	bool is_valid = (
+		reader.read_int(format_version) &&
+		format_version == CHECKPOINT_FORMAT_VERSION &&
+		reader.read_long(file_size) &&
+		file_size == file_size_ &&
+		reader.read_long(file_position) &&
+		file_position >= 0 &&
+		file_position <= file_size_ &&
+		reader.read_int(lines_processed) &&
+		reader.read_int(gcodes_processed) &&
+		reader.read_int(missed_snapshots) &&
+		reader.read_bool(snapshots_enabled) &&
+		reader.read_int(num_stabilization_points) &&
+		num_stabilization_points >= num_stabilization_points_ &&
+		reader.read_double(stabilization_x) &&
+		reader.read_double(stabilization_y) &&
+		p_position->read_state(reader) &&
+		reader.read_size(num_snapshot_plans)
+	);
+	for (size_t index = 0; is_valid && index < num_snapshot_plans; index++)
+	{
+		snapshot_plans.push_back(snapshot_plan());
+		is_valid = snapshot_plans.back().read(reader);
+	}
+	// The state of the derived class is read last, and is only changed if it is valid.
+	if (!is_valid || !read_checkpoint_state(reader))
+	{
+		delete p_position;
+		octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::WARNING,
+			"The checkpoint file does not match the file or settings being processed, and will be replaced.");
+		return false;
+	}
+
+	delete_gcode_position();
+	gcode_position_ = p_position;
+	file_position_ = file_position;
+	lines_processed_ = lines_processed;
+	gcodes_processed_ = gcodes_processed;
+	missed_snapshots_ = missed_snapshots;
+	snapshots_enabled_ = snapshots_enabled;
+	// Request the stabilization points that were already used so that the next point matches the original run.
+	double x, y;
+	while (num_stabilization_points_ < num_stabilization_points)
+	{
+		get_next_xy_coordinates(x, y);
+	}
+	stabilization_x_ = stabilization_x;
+	stabilization_y_ = stabilization_y;
+	p_snapshot_plans_.clear();
+	for (std::vector<snapshot_plan>::const_iterator it = snapshot_plans.begin(); it != snapshot_plans.end(); ++it)
+	{
+		add_snapshot_plan(*it);
+	}
+
+	std::stringstream stream;
+	stream << "Resuming from a checkpoint at file position " << file_position_ << " with " <<
+		p_snapshot_plans_.size() << " snapshot plans.";
+	octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO, stream.str());
+	return true;
+}
+
+void stabilization::write_checkpoint_state(binary_writer& writer) const
+{
+	// nothing to write by default
+}
+
+bool stabilization::read_checkpoint_state(binary_reader& reader)
+{
+	return reader.is_complete();
+}
+
 void stabilization::process_pos(position* current_pos, position* previous_pos, bool found_command)
 {
 	throw std::exception();
@@ -508,8 +749,9 @@ std::vector<stabilization_processing_issue> stabilization::get_processing_issues
 }
 
 
-void stabilization::get_next_xy_coordinates(double& x, double& y) const
+void stabilization::get_next_xy_coordinates(double& x, double& y)
 {
+	num_stabilization_points_++;
 	//octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO, "Getting stabilization coordinates.");
 	//std::cout << "Getting XY stabilization coordinates...";
 	double x_ret, y_ret;
@@ -636,7 +878,7 @@ void stabilization::add_plan_plan_from_snapshot_command(position* p_position)
 	p_plan.file_position = p_position->file_position;
 
 	// Add the plan
-	p_snapshot_plans_.push_back(p_plan);
+	add_snapshot_plan(p_plan);
 	// get the next coordinates
 	update_stabilization_coordinates();
 }
@@ -645,3 +887,10 @@ void stabilization::update_stabilization_coordinates()
 {
 	get_next_xy_coordinates(stabilization_x_, stabilization_y_);
 }
+
+void stabilization::add_snapshot_plan(const snapshot_plan& plan)
+{
+	p_snapshot_plans_.push_back(plan);
+	if (stabilization_args_.progress != NULL)
+		stabilization_args_.progress->add_preview_plan(plan);
+}
@@ -27,8 +27,11 @@
 #include "position.h"
 #include "gcode_position.h"
 #include "snapshot_plan.h"
+#include "binary_serialization.h"
 #include "stabilization_results.h"
+#include "stabilization_progress.h"
 #include <vector>
+#include <chrono>
 #ifdef _DEBUG
 //#undef _DEBUG
 #include <Python.h>
@@ -56,6 +59,10 @@ public:
         x_stabilization_disabled = false;
         y_stabilization_disabled = false;
         allow_snapshot_commands = true;
+        processing_threads = 1;
+        progress = NULL;
+        checkpoint_file_path = "";
+        checkpoint_period_seconds = 30.0;
         snapshot_command_text = "@OCTOLAPSE TAKE-SNAPSHOT";
         snapshot_command.command = "@OCTOLAPSE";
         parsed_command_parameter parameter;
@@ -86,6 +93,30 @@ public:
      */
     bool y_stabilization_disabled;
 
+    /**
+     * \brief The number of threads used to process the file.  If greater than 1, the file is parsed in chunks on
+     * processing_threads - 1 worker threads.
+     */
+    unsigned int processing_threads;
+
+    /**
+     * \brief If not NULL, progress is published here rather than through the progress callback, and the
+     * stabilization stops when it is cancelled.  The progress is not owned by the args and must outlive the
+     * stabilization.
+     */
+    stabilization_progress* progress;
+
+    /**
+     * \brief If not empty, the processing state is saved to this file periodically and when processing is cancelled,
+     * and the next run resumes from the saved state.  The checkpoint must have been written with the same file and
+     * settings.  It is deleted once the file has been processed.
+     */
+    std::string checkpoint_file_path;
+    /**
+     * \brief The minimum number of (processor) seconds between checkpoints.
+     */
+    double checkpoint_period_seconds;
+
     double x_coordinate;
     double y_coordinate;
     parsed_command snapshot_command;
@@ -117,10 +148,21 @@ public:
 private:
     stabilization(const stabilization& source); // don't copy me!
     double get_next_update_time() const;
-    static double get_time_elapsed(double start_clock, double end_clock);
     bool has_python_callbacks_;
     // False if return < 0, else true
     pythonGetCoordinatesCallback _get_coordinates_callback;
+    void process_command(parsed_command& cmd, bool found_command);
+    void process_file_chunks(long start_offset);
+    bool is_checkpoint_enabled() const;
+    double get_next_checkpoint_time() const;
+    /**
+     * \brief Restores the state saved in the checkpoint file, if there is one.  Nothing is changed unless the
+     * entire checkpoint could be read.
+     * \return true if the state was restored, in which case processing continues from file_position_.
+     */
+    bool try_resume_from_checkpoint();
+    void write_checkpoint();
+    void delete_checkpoint() const;
     void notify_progress(double percent_progress, double seconds_elapsed, double seconds_to_complete,
         int gcodes_processed, int lines_processed);
 
@@ -128,6 +170,12 @@ private:
     PyObject* py_get_snapshot_position_callback;
 
 protected:
+    /**
+     * \brief Gets the current time in seconds from a monotonic wall clock.  clock() is not used because it measures
+     * the processor time of every thread, which runs faster than real time when processing with multiple threads.
+     */
+    static double get_clock_seconds();
+    static double get_time_elapsed(double start_clock, double end_clock);
     /**
      * \brief Gets the next xy stabilization point
      * \param x The current x stabilization point, will be replaced with the next x point.
@@ -135,17 +183,30 @@ protected:
      */
     void delete_gcode_parser();
     void delete_gcode_position();
-    void get_next_xy_coordinates(double& x, double& y) const;
+    void get_next_xy_coordinates(double& x, double& y);
     virtual void process_pos(position* p_current_pos, position* p_previous_pos, bool found_command);
     virtual void on_processing_start();
     virtual void on_processing_complete();
     virtual std::vector<stabilization_processing_issue> get_internal_processing_issues();
     virtual std::vector<stabilization_quality_issue> get_quality_issues();
     virtual std::vector<stabilization_processing_issue> get_processing_issues();
+    /**
+     * \brief Writes any state that is not tracked by the stabilization base class to a checkpoint.
+     */
+    virtual void write_checkpoint_state(binary_writer& writer) const;
+    /**
+     * \brief Reads the state written by write_checkpoint_state, which is the last thing in the checkpoint.  Must read to
+     * the end of the reader, and must not change anything unless it returns true.
+     */
+    virtual bool read_checkpoint_state(binary_reader& reader);
     bool process_snapshot_command(position* p_cur_pos);
     void process_snapshot_command_parameters(position* p_cur_pos);
-    void add_plan_plan_from_snapshot_command(position* p_position);
+    virtual void add_plan_plan_from_snapshot_command(position* p_position);
     void update_stabilization_coordinates();
+    /**
+     * \brief Adds a snapshot plan to the results, and to the preview queue of the progress if there is one.
+     */
+    void add_snapshot_plan(const snapshot_plan& plan);
     std::vector<snapshot_plan> p_snapshot_plans_;
     bool is_running_;
     gcode_position_args gcode_position_args_;
@@ -154,11 +215,17 @@ protected:
     pythonProgressCallback progress_callback_;
     gcode_position* gcode_position_;
     gcode_parser* gcode_parser_;
-    long get_file_size(const std::string& file_path);
     long file_size_;
     int lines_processed_;
     int gcodes_processed_;
     long file_position_;
+    // The file position that processing started from, which is not 0 if it was resumed from a checkpoint
+    long start_file_position_;
+    double start_clock_;
+    double next_checkpoint_time_;
+    // The number of stabilization points that have been requested, so that they can be requested again on resume
+    int num_stabilization_points_;
+    double next_update_time_;
     int missed_snapshots_;
     bool snapshots_enabled_;
     double stabilization_x_;
@@ -0,0 +1,237 @@
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+// Copyright(C) 2019  Brad Hochgesang
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// This program is free software : you can redistribute it and/or modify
+// it under the terms of the GNU Affero General Public License as published
+// by the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.See the
+// GNU Affero General Public License for more details.
+//
+// You should have received a copy of the GNU Affero General Public License
+// along with this program.If not, see the following :
+// https ://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+//
+// You can contact the author either through the git - hub repository, or at the
+// following email address : FormerLurker@pm.me
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+#include "stabilization_progress.h"
+
+stabilization_progress::stabilization_progress()
+{
+  percent_complete = 0;
+  seconds_elapsed = 0;
+  seconds_to_complete = 0;
+  gcodes_processed = 0;
+  lines_processed = 0;
+  is_cancelled_ = false;
+  preview_capacity_ = 0;
+  preview_plans_dropped_ = 0;
+}
+
+void stabilization_progress::update(const double percent_complete, const double seconds_elapsed,
+                                    const double seconds_to_complete, const long gcodes_processed,
+                                    const long lines_processed)
+{
+  this->percent_complete = percent_complete;
+  this->seconds_elapsed = seconds_elapsed;
+  this->seconds_to_complete = seconds_to_complete;
+  this->gcodes_processed = gcodes_processed;
+  this->lines_processed = lines_processed;
+}
+
+void stabilization_progress::cancel()
+{
+  is_cancelled_ = true;
+}
+
+bool stabilization_progress::is_cancelled() const
+{
+  return is_cancelled_;
+}
+
+void stabilization_progress::set_preview_capacity(const size_t capacity)
+{
+  preview_capacity_ = capacity;
+}
+
+void stabilization_progress::add_preview_plan(const snapshot_plan& plan)
+{
+  if (preview_capacity_ == 0)
+    return;
+  std::lock_guard<std::mutex> lock(preview_mutex_);
+  if (preview_plans_.size() >= preview_capacity_)
+  {
+    ++preview_plans_dropped_;
+    return;
+  }
+  preview_plans_.push_back(plan);
+}
+
+void stabilization_progress::get_preview_plans(std::vector<snapshot_plan>& plans)
+{
+  std::lock_guard<std::mutex> lock(preview_mutex_);
+  plans.insert(plans.end(), preview_plans_.begin(), preview_plans_.end());
+  preview_plans_.clear();
+}
+
+long stabilization_progress::get_preview_plans_dropped() const
+{
+  return preview_plans_dropped_;
+}
+
+namespace python_stabilization_progress
+{
+  static stabilization_progress* get_self_progress(PyObject* self)
+  {
+    return reinterpret_cast<py_stabilization_progress_object*>(self)->p_progress;
+  }
+
+  static PyObject* get_percent_complete(PyObject* self, void* closure)
+  {
+    return PyFloat_FromDouble(get_self_progress(self)->percent_complete);
+  }
+
+  static PyObject* get_seconds_elapsed(PyObject* self, void* closure)
+  {
+    return PyFloat_FromDouble(get_self_progress(self)->seconds_elapsed);
+  }
+
+  static PyObject* get_seconds_to_complete(PyObject* self, void* closure)
+  {
+    return PyFloat_FromDouble(get_self_progress(self)->seconds_to_complete);
+  }
+
+  static PyObject* get_gcodes_processed(PyObject* self, void* closure)
+  {
+    return PyLong_FromLong(get_self_progress(self)->gcodes_processed);
+  }
+
+  static PyObject* get_lines_processed(PyObject* self, void* closure)
+  {
+    return PyLong_FromLong(get_self_progress(self)->lines_processed);
+  }
+
+  static PyObject* get_is_cancelled(PyObject* self, void* closure)
+  {
+    return PyBool_FromLong(get_self_progress(self)->is_cancelled());
+  }
+
+  static PyObject* get_preview_plans_dropped(PyObject* self, void* closure)
+  {
+    return PyLong_FromLong(get_self_progress(self)->get_preview_plans_dropped());
+  }
+
+  static PyGetSetDef py_stabilization_progress_getset[] = {
+    {(char*)"percent_complete", get_percent_complete, NULL, NULL, NULL},
+    {(char*)"seconds_elapsed", get_seconds_elapsed, NULL, NULL, NULL},
+    {(char*)"seconds_to_complete", get_seconds_to_complete, NULL, NULL, NULL},
+    {(char*)"gcodes_processed", get_gcodes_processed, NULL, NULL, NULL},
+    {(char*)"lines_processed", get_lines_processed, NULL, NULL, NULL},
+    {(char*)"is_cancelled", get_is_cancelled, NULL, NULL, NULL},
+    {(char*)"preview_plans_dropped", get_preview_plans_dropped, NULL, NULL, NULL},
+    {NULL}
+  };
+
+  static PyObject* py_stabilization_progress_cancel(PyObject* self, PyObject* args)
+  {
+    get_self_progress(self)->cancel();
+    Py_RETURN_NONE;
+  }
+
+  static PyObject* py_stabilization_progress_get_preview_plans(PyObject* self, PyObject* args)
+  {
+    std::vector<snapshot_plan> plans;
+    // Copy the plans out first so that the stabilization is never waiting on the lock while python objects are built
+    get_self_progress(self)->get_preview_plans(plans);
+    return snapshot_plan::build_py_object(plans);
+  }
+
+  static PyMethodDef py_stabilization_progress_methods[] = {
+    {"cancel", (PyCFunction)py_stabilization_progress_cancel, METH_NOARGS, "Cancels the stabilization."},
+    {
+      "get_preview_plans", (PyCFunction)py_stabilization_progress_get_preview_plans, METH_NOARGS,
+      "Returns the snapshot plans created since the last call, and removes them from the preview queue."
+    },
+    {NULL}
+  };
+
+  static PyObject* py_stabilization_progress_new(PyTypeObject* type, PyObject* args, PyObject* kwds)
+  {
+    // preview_capacity (optional)
+    static char* kwlist[] = {(char*)"preview_capacity", NULL};
+    Py_ssize_t preview_capacity = 0;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|n", kwlist, &preview_capacity))
+    {
+      return NULL;
+    }
+    if (preview_capacity < 0)
+    {
+      PyErr_SetString(PyExc_ValueError, "The preview_capacity must not be negative.");
+      return NULL;
+    }
+    py_stabilization_progress_object* self = reinterpret_cast<py_stabilization_progress_object*>(
+      type->tp_alloc(type, 0));
+    if (self == NULL)
+    {
+      return NULL;
+    }
+    self->p_progress = new stabilization_progress();
+    self->p_progress->set_preview_capacity(static_cast<size_t>(preview_capacity));
+    return reinterpret_cast<PyObject*>(self);
+  }
+
+  static void py_stabilization_progress_dealloc(py_stabilization_progress_object* self)
+  {
+    if (self->p_progress != NULL)
+    {
+      delete self->p_progress;
+      self->p_progress = NULL;
+    }
+    Py_TYPE(self)->tp_free(reinterpret_cast<PyObject*>(self));
+  }
+
+  PyTypeObject py_stabilization_progress_type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "GcodePositionProcessor.StabilizationProgress"
+  };
+
+  bool initialize_type(PyObject* module)
+  {
+    py_stabilization_progress_type.tp_basicsize = sizeof(py_stabilization_progress_object);
+    py_stabilization_progress_type.tp_itemsize = 0;
+    py_stabilization_progress_type.tp_flags = Py_TPFLAGS_DEFAULT;
+    py_stabilization_progress_type.tp_doc =
+      "The progress of a running stabilization, which can be read (and cancelled) from any thread.";
+    py_stabilization_progress_type.tp_new = py_stabilization_progress_new;
+    py_stabilization_progress_type.tp_dealloc = reinterpret_cast<destructor>(py_stabilization_progress_dealloc);
+    py_stabilization_progress_type.tp_getset = py_stabilization_progress_getset;
+    py_stabilization_progress_type.tp_methods = py_stabilization_progress_methods;
+    if (PyType_Ready(&py_stabilization_progress_type) < 0)
+    {
+      return false;
+    }
+    Py_INCREF(&py_stabilization_progress_type);
+    if (PyModule_AddObject(
+      module, "StabilizationProgress", reinterpret_cast<PyObject*>(&py_stabilization_progress_type)) < 0)
+    {
+      Py_DECREF(&py_stabilization_progress_type);
+      return false;
+    }
+    return true;
+  }
+
+  bool check(PyObject* py_object)
+  {
+    return PyObject_TypeCheck(py_object, &py_stabilization_progress_type);
+  }
+
+  stabilization_progress* get_progress(PyObject* py_object)
+  {
+    return get_self_progress(py_object);
+  }
+}
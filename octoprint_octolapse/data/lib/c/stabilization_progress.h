@@ -0,0 +1,94 @@
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+// Copyright(C) 2019  Brad Hochgesang
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+// This program is free software : you can redistribute it and/or modify
+// it under the terms of the GNU Affero General Public License as published
+// by the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.See the
+// GNU Affero General Public License for more details.
+//
+// You should have received a copy of the GNU Affero General Public License
+// along with this program.If not, see the following :
+// https ://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+//
+// You can contact the author either through the git - hub repository, or at the
+// following email address : FormerLurker@pm.me
+////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+
+#ifndef STABILIZATION_PROGRESS_H
+#define STABILIZATION_PROGRESS_H
+#ifdef _DEBUG
+//#undef _DEBUG
+#include <Python.h>
+//python311_d.lib
+#else
+#include <Python.h>
+#endif
+#include <atomic>
+#include <deque>
+#include <mutex>
+#include <vector>
+#include "snapshot_plan.h"
+
+/**
+ * \brief Progress counters that are written by a running stabilization and read from any other thread, so that
+ * progress can be reported and the stabilization cancelled without calling back into python (and without the GIL).
+ */
+class stabilization_progress
+{
+public:
+  stabilization_progress();
+  void update(double percent_complete, double seconds_elapsed, double seconds_to_complete, long gcodes_processed,
+              long lines_processed);
+  void cancel();
+  bool is_cancelled() const;
+  /**
+   * \brief Sets the maximum number of plans that can wait in the preview queue.  A capacity of 0 (the default)
+   * disables the preview.
+   */
+  void set_preview_capacity(size_t capacity);
+  /**
+   * \brief Queues a copy of a new snapshot plan for preview.  If the preview queue is full the plan is counted as
+   * dropped rather than queued, so that a slow reader can never hold up the stabilization.
+   */
+  void add_preview_plan(const snapshot_plan& plan);
+  /**
+   * \brief Moves every queued preview plan to the end of plans, emptying the preview queue.
+   */
+  void get_preview_plans(std::vector<snapshot_plan>& plans);
+  long get_preview_plans_dropped() const;
+  std::atomic<double> percent_complete;
+  std::atomic<double> seconds_elapsed;
+  std::atomic<double> seconds_to_complete;
+  std::atomic<long> gcodes_processed;
+  std::atomic<long> lines_processed;
+private:
+  std::atomic<bool> is_cancelled_;
+  std::atomic<size_t> preview_capacity_;
+  std::atomic<long> preview_plans_dropped_;
+  std::mutex preview_mutex_;
+  std::deque<snapshot_plan> preview_plans_;
+};
+
+// A python object that owns a stabilization_progress.  Pass it in the stabilization args as "progress" and poll it
+// from another thread while the stabilization runs.  Construct it with a preview_capacity to also receive the new
+// snapshot plans from get_preview_plans while the stabilization runs.
+struct py_stabilization_progress_object
+{
+  PyObject_HEAD
+  stabilization_progress* p_progress;
+};
+
+namespace python_stabilization_progress
+{
+  extern PyTypeObject py_stabilization_progress_type;
+  bool initialize_type(PyObject* module);
+  bool check(PyObject* py_object);
+  stabilization_progress* get_progress(PyObject* py_object);
+}
+#endif
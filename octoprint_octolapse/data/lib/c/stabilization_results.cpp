@@ -22,6 +22,7 @@
 #include "stabilization_results.h"
 #include "logging.h"
 #include "python_helpers.h"
+#include "snapshot_plan_list.h"
 
 stabilization_results::stabilization_results()
 {
@@ -33,7 +34,8 @@ stabilization_results::stabilization_results()
 
 PyObject* stabilization_results::to_py_object()
 {
-  PyObject* py_snapshot_plans = snapshot_plan::build_py_object(snapshot_plans);
+  // The plans are moved into a compact native list, and only converted to python objects when they are used.
+  PyObject* py_snapshot_plans = python_snapshot_plan_list::create(snapshot_plans);
   if (py_snapshot_plans == NULL)
   {
     return NULL;
@@ -116,3 +116,17 @@ std::vector<stabilization_processing_issue> stabilization_smart_gcode::get_inter
 }
 
 
+
+void stabilization_smart_gcode::write_checkpoint_state(binary_writer& writer) const
+{
+	writer.write_int(snapshot_commands_found_);
+}
+
+bool stabilization_smart_gcode::read_checkpoint_state(binary_reader& reader)
+{
+	int snapshot_commands_found;
+	if (!reader.read_int(snapshot_commands_found) || !reader.is_complete())
+		return false;
+	snapshot_commands_found_ = snapshot_commands_found;
+	return true;
+}
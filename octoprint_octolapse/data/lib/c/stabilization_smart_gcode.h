@@ -29,6 +29,8 @@ private:
   void on_processing_complete() override;
   std::vector<stabilization_quality_issue> get_quality_issues() override;
   std::vector<stabilization_processing_issue> get_internal_processing_issues() override;
+  void write_checkpoint_state(binary_writer& writer) const override;
+  bool read_checkpoint_state(binary_reader& reader) override;
   smart_gcode_args smart_gcode_args_;
   int snapshot_commands_found_;
   
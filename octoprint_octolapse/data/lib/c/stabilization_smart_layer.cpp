@@ -1,7 +1,22 @@
 #include "stabilization_smart_layer.h"
 #include "utilities.h"
 #include "logging.h"
-
+#include "gcode_line_scanner.h"
+#include <sstream>
+
+// Increment this when the format of the layer candidates changes.
+static const int LAYER_CANDIDATES_FORMAT_VERSION = 2;
+// The events recorded in the layer candidates, in the order that they happened while processing the file.  Every
+// position tested by the trigger positions is also recorded (see trigger_positions::set_candidate_writer).
+static const char LAYER_CANDIDATES_EVENT_CLEAR = 'C';
+static const char LAYER_CANDIDATES_EVENT_LAYER_CHANGE = 'L';
+static const char LAYER_CANDIDATES_EVENT_SNAPSHOT_COMMAND = 'S';
+static const char LAYER_CANDIDATES_EVENT_PLAN = 'P';
+static const char LAYER_CANDIDATES_EVENT_KEYFRAME = 'K';
+static const char LAYER_CANDIDATES_EVENT_END = 'E';
+// The minimum number of lines between keyframes.  The position of a selected candidate is found by processing at most
+// this many lines again.
+static const long LAYER_CANDIDATES_KEYFRAME_INTERVAL = 1000;
 
 stabilization_smart_layer::stabilization_smart_layer()
 {
@@ -17,6 +32,11 @@ stabilization_smart_layer::stabilization_smart_layer()
   slowest_extrusion_speed_ = -1;
   last_snapshot_layer_ = 0;
   last_snapshot_height_increment_change_count_ = 0;
+  comment_process_type_ = comment_process_type_unknown;
+  is_recording_layer_candidates_ = false;
+  last_keyframe_line_number_ = 0;
+  is_processing_layer_candidates_ = false;
+  has_layer_candidates_error_ = false;
   trigger_position_args default_args;
   closest_positions_.initialize(default_args);
 }
@@ -37,14 +57,23 @@ stabilization_smart_layer::stabilization_smart_layer(
   // initialize closest extrusion/travel tracking structs
   current_layer_saved_extrusion_speed_ = -1;
   standard_layer_trigger_distance_ = 0.0;
+  comment_process_type_ = comment_process_type_unknown;
+  is_recording_layer_candidates_ = mt_args.record_layer_candidates && can_record_layer_candidates();
+  last_keyframe_line_number_ = 0;
+  is_processing_layer_candidates_ = false;
+  has_layer_candidates_error_ = false;
 
   trigger_position_args default_args;
   default_args.type = mt_args.smart_layer_trigger_type;
   default_args.minimum_speed = mt_args.speed_threshold;
   default_args.snap_to_print_high_quality = mt_args.snap_to_print_high_quality;
+  default_args.snap_to_print_split_extrusions = mt_args.snap_to_print_split_extrusions;
   default_args.x_stabilization_disabled = stab_args.x_stabilization_disabled;
   default_args.y_stabilization_disabled = stab_args.y_stabilization_disabled;
+  default_args.record_candidates = is_recording_layer_candidates_;
   closest_positions_.initialize(default_args);
+  if (is_recording_layer_candidates_)
+    closest_positions_.set_candidate_writer(&layer_candidates_writer_);
   last_snapshot_initial_position_.is_empty = true;
   update_stabilization_coordinates();
 }
@@ -67,14 +96,23 @@ stabilization_smart_layer::stabilization_smart_layer(
   smart_layer_args_ = mt_args;
   current_layer_saved_extrusion_speed_ = -1;
   standard_layer_trigger_distance_ = 0.0;
+  comment_process_type_ = comment_process_type_unknown;
+  is_recording_layer_candidates_ = mt_args.record_layer_candidates && can_record_layer_candidates();
+  last_keyframe_line_number_ = 0;
+  is_processing_layer_candidates_ = false;
+  has_layer_candidates_error_ = false;
 
   trigger_position_args default_args;
   default_args.type = mt_args.smart_layer_trigger_type;
   default_args.minimum_speed = mt_args.speed_threshold;
   default_args.snap_to_print_high_quality = mt_args.snap_to_print_high_quality;
+  default_args.snap_to_print_split_extrusions = mt_args.snap_to_print_split_extrusions;
   default_args.x_stabilization_disabled = stab_args.x_stabilization_disabled;
   default_args.y_stabilization_disabled = stab_args.y_stabilization_disabled;
+  default_args.record_candidates = is_recording_layer_candidates_;
   closest_positions_.initialize(default_args);
+  if (is_recording_layer_candidates_)
+    closest_positions_.set_candidate_writer(&layer_candidates_writer_);
   last_snapshot_initial_position_.is_empty = true;
   update_stabilization_coordinates();
 }
@@ -90,6 +128,105 @@ stabilization_smart_layer::~stabilization_smart_layer()
 void stabilization_smart_layer::on_processing_start()
 {
   gcode_position_args_.height_increment = stabilization_args_.height_increment;
+  if (is_recording_layer_candidates_)
+  {
+    // The layer candidates can be used with any stabilization point, but not with other height increment or snapshot
+    // command settings.
+    layer_candidates_writer_.write_int(LAYER_CANDIDATES_FORMAT_VERSION);
+    layer_candidates_writer_.write_double(stabilization_args_.height_increment);
+    layer_candidates_writer_.write_bool(stabilization_args_.allow_snapshot_commands);
+  }
+}
+
+void stabilization_smart_layer::write_checkpoint_state(binary_writer& writer) const
+{
+  // The trigger type and recording flag are only written so that a checkpoint made with other settings is rejected.
+  writer.write_int(smart_layer_args_.smart_layer_trigger_type);
+  writer.write_bool(is_recording_layer_candidates_);
+  writer.write_bool(is_layer_change_wait_);
+  writer.write_int(last_snapshot_layer_);
+  writer.write_int(static_cast<int>(last_snapshot_height_increment_change_count_));
+  writer.write_int(last_tested_gcode_number_);
+  writer.write_double(fastest_extrusion_speed_);
+  writer.write_double(slowest_extrusion_speed_);
+  writer.write_bool(has_one_extrusion_speed_);
+  writer.write_double(current_layer_saved_extrusion_speed_);
+  writer.write_double(standard_layer_trigger_distance_);
+  writer.write_position(last_snapshot_initial_position_);
+  closest_positions_.write_state(writer);
+  if (is_recording_layer_candidates_)
+  {
+    writer.write_long(last_keyframe_line_number_);
+    writer.write_string(layer_candidates_writer_.get_buffer());
+  }
+}
+
+bool stabilization_smart_layer::read_checkpoint_state(binary_reader& reader)
+{
+  int trigger_type, last_snapshot_layer, last_snapshot_height_increment_change_count, last_tested_gcode_number;
+  bool is_recording_layer_candidates, is_layer_change_wait, has_one_extrusion_speed;
+  double fastest_extrusion_speed, slowest_extrusion_speed, current_layer_saved_extrusion_speed;
+  double standard_layer_trigger_distance;
+  long last_keyframe_line_number = 0;
+  position last_snapshot_initial_position;
+  // Copy the closest positions to keep the args, which are not part of the checkpoint.
+  trigger_positions closest_positions = closest_positions_;
+  std::string layer_candidates;
+  if (
+    !reader.read_int(trigger_type) ||
+    trigger_type != smart_layer_args_.smart_layer_trigger_type ||
+    !reader.read_bool(is_recording_layer_candidates) ||
+    is_recording_layer_candidates != is_recording_layer_candidates_ ||
+    !reader.read_bool(is_layer_change_wait) ||
+    !reader.read_int(last_snapshot_layer) ||
+    !reader.read_int(last_snapshot_height_increment_change_count) ||
+    !reader.read_int(last_tested_gcode_number) ||
+    !reader.read_double(fastest_extrusion_speed) ||
+    !reader.read_double(slowest_extrusion_speed) ||
+    !reader.read_bool(has_one_extrusion_speed) ||
+    !reader.read_double(current_layer_saved_extrusion_speed) ||
+    !reader.read_double(standard_layer_trigger_distance) ||
+    !reader.read_position(last_snapshot_initial_position) ||
+    !closest_positions.read_state(reader) ||
+    (
+      is_recording_layer_candidates_ &&
+      (!reader.read_long(last_keyframe_line_number) || !reader.read_string(layer_candidates))
+    ) ||
+    !reader.is_complete()
+  )
+    return false;
+
+  is_layer_change_wait_ = is_layer_change_wait;
+  last_snapshot_layer_ = last_snapshot_layer;
+  last_snapshot_height_increment_change_count_ = static_cast<unsigned int>(last_snapshot_height_increment_change_count);
+  last_tested_gcode_number_ = last_tested_gcode_number;
+  fastest_extrusion_speed_ = fastest_extrusion_speed;
+  slowest_extrusion_speed_ = slowest_extrusion_speed;
+  has_one_extrusion_speed_ = has_one_extrusion_speed;
+  current_layer_saved_extrusion_speed_ = current_layer_saved_extrusion_speed;
+  standard_layer_trigger_distance_ = standard_layer_trigger_distance;
+  last_snapshot_initial_position_ = last_snapshot_initial_position;
+  closest_positions_ = closest_positions;
+  if (is_recording_layer_candidates_)
+  {
+    // The recorded candidates already start with the header written by on_processing_start.
+    last_keyframe_line_number_ = last_keyframe_line_number;
+    layer_candidates_writer_ = binary_writer();
+    layer_candidates_writer_.write_buffer(layer_candidates);
+  }
+  return true;
+}
+
+// The tested positions are the same for the fast, compatibility and high quality trigger types and for any
+// stabilization point, as long as the distance to the stabilization point does not depend on the previous snapshot
+// position.
+bool stabilization_smart_layer::can_record_layer_candidates() const
+{
+  return (
+    smart_layer_args_.smart_layer_trigger_type != trigger_type_snap_to_print &&
+    !stabilization_args_.x_stabilization_disabled &&
+    !stabilization_args_.y_stabilization_disabled
+  );
 }
 
 void stabilization_smart_layer::update_stabilization_coordinates()
@@ -133,31 +270,27 @@ void stabilization_smart_layer::process_pos(position* p_current_pos, position* p
       // We need to clear all of the closest positions here, since there was not
       //height increment change.  Else our snapshot height incrementation may not be stable.
       closest_positions_.clear();
+      if (is_recording_layer_candidates_)
+        layer_candidates_writer_.write_char(LAYER_CANDIDATES_EVENT_CLEAR);
     }
     else
     {
-      // This is either a layer change or a height increment change.
-      //octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::VERBOSE, "Layer change detected.");
-      is_layer_change_wait_ = true;
-
-      // Determine if we've missed a snapshot layer or height increment
-      if (stabilization_args_.height_increment != 0)
-      {
-        if (p_current_pos->height_increment_change_count > 2 && p_current_pos->height_increment_change_count - 2 >
-          last_snapshot_height_increment_change_count_)
-          missed_snapshots_++;
-      }
-      else
-      {
-        if (p_current_pos->layer - 2 > last_snapshot_layer_)
-          missed_snapshots_++;
-      }
-
       // get distance from current point to the stabilization point
-      standard_layer_trigger_distance_ = utilities::get_cartesian_distance(
+      const double standard_layer_trigger_distance = utilities::get_cartesian_distance(
         p_current_pos->x, p_current_pos->y,
         stabilization_x_, stabilization_y_
       );
+      if (is_recording_layer_candidates_)
+      {
+        layer_candidates_writer_.write_char(LAYER_CANDIDATES_EVENT_LAYER_CHANGE);
+        layer_candidates_writer_.write_long(p_current_pos->layer);
+        layer_candidates_writer_.write_int(p_current_pos->height_increment_change_count);
+        layer_candidates_writer_.write_double(p_current_pos->x);
+        layer_candidates_writer_.write_double(p_current_pos->y);
+      }
+      on_layer_change(
+        p_current_pos->layer, p_current_pos->height_increment_change_count, standard_layer_trigger_distance
+      );
     }
   }
 
@@ -165,16 +298,75 @@ void stabilization_smart_layer::process_pos(position* p_current_pos, position* p
   {
     add_plan();
   }
+  if (
+    is_recording_layer_candidates_ &&
+    p_current_pos->file_line_number - last_keyframe_line_number_ >= LAYER_CANDIDATES_KEYFRAME_INTERVAL
+  )
+    write_layer_candidate_keyframe();
   //octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::VERBOSE, "Adding closest position.");
   closest_positions_.try_add(p_current_pos, p_previous_pos);
   last_tested_gcode_number_ = p_current_pos->gcode_number;
 }
 
+void stabilization_smart_layer::on_layer_change(
+  const long layer, const int height_increment_change_count, const double standard_layer_trigger_distance
+)
+{
+  // This is either a layer change or a height increment change.
+  //octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::VERBOSE, "Layer change detected.");
+  is_layer_change_wait_ = true;
+
+  // Determine if we've missed a snapshot layer or height increment
+  if (stabilization_args_.height_increment != 0)
+  {
+    if (height_increment_change_count > 2 && height_increment_change_count - 2 >
+      last_snapshot_height_increment_change_count_)
+      missed_snapshots_++;
+  }
+  else
+  {
+    if (layer - 2 > last_snapshot_layer_)
+      missed_snapshots_++;
+  }
+
+  standard_layer_trigger_distance_ = standard_layer_trigger_distance;
+}
+
+void stabilization_smart_layer::add_plan_plan_from_snapshot_command(position* p_position)
+{
+  if (is_recording_layer_candidates_)
+  {
+    layer_candidates_writer_.write_char(LAYER_CANDIDATES_EVENT_SNAPSHOT_COMMAND);
+    layer_candidates_writer_.write_position(*p_position);
+  }
+  stabilization::add_plan_plan_from_snapshot_command(p_position);
+}
+
 void stabilization_smart_layer::add_plan()
 {
+  if (is_recording_layer_candidates_)
+    layer_candidates_writer_.write_char(LAYER_CANDIDATES_EVENT_PLAN);
   trigger_position p_closest;
   if (closest_positions_.get_position(p_closest))
   {
+    if (is_processing_layer_candidates_)
+    {
+      // Only the coordinates and the line of the candidates are recorded, so find the rest of the position.
+      position pos;
+      if (
+        !get_layer_candidate_position(p_closest.pos.file_line_number, pos) ||
+        !utilities::is_equal(pos.x, p_closest.pos.x) ||
+        !utilities::is_equal(pos.y, p_closest.pos.y)
+      )
+      {
+        octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::WARNING,
+                      "The position of a layer candidate does not match the file.");
+        has_layer_candidates_error_ = true;
+        reset_saved_positions();
+        return;
+      }
+      p_closest.pos = pos;
+    }
     //std::cout << "Adding saved plan to plans...  F Speed" << p_saved_position_->f_ << " \r\n";
     snapshot_plan p_plan;
     double total_travel_distance;
@@ -194,7 +386,16 @@ void stabilization_smart_layer::add_plan()
     p_plan.triggering_command_feature_type = p_closest.type_feature;
     // create the initial position
     p_plan.triggering_command = p_closest.pos.command;
-    p_plan.start_command = p_closest.pos.command;
+    if (p_closest.is_split)
+    {
+      // The triggering command is replaced by the part of the extrusion before the snapshot, and the rest follows it
+      p_plan.start_command = p_closest.start_command;
+      p_plan.end_command = p_closest.end_command;
+    }
+    else
+    {
+      p_plan.start_command = p_closest.pos.command;
+    }
     p_plan.initial_position = p_closest.pos;
     p_plan.has_initial_position = true;
     const bool all_stabilizations_disabled = stabilization_args_.x_stabilization_disabled && stabilization_args_.
@@ -229,7 +430,7 @@ void stabilization_smart_layer::add_plan()
     p_plan.file_position = p_closest.pos.file_position;
 
     // Add the plan
-    p_snapshot_plans_.push_back(p_plan);
+    add_snapshot_plan(p_plan);
     last_snapshot_initial_position_ = p_plan.initial_position;
     // only get the next coordinates if we've actually added a plan.
     update_stabilization_coordinates();
@@ -272,15 +473,245 @@ void stabilization_smart_layer::on_processing_complete()
   {
     add_plan();
   }
+  comment_process_type_ = gcode_position_->get_gcode_comment_processor()->get_comment_process_type();
+  if (is_recording_layer_candidates_)
+  {
+    // Record everything else needed to create the results.
+    layer_candidates_writer_.write_char(LAYER_CANDIDATES_EVENT_END);
+    layer_candidates_writer_.write_int(gcodes_processed_);
+    layer_candidates_writer_.write_int(lines_processed_);
+    layer_candidates_writer_.write_int(comment_process_type_);
+    std::vector<stabilization_processing_issue> processing_issues = get_processing_issues();
+    layer_candidates_writer_.write_size(processing_issues.size());
+    for (std::vector<stabilization_processing_issue>::const_iterator it = processing_issues.begin();
+         it != processing_issues.end(); ++it)
+    {
+      layer_candidates_writer_.write_int(it->issue_type);
+      layer_candidates_writer_.write_string(it->description);
+      layer_candidates_writer_.write_size(it->replacement_tokens.size());
+      for (std::vector<replacement_token>::const_iterator token = it->replacement_tokens.begin();
+           token != it->replacement_tokens.end(); ++token)
+      {
+        layer_candidates_writer_.write_string(token->key);
+        layer_candidates_writer_.write_string(token->value);
+      }
+    }
+  }
   //std::cout << "Complete.\r\n";
 }
 
+bool stabilization_smart_layer::get_layer_candidates(std::string& layer_candidates) const
+{
+  // The candidates are incomplete if processing was cancelled.
+  if (!is_recording_layer_candidates_ || !is_running_)
+    return false;
+  layer_candidates = layer_candidates_writer_.get_buffer();
+  return true;
+}
+
+// Records the current gcode position state, which is written before the current position is tested.
+void stabilization_smart_layer::write_layer_candidate_keyframe()
+{
+  binary_writer state_writer;
+  gcode_position_->write_state(state_writer);
+  last_keyframe_line_number_ = lines_processed_;
+  layer_candidates_writer_.write_char(LAYER_CANDIDATES_EVENT_KEYFRAME);
+  layer_candidates_writer_.write_long(lines_processed_);
+  layer_candidates_writer_.write_int(gcodes_processed_);
+  layer_candidates_writer_.write_long(file_position_);
+  layer_candidates_writer_.write_string(state_writer.get_buffer());
+}
+
+bool stabilization_smart_layer::get_layer_candidate_position(const long file_line_number, position& pos)
+{
+  // Start from the last keyframe at or before the line, or from the start of the file if there is none.
+  const layer_candidate_keyframe* p_keyframe = NULL;
+  for (std::vector<layer_candidate_keyframe>::const_reverse_iterator it = layer_candidate_keyframes_.rbegin();
+       it != layer_candidate_keyframes_.rend(); ++it)
+  {
+    if (it->line_number <= file_line_number)
+    {
+      p_keyframe = &(*it);
+      break;
+    }
+  }
+
+  delete_gcode_position();
+  gcode_position_ = new gcode_position(gcode_position_args_);
+  if (gcode_parser_ == NULL)
+    gcode_parser_ = new gcode_parser();
+  long line_number = 0;
+  long gcode_number = 0;
+  long file_position = 0;
+  if (p_keyframe != NULL)
+  {
+    binary_reader state_reader(p_keyframe->position_state.data(), p_keyframe->position_state.size());
+    if (!gcode_position_->read_state(state_reader))
+      return false;
+    line_number = p_keyframe->line_number;
+    gcode_number = p_keyframe->gcode_number;
+    file_position = p_keyframe->file_position;
+  }
+
+  if (line_number < file_line_number)
+  {
+    gcode_line_scanner scanner;
+    if (!scanner.open(stabilization_args_.file_path) || !scanner.seek_to_line_start(file_position))
+      return false;
+    const char* line;
+    parsed_command cmd;
+    while (line_number < file_line_number && scanner.get_next_line(line))
+    {
+      cmd.clear();
+      gcode_parser_->try_parse_gcode(line, cmd);
+      line_number++;
+      if (cmd.gcode.length() > 0)
+        gcode_number++;
+      gcode_position_->update(cmd, line_number, gcode_number, scanner.get_position());
+    }
+  }
+
+  pos = *gcode_position_->get_current_position_ptr();
+  return !pos.is_empty && pos.file_line_number == file_line_number;
+}
+
+bool stabilization_smart_layer::process_layer_candidates(const std::string& layer_candidates,
+                                                         stabilization_results& results)
+{
+  const double start_clock = get_clock_seconds();
+  binary_reader reader(layer_candidates.data(), layer_candidates.size());
+  int format_version;
+  double height_increment;
+  bool allow_snapshot_commands;
+  if (
+    !can_record_layer_candidates() ||
+    !reader.read_int(format_version) ||
+    format_version != LAYER_CANDIDATES_FORMAT_VERSION ||
+    !reader.read_double(height_increment) ||
+    !utilities::is_equal(height_increment, stabilization_args_.height_increment) ||
+    !reader.read_bool(allow_snapshot_commands) ||
+    allow_snapshot_commands != stabilization_args_.allow_snapshot_commands
+  )
+    return false;
+  gcode_position_args_.height_increment = stabilization_args_.height_increment;
+  is_processing_layer_candidates_ = true;
+  has_layer_candidates_error_ = false;
+  layer_candidate_keyframes_.clear();
+
+  std::vector<stabilization_processing_issue> processing_issues;
+  bool is_complete = false;
+  char event_type;
+  while (!is_complete && !has_layer_candidates_error_ && reader.read_char(event_type))
+  {
+    switch (event_type)
+    {
+    case LAYER_CANDIDATES_EVENT_CLEAR:
+      closest_positions_.clear();
+      break;
+    case LAYER_CANDIDATES_EVENT_LAYER_CHANGE:
+      {
+        long layer;
+        int height_increment_change_count;
+        double x, y;
+        if (
+          !reader.read_long(layer) ||
+          !reader.read_int(height_increment_change_count) ||
+          !reader.read_double(x) ||
+          !reader.read_double(y)
+        )
+          return false;
+        on_layer_change(
+          layer, height_increment_change_count,
+          utilities::get_cartesian_distance(x, y, stabilization_x_, stabilization_y_)
+        );
+        break;
+      }
+    case LAYER_CANDIDATES_EVENT_SNAPSHOT_COMMAND:
+      {
+        position pos;
+        if (!reader.read_position(pos))
+          return false;
+        stabilization::add_plan_plan_from_snapshot_command(&pos);
+        break;
+      }
+    case LAYER_CANDIDATES_EVENT_PLAN:
+      add_plan();
+      break;
+    case trigger_positions::candidate_type_position:
+    case trigger_positions::candidate_type_feature_position:
+      if (!closest_positions_.read_candidate(reader, event_type))
+        return false;
+      break;
+    case LAYER_CANDIDATES_EVENT_KEYFRAME:
+      {
+        layer_candidate_keyframe keyframe;
+        if (
+          !reader.read_long(keyframe.line_number) ||
+          !reader.read_int(keyframe.gcode_number) ||
+          !reader.read_long(keyframe.file_position) ||
+          !reader.read_string(keyframe.position_state)
+        )
+          return false;
+        layer_candidate_keyframes_.push_back(keyframe);
+        break;
+      }
+    case LAYER_CANDIDATES_EVENT_END:
+      {
+        int process_type;
+        size_t num_issues;
+        if (
+          !reader.read_int(gcodes_processed_) ||
+          !reader.read_int(lines_processed_) ||
+          !reader.read_int(process_type) ||
+          !reader.read_size(num_issues)
+        )
+          return false;
+        comment_process_type_ = static_cast<comment_process_type>(process_type);
+        for (size_t index = 0; index < num_issues; index++)
+        {
+          stabilization_processing_issue issue;
+          int issue_type;
+          size_t num_tokens;
+          if (!reader.read_int(issue_type) || !reader.read_string(issue.description) || !reader.read_size(num_tokens))
+            return false;
+          issue.issue_type = static_cast<stabilization_processing_issue_type>(issue_type);
+          for (size_t token_index = 0; token_index < num_tokens; token_index++)
+          {
+            replacement_token token;
+            if (!reader.read_string(token.key) || !reader.read_string(token.value))
+              return false;
+            issue.replacement_tokens.push_back(token);
+          }
+          processing_issues.push_back(issue);
+        }
+        is_complete = true;
+        break;
+      }
+    default:
+      return false;
+    }
+  }
+  if (!is_complete || !reader.is_complete())
+    return false;
+
+  results.seconds_elapsed = get_time_elapsed(start_clock, get_clock_seconds());
+  results.gcodes_processed = gcodes_processed_;
+  results.lines_processed = lines_processed_;
+  results.quality_issues = get_quality_issues();
+  results.snapshot_plans = p_snapshot_plans_;
+  results.processing_issues = processing_issues;
+  results.missed_layer_count = missed_snapshots_;
+  std::stringstream stream;
+  stream << "Created " << results.snapshot_plans.size() << " snapshot plans from the layer candidates.";
+  octolapse_log(octolapse_log::SNAPSHOT_PLAN, octolapse_log::INFO, stream.str());
+  return true;
+}
+
 std::vector<stabilization_quality_issue> stabilization_smart_layer::get_quality_issues()
 {
   std::vector<stabilization_quality_issue> issues;
 
   // Detect quality issues and return as a human readable string.
-  gcode_comment_processor* p_comment_processor = gcode_position_->get_gcode_comment_processor();
   if (this->smart_layer_args_.smart_layer_trigger_type == trigger_type_fast)
   {
     stabilization_quality_issue issue;
@@ -301,7 +732,7 @@ std::vector<stabilization_quality_issue> stabilization_smart_layer::get_quality_
       issues.push_back(issue);
     }
 
-    else if (p_comment_processor->get_comment_process_type() == comment_process_type_unknown)
+    else if (comment_process_type_ == comment_process_type_unknown)
     {
       stabilization_quality_issue issue;
       issue.description =
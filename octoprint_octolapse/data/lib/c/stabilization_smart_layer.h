@@ -3,6 +3,7 @@
 #include "stabilization.h"
 #include "position.h"
 #include "trigger_position.h"
+#include "binary_serialization.h"
 #ifdef _DEBUG
 //#undef _DEBUG
 #include <Python.h>
@@ -18,12 +19,41 @@ struct smart_layer_args
     speed_threshold = 0;
     snap_to_print_high_quality = false;
     snap_to_print_smooth = false;
+    snap_to_print_split_extrusions = false;
+    record_layer_candidates = false;
   }
 
   trigger_type smart_layer_trigger_type;
   double speed_threshold;
   bool snap_to_print_high_quality;
   bool snap_to_print_smooth;
+  bool snap_to_print_split_extrusions;
+  /**
+   * \brief If true, the candidate positions for each layer are recorded so that the snapshot plans can be created
+   * again for another trigger type or stabilization point without processing the whole file.  Not supported for snap
+   * to print, or if either axis is disabled.
+   */
+  bool record_layer_candidates;
+};
+
+/**
+ * \brief The state of the gcode position at a recorded line, which is used to find the full position of a layer
+ * candidate without processing the file from the start.
+ */
+struct layer_candidate_keyframe
+{
+  layer_candidate_keyframe()
+  {
+    line_number = 0;
+    gcode_number = 0;
+    file_position = 0;
+  }
+
+  long line_number;
+  int gcode_number;
+  // The position of the line following line_number
+  long file_position;
+  std::string position_state;
 };
 
 class stabilization_smart_layer : public stabilization
@@ -36,12 +66,40 @@ public:
                             pythonGetCoordinatesCallback get_coordinates, PyObject* py_get_coordinates_callback,
                             pythonProgressCallback progress, PyObject* py_progress_callback);
   ~stabilization_smart_layer();
+  /**
+   * \brief Gets the layer candidates recorded while processing the file.
+   * \param layer_candidates Is set to the recorded layer candidates
+   * \return false if no layer candidates were recorded, or if the recorded candidates can't be used.
+   */
+  bool get_layer_candidates(std::string& layer_candidates) const;
+  /**
+   * \brief Creates the snapshot plans from layer candidates recorded with another trigger type or stabilization point
+   * (but otherwise the same settings) instead of processing the file.  Only the lines before each selected candidate
+   * are processed again, starting from the closest recorded keyframe.
+   * \param layer_candidates The layer candidates returned by get_layer_candidates.
+   * \param results Is set to the results
+   * \return false if the layer candidates can't be used, for example if the height increment is different.
+   */
+  bool process_layer_candidates(const std::string& layer_candidates, stabilization_results& results);
 private:
   stabilization_smart_layer(const stabilization_smart_layer& source); // don't copy me
   void process_pos(position* p_current_pos, position* p_previous_pos, bool found_command) override;
   void on_processing_start() override;
   void on_processing_complete() override;
   std::vector<stabilization_quality_issue> get_quality_issues() override;
+  void add_plan_plan_from_snapshot_command(position* p_position) override;
+  void write_checkpoint_state(binary_writer& writer) const override;
+  bool read_checkpoint_state(binary_reader& reader) override;
+  void on_layer_change(long layer, int height_increment_change_count, double standard_layer_trigger_distance);
+  bool can_record_layer_candidates() const;
+  void write_layer_candidate_keyframe();
+  /**
+   * \brief Processes the file from the closest keyframe to find the full position at a line.
+   * \param file_line_number The line of the position
+   * \param pos Is set to the position
+   * \return false if there is no position at the line.
+   */
+  bool get_layer_candidate_position(long file_line_number, position& pos);
   void add_plan();
   void reset_saved_positions();
   /**
@@ -69,5 +127,14 @@ private:
   position last_snapshot_initial_position_;
   // closest extrusion/travel position tracking variables
   trigger_positions closest_positions_;
+  comment_process_type comment_process_type_;
+  // layer candidate recording variables
+  bool is_recording_layer_candidates_;
+  binary_writer layer_candidates_writer_;
+  long last_keyframe_line_number_;
+  // layer candidate processing variables
+  bool is_processing_layer_candidates_;
+  bool has_layer_candidates_error_;
+  std::vector<layer_candidate_keyframe> layer_candidate_keyframes_;
 };
 #endif
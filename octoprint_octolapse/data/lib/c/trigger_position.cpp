@@ -1,6 +1,12 @@
 #include "trigger_position.h"
 #include "utilities.h"
 #include "stabilization_smart_layer.h"
+#include <cmath>
+#include <iomanip>
+#include <sstream>
+
+// Extrusions are only split if both parts are at least this long (mm), since the ends have already been considered.
+static const double MINIMUM_SPLIT_EXTRUSION_LENGTH = 0.1;
 
 position_type trigger_position::get_type(position* p_pos)
 {
@@ -83,6 +89,7 @@ trigger_positions::trigger_positions()
   slowest_extrusion_speed_ = -1;
   stabilization_x_ = 0;
   stabilization_y_ = 0;
+  p_candidate_writer_ = NULL;
 }
 
 trigger_positions::~trigger_positions()
@@ -416,6 +423,7 @@ void trigger_positions::try_add(position* p_current_pos, position* p_previous_po
   if (
     p_current_pos->feature_type_tag != feature_type::feature_type_unknown_feature &&
     (
+      args_.record_candidates ||
       args_.type == trigger_type_high_quality ||
       args_.type == trigger_type_compatibility ||
       (args_.type == trigger_type_snap_to_print && type == position_type_extrusion && args_.snap_to_print_high_quality)
@@ -465,6 +473,16 @@ void trigger_positions::try_add(position* p_current_pos, position* p_previous_po
   //std::cout << "Distance:" << distance << "\r\n";
   try_add_internal(p_current_pos, distance, type);
 
+  if (
+    args_.type == trigger_type_snap_to_print &&
+    args_.snap_to_print_split_extrusions &&
+    type == position_type_extrusion
+  )
+  {
+    // The closest point of the extrusion may be between its start and end
+    try_add_split_extrusion_position(p_current_pos, p_previous_pos);
+  }
+
   // If we are using snap to print, and the current position is = is_extruding_start
   if (args_.type == trigger_type_snap_to_print)
   {
@@ -487,6 +505,10 @@ void trigger_positions::try_add_feature_position_internal(position* p_pos)
   const double distance = get_stabilization_distance(p_pos);
   const feature_type type = static_cast<feature_type>(p_pos->feature_type_tag);
 
+  // Only features that can be selected by the compatibility and high quality trigger types are recorded.
+  if (p_candidate_writer_ != NULL && type >= feature_type_inner_perimeter_feature)
+    write_candidate(*p_candidate_writer_, candidate_type_feature_position, p_pos, type);
+
   if (feature_position_list_[type].is_empty)
   {
     add_position = true;
@@ -533,6 +555,7 @@ void trigger_positions::add_internal(position* p_pos, double distance, position_
   position_list_[type].distance = distance;
   position_list_[type].type_position = type;
   position_list_[type].is_empty = false;
+  position_list_[type].is_split = false;
 }
 
 void trigger_positions::try_add_extrusion_start_positions(position* p_extrusion_start_pos)
@@ -607,6 +630,9 @@ void trigger_positions::try_add_extrusion_start_position(position* p_extrusion_s
 // Try to add a position to the internal position list.
 void trigger_positions::try_add_internal(position* p_pos, double distance, position_type type)
 {
+  if (p_candidate_writer_ != NULL)
+    write_candidate(*p_candidate_writer_, candidate_type_position, p_pos, type);
+
   // If this is an extrusion type position, we need to handle it with care since we want to track both the closest 
   // extrusion and the closest extrusion at the fastest speed (inluding any speed filters that are supplied.
   if (type == position_type_extrusion)
@@ -679,3 +705,298 @@ void trigger_positions::try_add_internal(position* p_pos, double distance, posit
     add_internal(p_pos, distance, type);
   }
 }
+
+// Gets the stabilization point if it does not depend on the position being tested.  It does depend on the position
+// when an axis is disabled and no snapshot has been taken yet.
+bool trigger_positions::get_fixed_stabilization_point(double& x, double& y) const
+{
+  if (previous_initial_pos_.is_empty && (args_.x_stabilization_disabled || args_.y_stabilization_disabled))
+    return false;
+  x = stabilization_x_;
+  y = stabilization_y_;
+  return true;
+}
+
+bool trigger_positions::is_closer(const trigger_position& current, double distance, double x, double y) const
+{
+  if (current.is_empty)
+    return true;
+  if (utilities::less_than(distance, current.distance))
+    return true;
+  if (utilities::is_equal(current.distance, distance) && !previous_initial_pos_.is_empty)
+  {
+    // In the case of a tie, use the position closest to the previous snapshot
+    const double old_distance_from_previous = utilities::get_cartesian_distance(
+      current.pos.x, current.pos.y, previous_initial_pos_.x, previous_initial_pos_.y);
+    const double new_distance_from_previous = utilities::get_cartesian_distance(
+      x, y, previous_initial_pos_.x, previous_initial_pos_.y);
+    return utilities::less_than(new_distance_from_previous, old_distance_from_previous);
+  }
+  return false;
+}
+
+// Only simple metric G0/G1 extrusions within a layer are split, so that the two new commands can be written without
+// changing anything but the coordinates.
+bool trigger_positions::can_split_extrusion(position* p_current_pos, position* p_previous_pos)
+{
+  if (p_current_pos->command.command != "G0" && p_current_pos->command.command != "G1")
+    return false;
+
+  bool has_e = false;
+  for (unsigned int index = 0; index < p_current_pos->command.parameters.size(); index++)
+  {
+    const std::string& name = p_current_pos->command.parameters[index].name;
+    if (name == "E")
+      has_e = true;
+    else if (name != "X" && name != "Y" && name != "F")
+      return false;
+  }
+
+  return (
+    has_e &&
+    !p_previous_pos->is_empty &&
+    !p_previous_pos->x_null &&
+    !p_previous_pos->y_null &&
+    !p_current_pos->is_metric_null &&
+    p_current_pos->is_metric &&
+    !p_current_pos->is_relative_null &&
+    !p_current_pos->is_extruder_relative_null &&
+    p_current_pos->current_tool == p_previous_pos->current_tool &&
+    utilities::is_equal(p_current_pos->z, p_previous_pos->z)
+  );
+}
+
+parsed_command trigger_positions::create_split_command(
+  const std::string& command, double x, double y, double e, double f
+)
+{
+  parsed_command split_command;
+  split_command.command = command;
+  split_command.is_known_command = true;
+  split_command.is_empty = false;
+  split_command.parameters.push_back(parsed_command_parameter("X", x));
+  split_command.parameters.push_back(parsed_command_parameter("Y", y));
+  split_command.parameters.push_back(parsed_command_parameter("E", e));
+  split_command.parameters.push_back(parsed_command_parameter("F", f));
+  // Use the same precision as the gcode created by python
+  std::ostringstream gcode;
+  gcode << std::fixed << command
+    << " X" << std::setprecision(3) << x
+    << " Y" << std::setprecision(3) << y
+    << " E" << std::setprecision(5) << e
+    << " F" << std::setprecision(3) << f;
+  split_command.gcode = gcode.str();
+  return split_command;
+}
+
+void trigger_positions::try_add_split_extrusion_position(position* p_current_pos, position* p_previous_pos)
+{
+  double stabilization_x, stabilization_y;
+  if (!get_fixed_stabilization_point(stabilization_x, stabilization_y))
+    return;
+
+  // Apply the same speed filter as the other extrusions
+  if (args_.minimum_speed > 0 && utilities::less_than_or_equal(p_current_pos->f, args_.minimum_speed))
+    return;
+
+  if (!can_split_extrusion(p_current_pos, p_previous_pos))
+    return;
+
+  // Find the point of the extrusion closest to the stabilization point
+  const double delta_x = p_current_pos->x - p_previous_pos->x;
+  const double delta_y = p_current_pos->y - p_previous_pos->y;
+  const double length_squared = delta_x * delta_x + delta_y * delta_y;
+  if (utilities::is_zero(length_squared))
+    return;
+  const double ratio = (
+    (stabilization_x - p_previous_pos->x) * delta_x + (stabilization_y - p_previous_pos->y) * delta_y
+  ) / length_squared;
+  const double length = std::sqrt(length_squared);
+  if (ratio * length < MINIMUM_SPLIT_EXTRUSION_LENGTH || (1 - ratio) * length < MINIMUM_SPLIT_EXTRUSION_LENGTH)
+    return;
+
+  const double split_x = p_previous_pos->x + delta_x * ratio;
+  const double split_y = p_previous_pos->y + delta_y * ratio;
+  const double distance = utilities::get_cartesian_distance(split_x, split_y, stabilization_x, stabilization_y);
+  if (!is_closer(position_list_[position_type_extrusion], distance, split_x, split_y))
+    return;
+
+  // Create the commands that extrude to the split point, and from the split point to the original end.
+  const extruder& current_extruder = p_current_pos->get_current_extruder();
+  const double split_e_relative = current_extruder.e_relative * ratio;
+  const double split_gcode_x = split_x - p_current_pos->x_offset + p_current_pos->x_firmware_offset;
+  const double split_gcode_y = split_y - p_current_pos->y_offset + p_current_pos->y_firmware_offset;
+  double start_x, start_y, start_e, end_x, end_y, end_e;
+  if (p_current_pos->is_relative)
+  {
+    start_x = split_gcode_x - p_previous_pos->get_gcode_x();
+    start_y = split_gcode_y - p_previous_pos->get_gcode_y();
+    end_x = p_current_pos->get_gcode_x() - split_gcode_x;
+    end_y = p_current_pos->get_gcode_y() - split_gcode_y;
+  }
+  else
+  {
+    start_x = split_gcode_x;
+    start_y = split_gcode_y;
+    end_x = p_current_pos->get_gcode_x();
+    end_y = p_current_pos->get_gcode_y();
+  }
+  if (p_current_pos->is_extruder_relative)
+  {
+    start_e = split_e_relative;
+    end_e = current_extruder.e_relative - split_e_relative;
+  }
+  else
+  {
+    end_e = current_extruder.get_offset_e();
+    start_e = end_e - current_extruder.e_relative + split_e_relative;
+  }
+
+  // The split position is the current position moved back to the split point
+  position split_pos(*p_current_pos);
+  split_pos.x = split_x;
+  split_pos.y = split_y;
+  extruder& split_extruder = split_pos.get_current_extruder();
+  split_extruder.e = current_extruder.e - current_extruder.e_relative + split_e_relative;
+  split_extruder.e_relative = split_e_relative;
+
+  add_internal(&split_pos, distance, position_type_extrusion);
+  trigger_position& split_position = position_list_[position_type_extrusion];
+  split_position.is_split = true;
+  split_position.start_command = create_split_command(
+    p_current_pos->command.command, start_x, start_y, start_e, p_current_pos->f
+  );
+  split_position.end_command = create_split_command(
+    p_current_pos->command.command, end_x, end_y, end_e, p_current_pos->f
+  );
+}
+
+void trigger_positions::set_candidate_writer(binary_writer* p_writer)
+{
+  p_candidate_writer_ = p_writer;
+}
+
+void trigger_positions::write_candidate(binary_writer& writer, const char candidate_type, position* p_pos, const int type)
+{
+  writer.write_char(candidate_type);
+  writer.write_char(static_cast<char>(type));
+  writer.write_long(p_pos->file_line_number);
+  writer.write_double(p_pos->x);
+  writer.write_double(p_pos->y);
+  // The speed is only used to find the fastest extrusion
+  if (candidate_type == candidate_type_position && type == position_type_extrusion)
+    writer.write_double(p_pos->f);
+}
+
+bool trigger_positions::read_candidate(binary_reader& reader, const char candidate_type)
+{
+  char type;
+  position pos;
+  if (
+    !reader.read_char(type) ||
+    !reader.read_long(pos.file_line_number) ||
+    !reader.read_double(pos.x) ||
+    !reader.read_double(pos.y)
+  )
+    return false;
+  pos.is_empty = false;
+  if (candidate_type == candidate_type_position)
+  {
+    if (type <= position_type_unknown || type >= position_type_fastest_extrusion)
+      return false;
+    if (type == position_type_extrusion && !reader.read_double(pos.f))
+      return false;
+    try_add_internal(&pos, get_stabilization_distance(&pos), static_cast<position_type>(type));
+    return true;
+  }
+  if (candidate_type == candidate_type_feature_position)
+  {
+    if (type < feature_type_inner_perimeter_feature || type >= NUM_FEATURE_TYPES)
+      return false;
+    pos.feature_type_tag = type;
+    try_add_feature_position_internal(&pos);
+    return true;
+  }
+  return false;
+}
+
+void trigger_positions::write_trigger_position(binary_writer& writer, const trigger_position& pos)
+{
+  writer.write_bool(pos.is_empty);
+  if (pos.is_empty)
+    return;
+  writer.write_int(pos.type_position);
+  writer.write_int(pos.type_feature);
+  writer.write_double(pos.distance);
+  writer.write_position(pos.pos);
+  writer.write_bool(pos.is_split);
+  if (pos.is_split)
+  {
+    writer.write_parsed_command(pos.start_command);
+    writer.write_parsed_command(pos.end_command);
+  }
+}
+
+bool trigger_positions::read_trigger_position(binary_reader& reader, trigger_position& pos)
+{
+  if (!reader.read_bool(pos.is_empty))
+    return false;
+  if (pos.is_empty)
+    return true;
+  int type_position, type_feature;
+  if (
+    !reader.read_int(type_position) ||
+    !reader.read_int(type_feature) ||
+    !reader.read_double(pos.distance) ||
+    !reader.read_position(pos.pos) ||
+    !reader.read_bool(pos.is_split)
+  )
+    return false;
+  pos.type_position = static_cast<position_type>(type_position);
+  pos.type_feature = static_cast<feature_type>(type_feature);
+  if (pos.is_split)
+    return reader.read_parsed_command(pos.start_command) && reader.read_parsed_command(pos.end_command);
+  return true;
+}
+
+void trigger_positions::write_state(binary_writer& writer) const
+{
+  for (unsigned int index = 0; index < trigger_position::num_position_types; index++)
+  {
+    write_trigger_position(writer, position_list_[index]);
+  }
+  for (unsigned int index = 0; index < NUM_FEATURE_TYPES; index++)
+  {
+    write_trigger_position(writer, feature_position_list_[index]);
+  }
+  writer.write_double(stabilization_x_);
+  writer.write_double(stabilization_y_);
+  writer.write_double(fastest_extrusion_speed_);
+  writer.write_double(slowest_extrusion_speed_);
+  writer.write_position(previous_initial_pos_);
+  writer.write_position(previous_retracted_pos_);
+  writer.write_position(previous_primed_pos_);
+}
+
+bool trigger_positions::read_state(binary_reader& reader)
+{
+  for (unsigned int index = 0; index < trigger_position::num_position_types; index++)
+  {
+    if (!read_trigger_position(reader, position_list_[index]))
+      return false;
+  }
+  for (unsigned int index = 0; index < NUM_FEATURE_TYPES; index++)
+  {
+    if (!read_trigger_position(reader, feature_position_list_[index]))
+      return false;
+  }
+  return (
+    reader.read_double(stabilization_x_) &&
+    reader.read_double(stabilization_y_) &&
+    reader.read_double(fastest_extrusion_speed_) &&
+    reader.read_double(slowest_extrusion_speed_) &&
+    reader.read_position(previous_initial_pos_) &&
+    reader.read_position(previous_retracted_pos_) &&
+    reader.read_position(previous_primed_pos_)
+  );
+}
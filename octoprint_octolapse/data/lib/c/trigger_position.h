@@ -1,6 +1,7 @@
 #pragma once
 #include "position.h"
 #include "gcode_comment_processor.h"
+#include "binary_serialization.h"
 
 /**
  * \brief A struct to hold the closest position, which  is used by the stabilization preprocessors.
@@ -65,6 +66,7 @@ struct trigger_position
     type_position = position_type_unknown;
     distance = -1;
     is_empty = true;
+    is_split = false;
     type_feature = feature_type_unknown_feature;
   }
 
@@ -74,6 +76,7 @@ struct trigger_position
     distance = distance_;
     pos = pos_;
     is_empty = false;
+    is_split = false;
     type_feature = feature_type_unknown_feature;
   }
 
@@ -83,6 +86,7 @@ struct trigger_position
     distance = distance_;
     pos = pos_;
     is_empty = false;
+    is_split = false;
     type_feature = feature_;
   }
 
@@ -92,6 +96,13 @@ struct trigger_position
   double distance;
   position pos;
   bool is_empty;
+  /**
+   * \brief True if pos is a point within the extrusion of pos.command.  The command must be replaced by
+   * start_command, which ends at pos, followed by end_command, which finishes the extrusion.
+   */
+  bool is_split;
+  parsed_command start_command;
+  parsed_command end_command;
 };
 
 struct trigger_position_args
@@ -102,15 +113,23 @@ public:
     type = trigger_type_compatibility;
     minimum_speed = 0;
     snap_to_print_high_quality = false;
+    snap_to_print_split_extrusions = false;
     x_stabilization_disabled = true;
     y_stabilization_disabled = true;
+    record_candidates = false;
   }
 
   trigger_type type;
   double minimum_speed;
   bool snap_to_print_high_quality;
+  bool snap_to_print_split_extrusions;
   bool x_stabilization_disabled;
   bool y_stabilization_disabled;
+  /**
+   * \brief If true, the feature positions are tested for every trigger type, so that they can be recorded for the
+   * compatibility and high quality trigger types.  Not used for snap to print.
+   */
+  bool record_candidates;
 };
 
 class trigger_positions
@@ -127,6 +146,27 @@ public:
   trigger_position get(position_type type);
   void set_stabilization_coordinates(double x, double y);
   void set_previous_initial_position(position& pos);
+  /**
+   * \brief If set, every position that is tested is written to the supplied writer, along with its type.  Only the
+   * coordinates, speed, feature and file line number are written, since the distance to the stabilization point is
+   * calculated when the candidate is read.  Not used for snap to print.
+   */
+  void set_candidate_writer(binary_writer* p_writer);
+  /**
+   * \brief Reads a candidate written to the candidate writer and tests it again for the current stabilization point.
+   * \param reader The reader, positioned after the candidate type.
+   * \param candidate_type Either candidate_type_position or candidate_type_feature_position
+   * \return false if the candidate could not be read.
+   */
+  bool read_candidate(binary_reader& reader, char candidate_type);
+  static const char candidate_type_position = 'T';
+  static const char candidate_type_feature_position = 'F';
+  /**
+   * \brief Writes the saved positions and all other tracking variables so that they can be restored by read_state.
+   * The args are not written.
+   */
+  void write_state(binary_writer& writer) const;
+  bool read_state(binary_reader& reader);
 private:
   bool has_fastest_extrusion_position() const;
   bool get_snap_to_print_position(trigger_position& pos);
@@ -135,6 +175,7 @@ private:
   bool get_high_quality_position(trigger_position& pos);
 
   double get_stabilization_distance(position* p_pos) const;
+  bool get_fixed_stabilization_point(double& x, double& y) const;
 
   //trigger_position* get_normal_quality_position();
   void try_save_retracted_position(position* p_current_pos);
@@ -146,6 +187,15 @@ private:
   void try_add_internal(position* p_pos, double distance, position_type type);
   void try_add_extrusion_start_positions(position* p_extrusion_start_pos);
   void try_add_extrusion_start_position(position* p_extrusion_start_pos, position& saved_pos);
+  void try_add_split_extrusion_position(position* p_current_pos, position* p_previous_pos);
+  static bool can_split_extrusion(position* p_current_pos, position* p_previous_pos);
+  static parsed_command create_split_command(
+    const std::string& command, double x, double y, double e, double f
+  );
+  bool is_closer(const trigger_position& current, double distance, double x, double y) const;
+  static void write_candidate(binary_writer& writer, char candidate_type, position* p_pos, int type);
+  static void write_trigger_position(binary_writer& writer, const trigger_position& pos);
+  static bool read_trigger_position(binary_reader& reader, trigger_position& pos);
 
   trigger_position position_list_[trigger_position::num_position_types];
   trigger_position feature_position_list_[NUM_FEATURE_TYPES];
@@ -159,4 +209,6 @@ private:
   position previous_initial_pos_;
   position previous_retracted_pos_;
   position previous_primed_pos_;
+  // Receives every tested position if the candidates are being recorded
+  binary_writer* p_candidate_writer_;
 };
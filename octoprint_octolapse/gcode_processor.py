@@ -152,230 +152,20 @@ class Extruder(utility.JsonSerializable):
         }
 
 
-class Pos(utility.JsonSerializable):
-    # Add slots for faster copy and init
-    __slots__ = [
-        "x",
-        "y",
-        "z",
-        "f",
-        "x_offset",
-        "y_offset",
-        "z_offset",
-        "x_firmware_offset",
-        "y_firmware_offset",
-        "z_firmware_offset",
-        "z_relative",
-        "last_extrusion_height",
-        "height",
-        "firmware_retraction_length",
-        "firmware_unretraction_additional_length",
-        "firmware_retraction_feedrate",
-        "firmware_unretraction_feedrate",
-        "firmware_z_lift",
-        "layer",
-        "height_increment",
-        "height_increment_change_count",
-        "current_tool",
-        "num_extruders",
-        "x_homed",
-        "y_homed",
-        "z_homed",
-        "is_relative",
-        "is_extruder_relative",
-        "is_metric",
-        "is_printer_primed",
-        "has_definite_position",
-        "is_layer_change",
-        "is_height_change",
-        "is_height_increment_change",
-        "is_xy_travel",
-        "is_xyz_travel",
-        "is_zhop",
-        "has_xy_position_changed",
-        "has_position_changed",
-        "has_received_home_command",
-        "is_in_position",
-        "in_path_position",
-        "file_line_number",
-        "gcode_number",
-        "file_position",
-        "is_in_bounds",
-        "parsed_command",
-        "extruders"
-    ]
+class Pos(GcodePositionProcessor.Pos, utility.JsonSerializable):
+    # All position values are stored in the native position struct and are read on demand.  The parsed command and
+    # the extruders are only converted to python objects when they are requested.
+    __slots__ = []
 
     min_length_to_retract = 0.0001
 
-    def __init__(self):
-        self.parsed_command = None
-        self.f = None
-        self.x = None
-        self.x_offset = 0
-        self.x_firmware_offset = 0
-        self.x_homed = False
-        self.y = None
-        self.y_offset = 0
-        self.y_firmware_offset = 0
-        self.y_homed = False
-        self.z = None
-        self.z_offset = 0
-        self.z_firmware_offset = 0
-        self.z_homed = False
-        self.z_relative = 0
-        self.is_relative = False
-        self.is_extruder_relative = False
-        self.is_metric = True
-        self.last_extrusion_height = None
-        self.layer = 0
-        self.height_increment = 0
-        self.height_increment_change_count = 0
-        self.height = 0
-        self.is_printer_primed = False
-        self.firmware_retraction_length = None
-        self.firmware_unretraction_additional_length = None
-        self.firmware_retraction_feedrate = None
-        self.firmware_unretraction_feedrate = None
-        self.firmware_z_lift = None
-        self.has_definite_position = False
-        # Extruders
-        self.current_tool = None
-        self.extruders = []
-
-        # State
-        self.is_layer_change = False
-        self.is_height_change = False
-        self.is_height_increment_change = False
-        self.is_xy_travel = False
-        self.is_xyz_travel = False
-        self.is_zhop = False
-        self.has_xy_position_changed = False
-        self.has_position_changed = False
-        self.has_received_home_command = False
-        self.is_in_position = False
-        self.in_path_position = False
-        self.is_in_bounds = True
-        # Gcode File Tracking
-        self.file_line_number = -1
-        self.gcode_number = -1
-        self.file_position = -1
-
     @staticmethod
-    def copy_from_cpp_pos(cpp_pos, target):
-        target.x = None if cpp_pos[43] > 0 else cpp_pos[0]
-        target.y = None if cpp_pos[44] > 0 else cpp_pos[1]
-        target.z = None if cpp_pos[45] > 0 else cpp_pos[2]
-        target.f = None if cpp_pos[46] > 0 else cpp_pos[3]
-        target.x_offset = cpp_pos[4]
-        target.y_offset = cpp_pos[5]
-        target.z_offset = cpp_pos[6]
-        target.x_firmware_offset = cpp_pos[7]
-        target.y_firmware_offset = cpp_pos[8]
-        target.z_firmware_offset = cpp_pos[9]
-        target.z_relative = cpp_pos[10]
-        target.last_extrusion_height = None if cpp_pos[49] > 0 else cpp_pos[11]
-        target.height = cpp_pos[12]
-        target.firmware_retraction_length = None if cpp_pos[51] > 0 else cpp_pos[13]
-        target.firmware_unretraction_additional_length = None if cpp_pos[52] > 0 else cpp_pos[14]
-        target.firmware_retraction_feedrate = None if cpp_pos[53] > 0 else cpp_pos[15]
-        target.firmware_unretraction_feedrate = None if cpp_pos[54] > 0 else cpp_pos[16]
-        target.firmware_z_lift = None if cpp_pos[55] > 0 else cpp_pos[17]
-        target.layer = cpp_pos[18]
-        target.height_increment = cpp_pos[19]
-        target.height_increment_change_count = cpp_pos[20]
-        target.current_tool = cpp_pos[21]
-        target.num_extruders = cpp_pos[22]
-        target.x_homed = cpp_pos[23] > 0
-        target.y_homed = cpp_pos[24] > 0
-        target.z_homed = cpp_pos[25] > 0
-        target.is_relative = None if cpp_pos[47] > 0 else cpp_pos[26] > 0
-        target.is_extruder_relative = None if cpp_pos[48] > 0 else cpp_pos[27] > 0
-        target.is_metric = None if cpp_pos[50] > 0 else cpp_pos[28] > 0
-        target.is_printer_primed = cpp_pos[29] > 0
-        target.has_definite_position = cpp_pos[30] > 0
-
-        target.is_layer_change = cpp_pos[31] > 0
-        target.is_height_change = cpp_pos[32] > 0
-        target.is_height_increment_change = cpp_pos[33]
-        target.is_xy_travel = cpp_pos[34] > 0
-        target.is_xyz_travel = cpp_pos[35] > 0
-        target.is_zhop = cpp_pos[36] > 0
-        target.has_xy_position_changed = cpp_pos[37] > 0
-        target.has_position_changed = cpp_pos[38] > 0
-        target.has_received_home_command = cpp_pos[39] > 0
-        # Todo:  figure out how to deal with these things which must be currently ignored
-        target.is_in_position = cpp_pos[40] > 0
-        target.in_path_position = cpp_pos[41] > 0
-        target.is_in_bounds = cpp_pos[42] > 0
-        target.file_line_number = cpp_pos[56]
-        target.gcode_number = cpp_pos[57]
-        target.file_position = cpp_pos[58]
-        parsed_command = cpp_pos[59]
-        if parsed_command is not None:
-            target.parsed_command = ParsedCommand(parsed_command[0], parsed_command[1], parsed_command[2], parsed_command[3])
-        else:
-            target.parsed_command = None
-        extruders = cpp_pos[60]
-        if extruders is not None:
-            target.extruders = []
-            for extruder in extruders:
-                target.extruders.append(Extruder.create_from_cpp_extruder(extruder))
-        else:
-            target.extruders = None
-
-        return target
+    def _create_parsed_command(cpp_parsed_command):
+        return ParsedCommand.create_from_cpp_parsed_command(cpp_parsed_command)
 
     @staticmethod
-    def create_from_cpp_pos(cpp_pos):
-        pos = Pos()
-        Pos.copy_from_cpp_pos(cpp_pos, pos)
-        return pos
-
-    @staticmethod
-    def copy(source, target):
-        """does not copy all items, only what is necessary for the Position.Update command"""
-        target.f = source.f
-        target.x = source.x
-        target.x_offset = source.x_offset
-        target.x_homed = source.x_homed
-        target.y = source.y
-        target.y_offset = source.y_offset
-        target.y_homed = source.y_homed
-        target.z = source.z
-        target.z_offset = source.z_offset
-        target.z_homed = source.z_homed
-        target.is_relative = source.is_relative
-        target.is_extruder_relative = source.is_extruder_relative
-        target.is_metric = source.is_metric
-        target.last_extrusion_height = source.last_extrusion_height
-        target.layer = source.layer
-        target.height_increment = source.height_increment
-        target.height_increment_change_count = source.height_increment_change_count
-        target.height = source.height
-        target.is_printer_primed = source.is_printer_primed
-        target.firmware_retraction_length = source.firmware_retraction_length
-        target.firmware_unretraction_additional_length = source.firmware_unretraction_additional_length
-        target.firmware_retraction_feedrate = source.firmware_retraction_feedrate
-        target.firmware_unretraction_feedrate = source.firmware_unretraction_feedrate
-        target.firmware_z_lift = source.firmware_z_lift
-        target.has_definite_position = source.has_definite_position
-        target.in_path_position = source.in_path_position
-        target.is_zhop = source.is_zhop
-        target.is_in_position = source.is_in_position
-
-        # copy extruders
-        target.extruders = []
-        for extruder in source.extruders:
-            target.extruders.append(Extruder(copy_from=extruder))
-
-        # Resets state changes
-        target.is_layer_change = False
-        target.is_height_change = False
-        target.is_height_increment_change = False
-        target.is_xy_travel = False
-        target.has_position_changed = False
-        target.has_received_home_command = False
-        target.is_in_bounds = True
+    def _create_extruder(cpp_extruder):
+        return Extruder.create_from_cpp_extruder(cpp_extruder)
 
     def get_current_extruder(self):
         if len(self.extruders) == 0:
@@ -630,6 +420,10 @@ class ParsedCommand(utility.JsonSerializable):
         return self.cmd == "@OCTOLAPSE" and len(self.parameters) == 1
 
 
+# Positions created by the GcodePositionProcessor (current, previous and snapshot plan positions) will be Pos objects
+GcodePositionProcessor.SetPosType(Pos)
+
+
 class GcodeProcessor(object):
     _key = "plugin_octolapse"
 
@@ -657,17 +451,15 @@ class GcodeProcessor(object):
 
     @staticmethod
     def get_current_position(key=_key):
-        current_pos_cpp = GcodePositionProcessor.GetCurrentPositionTuple(key)
-        return Pos.create_from_cpp_pos(current_pos_cpp)
+        return GcodePositionProcessor.GetCurrentPosition(key)
 
     @staticmethod
     def get_previous_position(key=_key):
-        previous_pos_cpp = GcodePositionProcessor.GetPreviousPositionTuple(key)
-        return Pos.create_from_cpp_pos(previous_pos_cpp)
+        return GcodePositionProcessor.GetPreviousPosition(key)
 
     @staticmethod
     def update_position(position, x, y, z, e, f, key=_key):
-        cpp_pos = GcodePositionProcessor.UpdatePosition(
+        GcodePositionProcessor.UpdatePosition(
             key,
             0.0 if x is None else x,
             True if x is None else False,
@@ -679,8 +471,8 @@ class GcodeProcessor(object):
             True if e is None else False,
             0.0 if f is None else f,
             True if f is None else False,
+            position
         )
-        Pos.copy_from_cpp_pos(cpp_pos, position)
         return position
 
     @staticmethod
@@ -689,10 +481,33 @@ class GcodeProcessor(object):
 
     @staticmethod
     def update(gcode, position, key=_key):
-        cpp_pos = GcodePositionProcessor.Update(key, gcode)
-        Pos.copy_from_cpp_pos(cpp_pos, position)
+        # the position is overwritten in place
+        GcodePositionProcessor.Update(key, gcode, position)
         return position
 
+    @staticmethod
+    def initialize_triggers(trigger_args, key=_key):
+        return GcodePositionProcessor.InitializeTriggers(key, trigger_args)
+
+    @staticmethod
+    def update_triggers(is_in_position, in_path_position, key=_key):
+        # returns None unless at least one trigger state has changed
+        return GcodePositionProcessor.UpdateTriggers(key, is_in_position, in_path_position)
+
+    @staticmethod
+    def pause_triggers(key=_key):
+        return GcodePositionProcessor.PauseTriggers(key)
+
+    @staticmethod
+    def resume_triggers(key=_key):
+        return GcodePositionProcessor.ResumeTriggers(key)
+
+    @staticmethod
+    def update_many(gcodes, file_line_numbers, positions, key=_key):
+        # Applies every gcode in order.  The positions following the final len(positions) gcodes are
+        # written into the supplied positions, oldest first.
+        return GcodePositionProcessor.UpdateMany(key, gcodes, file_line_numbers, positions)
+
 
 # class GcodeStabilizationProcessor(object):
 #
@@ -0,0 +1,194 @@
+# coding=utf-8
+##################################################################################
+# Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+# Copyright (C) 2023  Brad Hochgesang
+##################################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see the following:
+# https://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+#
+# You can contact the author either through the git-hub repository, or at the
+# following email address: FormerLurker@pm.me
+##################################################################################
+from __future__ import unicode_literals
+import os
+import json
+import time
+import threading
+import octoprint_octolapse.utility as utility
+# create the module level logger
+from octoprint_octolapse.log import LoggingConfigurator
+logging_configurator = LoggingConfigurator()
+logger = logging_configurator.get_logger(__name__)
+
+
+class LatencyHistogram(object):
+    """A log-linear (HDR style) histogram of latencies in nanoseconds.  Values below 2^SUB_BUCKET_BITS are
+    stored exactly.  Above that, every power of two is split into 2^(SUB_BUCKET_BITS-1) linear sub buckets,
+    so every recorded value is accurate to within about 3% while using a small, fixed amount of memory.
+    Recording is a few integer operations under the histogram's lock and does not allocate."""
+    SUB_BUCKET_BITS = 6
+    SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+    SUB_BUCKET_HALF_COUNT = SUB_BUCKET_COUNT >> 1
+    # 2^40 nanoseconds is roughly 18 minutes, which is plenty for a gcode hook.
+    MAX_VALUE_BITS = 40
+    BUCKET_COUNT = SUB_BUCKET_COUNT + (MAX_VALUE_BITS - SUB_BUCKET_BITS) * SUB_BUCKET_HALF_COUNT
+
+    __slots__ = ['counts', 'count', 'total', 'min', 'max', '_lock']
+
+    def __init__(self):
+        self.counts = [0] * LatencyHistogram.BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def record(self, value):
+        if value < 0:
+            value = 0
+        index = LatencyHistogram.get_bucket_index(value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    @staticmethod
+    def get_bucket_index(value):
+        magnitude = value.bit_length() - LatencyHistogram.SUB_BUCKET_BITS
+        if magnitude <= 0:
+            # small values are stored exactly
+            return value
+        if magnitude > LatencyHistogram.MAX_VALUE_BITS - LatencyHistogram.SUB_BUCKET_BITS:
+            return LatencyHistogram.BUCKET_COUNT - 1
+        # value >> magnitude is always within [SUB_BUCKET_HALF_COUNT, SUB_BUCKET_COUNT)
+        return (
+            LatencyHistogram.SUB_BUCKET_COUNT +
+            (magnitude - 1) * LatencyHistogram.SUB_BUCKET_HALF_COUNT +
+            (value >> magnitude) - LatencyHistogram.SUB_BUCKET_HALF_COUNT
+        )
+
+    @staticmethod
+    def get_bucket_value(index):
+        """Returns the highest value that is stored in the bucket with the supplied index."""
+        if index < LatencyHistogram.SUB_BUCKET_COUNT:
+            return index
+        magnitude, sub_bucket = divmod(index - LatencyHistogram.SUB_BUCKET_COUNT, LatencyHistogram.SUB_BUCKET_HALF_COUNT)
+        return ((LatencyHistogram.SUB_BUCKET_HALF_COUNT + sub_bucket + 1) << (magnitude + 1)) - 1
+
+    def get_percentile(self, percentile):
+        if self.count == 0:
+            return None
+        target = max(1, int(self.count * percentile / 100.0 + 0.5))
+        total = 0
+        for index, count in enumerate(self.counts):
+            total += count
+            if total >= target:
+                return min(LatencyHistogram.get_bucket_value(index), self.max)
+        return self.max
+
+    def copy(self):
+        """Returns a copy of the histogram that isn't changed by later recordings."""
+        histogram = LatencyHistogram()
+        with self._lock:
+            histogram.counts = list(self.counts)
+            histogram.count = self.count
+            histogram.total = self.total
+            histogram.min = self.min
+            histogram.max = self.max
+        return histogram
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ns": self.total,
+            "mean_ns": None if self.count == 0 else self.total / self.count,
+            "min_ns": self.min,
+            "max_ns": self.max,
+            "p50_ns": self.get_percentile(50),
+            "p90_ns": self.get_percentile(90),
+            "p99_ns": self.get_percentile(99),
+            "p999_ns": self.get_percentile(99.9),
+            # only non-empty buckets are included, keyed by the highest value in the bucket
+            "buckets": [
+                [LatencyHistogram.get_bucket_value(index), count]
+                for index, count in enumerate(self.counts) if count > 0
+            ]
+        }
+
+
+class HookMetrics(object):
+    """Records latency histograms for the OctoPrint gcode hooks and their inner phases for the current print.
+    The hooks are called from more than one OctoPrint thread, and some phases are recorded by more than one hook, so
+    each histogram has its own lock.  The locks are rarely contended."""
+    ON_GCODE_QUEUING = "on_gcode_queuing"
+    ON_GCODE_SENDING = "on_gcode_sending"
+    ON_GCODE_SENT = "on_gcode_sent"
+    ON_GCODE_RECEIVED = "on_gcode_received"
+    PROCESS_REALTIME_GCODE = "process_realtime_gcode"
+    PROCESS_PRE_CALCULATED_GCODE = "process_pre_calculated_gcode"
+    TRIGGERS_UPDATE = "triggers_update"
+
+    metrics_file_name = "hook_metrics.json"
+
+    @staticmethod
+    def is_metrics_file(file_name):
+        return file_name.lower() == HookMetrics.metrics_file_name
+
+    def __init__(self):
+        self._histograms = {}
+        self._start_time = time.time()
+        self._reset_lock = threading.Lock()
+
+    @staticmethod
+    def now():
+        return time.perf_counter_ns()
+
+    def record(self, name, start_ns):
+        """Record the time elapsed since start_ns, which must have been returned by HookMetrics.now()."""
+        elapsed = time.perf_counter_ns() - start_ns
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms.setdefault(name, LatencyHistogram())
+        histogram.record(elapsed)
+
+    def reset(self):
+        with self._reset_lock:
+            # replace rather than clear so that any hook currently recording is unaffected
+            self._histograms = {}
+            self._start_time = time.time()
+
+    def to_dict(self):
+        histograms = self._histograms
+        return {
+            "start_time": self._start_time,
+            "end_time": time.time(),
+            "hooks": dict((name, histogram.copy().to_dict()) for name, histogram in list(histograms.items()))
+        }
+
+    def save(self, temporary_directory, job_guid):
+        file_directory = utility.get_temporary_snapshot_job_path(temporary_directory, job_guid)
+        file_path = os.path.join(file_directory, HookMetrics.metrics_file_name)
+        try:
+            if not os.path.exists(file_directory):
+                os.makedirs(file_directory)
+            with open(file_path, 'w') as metrics_file:
+                json.dump(self.to_dict(), metrics_file)
+        except (OSError, IOError, ValueError):
+            logger.exception("Unable to save the gcode hook metrics to %s.", file_path)
+            return False
+        return True
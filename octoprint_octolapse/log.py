@@ -24,9 +24,11 @@ from __future__ import unicode_literals
 import logging
 import datetime as datetime
 import os
+import threading
+from collections import deque
 # Remove python 2 support
 # import six
-from octoprint.logging.handlers import AsyncLogHandlerMixin, CleaningTimedRotatingFileHandler
+from octoprint.logging.handlers import CleaningTimedRotatingFileHandler
 
 
 class Singleton(type):
@@ -76,12 +78,12 @@ class OctolapseFormatter(logging.Formatter):
         return s
 
 
-class OctolapseConsoleHandler(logging.StreamHandler, AsyncLogHandlerMixin):
+class OctolapseConsoleHandler(logging.StreamHandler):
     def __init__(self, *args, **kwargs):
         super(OctolapseConsoleHandler, self).__init__(*args, **kwargs)
 
 
-class OctolapseFileHandler(CleaningTimedRotatingFileHandler, AsyncLogHandlerMixin):
+class OctolapseFileHandler(CleaningTimedRotatingFileHandler):
     def __init__(self, *args, **kwargs):
         super(OctolapseFileHandler, self).__init__(*args, **kwargs)
 
@@ -93,6 +95,111 @@ class OctolapseFileHandler(CleaningTimedRotatingFileHandler, AsyncLogHandlerMixi
             os.remove(s)
         self.backupCount = backup_count
 
+class OctolapseRingBufferHandler(logging.Handler):
+    """Stores log records in an in-memory ring buffer and writes them to the target handlers in batches from a
+    background thread, so logging from the comm thread never waits on file I/O.  If the buffer is full, records below
+    ERROR are dropped and counted, and the number of dropped records is logged with the next batch.  ERROR and
+    CRITICAL records are never dropped:  the buffer is written by the logging thread instead."""
+    DEFAULT_CAPACITY = 10000
+    DEFAULT_FLUSH_INTERVAL_SECONDS = 0.25
+
+    def __init__(
+        self, target_handlers, capacity=DEFAULT_CAPACITY, flush_interval_seconds=DEFAULT_FLUSH_INTERVAL_SECONDS
+    ):
+        super(OctolapseRingBufferHandler, self).__init__()
+        self._target_handlers = list(target_handlers)
+        self._capacity = capacity
+        self._flush_interval_seconds = flush_interval_seconds
+        # deque.append and deque.popleft are atomic, so no lock is needed between the loggers and the writer
+        self._buffer = deque()
+        # This is only incremented by the logging threads, so a count may occasionally be missed.  That's ok.
+        self.dropped_records = 0
+        self._reported_dropped_records = 0
+        # Serializes the writer thread and explicit flushes
+        self._write_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._writer_thread = threading.Thread(target=self._run, name="octolapse-log-writer")
+        self._writer_thread.daemon = True
+        self._writer_thread.start()
+
+    def handle(self, record):
+        # logging.Handler.handle acquires the handler lock before calling emit, which isn't needed here.
+        rv = self.filter(record)
+        if rv:
+            self.emit(record)
+        return rv
+
+    def emit(self, record):
+        num_records = len(self._buffer)
+        is_full = num_records >= self._capacity
+        if is_full and record.levelno < logging.ERROR:
+            self.dropped_records += 1
+            return
+        try:
+            # Format the message now, since the arguments may change before the record is written
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+        except Exception:
+            self.handleError(record)
+            return
+        self._buffer.append(record)
+        if is_full:
+            # Write the buffered records, including this one, before returning so that errors are never lost
+            self.flush()
+        elif num_records + 1 >= self._capacity // 2:
+            # write the records now rather than waiting for the flush interval
+            self._flush_event.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._flush_event.wait(self._flush_interval_seconds)
+            self._flush_event.clear()
+            self.flush()
+
+    def _write_dropped_records_warning(self):
+        dropped_records = self.dropped_records - self._reported_dropped_records
+        if dropped_records < 1:
+            return
+        self._reported_dropped_records += dropped_records
+        record = logging.LogRecord(
+            "octolapse.log", logging.WARNING, __file__, 0,
+            "%d log records were dropped because the log buffer was full.", (dropped_records,), None
+        )
+        self._write_record(record)
+
+    def _write_record(self, record):
+        for handler in self._target_handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def flush(self):
+        """Writes all buffered records to the target handlers."""
+        with self._write_lock:
+            self._write_dropped_records_warning()
+            while True:
+                try:
+                    record = self._buffer.popleft()
+                except IndexError:
+                    break
+                self._write_record(record)
+            for handler in self._target_handlers:
+                handler.flush()
+
+    def close(self):
+        self._stop_event.set()
+        self._flush_event.set()
+        if self._writer_thread.is_alive() and self._writer_thread is not threading.current_thread():
+            self._writer_thread.join()
+        self.flush()
+        for handler in self._target_handlers:
+            handler.close()
+        super(OctolapseRingBufferHandler, self).close()
+
+
 # remove python 2 support
 # @six.add_metaclass(Singleton)
 class LoggingConfigurator(metaclass=Singleton):
@@ -106,6 +213,8 @@ class LoggingConfigurator(metaclass=Singleton):
         self._level = logging.DEBUG
         self._file_handler = None
         self._console_handler = None
+        # All records are written to the file and console handlers through this handler
+        self._ring_buffer_handler = None
         self.child_loggers = set()
 
     def _get_root_logger(self, name):
@@ -138,33 +247,47 @@ class LoggingConfigurator(metaclass=Singleton):
         return child
 
     def _remove_handlers(self):
-        if self._file_handler is not None:
-            self._root_logger.removeHandler(self._file_handler)
-            self._file_handler = None
-
-        if self._console_handler is not None:
-            self._root_logger.removeHandler(self._console_handler)
-            self._console_handler = None
+        if self._ring_buffer_handler is not None:
+            self._root_logger.removeHandler(self._ring_buffer_handler)
+            # closes the file and console handlers after writing any buffered records
+            self._ring_buffer_handler.close()
+            self._ring_buffer_handler = None
+        self._file_handler = None
+        self._console_handler = None
 
     def _add_file_handler(self, log_file_path, log_level):
         self._file_handler = OctolapseFileHandler(log_file_path, when="D", backupCount=LoggingConfigurator.BACKUP_COUNT)
         self._file_handler.setFormatter(self.logging_formatter)
         self._file_handler.setLevel(log_level)
-        self._root_logger.addHandler(self._file_handler)
 
     def _add_console_handler(self, log_level):
         self._console_handler = OctolapseConsoleHandler()
         self._console_handler.setFormatter(self.logging_formatter)
         self._console_handler.setLevel(log_level)
-        self._root_logger.addHandler(self._console_handler)
+
+    def _add_ring_buffer_handler(self):
+        target_handlers = [
+            handler for handler in [self._file_handler, self._console_handler] if handler is not None
+        ]
+        if not target_handlers:
+            return
+        self._ring_buffer_handler = OctolapseRingBufferHandler(target_handlers)
+        self._root_logger.addHandler(self._ring_buffer_handler)
 
     def do_rollover(self, clear_all=False):
         if self._file_handler is None:
             return
-        # To clear everything, we'll roll over every file
-        self._file_handler.doRollover()
-        if clear_all:
-            self._file_handler.delete_all_backups()
+        # write any buffered records to the current file before rolling over
+        if self._ring_buffer_handler is not None:
+            self._ring_buffer_handler.flush()
+        self._file_handler.acquire()
+        try:
+            # To clear everything, we'll roll over every file
+            self._file_handler.doRollover()
+            if clear_all:
+                self._file_handler.delete_all_backups()
+        finally:
+            self._file_handler.release()
 
 
     def configure_loggers(self, log_file_path=None, logging_settings=None):
@@ -193,6 +316,7 @@ class LoggingConfigurator(metaclass=Singleton):
         # if we are logging to console, add the console logging handler
         if log_to_console:
             self._add_console_handler(logging.NOTSET)
+        self._add_ring_buffer_handler()
         for logger_full_name in self.child_loggers:
 
             if logger_full_name.startswith("octolapse."):
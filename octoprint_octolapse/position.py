@@ -21,6 +21,8 @@
 # following email address: FormerLurker@pm.me
 ##################################################################################
 from __future__ import unicode_literals
+import math
+import re
 import octoprint_octolapse.utility as utility
 from octoprint_octolapse.settings import OctolapseGcodeSettings
 # remove unused import
@@ -31,6 +33,157 @@ from octoprint_octolapse.log import LoggingConfigurator
 logging_configurator = LoggingConfigurator()
 logger = logging_configurator.get_logger(__name__)
 
+
+class PositionRestrictionIndex(object):
+    """A uniform grid over the bounding boxes of the snapshot position restrictions.  Each grid cell holds the
+    restrictions that overlap it, so the in position and intersection checks only need to visit the restrictions
+    near the current path instead of every restriction.  The index is built once when the Position is created."""
+    MAX_CELLS_PER_AXIS = 64
+    CELLS_PER_RESTRICTION = 4
+
+    def __init__(self, restrictions, tolerance=utility.FLOAT_MATH_EQUALITY_RANGE):
+        self._restrictions = list(restrictions)
+        self._tolerance = tolerance
+        self._has_required_position = False
+        for restriction in self._restrictions:
+            if restriction.Type == "required":
+                self._has_required_position = True
+                break
+        # Pad the bounds so that points within the tolerance of a circle's radius are still found.
+        padding = math.sqrt(tolerance) + tolerance
+        self._bounds = [
+            PositionRestrictionIndex._get_bounds(restriction, padding) for restriction in self._restrictions
+        ]
+        self._cells = []
+        self._columns = 0
+        self._rows = 0
+        self._min_x = 0.0
+        self._min_y = 0.0
+        self._cell_width = 1.0
+        self._cell_height = 1.0
+        if self._bounds:
+            self._build_grid()
+
+    @staticmethod
+    def _get_bounds(restriction, padding):
+        if restriction.Shape == 'rect':
+            left = min(restriction.x, restriction.x2)
+            right = max(restriction.x, restriction.x2)
+            bottom = min(restriction.y, restriction.y2)
+            top = max(restriction.y, restriction.y2)
+        else:
+            left = restriction.x - restriction.r
+            right = restriction.x + restriction.r
+            bottom = restriction.y - restriction.r
+            top = restriction.y + restriction.r
+        return left - padding, bottom - padding, right + padding, top + padding
+
+    def _build_grid(self):
+        self._min_x = min(bounds[0] for bounds in self._bounds)
+        self._min_y = min(bounds[1] for bounds in self._bounds)
+        max_x = max(bounds[2] for bounds in self._bounds)
+        max_y = max(bounds[3] for bounds in self._bounds)
+        cells_per_axis = int(math.ceil(math.sqrt(len(self._bounds) * PositionRestrictionIndex.CELLS_PER_RESTRICTION)))
+        cells_per_axis = max(1, min(PositionRestrictionIndex.MAX_CELLS_PER_AXIS, cells_per_axis))
+        self._columns = cells_per_axis
+        self._rows = cells_per_axis
+        self._cell_width = max((max_x - self._min_x) / self._columns, utility.FLOAT_MATH_EQUALITY_RANGE)
+        self._cell_height = max((max_y - self._min_y) / self._rows, utility.FLOAT_MATH_EQUALITY_RANGE)
+
+        cells = [[] for _ in range(self._columns * self._rows)]
+        for index, bounds in enumerate(self._bounds):
+            first_column, first_row = self._get_cell(bounds[0], bounds[1])
+            last_column, last_row = self._get_cell(bounds[2], bounds[3])
+            for row in range(first_row, last_row + 1):
+                for column in range(first_column, last_column + 1):
+                    cells[row * self._columns + column].append(index)
+        # the restriction indexes are added in order, so each cell preserves the restriction order
+        self._cells = [tuple(cell) for cell in cells]
+
+    def _get_cell(self, x, y):
+        # returns the column and row containing the point, clamped to the grid
+        column = int((x - self._min_x) / self._cell_width)
+        row = int((y - self._min_y) / self._cell_height)
+        return max(0, min(self._columns - 1, column)), max(0, min(self._rows - 1, row))
+
+    def _get_point_candidates(self, x, y):
+        if (
+            not self._cells or
+            x < self._min_x or
+            y < self._min_y or
+            x > self._min_x + self._cell_width * self._columns or
+            y > self._min_y + self._cell_height * self._rows
+        ):
+            return ()
+        column, row = self._get_cell(x, y)
+        return self._cells[row * self._columns + column]
+
+    def _get_path_candidates(self, x, y, previous_x, previous_y):
+        if not self._cells:
+            return []
+        left = min(x, previous_x)
+        right = max(x, previous_x)
+        bottom = min(y, previous_y)
+        top = max(y, previous_y)
+        first_column, first_row = self._get_cell(left, bottom)
+        last_column, last_row = self._get_cell(right, top)
+        candidates = set()
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                candidates.update(self._cells[row * self._columns + column])
+        # Remove any restrictions whose bounds do not overlap the path, and preserve the restriction order
+        return [
+            index for index in sorted(candidates)
+            if (
+                self._bounds[index][0] <= right and left <= self._bounds[index][2] and
+                self._bounds[index][1] <= top and bottom <= self._bounds[index][3]
+            )
+        ]
+
+    def is_in_position(self, x, y):
+        """Equivalent to Position.calculate_is_in_position for the indexed restrictions."""
+        in_position = False
+        if x is not None and y is not None:
+            for index in self._get_point_candidates(x, y):
+                restriction = self._restrictions[index]
+                if restriction.is_in_position(x, y, self._tolerance):
+                    if restriction.Type == "forbidden":
+                        # if we're in a forbidden position, return false now
+                        return False
+                    # we're in position in at least one required position restriction
+                    in_position = True
+
+        if self._has_required_position:
+            return in_position
+        # we only have forbidden restrictions, and the point was not within any of them
+        return True
+
+    def get_in_position_intersection(self, x, y, previous_x, previous_y):
+        """Equivalent to Position.calculate_in_position_intersection for the indexed restrictions."""
+        for index in self._get_path_candidates(x, y, previous_x, previous_y):
+            cur_intersections = self._restrictions[index].get_intersections(x, y, previous_x, previous_y)
+            if cur_intersections:
+                for intersection in cur_intersections:
+                    if self.is_in_position(intersection[0], intersection[1]):
+                        return {
+                            'intersection': intersection
+                        }
+        return False
+
+    def get_path_intersections(self, x, y, previous_x, previous_y, can_calculate_intersections):
+        """Equivalent to Position.calculate_path_intersections for the indexed restrictions."""
+        if self.is_in_position(x, y):
+            return True, None
+
+        if previous_x is None or previous_y is None:
+            return False, False
+
+        if not can_calculate_intersections:
+            return False, None
+
+        return False, self.get_in_position_intersection(x, y, previous_x, previous_y)
+
+
 class Position(utility.JsonSerializable):
     def __init__(self, printer_profile, trigger_profile, overridable_printer_profile_settings):
         # This key is used to call the unique gcode_position object for Octolapse.
@@ -71,18 +224,61 @@ class Position(utility.JsonSerializable):
         self._has_restricted_position = False if trigger_profile is None else (
             len(trigger_profile.position_restrictions) > 0 and trigger_profile.position_restrictions_enabled
         )
+        self._position_restriction_index = None
+        if self._has_restricted_position:
+            self._position_restriction_index = PositionRestrictionIndex(self._position_restrictions)
 
         self._gcode_generation_settings = printer_profile.get_current_state_detection_settings()
         assert (isinstance(self._gcode_generation_settings, OctolapseGcodeSettings))
         self._priming_height = printer_profile.priming_height
         self._minimum_layer_height = printer_profile.minimum_layer_height
 
-        self.current_pos = GcodeProcessor.get_current_position()
-        self.previous_pos = GcodeProcessor.get_previous_position()
-        self.undo_pos = GcodeProcessor.get_current_position()
+        self._current_pos = GcodeProcessor.get_current_position()
+        self._previous_pos = GcodeProcessor.get_previous_position()
+        self._undo_pos = GcodeProcessor.get_current_position()
+
+        # Gcodes that cannot affect any trigger can be queued and sent to the
+        # position processor in a single batch.  See queue_gcode.
+        self._queued_gcodes = []
+        self._queued_file_line_numbers = []
+        # location detection is performed on the gcode following a detection command, so
+        # that gcode must be processed by update.
+        self._last_update_requires_detection = False
+        # incremented whenever the position changes, so that unchanged states need not be sent to the client
+        self.state_version = 0
+
+    # The maximum number of gcodes that will be queued before the position is
+    # updated.  This bounds the delay before the position objects are current.
+    max_queued_gcodes = 50
+
+    # Matches the command portion of a gcode, ignoring leading zeros (G01 -> G1)
+    _command_regex = re.compile(r"^\s*([A-Za-z])0*(\d+(?:\.\d+)?)")
+
+    @property
+    def has_restricted_position(self):
+        return self._has_restricted_position
+
+    @property
+    def current_pos(self):
+        if self._queued_gcodes:
+            self.flush_queue()
+        return self._current_pos
+
+    @property
+    def previous_pos(self):
+        if self._queued_gcodes:
+            self.flush_queue()
+        return self._previous_pos
+
+    @property
+    def undo_pos(self):
+        if self._queued_gcodes:
+            self.flush_queue()
+        return self._undo_pos
 
     def update_position(self, x, y, z, e, f):
         GcodeProcessor.update_position(self.current_pos, x, y, z, e, f)
+        self.state_version += 1
 
     def to_position_dict(self):
         ret_dict = self.current_pos.to_dict()
@@ -98,39 +294,105 @@ class Position(utility.JsonSerializable):
         return False
 
     def undo_update(self):
+        self.flush_queue()
         GcodeProcessor.undo()
         # set pos to the previous pos and pop the current position
-        if self.undo_pos is None:
+        if self._undo_pos is None:
             raise Exception("Cannot undo updates when there is less than one position in the position queue.")
 
-        previous_position = self.current_pos
-        self.current_pos = self.previous_pos
-        self.previous_pos = self.undo_pos
-        self.undo_pos = None
+        previous_position = self._current_pos
+        self._current_pos = self._previous_pos
+        self._previous_pos = self._undo_pos
+        self._undo_pos = None
+        self.state_version += 1
         return previous_position
 
-    def update(self, gcode, file_line_number=None):
+    def _rotate_positions(self):
         # Move the current position to the previous and the previous to the undo position
-        # then copy previous to current
-        if self.undo_pos is None:
-            self.undo_pos = Pos()
-        old_undo_pos = self.undo_pos
-        self.undo_pos = self.previous_pos
-        self.previous_pos = self.current_pos
-        self.current_pos = old_undo_pos
+        # then re-use the old undo position for the current position
+        if self._undo_pos is None:
+            self._undo_pos = Pos()
+        old_undo_pos = self._undo_pos
+        self._undo_pos = self._previous_pos
+        self._previous_pos = self._current_pos
+        self._current_pos = old_undo_pos
 
-        Pos.copy(self.previous_pos, self.current_pos)
+    def update(self, gcode, file_line_number=None):
+        self.flush_queue()
+        self._rotate_positions()
+        self.state_version += 1
 
-        # process the gcode and update our current position
-        GcodeProcessor.update(gcode, self.current_pos)
+        # process the gcode and overwrite the current position with the result
+        GcodeProcessor.update(gcode, self._current_pos)
 
         # fill in the file line number if it is supplied.
         if file_line_number is not None:
-            self.current_pos.file_line_number = file_line_number
+            self._current_pos.file_line_number = file_line_number
 
-        previous = self.previous_pos
-        current = self.current_pos
+        self._update_position_restrictions(self._previous_pos, self._current_pos)
+        self._last_update_requires_detection = (
+            self._auto_detect_position and self.command_requires_location_detection(self.get_command(gcode))
+        )
 
+    @staticmethod
+    def get_command(gcode):
+        """Returns the normalized command (G1, M104, @OCTOLAPSE, etc) of a gcode, or None."""
+        stripped_gcode = gcode.lstrip()
+        if stripped_gcode.startswith("@"):
+            return stripped_gcode.split(None, 1)[0].upper()
+        match = Position._command_regex.match(stripped_gcode)
+        if match is None:
+            return None
+        return "{0}{1}".format(match.group(1).upper(), match.group(2))
+
+    def can_queue_gcode(self, gcode):
+        """Returns True if the gcode can be sent to queue_gcode instead of update.  Commands that must be
+        inspected immediately after they are processed (units, G92 and location detection) are never queued."""
+        if self._last_update_requires_detection and not self._queued_gcodes:
+            return False
+        cmd = self.get_command(gcode)
+        if cmd in ["G20", "G21", "G92"]:
+            return False
+        return not self.command_requires_location_detection(cmd)
+
+    def has_queued_gcodes(self):
+        return len(self._queued_gcodes) > 0
+
+    def queue_gcode(self, gcode, file_line_number=None):
+        """Queues a gcode that will be applied to the position the next time any position is requested, or when
+        the queue is full.  Only gcode for which can_queue_gcode returns True should be queued."""
+        self._queued_gcodes.append(gcode)
+        self._queued_file_line_numbers.append(file_line_number)
+        self.state_version += 1
+        if len(self._queued_gcodes) >= self.max_queued_gcodes:
+            self.flush_queue()
+
+    def flush_queue(self):
+        """Sends all queued gcodes to the position processor in one batch."""
+        num_gcodes = len(self._queued_gcodes)
+        if num_gcodes == 0:
+            return
+        gcodes = self._queued_gcodes
+        file_line_numbers = self._queued_file_line_numbers
+        self._queued_gcodes = []
+        self._queued_file_line_numbers = []
+
+        # Only the final three positions are kept, so rotate at most three times
+        num_targets = min(num_gcodes, 3)
+        for _ in range(num_targets):
+            self._rotate_positions()
+        targets = [self._undo_pos, self._previous_pos, self._current_pos][3 - num_targets:]
+        GcodeProcessor.update_many(gcodes, file_line_numbers, targets)
+
+        # The position restrictions can only be calculated when the preceding position is available
+        if num_targets == 3:
+            self._undo_pos.is_in_position = not self._has_restricted_position
+            self._undo_pos.in_path_position = False
+        if num_targets > 1:
+            self._update_position_restrictions(self._undo_pos, self._previous_pos)
+        self._update_position_restrictions(self._previous_pos, self._current_pos)
+
+    def _update_position_restrictions(self, previous, current):
         # reset the position restriction in_path_position state since it only works
         # for one gcode at a time.
         current.in_path_position = False
@@ -149,8 +411,7 @@ class Position(utility.JsonSerializable):
             else:
                 # If we're using restricted positions, calculate intersections and determine if we are in position
                 can_calculate_intersections = current.parsed_command.cmd in ["G0", "G1"]
-                _is_in_position, _intersections = self.calculate_path_intersections(
-                    self._position_restrictions,
+                _is_in_position, _intersections = self._position_restriction_index.get_path_intersections(
                     current.x,
                     current.y,
                     previous.x,
@@ -0,0 +1,407 @@
+# coding=utf-8
+##################################################################################
+# Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+# Copyright (C) 2023  Brad Hochgesang
+##################################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see the following:
+# https://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+#
+# You can contact the author either through the git-hub repository, or at the
+# following email address: FormerLurker@pm.me
+##################################################################################
+# Preprocesses gcode files with the smart layer or smart gcode trigger without OctoPrint, so that the snapshot plans
+# are already in the snapshot plan cache when the files are printed.  Files are processed in parallel by a pool of
+# processes, using the current profiles of an Octolapse settings file.  For example:
+#
+#   python -m octoprint_octolapse.preprocess settings.json /path/to/gcode \
+#       --cache-directory ~/.octoprint/data/octolapse/snapshot_plan_cache --report report.json
+#
+# The cache is keyed by the path, size and modification time of each file, so the plans are only found if OctoPrint
+# prints the same file from the same path, for example on the same machine or from shared storage.  The cache limits
+# default to the Snapshot Plan Cache settings in the settings file.  OctoPrint trims the cache to its own limits
+# whenever it saves an entry, so its limits must be large enough for the whole library too.
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+
+# The OctoPrint printer profile used when none is supplied, which matches the default OctoPrint profile
+DEFAULT_OCTOPRINT_PRINTER_PROFILE = {
+    "volume": {
+        "width": 200, "depth": 200, "height": 200, "origin": "lowerleft", "formFactor": "rectangular",
+        "custom_box": False
+    }
+}
+GCODE_FILE_EXTENSIONS = (".gcode", ".gco", ".g")
+REPORT_VERSION = 1
+
+# The batch preprocessor of a worker process, see initialize_worker
+_batch_preprocessor = None
+
+
+def get_gcode_file_paths(paths, recursive=False):
+    """Returns the gcode files in the supplied files and directories, sorted by path."""
+    gcode_file_paths = set()
+    for path in paths:
+        if os.path.isfile(path):
+            gcode_file_paths.add(os.path.abspath(path))
+            continue
+        for directory, directory_names, file_names in os.walk(path):
+            for file_name in file_names:
+                if file_name.lower().endswith(GCODE_FILE_EXTENSIONS):
+                    gcode_file_paths.add(os.path.abspath(os.path.join(directory, file_name)))
+            if not recursive:
+                break
+    return sorted(gcode_file_paths)
+
+
+def load_octoprint_printer_profile(file_path):
+    """Loads an OctoPrint printer profile, which is yaml (or json) with at least the volume."""
+    import yaml
+    with open(file_path, 'r') as profile_file:
+        return yaml.safe_load(profile_file)
+
+
+def _get_profile_guid(profiles, name_or_guid, profile_type):
+    for guid, profile in profiles.items():
+        if name_or_guid in (guid, profile.name):
+            return guid
+    raise ValueError("There is no {0} profile named '{1}'.".format(profile_type, name_or_guid))
+
+
+def load_settings(settings_path, printer=None, stabilization=None, trigger=None):
+    """Loads an Octolapse settings file and selects the printer, stabilization and trigger profiles by name or guid.
+    The current profiles are used if none are supplied.  Raises a ValueError if the settings can't be used."""
+    import octoprint_octolapse
+    from octoprint_octolapse.settings import OctolapseSettings, TriggerProfile
+
+    with open(settings_path, 'r') as settings_file:
+        data = json.load(settings_file)
+    settings = OctolapseSettings.create_from_iterable(octoprint_octolapse.__version__, data)
+    if printer is not None:
+        settings.profiles.current_printer_profile_guid = _get_profile_guid(settings.profiles.printers, printer, "printer")
+    if stabilization is not None:
+        settings.profiles.current_stabilization_profile_guid = _get_profile_guid(
+            settings.profiles.stabilizations, stabilization, "stabilization"
+        )
+    if trigger is not None:
+        settings.profiles.current_trigger_profile_guid = _get_profile_guid(settings.profiles.triggers, trigger, "trigger")
+
+    if settings.profiles.current_printer() is None:
+        raise ValueError("The settings do not have a printer profile.")
+    if settings.profiles.current_trigger().trigger_type not in TriggerProfile.get_precalculated_trigger_types():
+        raise ValueError("Only the smart triggers can be preprocessed.")
+    return settings
+
+
+class BatchPreprocessor(object):
+    """Preprocesses gcode files one at a time with fixed settings, and saves the results in the snapshot plan
+    cache."""
+
+    def __init__(
+        self, settings, snapshot_plan_cache, octoprint_printer_profile=None, g90_influences_extruder=False,
+        processing_threads=1
+    ):
+        self.settings = settings
+        self.snapshot_plan_cache = snapshot_plan_cache
+        self.octoprint_printer_profile = (
+            DEFAULT_OCTOPRINT_PRINTER_PROFILE if octoprint_printer_profile is None else octoprint_printer_profile
+        )
+        self.g90_influences_extruder = g90_influences_extruder
+        self.processing_threads = processing_threads
+
+    def get_timelapse_settings(self, gcode_file_path):
+        """Returns the timelapse settings for the file, like OctolapsePlugin.get_timelapse_settings, along with a
+        list of errors if the settings can't be used."""
+        from octoprint_octolapse import error_messages
+
+        # the detected slicer settings are saved to the printer profile, so each file needs its own copy
+        settings_clone = self.settings.clone()
+        current_printer_clone = settings_clone.profiles.current_printer()
+        if current_printer_clone.slicer_type == 'automatic':
+            try:
+                success, error_type, error_list = current_printer_clone.get_gcode_settings_from_file(
+                    gcode_file_path, settings_cache=self.snapshot_plan_cache
+                )
+            except error_messages.OctolapseException as e:
+                return None, [e.to_dict()]
+            if not success:
+                if error_type == "no-settings-detected":
+                    return None, [error_messages.get_error(["init", "automatic_slicer_no_settings_found"])]
+                return None, [error_messages.get_error(
+                    ["init", "automatic_slicer_settings_missing"], missing_settings=",".join(error_list)
+                )]
+        else:
+            missing_settings = current_printer_clone.get_current_slicer_settings().get_missing_gcode_generation_settings(
+                slicer_type=current_printer_clone.slicer_type
+            )
+            if len(missing_settings) > 0:
+                return None, [error_messages.get_error(
+                    ["init", "manual_slicer_settings_missing"], missing_settings=",".join(missing_settings)
+                )]
+
+        slicer_settings_clone = current_printer_clone.get_current_slicer_settings()
+        if len(slicer_settings_clone.extruders) > current_printer_clone.num_extruders:
+            return None, [error_messages.get_error(
+                ["init", "too_few_extruders_defined"],
+                printer_num_extruders=current_printer_clone.num_extruders,
+                gcode_num_extruders=len(slicer_settings_clone.extruders)
+            )]
+        if (
+            not current_printer_clone.shared_extruder and
+            current_printer_clone.num_extruders < len(current_printer_clone.extruder_offsets)
+        ):
+            return None, [error_messages.get_error(
+                ["init", "too_few_extruder_offsets_defined"],
+                num_extruders=current_printer_clone.num_extruders,
+                num_extruder_offsets=len(current_printer_clone.extruder_offsets)
+            )]
+
+        return {
+            "success": True,
+            "settings": settings_clone,
+            "gcode_file_path": gcode_file_path,
+            "overridable_printer_profile_settings": current_printer_clone.get_overridable_profile_settings(
+                self.g90_influences_extruder, self.octoprint_printer_profile
+            )
+        }, []
+
+    def preprocess(self, gcode_file_path):
+        """Preprocesses the file on this thread and returns a report of the results."""
+        from octoprint_octolapse import error_messages
+        from octoprint_octolapse.stabilization_preprocessing import StabilizationPreprocessingThread
+
+        report = {
+            "file_path": gcode_file_path,
+            "success": False,
+            "snapshot_plans": 0,
+            "seconds_elapsed": 0,
+            "gcodes_processed": 0,
+            "lines_processed": 0,
+            "missed_snapshots": 0,
+            "quality_issues": [],
+            "errors": [],
+            "cache_key": None
+        }
+        try:
+            timelapse_settings, errors = self.get_timelapse_settings(gcode_file_path)
+        except Exception:
+            timelapse_settings = None
+            errors = [error_messages.get_error(["preprocessor", "preprocessor_errors", "unhandled_exception"])]
+        if timelapse_settings is None:
+            report["errors"] = errors
+            return report
+
+        def on_complete(
+            success, is_cancelled, snapshot_plans, seconds_elapsed, gcodes_processed, lines_processed,
+            missed_snapshots, quality_issues, processing_issues, timelapse_settings, parsed_command
+        ):
+            report.update({
+                "success": success,
+                "snapshot_plans": len(snapshot_plans),
+                "seconds_elapsed": seconds_elapsed,
+                "gcodes_processed": gcodes_processed,
+                "lines_processed": lines_processed,
+                "missed_snapshots": missed_snapshots,
+                "quality_issues": quality_issues,
+                "errors": processing_issues
+            })
+
+        preprocessor = StabilizationPreprocessingThread(
+            timelapse_settings,
+            lambda *args: None,
+            lambda: None,
+            on_complete,
+            threading.Event(),
+            None,
+            snapshot_plan_cache=self.snapshot_plan_cache
+        )
+        preprocessor.processing_threads = self.processing_threads
+        # run the preprocessor on this thread
+        preprocessor.run()
+        report["cache_key"] = preprocessor.snapshot_plan_cache_key
+        return report
+
+
+def create_snapshot_plan_cache(cache_directory, settings, max_entries=None, max_size_mb=None):
+    """Creates the snapshot plan cache, with the limits from the main settings unless they are supplied."""
+    import octoprint_octolapse
+    from octoprint_octolapse.snapshot_plan_cache import SnapshotPlanCache
+
+    if max_entries is None:
+        max_entries = settings.main_settings.snapshot_plan_cache_max_entries
+    if max_size_mb is None:
+        max_size_mb = settings.main_settings.snapshot_plan_cache_max_size_mb
+    return SnapshotPlanCache(
+        cache_directory, plugin_version=octoprint_octolapse.__version__, max_size_bytes=max_size_mb * 1024 * 1024,
+        max_entries=max_entries
+    )
+
+
+def initialize_worker(
+    settings_path, profiles, cache_directory, cache_limits, octoprint_printer_profile, g90_influences_extruder,
+    processing_threads
+):
+    """Creates the batch preprocessor of a worker process.  cache_limits is a dict of create_snapshot_plan_cache
+    arguments.  Everything is passed by value so that this also works with the spawn start method."""
+    global _batch_preprocessor
+    # import octolapse before GcodePositionProcessor, which imports the octolapse logging module when initialized
+    from octoprint_octolapse.log import LoggingConfigurator
+
+    settings = load_settings(settings_path, **profiles)
+    LoggingConfigurator().configure_loggers(logging_settings=settings.profiles.current_logging_profile())
+    _batch_preprocessor = BatchPreprocessor(
+        settings,
+        create_snapshot_plan_cache(cache_directory, settings, **cache_limits),
+        octoprint_printer_profile,
+        g90_influences_extruder,
+        processing_threads
+    )
+
+
+def preprocess_file(gcode_file_path):
+    return _batch_preprocessor.preprocess(gcode_file_path)
+
+
+def run(gcode_file_paths, processes, *worker_args):
+    """Preprocesses the files with initialize_worker(*worker_args), and yields the report of each file as it
+    completes.  The files are processed in this process if processes is 1."""
+    if processes <= 1 or len(gcode_file_paths) <= 1:
+        initialize_worker(*worker_args)
+        for gcode_file_path in gcode_file_paths:
+            yield preprocess_file(gcode_file_path)
+        return
+    # spawn works the same way on every platform, and keeps the parser threads of the parent out of the workers
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(min(processes, len(gcode_file_paths)), initialize_worker, worker_args) as pool:
+        for report in pool.imap_unordered(preprocess_file, gcode_file_paths):
+            yield report
+
+
+def get_required_cache_entries(settings, num_files):
+    """Returns the number of cache entries needed to keep the results of every file."""
+    # automatic slicer settings detection caches the detected settings of each file too
+    if settings.profiles.current_printer().slicer_type == 'automatic':
+        return num_files * 2
+    return num_files
+
+
+def print_report(report):
+    if report["success"]:
+        print("{0}: {1} plans, {2} quality issues, {3:.2f} sec".format(
+            report["file_path"], report["snapshot_plans"], len(report["quality_issues"]), report["seconds_elapsed"]
+        ))
+        return
+    print("{0}: FAILED{1}".format(
+        report["file_path"], " - " + report["errors"][0]["name"] if report["errors"] else ""
+    ))
+
+
+def save_report(report_path, settings_path, reports):
+    with open(report_path, 'w') as report_file:
+        json.dump({
+            "version": REPORT_VERSION,
+            "settings_path": os.path.abspath(settings_path),
+            "files": sorted(reports, key=lambda report: report["file_path"])
+        }, report_file, indent=2, sort_keys=True)
+        report_file.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Preprocess gcode files so that their snapshot plans are cached before they are printed."
+    )
+    parser.add_argument("settings", help="The Octolapse settings file.")
+    parser.add_argument("paths", nargs="+", help="The gcode files, or directories that contain gcode files.")
+    parser.add_argument(
+        "--cache-directory", required=True,
+        help="The snapshot plan cache directory, which is snapshot_plan_cache in the Octolapse data folder."
+    )
+    parser.add_argument("--report", default=None, help="Write the results and quality issues to this json file.")
+    parser.add_argument("--recursive", action="store_true", help="Include the gcode files in subdirectories.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=1, help="The number of processing threads for each process.")
+    parser.add_argument("--printer", default=None, help="The name or guid of the printer profile to use.")
+    parser.add_argument("--stabilization", default=None, help="The name or guid of the stabilization profile to use.")
+    parser.add_argument("--trigger", default=None, help="The name or guid of the trigger profile to use.")
+    parser.add_argument(
+        "--octoprint-printer-profile", default=None,
+        help="The OctoPrint printer profile (yaml or json) that supplies the print volume, unless it is overridden by "
+             "the Octolapse printer profile."
+    )
+    parser.add_argument("--g90-influences-extruder", action="store_true")
+    parser.add_argument(
+        "--max-entries", type=int, default=None,
+        help="The largest number of cache entries.  Defaults to the Snapshot Plan Cache Entries setting."
+    )
+    parser.add_argument(
+        "--max-size", type=int, default=None,
+        help="The largest cache size in MB.  Defaults to the Snapshot Plan Cache Size setting."
+    )
+    args = parser.parse_args()
+
+    profiles = {"printer": args.printer, "stabilization": args.stabilization, "trigger": args.trigger}
+    try:
+        # check the settings before starting any workers
+        settings = load_settings(args.settings, **profiles)
+    except (IOError, OSError, ValueError) as e:
+        print("Unable to load the settings: {0}".format(e))
+        return 2
+    octoprint_printer_profile = None
+    if args.octoprint_printer_profile is not None:
+        octoprint_printer_profile = load_octoprint_printer_profile(args.octoprint_printer_profile)
+    gcode_file_paths = get_gcode_file_paths(args.paths, args.recursive)
+    if not gcode_file_paths:
+        print("No gcode files were found.")
+        return 0
+
+    cache_limits = {"max_entries": args.max_entries, "max_size_mb": args.max_size}
+    snapshot_plan_cache = create_snapshot_plan_cache(args.cache_directory, settings, **cache_limits)
+    required_cache_entries = get_required_cache_entries(settings, len(gcode_file_paths))
+    if required_cache_entries > snapshot_plan_cache.max_entries:
+        print(
+            "Warning: {0} files need {1} cache entries, but the cache is limited to {2} entries, so the results of "
+            "some files will be removed.  Use --max-entries, and raise the Snapshot Plan Cache Entries setting in "
+            "OctoPrint.".format(len(gcode_file_paths), required_cache_entries, snapshot_plan_cache.max_entries)
+        )
+
+    reports = []
+    for report in run(
+        gcode_file_paths, args.processes, args.settings, profiles, args.cache_directory, cache_limits,
+        octoprint_printer_profile, args.g90_influences_extruder, max(1, args.threads)
+    ):
+        print_report(report)
+        reports.append(report)
+    if args.report is not None:
+        save_report(args.report, args.settings, reports)
+    num_failed = sum(1 for report in reports if not report["success"])
+    print("Preprocessed {0} files, {1} failed.".format(len(reports), num_failed))
+    num_removed = sum(
+        1 for report in reports if report["success"] and not snapshot_plan_cache.contains(report["cache_key"])
+    )
+    if num_removed:
+        print(
+            "Warning: the plans of {0} files were removed from the cache because it is limited to {1} entries and "
+            "{2:.0f} MB.  Use --max-entries or --max-size, and raise the Snapshot Plan Cache settings in "
+            "OctoPrint.".format(
+                num_removed, snapshot_plan_cache.max_entries, snapshot_plan_cache.max_size_bytes / 1024.0 / 1024.0
+            )
+        )
+    return 1 if num_failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -52,6 +52,7 @@ import octoprint_octolapse.utility as utility
 import octoprint_octolapse.script as script
 from octoprint_octolapse.snapshot import SnapshotMetadata, CameraInfo
 from octoprint_octolapse.settings import OctolapseSettings, CameraProfile, RenderingProfile
+from octoprint_octolapse.hook_metrics import HookMetrics
 # create the module level logger
 from octoprint_octolapse.log import LoggingConfigurator
 
@@ -1037,7 +1038,11 @@ class RenderingProcessor(threading.Thread):
             for name in os.listdir(job_path):
                 path = os.path.join(job_path, name)
                 if os.path.isdir(path) or (
-                    os.path.isfile(path) and not utility.TimelapseJobInfo.is_timelapse_info_file(name)):
+                    os.path.isfile(path) and not (
+                        utility.TimelapseJobInfo.is_timelapse_info_file(name) or
+                        HookMetrics.is_metrics_file(name)
+                    )
+                ):
                     has_files_or_folders = True
                     break
             if not has_files_or_folders:
@@ -651,20 +651,17 @@ class PrinterProfile(AutomaticConfigurationProfile):
             return None
         return self.get_current_slicer_settings().get_gcode_generation_settings(slicer_type=self.slicer_type)
 
-    def get_gcode_settings_from_file(self, gcode_file_path):
-        simplify_preprocessor = settings_preprocessor.Simplify3dSettingsProcessor(
-            search_direction="both", max_forward_search=1000, max_reverse_search=1000
-        )
-        slic3r_preprocessor = settings_preprocessor.Slic3rSettingsProcessor(
-            search_direction="both", max_forward_search=1000, max_reverse_search=1000
-        )
-        cura_preprocessor = settings_preprocessor.CuraSettingsProcessor(
-            search_direction="both", max_forward_search=1000, max_reverse_search=1000
-        )
-        file_processor = settings_preprocessor.GcodeFileProcessor(
-            [simplify_preprocessor, slic3r_preprocessor, cura_preprocessor], 1, None
-        )
-        results = file_processor.process_file(gcode_file_path, filter_tags=['octolapse_setting'])
+    def get_gcode_settings_from_file(self, gcode_file_path, settings_cache=None):
+        # The detected settings only depend on the gcode file, so they can be cached by file alone
+        cache_key = None
+        results = None
+        if settings_cache is not None:
+            cache_key = settings_cache.get_key(gcode_file_path, settings_cache.get_fingerprint("gcode_settings"))
+            results = settings_cache.get(cache_key)
+        if results is None:
+            results = PrinterProfile.read_gcode_settings_from_file(gcode_file_path)
+            if settings_cache is not None:
+                settings_cache.put(cache_key, results)
 
         # determine which results have the most settings
         current_max_slicer_type = None
@@ -711,6 +708,22 @@ class PrinterProfile(AutomaticConfigurationProfile):
 
         return False, "no-settings-detected", ["No settings were detected in the gcode file."]
 
+    @staticmethod
+    def read_gcode_settings_from_file(gcode_file_path):
+        simplify_preprocessor = settings_preprocessor.Simplify3dSettingsProcessor(
+            search_direction="both", max_forward_search=1000, max_reverse_search=1000
+        )
+        slic3r_preprocessor = settings_preprocessor.Slic3rSettingsProcessor(
+            search_direction="both", max_forward_search=1000, max_reverse_search=1000
+        )
+        cura_preprocessor = settings_preprocessor.CuraSettingsProcessor(
+            search_direction="both", max_forward_search=1000, max_reverse_search=1000
+        )
+        file_processor = settings_preprocessor.GcodeFileProcessor(
+            [simplify_preprocessor, slic3r_preprocessor, cura_preprocessor], 1, None
+        )
+        return file_processor.process_file(gcode_file_path, filter_tags=['octolapse_setting'])
+
     def get_location_detection_command_list(self):
         if self.auto_position_detection_commands is not None:
             trimmed_commands = self.auto_position_detection_commands.strip()
@@ -1000,6 +1013,7 @@ class TriggerProfile(AutomaticConfigurationProfile):
         self.smart_layer_trigger_type = TriggerProfile.SMART_TRIGGER_TYPE_COMPATIBILITY
         self.smart_layer_snap_to_print_high_quality = False
         self.smart_layer_snap_to_print_smooth = False
+        self.smart_layer_snap_to_print_split_extrusions = False
         self.smart_layer_disable_z_lift = True
         self.allow_smart_snapshot_commands = True
         # Settings that were formerly in the snapshot profile (now removed)
@@ -1657,6 +1671,9 @@ class MainSettings(Settings):
         self.show_trigger_state_changes = False
         self.show_snapshot_plan_information = False
         self.cancel_print_on_startup_error = True
+        self.preprocess_on_file_added = False
+        self.snapshot_plan_cache_max_entries = 50
+        self.snapshot_plan_cache_max_size_mb = 100
         self.platform = sys.platform
         self.version = plugin_version
         self.settings_version = NumberedVersion.CurrentSettingsVersion
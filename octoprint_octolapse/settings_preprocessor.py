@@ -25,8 +25,8 @@ from __future__ import unicode_literals
 import os
 import time
 import datetime
-from file_read_backwards import FileReadBackwards
 import re
+import GcodePositionProcessor
 # remove unused usings
 # import six
 # import string
@@ -36,12 +36,87 @@ logging_configurator = LoggingConfigurator()
 logger = logging_configurator.get_logger(__name__)
 
 
+class ReverseBlockReader(object):
+    """Reads the lines of a file from the end towards the start.  The file is read backwards in blocks, so only the
+    end of the file is read no matter how large the file is, and reading stops once max_bytes have been read from the
+    end of the file (None or 0 for no limit).  A line that is cut off by the limit is not returned.  position is the
+    offset of the start of the most recently returned line."""
+    DEFAULT_BLOCK_SIZE = 65536
+
+    def __init__(self, file_path, max_bytes=None, block_size=DEFAULT_BLOCK_SIZE, encoding="utf-8"):
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self.encoding = encoding
+        self.position = 0
+        self.file_size_bytes = 0
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.file_path, 'rb')
+        self._file.seek(0, os.SEEK_END)
+        self.file_size_bytes = self._file.tell()
+        self.position = self.file_size_bytes
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._file.close()
+        self._file = None
+
+    def __iter__(self):
+        return self.readlines()
+
+    def readlines(self):
+        min_offset = 0
+        if self.max_bytes and self.max_bytes < self.file_size_bytes:
+            min_offset = self.file_size_bytes - self.max_bytes
+        # a newline at the very end of the file ends the last line rather than starting a new one
+        line_end = self.file_size_bytes
+        read_end = self.file_size_bytes
+        remainder = b''
+        while read_end > min_offset:
+            read_start = max(min_offset, read_end - self.block_size)
+            self._file.seek(read_start)
+            block = self._file.read(read_end - read_start) + remainder
+            read_end = read_start
+            lines = block.split(b'\n')
+            # the first line may continue in the previous block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line_end == self.file_size_bytes and len(line) == 0:
+                    line_end -= 1
+                    continue
+                self.position = line_end - len(line)
+                line_end = self.position - 1
+                yield self.decode(line)
+        if line_end == self.file_size_bytes and len(remainder) == 0:
+            return
+        # the first line of the file is complete, but a line cut off by max_bytes is not
+        if min_offset > 0:
+            self._file.seek(min_offset - 1)
+            if self._file.read(1) != b'\n':
+                return
+        self.position = min_offset
+        yield self.decode(remainder)
+
+    def decode(self, line):
+        if line.endswith(b'\r'):
+            line = line[:-1]
+        return line.decode(self.encoding, 'replace')
+
+
 class GcodeFileProcessor(object):
-    def __init__(self, processors, notification_period_seconds, on_update_progress):
+    # Slicers that write their settings at the end of the file write them within the last few hundred KB
+    DEFAULT_MAX_REVERSE_BYTES = 1048576
+
+    def __init__(
+        self, processors, notification_period_seconds, on_update_progress, max_reverse_bytes=DEFAULT_MAX_REVERSE_BYTES
+    ):
         assert(isinstance(processors, list))
         self.processors = processors
         self.update_progress_callback = on_update_progress
         self.notification_period_seconds = notification_period_seconds
+        self.max_reverse_bytes = max_reverse_bytes
         self.current_file_position = 0
         self.file_size_bytes = 0
         self._last_notification_time = None
@@ -83,10 +158,26 @@ class GcodeFileProcessor(object):
         forward_processors = [x for x in filtered_processors if x.file_process_type in [u'forward', u'both']]
         reverse_processors = [x for x in filtered_processors if x.file_process_type in [u'reverse', u'both']]
 
-        # process any forward items
-        complete = self.process_forwards(forward_processors, target_file_path)
-        if not complete:
-            complete = self.process_reverse(reverse_processors, target_file_path)
+        # Read the header and the tail of the file in a single native pass.  Only the lines the processors can
+        # search are read, and the pages stay in the OS cache for the stabilization pass that follows.
+        max_header_lines = max([x.max_forward_lines_to_process for x in forward_processors] + [0])
+        max_tail_lines = max([x.max_reverse_lines_to_process for x in reverse_processors] + [0])
+        try:
+            header_lines, tail_lines = GcodePositionProcessor.GetHeaderAndTailLines(
+                target_file_path, max_header_lines, max_tail_lines, self.max_reverse_bytes or 0
+            )
+        except (IOError, UnicodeError):
+            logger.exception(
+                "Unable to read the header and tail of %s natively, falling back to python.", target_file_path
+            )
+            complete = self.process_forwards(forward_processors, target_file_path)
+            if not complete:
+                complete = self.process_reverse(reverse_processors, target_file_path)
+        else:
+            complete = self.process_lines(forward_processors, header_lines, u'forward')
+            if not complete:
+                complete = self.process_lines(reverse_processors, reversed(tail_lines), u'reverse')
+            self.current_file_position = self.file_size_bytes
 
         self.end_time = time.time()
         if complete:
@@ -97,73 +188,51 @@ class GcodeFileProcessor(object):
         return self.get_processor_results()
 
     def process_forwards(self, processors, target_file_path):
-        # open the file for streaming
-        line_number = 0
-        slicer_type_detected = False
         # we're using binary read to avoid file.tell() issues with windows
         with open(target_file_path, 'r') as f:
-            while True:
-                if len(processors) < 1:
-                    break
-
-                line = f.readline()
-                if line == '':
-                    break
-
-                line_number += 1
-                # get the current file position
-                self.current_file_position = f.tell()
-
-                for processor in reversed(processors):
-                    processor.process_line(line, line_number, 'forward')
-                    if processor.max_search_reached(u'forward'):
-                        processors.remove(processor)
-                    elif processor.is_complete():
-                        return True
-                if not slicer_type_detected:
-                    for processor in processors:
-                        if processor.is_slicer_type_detected:
-                            # remove the other processors
-                            processors = [processor]
-                            slicer_type_detected = True
-                            break
-
-                self.notify_progress()
-        return False
+            def read_lines():
+                while True:
+                    line = f.readline()
+                    if line == '':
+                        break
+                    # get the current file position
+                    self.current_file_position = f.tell()
+                    yield line
+            return self.process_lines(processors, read_lines(), u'forward')
 
     def process_reverse(self, processors, target_file_path):
-        # open the file for streaming
+        with ReverseBlockReader(target_file_path, max_bytes=self.max_reverse_bytes) as reader:
+            def read_lines():
+                for line in reader:
+                    # report the number of bytes read from the end of the file
+                    self.current_file_position = reader.file_size_bytes - reader.position
+                    yield line
+            return self.process_lines(processors, read_lines(), u'reverse')
+
+    def process_lines(self, processors, lines, process_type):
         slicer_type_detected = False
         line_number = 0
-        with FileReadBackwards(target_file_path, encoding="utf-8") as frb:
-            while True:
-                if len(processors) < 1:
-                    break
-
-                line = frb.readline()
-
-                if line == '':
-                    break
-
-                line_number += 1
-                # getting the current file position is not possible
-                # with the reverse processor.  Need to write one that works for this purpose.
-                #self.current_file_position = f.tell()
-
-                for processor in reversed(processors):
-                    processor.process_line(line, line_number, u'reverse')
-                    if processor.max_search_reached(u'reverse'):
-                        processors.remove(processor)
-                    elif processor.is_complete():
-                        return True
-
-                if not slicer_type_detected:
-                    for processor in processors:
-                        if processor.is_slicer_type_detected:
-                            # remove the other processors
-                            processors = [processor]
-                            slicer_type_detected = True
-                            continue
+        for line in lines:
+            if len(processors) < 1:
+                break
+
+            line_number += 1
+            for processor in reversed(processors):
+                processor.process_line(line, line_number, process_type)
+                if processor.max_search_reached(process_type):
+                    processors.remove(processor)
+                elif processor.is_complete():
+                    return True
+
+            if not slicer_type_detected:
+                for processor in processors:
+                    if processor.is_slicer_type_detected:
+                        # remove the other processors
+                        processors = [processor]
+                        slicer_type_detected = True
+                        break
+
+            self.notify_progress()
         return False
 
     def notify_progress(self, end_progress=False):
@@ -256,6 +325,7 @@ class GcodeSettingsProcessor(GcodeProcessor):
         self.all_regex_definitions = self.get_regex_definitions()
         self.active_regex_definitions = []
         self.is_slicer_type_detected = False
+        self._regex_dispatcher = None
 
     def reset(self):
         self.forward_lines_processed = 0
@@ -299,6 +369,7 @@ class GcodeSettingsProcessor(GcodeProcessor):
                 or (regex.tags is not None and len(regex.tags) > 0 and not regex.tags.isdisjoint(filter_tags))
             ):
                 self.active_regex_definitions[regex.name] = regex
+        self._regex_dispatcher = None
 
     def can_process(self):
         return len(self.active_settings_dictionary) > 0
@@ -323,21 +394,21 @@ class GcodeSettingsProcessor(GcodeProcessor):
             self.reverse_lines_processed += 1
 
         logger.verbose("Process type: %s, line: %s, gcode: %s", process_type, line_number, line)
-        # Remove python 2 support
-        # for key, regex_definition in six.iteritems(self.active_regex_definitions):
-        for key, regex_definition in self.active_regex_definitions.items():
-            if regex_definition.match_once and regex_definition.has_matched:
-                continue
-            try:
-                match = re.search(regex_definition.regex, line)
-            except Exception as e:
-                logger.exception(u"Unable to match via regex.")
-                raise e
-            if not match:
-                continue
-            regex_definition.has_matched = True
-            self.process_match(match, line, regex_definition)
-            break
+        # Every active regex is tried with a single match
+        if self._regex_dispatcher is None:
+            self._regex_dispatcher = RegexDispatcher([
+                regex_definition for regex_definition in self.active_regex_definitions.values()
+                if regex_definition.try_match()
+            ])
+        regex_definition, match = self._regex_dispatcher.match(line)
+        if regex_definition is None:
+            return
+        regex_definition.has_matched = True
+        num_active_regex_definitions = len(self.active_regex_definitions)
+        self.process_match(match, line, regex_definition)
+        # rebuild the dispatcher if the match removed any regexes
+        if regex_definition.match_once or len(self.active_regex_definitions) != num_active_regex_definitions:
+            self._regex_dispatcher = None
 
     def process_match(self, matches, line_text, regex):
 
@@ -747,6 +818,64 @@ class RegexDefinition(object):
         return not (self.match_once and self.has_matched)
 
 
+class RegexDispatcher(object):
+    """Combines regex definitions into a single regex so that a line can be tested against all of them with one match.
+    Each definition becomes an alternative in definition order, so the result is the same as trying re.search with
+    each definition in turn and stopping at the first match."""
+    _group_name_regex = re.compile(r"\(\?P<(?P<name>[A-Za-z_][A-Za-z0-9_]*)>")
+    _compiled_regexes = {}
+
+    def __init__(self, regex_definitions):
+        self.regex_definitions = regex_definitions
+        self.regex = None
+        if len(regex_definitions) == 0:
+            return
+        regex_strings = tuple(x.regex_string for x in regex_definitions)
+        self.regex = RegexDispatcher._compiled_regexes.get(regex_strings, None)
+        if self.regex is None:
+            self.regex = re.compile(RegexDispatcher.combine(regex_strings))
+            RegexDispatcher._compiled_regexes[regex_strings] = self.regex
+
+    @staticmethod
+    def combine(regex_strings):
+        alternatives = []
+        for index, regex_string in enumerate(regex_strings):
+            prefix = RegexDispatcher.get_group_prefix(index)
+            # group names must be unique, so prefix every named group with the index of its definition
+            regex_string = RegexDispatcher._group_name_regex.sub(
+                lambda m: u"(?P<{0}{1}>".format(prefix, m.group(u"name")), regex_string
+            )
+            # the combined regex is matched at the start of the line, so let unanchored regexes skip ahead
+            if not regex_string.startswith(u"^"):
+                regex_string = u".*?(?:{0})".format(regex_string)
+            alternatives.append(u"(?P<{0}>{1})".format(prefix[:-1], regex_string))
+        return u"|".join(alternatives)
+
+    @staticmethod
+    def get_group_prefix(index):
+        return u"d{0}_".format(index)
+
+    def match(self, line):
+        if self.regex is None:
+            return None, None
+        match = self.regex.match(line)
+        if match is None:
+            return None, None
+        # the group for the matching definition closes last, so it is always the last group
+        index = int(match.lastgroup[1:])
+        return self.regex_definitions[index], DispatchedMatch(match, RegexDispatcher.get_group_prefix(index))
+
+
+class DispatchedMatch(object):
+    """Wraps a match from a RegexDispatcher so that groups can be accessed by the names used in the original regex."""
+    def __init__(self, match, group_prefix):
+        self.match = match
+        self.group_prefix = group_prefix
+
+    def group(self, *names):
+        return self.match.group(*[self.group_prefix + x if isinstance(x, str) else x for x in names])
+
+
 #############################################
 # Gcode settings processors
 # Extends GcodeProcessor
@@ -37,7 +37,9 @@ except ImportError:
     from PIL import ImageFile
 
 from requests.auth import HTTPBasicAuth
-from threading import Thread, Event
+from threading import Thread, Event, Lock
+from concurrent import futures
+import queue as queue
 from tempfile import mkdtemp
 from uuid import uuid4
 from time import time
@@ -99,10 +101,123 @@ def take_in_memory_snapshot(settings, current_camera):
         utility.rmtree(temp_snapshot_dir)
 
 
+class SnapshotWorkerLane(object):
+    """A single daemon worker thread that runs tasks in the order they were submitted.  A ThreadPoolExecutor is not
+    used because its workers are not daemon threads, so a hung job would keep OctoPrint from exiting."""
+
+    def __init__(self, lane):
+        self._tasks = queue.Queue()
+        self._thread = Thread(target=self._run, name="octolapse-{0}".format(lane))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            future, fn, args = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def submit(self, fn, *args):
+        """Queues fn to run after any tasks already queued.  Returns a future."""
+        future = futures.Future()
+        self._tasks.put((future, fn, args))
+        return future
+
+    def shutdown(self, wait=False):
+        """Stops the worker thread once the queued tasks have run."""
+        self._tasks.put(None)
+        if wait:
+            self._thread.join()
+
+
+class SnapshotWorkerPool(object):
+    """Long lived worker threads used to take snapshots.  Each lane is a single worker thread:  an orchestrator lane
+    that runs the snapshot and position acquisition started by the gcode hooks, a post-processing lane, a callback
+    lane for the snapshot start and complete notifications, one lane per camera, and a script lane per camera for the
+    before and after snapshot scripts, so that a script never waits for the camera's download to finish.  warm_up
+    starts the threads when the timelapse starts so that no threads are created while the job is on hold, and the
+    number of threads never exceeds the number of lanes, except while a hung job is still running on a lane that was
+    replaced."""
+    ORCHESTRATOR_LANE = "orchestrator"
+    POST_PROCESSING_LANE = "post-processing"
+    CALLBACK_LANE = "callback"
+    # A camera job that is still running this long after its delay and timeout have passed is considered hung.
+    HUNG_JOB_GRACE_SECONDS = 60
+
+    def __init__(self):
+        self._lanes = {}
+        self._lock = Lock()
+
+    def _get_lane(self, lane):
+        with self._lock:
+            worker_lane = self._lanes.get(lane)
+            if worker_lane is None:
+                worker_lane = SnapshotWorkerLane(lane)
+                self._lanes[lane] = worker_lane
+            return worker_lane
+
+    @staticmethod
+    def get_script_lane(camera_guid):
+        return "{0}-script".format(camera_guid)
+
+    def warm_up(self, camera_guids, script_camera_guids=()):
+        """Creates a lane for each camera, and a script lane for each camera with a before or after snapshot script,
+        and starts every worker thread.  Lanes for cameras that are no longer active are shut down."""
+        lanes = [
+            SnapshotWorkerPool.ORCHESTRATOR_LANE, SnapshotWorkerPool.POST_PROCESSING_LANE,
+            SnapshotWorkerPool.CALLBACK_LANE
+        ]
+        lanes.extend("{0}".format(camera_guid) for camera_guid in camera_guids)
+        lanes.extend(SnapshotWorkerPool.get_script_lane(camera_guid) for camera_guid in script_camera_guids)
+        with self._lock:
+            for lane in list(self._lanes.keys()):
+                if lane not in lanes:
+                    self._lanes.pop(lane).shutdown(wait=False)
+        for lane in lanes:
+            self._get_lane(lane)
+        logger.debug("The snapshot worker pool is running %d lanes.", len(lanes))
+
+    def submit(self, lane, fn, *args):
+        """Runs fn on the lane's worker thread after any tasks already queued for the lane.  Returns a future."""
+        return self._get_lane("{0}".format(lane)).submit(fn, *args)
+
+    def run_callback(self, fn, *args):
+        """Runs fn on the callback lane, and logs any exception it raises.  Returns a future."""
+        def run():
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception("An exception was raised by a snapshot callback.")
+        return self.submit(SnapshotWorkerPool.CALLBACK_LANE, run)
+
+    def replace_lane(self, lane):
+        """Releases a lane whose worker is stuck on a hung job.  The next task submitted to the lane starts a new
+        worker thread, and the hung worker exits once its job returns."""
+        with self._lock:
+            worker_lane = self._lanes.pop("{0}".format(lane), None)
+        if worker_lane is not None:
+            worker_lane.shutdown(wait=False)
+            logger.warning("The snapshot worker for the %s lane is hung and has been replaced.", lane)
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            lanes = self._lanes
+            self._lanes = {}
+        for worker_lane in lanes.values():
+            worker_lane.shutdown(wait=wait)
+
+
 class CaptureSnapshot(object):
 
     def __init__(self, settings, data_directory, cameras, timelapse_job_info, send_gcode_array_callback
-                 , on_new_thumbnail_available_callback, on_post_processing_error_callback):
+                 , on_new_thumbnail_available_callback, on_post_processing_error_callback, worker_pool=None):
         self.Cameras = []
         for current_camera in cameras:
             self.Cameras.append(current_camera)
@@ -119,6 +234,19 @@ class CaptureSnapshot(object):
         self.SendGcodeArrayCallback = send_gcode_array_callback
         self.OnNewThumbnailAvailableCallback = on_new_thumbnail_available_callback
         self.on_post_processing_error_callback = on_post_processing_error_callback
+        self.worker_pool = worker_pool
+
+    def _start_job(self, job):
+        # run the job on its camera's lane if we have a worker pool, else start a new thread.  The before and after
+        # snapshot scripts have their own lane so that they run while the camera's snapshot is downloading.
+        if self.worker_pool is not None:
+            if job.snapshot_job_info.job_type in ('before-snapshot', 'after-snapshot'):
+                lane = SnapshotWorkerPool.get_script_lane(job.snapshot_job_info.camera_guid)
+            else:
+                lane = job.snapshot_job_info.camera_guid
+            job.start_in_pool(self.worker_pool, lane)
+        else:
+            job.start()
 
     def take_snapshots(self, metadata={}, no_wait=False):
         logger.info("Starting snapshot acquisition")
@@ -210,12 +338,12 @@ class CaptureSnapshot(object):
 
         # start the pre-snapshot threads
         for t in before_snapshot_threads:
-            t.start()
+            self._start_job(t)
 
         # join the pre-snapshot threads
         for t in before_snapshot_threads:
             if not no_wait:
-                snapshot_job_info = t.join()
+                snapshot_job_info = t.join(timeout=t.get_hung_timeout_seconds())
                 assert (isinstance(snapshot_job_info, SnapshotJobInfo))
                 if t.snapshot_thread_error:
                     snapshot_job_info.success = False
@@ -233,7 +361,7 @@ class CaptureSnapshot(object):
             logger.info("Starting %d snapshot threads.", len(snapshot_threads))
         # start the snapshot threads, then wait for all threads to signal before continuing
         for t in snapshot_threads:
-            t[0].start()
+            self._start_job(t[0])
 
         # now send any gcode for gcode cameras
         for current_camera in self.Cameras:
@@ -256,9 +384,10 @@ class CaptureSnapshot(object):
         for t, snapshot_job_info, event in snapshot_threads:
             if not no_wait:
                 if event:
-                    event.wait()
+                    if not event.wait(t.get_hung_timeout_seconds()):
+                        t.set_hung()
                 else:
-                    snapshot_job_info = t.join()
+                    snapshot_job_info = t.join(timeout=t.get_hung_timeout_seconds())
                 if t.snapshot_thread_error:
                     snapshot_job_info.success = False
                     snapshot_job_info.error = t.snapshot_thread_error
@@ -302,12 +431,12 @@ class CaptureSnapshot(object):
 
         # start the after-snapshot threads
         for t in after_snapshot_threads:
-            t.start()
+            self._start_job(t)
 
         # join the after-snapshot threads
         for t in after_snapshot_threads:
             if not no_wait:
-                snapshot_job_info = t.join()
+                snapshot_job_info = t.join(timeout=t.get_hung_timeout_seconds())
                 assert (isinstance(snapshot_job_info, SnapshotJobInfo))
                 info = self.CameraInfos[snapshot_job_info.camera_guid]
                 if t.snapshot_thread_error:
@@ -512,12 +641,44 @@ class SnapshotThread(Thread):
         self.on_post_processing_error_callback = on_post_processing_error_callback
         self.post_processing_error = None
         self.snapshot_thread_error = None
+        self._worker_pool = None
+        self._lane = None
+        self._future = None
+
+    def start_in_pool(self, worker_pool, lane):
+        """Runs the job on a SnapshotWorkerPool lane instead of starting a new thread."""
+        self._worker_pool = worker_pool
+        self._lane = lane
+        self._future = worker_pool.submit(lane, self.run)
+
+    def get_hung_timeout_seconds(self):
+        return (
+            self.snapshot_job_info.delay_seconds + self.snapshot_job_info.timeout_seconds +
+            SnapshotWorkerPool.HUNG_JOB_GRACE_SECONDS
+        )
 
     def join(self, timeout=None):
-        super(SnapshotThread, self).join(timeout=timeout)
-
+        """Waits for the job to finish.  If it is still running after the timeout, the job is treated as hung:  it
+        fails, and its lane is replaced so that it doesn't block the next snapshot."""
+        if self._future is not None:
+            # Any exception raised by run has already been logged and recorded in snapshot_thread_error
+            is_running = len(futures.wait([self._future], timeout=timeout).not_done) > 0
+        else:
+            super(SnapshotThread, self).join(timeout=timeout)
+            is_running = self.is_alive()
+        if is_running:
+            self.set_hung()
         return self.snapshot_job_info
 
+    def set_hung(self):
+        message = "The {0} job for the {1} camera did not finish within {2:.0f} seconds.".format(
+            self.snapshot_job_info.job_type, self.snapshot_job_info.camera.name, self.get_hung_timeout_seconds()
+        )
+        logger.error(message)
+        self.snapshot_thread_error = SnapshotError('snapshot-job-hung', message)
+        if self._worker_pool is not None:
+            self._worker_pool.replace_lane(self._lane)
+
     def apply_camera_delay(self):
         # Some users had issues just using sleep.In one examined instance the time.sleep
         # function was being called to sleep 0.250 S, but waited 0.005 S.  To deal with this a sleep loop was
@@ -550,9 +711,14 @@ class SnapshotThread(Thread):
                 on_post_processing_error_callback=self.on_post_processing_error_callback,
                 request=request)
             if not block and not request:
-                processing_thread = Thread(target=post_process_thread, args=[image_post_processor])
-                processing_thread.daemon = True
-                processing_thread.start()
+                if self._worker_pool is not None:
+                    self._worker_pool.submit(
+                        SnapshotWorkerPool.POST_PROCESSING_LANE, post_process_thread, image_post_processor
+                    )
+                else:
+                    processing_thread = Thread(target=post_process_thread, args=[image_post_processor])
+                    processing_thread.daemon = True
+                    processing_thread.start()
             else:
                 image_post_processor.process()
         except SnapshotError as e:
@@ -0,0 +1,212 @@
+# coding=utf-8
+##################################################################################
+# Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+# Copyright (C) 2023  Brad Hochgesang
+##################################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see the following:
+# https://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+#
+# You can contact the author either through the git-hub repository, or at the
+# following email address: FormerLurker@pm.me
+##################################################################################
+from __future__ import unicode_literals
+import os
+import json
+import pickle
+import hashlib
+import threading
+import uuid
+# create the module level logger
+from octoprint_octolapse.log import LoggingConfigurator
+logging_configurator = LoggingConfigurator()
+logger = logging_configurator.get_logger(__name__)
+
+
+class CachedSnapshotPlans(object):
+    """The results of a successful stabilization preprocessing run."""
+    def __init__(
+        self, snapshot_plans, seconds_elapsed, gcodes_processed, lines_processed, missed_snapshots, quality_issues,
+        processing_issues
+    ):
+        self.snapshot_plans = snapshot_plans
+        self.seconds_elapsed = seconds_elapsed
+        self.gcodes_processed = gcodes_processed
+        self.lines_processed = lines_processed
+        self.missed_snapshots = missed_snapshots
+        self.quality_issues = quality_issues
+        self.processing_issues = processing_issues
+
+
+class CachedLayerCandidates(object):
+    """The layer candidates recorded by a smart layer stabilization, which can be used to create the snapshot plans for
+    another smart layer trigger type without processing the gcode file again."""
+    def __init__(self, layer_candidates):
+        self.layer_candidates = layer_candidates
+
+
+class SnapshotPlanCache(object):
+    """A disk backed cache of gcode preprocessing results, mainly snapshot plans.  Entries are keyed by the plugin
+    version, the identity of the gcode file (path, size, modification time and inode) and a fingerprint of every
+    setting that affects the results.  Each entry is stored in its own file, and the least recently used entries are
+    removed when the cache grows beyond its size or entry limits."""
+    # Increment this when the format of the cached data changes.
+    CACHE_FORMAT_VERSION = 2
+    CACHE_FILE_EXTENSION = ".plans"
+    CHECKPOINT_FILE_EXTENSION = ".checkpoint"
+    DEFAULT_MAX_SIZE_BYTES = 100 * 1024 * 1024
+    DEFAULT_MAX_ENTRIES = 50
+
+    def __init__(
+        self, cache_directory, plugin_version=None, max_size_bytes=DEFAULT_MAX_SIZE_BYTES,
+        max_entries=DEFAULT_MAX_ENTRIES
+    ):
+        self._cache_directory = cache_directory
+        self._plugin_version = plugin_version
+        self.max_size_bytes = max_size_bytes
+        self.max_entries = max_entries
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def get_fingerprint(*settings):
+        """Returns a hash of the supplied settings, which must be json serializable (objects are converted with
+        str)."""
+        settings_json = json.dumps(settings, sort_keys=True, default=str)
+        return hashlib.sha256(settings_json.encode("utf-8")).hexdigest()
+
+    def get_key(self, gcode_file_path, fingerprint):
+        """Returns the cache key for the gcode file and settings fingerprint, or None if the file does not exist."""
+        try:
+            file_stat = os.stat(gcode_file_path)
+        except OSError:
+            return None
+        key_json = json.dumps([
+            SnapshotPlanCache.CACHE_FORMAT_VERSION,
+            self._plugin_version,
+            os.path.realpath(gcode_file_path),
+            file_stat.st_size,
+            file_stat.st_mtime_ns,
+            file_stat.st_ino,
+            fingerprint
+        ])
+        return hashlib.sha256(key_json.encode("utf-8")).hexdigest()
+
+    def _get_cache_file_path(self, key):
+        return os.path.join(self._cache_directory, key + SnapshotPlanCache.CACHE_FILE_EXTENSION)
+
+    def get_checkpoint_path(self, key):
+        """Returns the path of the preprocessing checkpoint for the key, or None if there is no key or the cache
+        directory can't be created.  The checkpoint is written and removed by the stabilization itself, but is
+        counted and removed along with the cached entries."""
+        if key is None:
+            return None
+        with self._lock:
+            try:
+                if not os.path.isdir(self._cache_directory):
+                    os.makedirs(self._cache_directory)
+            except (IOError, OSError):
+                logger.exception("Unable to create the snapshot plan cache directory.")
+                return None
+        return os.path.join(self._cache_directory, key + SnapshotPlanCache.CHECKPOINT_FILE_EXTENSION)
+
+    def contains(self, key):
+        """Returns True if there is an entry for the key, without marking it as used."""
+        return key is not None and os.path.isfile(self._get_cache_file_path(key))
+
+    def get(self, key):
+        """Returns the cached value for the key, or None if there is no entry."""
+        if key is None:
+            return None
+        cache_file_path = self._get_cache_file_path(key)
+        with self._lock:
+            try:
+                with open(cache_file_path, "rb") as cache_file:
+                    format_version, cached_plans = pickle.load(cache_file)
+            except (IOError, OSError):
+                # no entry
+                return None
+            except Exception:
+                logger.exception("Unable to load the cached snapshot plans from %s, removing.", cache_file_path)
+                self._remove_file(cache_file_path)
+                return None
+            if format_version != SnapshotPlanCache.CACHE_FORMAT_VERSION:
+                self._remove_file(cache_file_path)
+                return None
+            # update the modification time so that this entry is the most recently used
+            try:
+                os.utime(cache_file_path, None)
+            except (IOError, OSError):
+                pass
+        return cached_plans
+
+    def put(self, key, cached_plans):
+        if key is None:
+            return
+        cache_file_path = self._get_cache_file_path(key)
+        with self._lock:
+            try:
+                if not os.path.isdir(self._cache_directory):
+                    os.makedirs(self._cache_directory)
+                # write to a temporary file so that a partially written entry is never loaded
+                temp_file_path = "{0}.{1}.tmp".format(cache_file_path, uuid.uuid4().hex)
+                with open(temp_file_path, "wb") as cache_file:
+                    pickle.dump(
+                        (SnapshotPlanCache.CACHE_FORMAT_VERSION, cached_plans), cache_file, pickle.HIGHEST_PROTOCOL
+                    )
+                os.replace(temp_file_path, cache_file_path)
+            except Exception:
+                logger.exception("Unable to save the snapshot plans to the cache.")
+                return
+            self._remove_least_recently_used()
+
+    def clear(self):
+        with self._lock:
+            for file_path, file_stat in self._get_entries():
+                self._remove_file(file_path)
+
+    def _get_entries(self):
+        entries = []
+        try:
+            file_names = os.listdir(self._cache_directory)
+        except (IOError, OSError):
+            return entries
+        for file_name in file_names:
+            if not file_name.endswith(
+                (SnapshotPlanCache.CACHE_FILE_EXTENSION, SnapshotPlanCache.CHECKPOINT_FILE_EXTENSION)
+            ):
+                continue
+            file_path = os.path.join(self._cache_directory, file_name)
+            try:
+                entries.append((file_path, os.stat(file_path)))
+            except (IOError, OSError):
+                pass
+        return entries
+
+    def _remove_least_recently_used(self):
+        entries = self._get_entries()
+        # the most recently used entries are first
+        entries.sort(key=lambda entry: entry[1].st_mtime_ns, reverse=True)
+        total_size = 0
+        for index, (file_path, file_stat) in enumerate(entries):
+            total_size += file_stat.st_size
+            # always keep the most recent entry
+            if index > 0 and (index >= self.max_entries or total_size > self.max_size_bytes):
+                logger.debug("Removing the least recently used snapshot plans from the cache: %s", file_path)
+                self._remove_file(file_path)
+
+    @staticmethod
+    def _remove_file(file_path):
+        try:
+            os.remove(file_path)
+        except (IOError, OSError):
+            pass
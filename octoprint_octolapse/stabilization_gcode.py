@@ -216,42 +216,7 @@ class SnapshotPlan(utility.JsonSerializable):
         plan_number = 1
         try:
             for cpp_plan in cpp_snapshot_plans:
-                # extract the arguments
-                file_line_number = cpp_plan[0]
-                file_gcode_number = cpp_plan[1]
-                file_position = cpp_plan[2]
-                travel_distance = cpp_plan[3]
-                saved_travel_distance = cpp_plan[4]
-                triggering_command = (
-                    None if cpp_plan[5] is None else ParsedCommand.create_from_cpp_parsed_command(cpp_plan[5])
-                )
-                start_command = (
-                    None if cpp_plan[6] is None else ParsedCommand.create_from_cpp_parsed_command(cpp_plan[6])
-                )
-                initial_position = Pos.create_from_cpp_pos(cpp_plan[7])
-                steps = []
-                for step in cpp_plan[8]:
-                    action = step[0]
-                    x = step[1]
-                    y = step[2]
-                    z = step[3]
-                    e = step[4]
-                    f = step[5]
-                    steps.append(SnapshotPlanStep(action, x, y, z, e, f))
-                return_position = None if cpp_plan[9] is None else Pos.create_from_cpp_pos(cpp_plan[9])
-                end_command = None if cpp_plan[10] is None else ParsedCommand.create_from_cpp_parsed_command(cpp_plan[10])
-                snapshot_plan = SnapshotPlan(
-                    file_line_number,
-                    file_gcode_number,
-                    file_position,
-                    travel_distance,
-                    saved_travel_distance,
-                    start_command,
-                    triggering_command,
-                    initial_position,
-                    steps,
-                    return_position,
-                    end_command)
+                snapshot_plan = cls.create_from_cpp_snapshot_plan(cpp_plan)
                 snapshot_plans.append(snapshot_plan)
                 logger.verbose("Plan %d: %s", plan_number, snapshot_plan)
                 plan_number += 1
@@ -260,6 +225,82 @@ class SnapshotPlan(utility.JsonSerializable):
             raise e
         return snapshot_plans
 
+    @classmethod
+    def create_from_cpp_snapshot_plan(cls, cpp_plan):
+        # extract the arguments
+        file_line_number = cpp_plan[0]
+        file_gcode_number = cpp_plan[1]
+        file_position = cpp_plan[2]
+        travel_distance = cpp_plan[3]
+        saved_travel_distance = cpp_plan[4]
+        triggering_command = (
+            None if cpp_plan[5] is None else ParsedCommand.create_from_cpp_parsed_command(cpp_plan[5])
+        )
+        start_command = (
+            None if cpp_plan[6] is None else ParsedCommand.create_from_cpp_parsed_command(cpp_plan[6])
+        )
+        initial_position = cpp_plan[7]
+        steps = []
+        for step in cpp_plan[8]:
+            action = step[0]
+            x = step[1]
+            y = step[2]
+            z = step[3]
+            e = step[4]
+            f = step[5]
+            steps.append(SnapshotPlanStep(action, x, y, z, e, f))
+        return_position = cpp_plan[9]
+        end_command = None if cpp_plan[10] is None else ParsedCommand.create_from_cpp_parsed_command(cpp_plan[10])
+        return SnapshotPlan(
+            file_line_number,
+            file_gcode_number,
+            file_position,
+            travel_distance,
+            saved_travel_distance,
+            triggering_command,
+            start_command,
+            initial_position,
+            steps,
+            return_position,
+            end_command)
+
+
+class SnapshotPlanList(object):
+    """A read only sequence of snapshot plans sorted by file_gcode_number.  The plans are kept in the compact form
+    returned by the GcodePositionProcessor, and a SnapshotPlan is only created when a plan is accessed, so large
+    prints don't need a SnapshotPlan (and its positions and steps) in memory for every layer."""
+    def __init__(self, cpp_snapshot_plans):
+        # Either a GcodePositionProcessor.SnapshotPlans object or a list of snapshot plan tuples, sorted by
+        # file_gcode_number
+        self._cpp_snapshot_plans = cpp_snapshot_plans
+
+    def __len__(self):
+        return len(self._cpp_snapshot_plans)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[x] for x in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("snapshot plan index out of range")
+        return SnapshotPlan.create_from_cpp_snapshot_plan(self._cpp_snapshot_plans[index])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def get_file_gcode_numbers(self):
+        if isinstance(self._cpp_snapshot_plans, list):
+            return [cpp_plan[1] for cpp_plan in self._cpp_snapshot_plans]
+        return self._cpp_snapshot_plans.get_file_gcode_numbers()
+
+    def __getstate__(self):
+        # The native plans can't be pickled, so store the plan tuples instead.
+        return {"cpp_snapshot_plans": [self._cpp_snapshot_plans[x] for x in range(len(self))]}
+
+    def __setstate__(self, state):
+        self._cpp_snapshot_plans = state["cpp_snapshot_plans"]
 
 
 class SnapshotGcodeGenerator(object):
@@ -21,14 +21,19 @@
 # following email address: FormerLurker@pm.me
 ##################################################################################
 from __future__ import unicode_literals
+import os
+import json
+import threading
 from threading import Thread
 # Remove python 2 support
 # from six.moves import queue
 import queue as queue
-from octoprint_octolapse.stabilization_gcode import SnapshotPlan, SnapshotGcodeGenerator
+from octoprint_octolapse.stabilization_gcode import SnapshotPlan, SnapshotPlanList, SnapshotGcodeGenerator
 from octoprint_octolapse.settings import PrinterProfile, TriggerProfile, StabilizationProfile
+from octoprint_octolapse.snapshot_plan_cache import CachedSnapshotPlans, CachedLayerCandidates
 import GcodePositionProcessor
 import octoprint_octolapse.error_messages as error_messages
+import octoprint_octolapse.utility as utility
 # create the module level logger
 from octoprint_octolapse.log import LoggingConfigurator
 logging_configurator = LoggingConfigurator()
@@ -36,6 +41,14 @@ logger = logging_configurator.get_logger(__name__)
 
 
 class StabilizationPreprocessingThread(Thread):
+    # The position is tracked on one thread while the remaining threads parse the gcode file.  More than a few
+    # parser threads can't keep the position thread any busier.
+    MAX_PROCESSING_THREADS = 4
+    # New plans wait in a bounded native queue until the progress is polled.  Any plans that do not fit are left out of
+    # the preview (but not the results), so that a slow preview never holds up the stabilization.
+    PREVIEW_QUEUE_CAPACITY = 1000
+    # The largest number of plans sent to the preview callback at once.
+    PREVIEW_CHUNK_SIZE = 100
 
     def __init__(
         self,
@@ -45,7 +58,9 @@ class StabilizationPreprocessingThread(Thread):
         complete_callback,
         cancel_event,
         parsed_command,
-        notification_period_seconds=1
+        notification_period_seconds=1,
+        snapshot_plan_cache=None,
+        preview_callback=None
     ):
 
         super(StabilizationPreprocessingThread, self).__init__()
@@ -67,6 +82,7 @@ class StabilizationPreprocessingThread(Thread):
         self.progress_callback = progress_callback
         self.start_callback = start_callback
         self.complete_callback = complete_callback
+        self.preview_callback = preview_callback
         self.timelapse_settings = timelapse_settings
         self.daemon = True
         self.parsed_command = parsed_command
@@ -77,6 +93,12 @@ class StabilizationPreprocessingThread(Thread):
             self.cancel_event.set()
 
         self.notification_period_seconds = notification_period_seconds
+        self.processing_threads = min(os.cpu_count() or 1, StabilizationPreprocessingThread.MAX_PROCESSING_THREADS)
+        self.progress = GcodePositionProcessor.StabilizationProgress(
+            preview_capacity=(
+                0 if preview_callback is None else StabilizationPreprocessingThread.PREVIEW_QUEUE_CAPACITY
+            )
+        )
         self.snapshot_plans = []
         self.printer_profile = printer
         self.stabilization_profile = stabilization
@@ -86,6 +108,35 @@ class StabilizationPreprocessingThread(Thread):
         self.gcodes_processed = 0
         self.lines_processed = 0
         self.cpp_position_args = printer.get_position_args(timelapse_settings["overridable_printer_profile_settings"])
+        self.snapshot_plan_cache = snapshot_plan_cache
+        self.snapshot_plan_cache_key = None
+        self.layer_candidates_cache_key = None
+        if self.snapshot_plan_cache is not None:
+            # to_dict is shallow, so serialize the profiles with their nested settings
+            printer_settings = json.loads(printer.to_json())
+            trigger_settings = json.loads(trigger.to_json())
+            self.snapshot_plan_cache_key = self.snapshot_plan_cache.get_key(
+                timelapse_settings["gcode_file_path"],
+                self.snapshot_plan_cache.get_fingerprint(
+                    printer_settings,
+                    json.loads(stabilization.to_json()),
+                    trigger_settings,
+                    timelapse_settings["overridable_printer_profile_settings"]
+                )
+            )
+            # Layer candidates can be used for any smart layer trigger type and any stabilization point, so they are
+            # keyed without the trigger type and the stabilization settings.  The other stabilization args that
+            # change the candidates are checked when they are used.
+            trigger_settings.pop("smart_layer_trigger_type", None)
+            self.layer_candidates_cache_key = self.snapshot_plan_cache.get_key(
+                timelapse_settings["gcode_file_path"],
+                self.snapshot_plan_cache.get_fingerprint(
+                    "layer_candidates",
+                    printer_settings,
+                    trigger_settings,
+                    timelapse_settings["overridable_printer_profile_settings"]
+                )
+            )
 
         logger.debug(
             "Pre-Processing thread is constructed."
@@ -98,6 +149,8 @@ class StabilizationPreprocessingThread(Thread):
             )
             # perform the start callback
             self.start_callback()
+            if self._try_complete_from_cache():
+                return
             ret_val, options = self._run_stabilization()
             logger.info(
                 "Received %s snapshot plans from the GcodePositionProcessor stabilization in %s seconds.",
@@ -157,9 +210,22 @@ class StabilizationPreprocessingThread(Thread):
                 error = error_messages.get_error(["preprocessor", "preprocessor_errors", "no_snapshot_plans_returned"])
                 other_errors.append(error)
         elif cpp_snapshot_plans:
-            snapshot_plans = SnapshotPlan.create_from_cpp_snapshot_plans(cpp_snapshot_plans)
+            snapshot_plans = SnapshotPlanList(cpp_snapshot_plans)
 
         errors = other_errors + processing_issues
+        if success and not self.is_cancelled and self.snapshot_plan_cache is not None:
+            self.snapshot_plan_cache.put(
+                self.snapshot_plan_cache_key,
+                CachedSnapshotPlans(
+                    snapshot_plans, seconds_elapsed, gcodes_processed, lines_processed, missed_snapshots,
+                    quality_issues, errors
+                )
+            )
+            options = results[9]
+            if options and options.get("layer_candidates") is not None:
+                self.snapshot_plan_cache.put(
+                    self.layer_candidates_cache_key, CachedLayerCandidates(options["layer_candidates"])
+                )
         self.complete_callback(
             success, self.is_cancelled, snapshot_plans, seconds_elapsed, gcodes_processed, lines_processed,
             missed_snapshots, quality_issues, errors, self.timelapse_settings, self.parsed_command
@@ -169,6 +235,25 @@ class StabilizationPreprocessingThread(Thread):
             "Pre-Processing thread is completed."
         )
 
+    def _try_complete_from_cache(self):
+        if self.snapshot_plan_cache is None:
+            return False
+        cached_plans = self.snapshot_plan_cache.get(self.snapshot_plan_cache_key)
+        if cached_plans is None:
+            return False
+        logger.info(
+            "Loaded %s snapshot plans from the snapshot plan cache.", len(cached_plans.snapshot_plans)
+        )
+        self.complete_callback(
+            True, False, cached_plans.snapshot_plans, cached_plans.seconds_elapsed, cached_plans.gcodes_processed,
+            cached_plans.lines_processed, cached_plans.missed_snapshots, cached_plans.quality_issues,
+            cached_plans.processing_issues, self.timelapse_settings, self.parsed_command
+        )
+        logger.debug(
+            "Pre-Processing thread is completed."
+        )
+        return True
+
     def _get_quality_issues_from_cpp(self, issues):
         quality_issues = []
         for issue in issues:
@@ -203,8 +288,16 @@ class StabilizationPreprocessingThread(Thread):
         stabilization_args = {
             'height_increment': height_increment,
             'notification_period_seconds': self.notification_period_seconds,
+            'processing_threads': self.processing_threads,
+            # progress is published to the progress object, which is polled while the stabilization runs
+            'progress': self.progress,
             'on_progress_received': self.on_progress_received,
             'file_path': self.timelapse_settings["gcode_file_path"],
+            # save the progress periodically, and when cancelled, so that the next run on the same file resumes
+            'checkpoint_file_path': (
+                None if self.snapshot_plan_cache is None
+                else self.snapshot_plan_cache.get_checkpoint_path(self.snapshot_plan_cache_key)
+            ),
             'gcode_generator': self.gcode_generator,
             "x_stabilization_disabled": (
                 self.stabilization_profile.x_type == StabilizationProfile.STABILIZATION_AXIS_TYPE_DISABLED
@@ -254,13 +347,22 @@ class StabilizationPreprocessingThread(Thread):
             smart_layer_args = {
                 'trigger_type': int(self.trigger_profile.smart_layer_trigger_type),
                 'snap_to_print_high_quality': self.trigger_profile.smart_layer_snap_to_print_high_quality,
-                'snap_to_print_smooth': self.trigger_profile.smart_layer_snap_to_print_smooth
+                'snap_to_print_smooth': self.trigger_profile.smart_layer_snap_to_print_smooth,
+                'snap_to_print_split_extrusions': self.trigger_profile.smart_layer_snap_to_print_split_extrusions
             }
-            ret_val = list(GcodePositionProcessor.GetSnapshotPlans_SmartLayer(
-                self.cpp_position_args,
-                stabilization_args,
-                smart_layer_args
-            ))
+            ret_val = self._get_snapshot_plans_from_layer_candidates(stabilization_args, smart_layer_args)
+            if ret_val is None:
+                smart_layer_args['record_layer_candidates'] = self.layer_candidates_cache_key is not None
+                ret_val = list(self._get_snapshot_plans(
+                    GcodePositionProcessor.GetSnapshotPlans_SmartLayer,
+                    stabilization_args,
+                    smart_layer_args
+                ))
+                if smart_layer_args['record_layer_candidates']:
+                    # the layer candidates are added to the end of the results
+                    options["layer_candidates"] = ret_val.pop()
+            else:
+                ret_val = list(ret_val)
             # add the success indicator
             ret_val.insert(0, True)
             # add the 'other' errors (errors not related to the C++ call)
@@ -277,8 +379,8 @@ class StabilizationPreprocessingThread(Thread):
             smart_gcode_args = {
 
             }
-            ret_val = list(GcodePositionProcessor.GetSnapshotPlans_SmartGcode(
-                self.cpp_position_args,
+            ret_val = list(self._get_snapshot_plans(
+                GcodePositionProcessor.GetSnapshotPlans_SmartGcode,
                 stabilization_args,
                 smart_gcode_args
             ))
@@ -308,12 +410,66 @@ class StabilizationPreprocessingThread(Thread):
                 [other_error]
             )
             logger.error("The current precalculated trigger type is unknown.")
-        # We need to sort the snapshot plans by line number because they can sometimes be out of order
-        def sort_by_line_number(val):
-            return val[0]
-        results[1].sort(key=sort_by_line_number)
+        # The snapshot plans can be created out of order, but GcodePositionProcessor.SnapshotPlans is sorted by
+        # file_gcode_number, which is in the same order as the line number.
         return results, options
 
+    def _get_snapshot_plans_from_layer_candidates(self, stabilization_args, smart_layer_args):
+        """Returns the smart layer results created from cached layer candidates, or None if there are no cached layer
+        candidates or if they can't be used with the current settings."""
+        if self.layer_candidates_cache_key is None:
+            return None
+        cached_layer_candidates = self.snapshot_plan_cache.get(self.layer_candidates_cache_key)
+        if cached_layer_candidates is None:
+            return None
+        results = GcodePositionProcessor.GetSnapshotPlans_SmartLayerCandidates(
+            cached_layer_candidates.layer_candidates, self.cpp_position_args, stabilization_args, smart_layer_args
+        )
+        if results is not None:
+            logger.info("Created the snapshot plans from the cached layer candidates.")
+        return results
+
+    def _get_snapshot_plans(self, get_snapshot_plans, stabilization_args, stabilization_type_args):
+        # The GIL is released while the stabilization runs, so poll its progress from another thread.
+        stop_polling_event = threading.Event()
+        progress_thread = utility.RecurringTimerThread(
+            self.notification_period_seconds, self._poll_progress, stop_polling_event
+        )
+        progress_thread.daemon = True
+        progress_thread.start()
+        try:
+            return get_snapshot_plans(self.cpp_position_args, stabilization_args, stabilization_type_args)
+        finally:
+            stop_polling_event.set()
+            progress_thread.join()
+
+    def _poll_progress(self):
+        if not self.on_progress_received(
+            self.progress.percent_complete,
+            self.progress.seconds_elapsed,
+            self.progress.seconds_to_complete,
+            self.progress.gcodes_processed,
+            self.progress.lines_processed
+        ):
+            self.progress.cancel()
+            return
+        if self.preview_callback is not None:
+            self._send_preview_plans()
+
+    def _send_preview_plans(self):
+        cpp_snapshot_plans = self.progress.get_preview_plans()
+        chunk_size = StabilizationPreprocessingThread.PREVIEW_CHUNK_SIZE
+        try:
+            for index in range(0, len(cpp_snapshot_plans), chunk_size):
+                snapshot_plans = [
+                    SnapshotPlan.create_from_cpp_snapshot_plan(cpp_plan)
+                    for cpp_plan in cpp_snapshot_plans[index:index + chunk_size]
+                ]
+                self.preview_callback(snapshot_plans, self.progress.preview_plans_dropped, self.timelapse_settings)
+        except Exception:
+            # The preview is only informational, so never let it stop the stabilization.
+            logger.exception("An error occurred while sending the snapshot plan preview.")
+
     def on_progress_received(self, percent_progress, seconds_elapsed, seconds_to_complete, gcodes_processed,
                              lines_processed):
         try:
@@ -332,5 +488,127 @@ class StabilizationPreprocessingThread(Thread):
         return not self.is_cancelled
 
 
+class BackgroundPreprocessingWorker(Thread):
+    """Preprocesses gcode files in the background when they are added or selected so that the detected slicer
+    settings and snapshot plans are already cached when the print starts.  Files are processed one at a time, in the
+    order they were queued, at a reduced priority."""
+    # the niceness added to this thread, and to the parser threads it starts, where supported
+    NICE_INCREMENT = 10
+    # how long cancel waits for the current file to stop
+    CANCEL_TIMEOUT_SECONDS = 10
+
+    def __init__(self, get_timelapse_settings, snapshot_plan_cache):
+        super(BackgroundPreprocessingWorker, self).__init__()
+        self.daemon = True
+        self.name = "octolapse-background-preprocessing"
+        # a function that takes a gcode file path and returns the timelapse settings for the file
+        self._get_timelapse_settings = get_timelapse_settings
+        self._snapshot_plan_cache = snapshot_plan_cache
+        self._queue = queue.Queue()
+        self._queued_file_paths = set()
+        self._lock = threading.Lock()
+        # incremented on every cancel so that files queued before the cancel are skipped
+        self._cancel_count = 0
+        # the cancel event of the file being processed.  Clear the event to cancel.
+        self._cancel_event = None
+        # set while no file is being processed
+        self._idle_event = threading.Event()
+        self._idle_event.set()
+
+    def add(self, gcode_file_path):
+        with self._lock:
+            if gcode_file_path in self._queued_file_paths:
+                return
+            self._queued_file_paths.add(gcode_file_path)
+            self._queue.put((gcode_file_path, self._cancel_count))
+        logger.debug("Queued %s for background preprocessing.", gcode_file_path)
+
+    def cancel(self, timeout=CANCEL_TIMEOUT_SECONDS):
+        """Cancel the current file and skip any queued files.  Waits up to timeout seconds for the current file to
+        stop, so that it isn't competing with a preprocessing started afterwards.  Returns False if it didn't stop."""
+        with self._lock:
+            self._cancel_count += 1
+            self._queued_file_paths.clear()
+            if self._cancel_event is not None:
+                self._cancel_event.clear()
+        if not self._idle_event.wait(timeout):
+            logger.warning("Background preprocessing did not stop within %s seconds of being cancelled.", timeout)
+            return False
+        return True
+
+    def run(self):
+        self._reduce_priority()
+        while True:
+            gcode_file_path, cancel_count = self._queue.get()
+            with self._lock:
+                if cancel_count != self._cancel_count:
+                    continue
+                self._queued_file_paths.discard(gcode_file_path)
+                self._idle_event.clear()
+            try:
+                self._preprocess(gcode_file_path, cancel_count)
+            except Exception:
+                logger.exception("An error occurred while preprocessing %s in the background.", gcode_file_path)
+            finally:
+                with self._lock:
+                    self._cancel_event = None
+                    self._idle_event.set()
+
+    def _reduce_priority(self):
+        # On linux the niceness of a thread can be set by its native id
+        if not hasattr(os, "setpriority") or not hasattr(threading, "get_native_id"):
+            return
+        try:
+            thread_id = threading.get_native_id()
+            os.setpriority(
+                os.PRIO_PROCESS, thread_id,
+                min(os.getpriority(os.PRIO_PROCESS, thread_id) + BackgroundPreprocessingWorker.NICE_INCREMENT, 19)
+            )
+        except OSError:
+            logger.debug("Unable to reduce the priority of the background preprocessing thread.")
+
+    def _preprocess(self, gcode_file_path, cancel_count):
+        logger.info("Background preprocessing %s.", gcode_file_path)
+        timelapse_settings = self._get_timelapse_settings(gcode_file_path)
+        if not timelapse_settings["success"]:
+            logger.info("Unable to get the timelapse settings, skipping background preprocessing.")
+            return
+        trigger = timelapse_settings["settings"].profiles.current_trigger()
+        if trigger.trigger_type not in TriggerProfile.get_precalculated_trigger_types():
+            return
+        cancel_event = threading.Event()
+        preprocessor = StabilizationPreprocessingThread(
+            timelapse_settings,
+            self._on_progress,
+            self._on_start,
+            self._on_complete,
+            cancel_event,
+            None,
+            snapshot_plan_cache=self._snapshot_plan_cache
+        )
+        with self._lock:
+            if cancel_count != self._cancel_count:
+                return
+            self._cancel_event = cancel_event
+        # run the preprocessor on this thread
+        preprocessor.run()
+
+    def _on_progress(self, *args):
+        pass
 
+    def _on_start(self):
+        pass
 
+    def _on_complete(
+        self, success, is_cancelled, snapshot_plans, seconds_elapsed, gcodes_processed, lines_processed,
+        missed_snapshots, quality_issues, processing_issues, timelapse_settings, parsed_command
+    ):
+        if is_cancelled:
+            logger.info("Background preprocessing was cancelled.")
+        elif success:
+            logger.info(
+                "Background preprocessing created %s snapshot plans in %s seconds.", len(snapshot_plans),
+                seconds_elapsed
+            )
+        else:
+            logger.info("Background preprocessing failed.")
@@ -1590,6 +1590,12 @@ $(function () {
                     //console.log("Previewing snapshot plans.");
                     self.updateState(data);
 
+                    break;
+                case "snapshot-plan-preview-chunk":
+                    // ignore chunks from a preprocessing job that is no longer running
+                    if (data.preprocessing_job_guid === self.preprocessing_job_guid) {
+                        Octolapse.Status.appendSnapshotPlanPreview(data);
+                    }
                     break;
                 case "snapshot-plan-preview-complete":
                     // create the cancel popup
@@ -34,6 +34,7 @@ $(function () {
         self.smart_layer_trigger_type = ko.observable(values.smart_layer_trigger_type);
         self.smart_layer_snap_to_print_high_quality = ko.observable(values.smart_layer_snap_to_print_high_quality);
         self.smart_layer_snap_to_print_smooth = ko.observable(values.smart_layer_snap_to_print_smooth);
+        self.smart_layer_snap_to_print_split_extrusions = ko.observable(values.smart_layer_snap_to_print_split_extrusions);
 
         self.smart_layer_disable_z_lift = ko.observable(values.smart_layer_disable_z_lift);
         self.allow_smart_snapshot_commands = ko.observable(values.allow_smart_snapshot_commands);
@@ -152,6 +153,7 @@ $(function () {
             self.trigger_type(values.trigger_type);
             self.smart_layer_snap_to_print_high_quality(values.smart_layer_snap_to_print_high_quality);
             self.smart_layer_snap_to_print_smooth(values.smart_layer_snap_to_print_smooth);
+            self.smart_layer_snap_to_print_split_extrusions(values.smart_layer_snap_to_print_split_extrusions);
             self.smart_layer_trigger_type(values.smart_layer_trigger_type);
             self.smart_layer_disable_z_lift(values.smart_layer_disable_z_lift);
             self.allow_smart_snapshot_commands(values.allow_smart_snapshot_commands);
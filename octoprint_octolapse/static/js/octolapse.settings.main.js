@@ -31,6 +31,9 @@ $(function () {
         self.show_navbar_icon = ko.observable();
         self.show_navbar_when_not_printing = ko.observable();
         self.cancel_print_on_startup_error = ko.observable();
+        self.preprocess_on_file_added = ko.observable();
+        self.snapshot_plan_cache_max_entries = ko.observable();
+        self.snapshot_plan_cache_max_size_mb = ko.observable();
         self.show_printer_state_changes = ko.observable();
         self.show_position_changes = ko.observable();
         self.show_extruder_state_changes = ko.observable();
@@ -85,6 +88,9 @@ $(function () {
             self.preview_snapshot_plan_autoclose(settings.preview_snapshot_plan_autoclose);
             self.preview_snapshot_plan_seconds(settings.preview_snapshot_plan_seconds);
             self.cancel_print_on_startup_error(settings.cancel_print_on_startup_error);
+            self.preprocess_on_file_added(settings.preprocess_on_file_added);
+            self.snapshot_plan_cache_max_entries(settings.snapshot_plan_cache_max_entries);
+            self.snapshot_plan_cache_max_size_mb(settings.snapshot_plan_cache_max_size_mb);
             self.automatic_update_interval_days(settings.automatic_update_interval_days);
             self.automatic_updates_enabled(settings.automatic_updates_enabled);
             self.snapshot_archive_directory(settings.snapshot_archive_directory);
@@ -90,6 +90,9 @@ $(function () {
             self.ExtruderState = new Octolapse.extruderStateViewModel();
             self.TriggerState = new Octolapse.TriggersStateViewModel();
             self.SnapshotPlanState = new Octolapse.snapshotPlanStateViewModel();
+            // The latest real-time state.  State changed messages may only contain the values that changed since the
+            // previous message (is_delta), so they are merged into this state before the view models are updated.
+            self.real_time_state = {position: null, printer_state: null, extruder: null, triggers: {}};
             self.webcam_settings_popup = new Octolapse.WebcamSettingsPopupViewModel("octolapse_tab_custom_image_preferences_popup");
             self.SnapshotPlanPreview = new Octolapse.SnapshotPlanPreviewPopupViewModel({
                 on_closed: function(){
@@ -223,9 +226,37 @@ $(function () {
                 Octolapse.Help.bindHelpLinks("#octolapse_tab");
             };
 
+            self.mergeStateDelta = function(state){
+                if (!state.is_delta) {
+                    // This is a full state, so discard the previous state
+                    self.real_time_state = {position: null, printer_state: null, extruder: null, triggers: {}};
+                }
+                var merged_state = $.extend({}, state);
+                var names = ["position", "printer_state", "extruder"];
+                for (var index = 0; index < names.length; index++) {
+                    var name = names[index];
+                    if (state[name] != null) {
+                        self.real_time_state[name] = $.extend({}, self.real_time_state[name], state[name]);
+                        merged_state[name] = self.real_time_state[name];
+                    }
+                }
+                if (state.trigger_state != null && state.trigger_state.triggers != null) {
+                    var triggers = [];
+                    for (var trigger_index = 0; trigger_index < state.trigger_state.triggers.length; trigger_index++) {
+                        var trigger = state.trigger_state.triggers[trigger_index];
+                        var merged_trigger = $.extend({}, self.real_time_state.triggers[trigger.type], trigger);
+                        self.real_time_state.triggers[trigger.type] = merged_trigger;
+                        triggers.push(merged_trigger);
+                    }
+                    merged_state.trigger_state = {name: state.trigger_state.name, triggers: triggers};
+                }
+                return merged_state;
+            };
+
             // Update the current tab state
             self.updateState = function(state){
                 //console.log("octolapse.status.js - Updating State")
+                state = self.mergeStateDelta(state);
                 if (state.trigger_type != null)
                     self.is_real_time(state.trigger_type === "real-time");
 
@@ -760,12 +791,23 @@ $(function () {
 
             self.previewSnapshotPlans = function(data){
                 //console.log("Updating snapshot plan state with a preview of the snapshot plans");
+                // The dialog is already open if the plans were streamed during preprocessing
+                var is_open = self.SnapshotPlanState.is_preview;
                 self.SnapshotPlanState.is_preview = true;
                 self.SnapshotPlanState.update(data);
-                self.SnapshotPlanPreview.openDialog();
+                if (!is_open)
+                    self.SnapshotPlanPreview.openDialog();
 
             };
 
+            self.appendSnapshotPlanPreview = function(data){
+                var is_open = self.SnapshotPlanState.is_preview;
+                self.SnapshotPlanState.is_preview = true;
+                self.SnapshotPlanState.append_preview_plans(data);
+                if (!is_open)
+                    self.SnapshotPlanPreview.openDialog();
+            };
+
             self.onTimelapseStart = function () {
                 self.TriggerState.removeAll();
                 self.PrinterState.is_initialized(false);
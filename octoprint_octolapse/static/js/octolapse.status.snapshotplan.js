@@ -62,6 +62,9 @@ Octolapse.snapshotPlanStateViewModel = function() {
             self.autoclose_seconds = ko.observable(0);
             self.quality_issues = ko.observableArray();
             self.missed_snapshots = ko.observable(0);
+            // True while snapshot plans are streamed to the preview during preprocessing
+            self.is_streaming_preview = ko.observable(false);
+            self.preview_plans_dropped = ko.observable(0);
 
             setInterval(function() {
                 var newTimer = self.autoclose_seconds() -1;
@@ -71,6 +74,7 @@ Octolapse.snapshotPlanStateViewModel = function() {
             self.update = function (state) {
                 if (state.snapshot_plans != null)
                 {
+                    self.is_streaming_preview(false);
                     self.snapshot_plans(state.snapshot_plans);
                     self.plan_count(state.snapshot_plans.length);
                     self.total_travel_distance(state.total_travel_distance);
@@ -121,6 +125,34 @@ Octolapse.snapshotPlanStateViewModel = function() {
                 self.update_current_plan();
             };
 
+            self.append_preview_plans = function (data) {
+                if (!self.is_streaming_preview())
+                {
+                    // This is the first chunk, clear any previous plans
+                    self.is_streaming_preview(true);
+                    self.snapshot_plans([]);
+                    self.total_travel_distance(0);
+                    self.total_saved_travel_percent(0);
+                    self.quality_issues([]);
+                    self.missed_snapshots(0);
+                    self.autoclose(false);
+                    self.current_plan_index(0);
+                    self.current_file_line(0);
+                    self.view_current_plan(true);
+                }
+                if (data.printer_volume != null)
+                    self.printer_volume = data.printer_volume;
+
+                var snapshot_plans = self.snapshot_plans().concat(data.snapshot_plans);
+                self.snapshot_plans(snapshot_plans);
+                self.plan_count(snapshot_plans.length);
+                self.preview_plans_dropped(data.plans_dropped);
+                // Follow the newest plan unless a plan was selected
+                if (self.view_current_plan())
+                    self.plan_index(snapshot_plans.length - 1);
+                self.update_current_plan();
+            };
+
             self.update_current_plan = function()
             {
                 if (! (self.snapshot_plans().length > 0 && self.plan_index() <  self.snapshot_plans().length))
@@ -25,12 +25,25 @@ import unittest
 
 from octoprint_octolapse.test.test_command import TestCommand
 from octoprint_octolapse.test.test_extruder import TestExtruder
+from octoprint_octolapse.test.test_hook_metrics import TestHookMetrics
 # from octoprint_octolapse.test.test_gcodeparts import TestGcodeParts
+from octoprint_octolapse.test.test_log import TestRingBufferHandler, TestLoggingConfiguratorRollover
 from octoprint_octolapse.test.test_octolapseplugin import TestOctolapsePlugin
-from octoprint_octolapse.test.test_position import TestPosition
+from octoprint_octolapse.test.test_preprocess import TestPreprocess, TestBackgroundPreprocessingWorker
+from octoprint_octolapse.test.test_position import TestPosition, TestPositionQueue, TestPositionRestrictionIndex
+from octoprint_octolapse.test.test_settings_preprocessor import (
+    TestRegexDispatcher, TestReverseBlockReader, TestHeaderAndTailLines
+)
 from octoprint_octolapse.test.test_snapshotGcode import TestSnapshotGcode
-from octoprint_octolapse.test.test_timelapse import TestTimelapse
-from octoprint_octolapse.test.test_trigger import TestTrigger
+from octoprint_octolapse.test.test_snapshot_plan_cache import TestSnapshotPlanCache
+from octoprint_octolapse.test.test_snapshot_plan_list import TestSnapshotPlanList
+from octoprint_octolapse.test.test_snapshot_worker_pool import TestSnapshotWorkerPool
+from octoprint_octolapse.test.test_smart_layer_stabilization import (
+    TestSplitExtrusions, TestSnapshotPlanPreview, TestLayerCandidates, TestCheckpoints, TestProcessingThreads,
+    TestLineEndings, TestMalformedCommands
+)
+from octoprint_octolapse.test.test_timelapse import TestTimelapse, TestTimelapseStateMessages
+from octoprint_octolapse.test.test_trigger import TestTrigger, TestLayerTriggerUpdateRequired, TestTriggerStateHistory
 from octoprint_octolapse.test.test_trigger_gcode import TestGcodeTrigger
 from octoprint_octolapse.test.test_trigger_layer import TestLayerTrigger
 from octoprint_octolapse.test.test_trigger_timer import TestTimerTrigger
@@ -42,9 +55,17 @@ def test_all():
     # removed Test_Timelapse from the list for the time being.  This test class is very messed up.
     test_classes = [TestCommand, TestExtruder,
                     # TestGcodeParts,
-                    TestPosition, TestSnapshotGcode,
+                    TestPosition, TestPositionQueue, TestPositionRestrictionIndex, TestSnapshotGcode,
                     TestGcodeTrigger, TestLayerTrigger, TestTimerTrigger, TestUtility, TestOctolapsePlugin,
-                    TestTrigger, TestMakerbotReplicator2]
+                    TestTrigger, TestLayerTriggerUpdateRequired, TestTriggerStateHistory, TestHookMetrics,
+                    TestSnapshotPlanCache, TestSnapshotPlanList,
+                    TestSnapshotWorkerPool, TestRingBufferHandler, TestLoggingConfiguratorRollover,
+                    TestRegexDispatcher, TestReverseBlockReader, TestHeaderAndTailLines,
+                    TestSplitExtrusions, TestSnapshotPlanPreview,
+                    TestLayerCandidates, TestCheckpoints, TestProcessingThreads, TestLineEndings, TestMalformedCommands,
+                    TestPreprocess, TestBackgroundPreprocessingWorker,
+                    TestTimelapseStateMessages,
+                    TestMakerbotReplicator2]
 
     loader = unittest.TestLoader()
 
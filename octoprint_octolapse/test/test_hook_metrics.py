@@ -0,0 +1,86 @@
+# coding=utf-8
+##################################################################################
+# Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+# Copyright (C) 2023  Brad Hochgesang
+##################################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see the following:
+# https://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+#
+# You can contact the author either through the git-hub repository, or at the
+# following email address: FormerLurker@pm.me
+##################################################################################
+
+import threading
+import unittest
+from octoprint_octolapse.hook_metrics import LatencyHistogram, HookMetrics
+
+
+class TestHookMetrics(unittest.TestCase):
+    def test_bucket_boundaries(self):
+        """Every value must fall into the bucket whose range contains it."""
+        previous_value = -1
+        for index in range(LatencyHistogram.BUCKET_COUNT):
+            value = LatencyHistogram.get_bucket_value(index)
+            self.assertGreater(value, previous_value)
+            self.assertEqual(LatencyHistogram.get_bucket_index(previous_value + 1), index)
+            self.assertEqual(LatencyHistogram.get_bucket_index(value), index)
+            previous_value = value
+        # values that are too large go into the last bucket
+        self.assertEqual(
+            LatencyHistogram.get_bucket_index(1 << (LatencyHistogram.MAX_VALUE_BITS + 2)),
+            LatencyHistogram.BUCKET_COUNT - 1
+        )
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        self.assertIsNone(histogram.get_percentile(50))
+        for value in range(1, 10001):
+            histogram.record(value * 1000)
+        self.assertEqual(histogram.count, 10000)
+        self.assertEqual(histogram.min, 1000)
+        self.assertEqual(histogram.max, 10000000)
+        # the histogram is accurate to within about 3%
+        self.assertAlmostEqual(histogram.get_percentile(50), 5000000, delta=5000000 * 0.03)
+        self.assertAlmostEqual(histogram.get_percentile(99), 9900000, delta=9900000 * 0.03)
+        self.assertEqual(histogram.get_percentile(100), 10000000)
+
+    def test_record(self):
+        metrics = HookMetrics()
+        metrics.record(HookMetrics.ON_GCODE_QUEUING, HookMetrics.now())
+        metrics.record(HookMetrics.ON_GCODE_QUEUING, HookMetrics.now())
+        hooks = metrics.to_dict()["hooks"]
+        self.assertEqual(hooks[HookMetrics.ON_GCODE_QUEUING]["count"], 2)
+        metrics.reset()
+        self.assertEqual(len(metrics.to_dict()["hooks"]), 0)
+
+    def test_record_from_several_threads(self):
+        metrics = HookMetrics()
+
+        def record():
+            for value in range(10000):
+                metrics.record(HookMetrics.TRIGGERS_UPDATE, HookMetrics.now() - value)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        histogram = metrics.to_dict()["hooks"][HookMetrics.TRIGGERS_UPDATE]
+        self.assertEqual(histogram["count"], 40000)
+        self.assertEqual(sum(count for value, count in histogram["buckets"]), 40000)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestHookMetrics)
+    unittest.TextTestRunner(verbosity=3).run(suite)
@@ -0,0 +1,169 @@
+# coding=utf-8
+##################################################################################
+# Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+# Copyright (C) 2023  Brad Hochgesang
+##################################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see the following:
+# https://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+#
+# You can contact the author either through the git-hub repository, or at the
+# following email address: FormerLurker@pm.me
+##################################################################################
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from octoprint_octolapse.log import LoggingConfigurator, OctolapseRingBufferHandler
+
+
+class CollectingHandler(logging.Handler):
+    def __init__(self):
+        super(CollectingHandler, self).__init__()
+        self.records = []
+        self.is_closed = False
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def get_messages(self):
+        return [record.getMessage() for record in self.records]
+
+    def close(self):
+        self.is_closed = True
+        super(CollectingHandler, self).close()
+
+
+class LoggingSettings(object):
+    default_log_level = logging.DEBUG
+    log_to_console = False
+    enabled_loggers = []
+
+
+def stop_writer_thread(ring_buffer_handler):
+    # Stop the background writer so that the records are only written when the tests expect them to be
+    ring_buffer_handler._stop_event.set()
+    ring_buffer_handler._flush_event.set()
+    ring_buffer_handler._writer_thread.join()
+
+
+class TestRingBufferHandler(unittest.TestCase):
+    def setUp(self):
+        self.target = CollectingHandler()
+        self.handler = OctolapseRingBufferHandler([self.target], capacity=4)
+        stop_writer_thread(self.handler)
+        self.logger = logging.getLogger("octolapse_test.ring_buffer")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
+
+    def test_records_are_dropped_when_full(self):
+        for index in range(6):
+            self.logger.info("record %d", index)
+        self.assertEqual(self.handler.dropped_records, 2)
+        self.assertEqual(self.target.records, [])
+
+        self.handler.flush()
+        self.assertEqual(self.target.get_messages(), [
+            "2 log records were dropped because the log buffer was full.",
+            "record 0", "record 1", "record 2", "record 3"
+        ])
+        self.assertEqual(self.target.records[0].levelno, logging.WARNING)
+
+    def test_dropped_records_are_reported_once(self):
+        for index in range(5):
+            self.logger.info("record %d", index)
+        self.handler.flush()
+        self.logger.info("record 5")
+        self.handler.flush()
+        messages = self.target.get_messages()
+        self.assertEqual(messages[0], "1 log records were dropped because the log buffer was full.")
+        self.assertEqual(messages[1:], ["record 0", "record 1", "record 2", "record 3", "record 5"])
+
+    def test_errors_are_kept_when_full(self):
+        for index in range(4):
+            self.logger.info("record %d", index)
+        self.logger.error("error")
+        self.assertEqual(self.handler.dropped_records, 0)
+        # the full buffer is written by the logging thread, in order
+        self.assertEqual(self.target.get_messages(), ["record 0", "record 1", "record 2", "record 3", "error"])
+
+        for index in range(4, 8):
+            self.logger.info("record %d", index)
+        self.logger.critical("critical")
+        self.assertEqual(self.handler.dropped_records, 0)
+        self.assertEqual(self.target.get_messages()[5:], ["record 4", "record 5", "record 6", "record 7", "critical"])
+
+    def test_messages_are_formatted_when_logged(self):
+        values = [1]
+        self.logger.info("values: %s", values)
+        values.append(2)
+        self.handler.flush()
+        self.assertEqual(self.target.get_messages(), ["values: [1]"])
+
+    def test_close_writes_buffered_records(self):
+        self.logger.info("record")
+        self.handler.close()
+        self.assertEqual(self.target.get_messages(), ["record"])
+        self.assertTrue(self.target.is_closed)
+
+
+class TestLoggingConfiguratorRollover(unittest.TestCase):
+    def setUp(self):
+        self.temp_directory = tempfile.mkdtemp()
+        self.log_file_path = os.path.join(self.temp_directory, "octolapse.log")
+        # LoggingConfigurator is a singleton, so create a separate instance with its own root logger
+        self.configurator = LoggingConfigurator.__new__(LoggingConfigurator)
+        LoggingConfigurator.__init__(self.configurator)
+        self.configurator._root_logger = self.configurator._get_root_logger("octolapse_test_rollover")
+        self.configurator.configure_loggers(self.log_file_path, LoggingSettings())
+        self.configurator.get_root_logger().setLevel(logging.DEBUG)
+        stop_writer_thread(self.configurator._ring_buffer_handler)
+
+    def tearDown(self):
+        self.configurator._remove_handlers()
+        shutil.rmtree(self.temp_directory)
+
+    def read_log_files(self):
+        contents = {}
+        for file_name in os.listdir(self.temp_directory):
+            with open(os.path.join(self.temp_directory, file_name)) as log_file:
+                contents[file_name] = log_file.read()
+        return contents
+
+    def test_rollover_writes_buffered_records(self):
+        self.configurator.get_root_logger().info("before rollover")
+        self.configurator.do_rollover()
+        self.configurator.get_root_logger().info("after rollover")
+        self.configurator._ring_buffer_handler.flush()
+
+        contents = self.read_log_files()
+        self.assertEqual(len(contents), 2)
+        self.assertNotIn("before rollover", contents["octolapse.log"])
+        self.assertIn("after rollover", contents["octolapse.log"])
+        backup_file_name = [file_name for file_name in contents if file_name != "octolapse.log"][0]
+        self.assertIn("before rollover", contents[backup_file_name])
+
+    def test_rollover_clear_all(self):
+        self.configurator.get_root_logger().info("before rollover")
+        self.configurator.do_rollover(clear_all=True)
+
+        contents = self.read_log_files()
+        self.assertEqual(list(contents), ["octolapse.log"])
+        self.assertNotIn("before rollover", contents["octolapse.log"])
@@ -23,11 +23,15 @@
 
 import unittest
 import pprint
+import random
 from tempfile import NamedTemporaryFile
 from octoprint_octolapse.gcode_commands import Commands
 from octoprint_octolapse.position import Pos
-from octoprint_octolapse.position import Position
-from octoprint_octolapse.settings import OctolapseSettings, PrinterProfile, SlicerSettings, Slic3rPeSettings
+from octoprint_octolapse.position import Position, PositionRestrictionIndex
+from octoprint_octolapse.settings import (
+    OctolapseSettings, PrinterProfile, SlicerSettings, Slic3rPeSettings, SnapshotPositionRestrictions, CuraExtruder
+)
+import octoprint_octolapse.utility as utility
 
 
 class TestPosition(unittest.TestCase):
@@ -867,6 +871,128 @@ class TestPosition(unittest.TestCase):
         raise NotImplementedError
 
 
+class TestPositionQueue(unittest.TestCase):
+    def setUp(self):
+        self.Printer = PrinterProfile()
+        self.Printer.auto_detect_position = False
+        self.Printer.slicer_type = 'cura'
+        slicer_settings = self.Printer.get_current_slicer_settings()
+        slicer_settings.layer_height = 0.2
+        extruder = CuraExtruder()
+        extruder.retraction_amount = 1
+        extruder.retraction_retract_speed = 40
+        extruder.speed_travel = 150
+        slicer_settings.extruders = [extruder]
+
+    def create_position(self):
+        return Position(self.Printer, None, self.Printer.get_overridable_profile_settings(False, {
+            "volume": {
+                "width": 200, "depth": 200, "height": 200, "origin": "lowerleft", "formFactor": "rectangular",
+                "custom_box": False
+            }
+        }))
+
+    def test_queue_gcode(self):
+        """Test that queued gcodes produce the same positions as gcodes sent to update."""
+        gcodes = ["G1 X100 Y100 Z0.2 E1", "G1 X110 Y105 E2", "G1 E1.2", "G1 Z0.6", "G1 X120 Y90", "G1 Z0.4 E2"]
+
+        # all positions share the same position processor, so update one at a time
+        position = self.create_position()
+        for gcode in ["G21", "M83", "G90", "G28"]:
+            position.update(gcode)
+        for file_line_number, gcode in enumerate(gcodes, 1):
+            position.update(gcode, file_line_number)
+        expected = [pos.to_dict() for pos in [position.undo_pos, position.previous_pos, position.current_pos]]
+
+        position = self.create_position()
+        for gcode in ["G21", "M83", "G90", "G28"]:
+            position.update(gcode)
+        for file_line_number, gcode in enumerate(gcodes, 1):
+            self.assertTrue(position.can_queue_gcode(gcode))
+            position.queue_gcode(gcode, file_line_number)
+        self.assertTrue(position.has_queued_gcodes())
+
+        # reading any position flushes the queue
+        self.assertEqual(expected[2], position.current_pos.to_dict())
+        self.assertFalse(position.has_queued_gcodes())
+        self.assertEqual(expected[1], position.previous_pos.to_dict())
+        self.assertEqual(expected[0], position.undo_pos.to_dict())
+        self.assertEqual(position.current_pos.file_line_number, len(gcodes))
+
+        # G92 must be processed immediately
+        self.assertFalse(position.can_queue_gcode("G92 E0"))
+
+    def test_location_detection_is_not_queued(self):
+        """Test that the gcode following a location detection command is never queued."""
+        self.Printer.auto_detect_position = True
+        position = self.create_position()
+        for gcode in ["G21", "M83", "G90"]:
+            position.update(gcode)
+        self.assertFalse(position.can_queue_gcode("G28"))
+        position.update("G28")
+        self.assertFalse(position.can_queue_gcode("G1 X100 Y100 Z0.2 E1"))
+        position.update("G1 X100 Y100 Z0.2 E1")
+        self.assertTrue(position.can_queue_gcode("G1 X110 Y105 E2"))
+
+
+class TestPositionRestrictionIndex(unittest.TestCase):
+    @staticmethod
+    def create_restrictions(random_generator, count, restriction_type=None):
+        restrictions = []
+        for index in range(count):
+            current_type = restriction_type or random_generator.choice(["forbidden", "required"])
+            x = random_generator.uniform(0, 250)
+            y = random_generator.uniform(0, 250)
+            if random_generator.random() < 0.5:
+                restrictions.append(SnapshotPositionRestrictions(
+                    current_type, "rect", x, y, x + random_generator.uniform(1, 40), y + random_generator.uniform(1, 40),
+                    0, True
+                ))
+            else:
+                restrictions.append(SnapshotPositionRestrictions(
+                    current_type, "circle", x, y, 0, 0, random_generator.uniform(1, 30), True
+                ))
+        return restrictions
+
+    def assert_matches_unindexed(self, restrictions, random_generator, num_paths=500):
+        index = PositionRestrictionIndex(restrictions)
+        tolerance = utility.FLOAT_MATH_EQUALITY_RANGE
+        for path in range(num_paths):
+            x, y, previous_x, previous_y = [random_generator.uniform(-20, 270) for _ in range(4)]
+            self.assertEqual(
+                index.is_in_position(x, y), Position.calculate_is_in_position(restrictions, x, y, tolerance)
+            )
+            self.assertEqual(
+                index.get_in_position_intersection(x, y, previous_x, previous_y),
+                Position.calculate_in_position_intersection(restrictions, x, y, previous_x, previous_y, tolerance)
+            )
+
+    def test_matches_unindexed_restrictions(self):
+        random_generator = random.Random(0)
+        for count in [1, 2, 10, 50]:
+            self.assert_matches_unindexed(self.create_restrictions(random_generator, count), random_generator)
+            self.assert_matches_unindexed(
+                self.create_restrictions(random_generator, count, "forbidden"), random_generator
+            )
+            self.assert_matches_unindexed(
+                self.create_restrictions(random_generator, count, "required"), random_generator
+            )
+
+    def test_restriction_edges(self):
+        restrictions = [
+            SnapshotPositionRestrictions("required", "rect", 10, 10, 20, 20, 0, True),
+            SnapshotPositionRestrictions("forbidden", "circle", 15, 15, 0, 0, 2, True)
+        ]
+        index = PositionRestrictionIndex(restrictions)
+        self.assertTrue(index.is_in_position(10, 10))
+        self.assertTrue(index.is_in_position(20, 20))
+        self.assertFalse(index.is_in_position(20.1, 20))
+        self.assertFalse(index.is_in_position(17, 15))
+        self.assertTrue(index.is_in_position(17.1, 15))
+        self.assertFalse(index.is_in_position(None, 15))
+        self.assertEqual(index.get_path_intersections(0, 15, 30, 15, True)[1], {'intersection': [20.0, 15.0]})
+
+
 if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(TestPosition)
     unittest.TextTestRunner(verbosity=3).run(suite)
@@ -0,0 +1,174 @@
+# coding=utf-8
+##################################################################################
+# Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+# Copyright (C) 2023  Brad Hochgesang
+##################################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see the following:
+# https://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+#
+# You can contact the author either through the git-hub repository, or at the
+# following email address: FormerLurker@pm.me
+##################################################################################
+
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from octoprint_octolapse import preprocess
+from octoprint_octolapse.stabilization_preprocessing import BackgroundPreprocessingWorker
+from octoprint_octolapse.benchmark.gcode_generator import SyntheticGcode
+from octoprint_octolapse.benchmark.preprocessing import get_timelapse_settings
+from octoprint_octolapse.snapshot_plan_cache import SnapshotPlanCache
+
+
+class TestPreprocess(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.gcode_directory = os.path.join(self.directory, "gcode")
+        os.makedirs(os.path.join(self.gcode_directory, "subdirectory"))
+        self.gcode_file_path = os.path.join(self.gcode_directory, "test.gcode")
+        SyntheticGcode(layers=5, moves_per_layer=20).write(self.gcode_file_path)
+        self.cache_directory = os.path.join(self.directory, "cache")
+        self.settings_path = os.path.join(self.directory, "settings.json")
+        # use the benchmark settings without z lift, since the manual slicer settings require a lift height
+        settings = get_timelapse_settings(self.gcode_file_path, {}, "layer", 0)["settings"]
+        printer = settings.profiles.current_printer()
+        slicer_settings = printer.get_current_slicer_settings()
+        for extruder in slicer_settings.extruders:
+            extruder.retraction_hop_enabled = False
+            extruder.retraction_hop = 0
+        printer.gcode_generation_settings = slicer_settings.get_gcode_generation_settings(
+            slicer_type=printer.slicer_type
+        )
+        with open(self.settings_path, "w") as settings_file:
+            settings_file.write(settings.to_json())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_preprocessor(self, gcode_file_paths, processes=1, max_entries=None):
+        profiles = {"printer": None, "stabilization": None, "trigger": None}
+        cache_limits = {"max_entries": max_entries, "max_size_mb": None}
+        return list(preprocess.run(
+            gcode_file_paths, processes, self.settings_path, profiles, self.cache_directory, cache_limits, None, False,
+            1
+        ))
+
+    def create_gcode_files(self, num_files):
+        gcode_file_paths = []
+        for index in range(num_files):
+            gcode_file_path = os.path.join(self.gcode_directory, "test_{0}.gcode".format(index))
+            SyntheticGcode(layers=3 + index, moves_per_layer=20).write(gcode_file_path)
+            gcode_file_paths.append(gcode_file_path)
+        return gcode_file_paths
+
+    def test_get_gcode_file_paths(self):
+        other_file_path = os.path.join(self.gcode_directory, "subdirectory", "other.GCO")
+        with open(other_file_path, "w") as gcode_file:
+            gcode_file.write("G1 X10 Y10\n")
+        with open(os.path.join(self.gcode_directory, "readme.txt"), "w") as text_file:
+            text_file.write("not gcode")
+        self.assertEqual(preprocess.get_gcode_file_paths([self.gcode_directory]), [self.gcode_file_path])
+        self.assertEqual(
+            preprocess.get_gcode_file_paths([self.gcode_directory, self.gcode_file_path], recursive=True),
+            sorted([self.gcode_file_path, other_file_path])
+        )
+
+    def test_preprocess(self):
+        reports = self.run_preprocessor([self.gcode_file_path])
+        self.assertEqual(len(reports), 1)
+        self.assertTrue(reports[0]["success"], reports[0]["errors"])
+        self.assertEqual(reports[0]["snapshot_plans"], 10)
+        cache_file_names = os.listdir(self.cache_directory)
+        self.assertEqual(len(cache_file_names), 1)
+        self.assertTrue(cache_file_names[0].endswith(SnapshotPlanCache.CACHE_FILE_EXTENSION))
+        # the second run is read from the cache
+        self.assertEqual(self.run_preprocessor([self.gcode_file_path])[0]["snapshot_plans"], 10)
+        self.assertEqual(os.listdir(self.cache_directory), cache_file_names)
+
+    def test_process_pool(self):
+        gcode_file_paths = self.create_gcode_files(3)
+        reports = self.run_preprocessor(gcode_file_paths, processes=2)
+        self.assertEqual(sorted(report["file_path"] for report in reports), gcode_file_paths)
+        cache = SnapshotPlanCache(self.cache_directory)
+        for report in reports:
+            self.assertTrue(report["success"], report["errors"])
+            self.assertEqual(report["snapshot_plans"], 2 * (3 + gcode_file_paths.index(report["file_path"])))
+            self.assertTrue(cache.contains(report["cache_key"]))
+
+    def test_cache_limits(self):
+        gcode_file_paths = self.create_gcode_files(3)
+        reports = self.run_preprocessor(gcode_file_paths, max_entries=2)
+        cache = SnapshotPlanCache(self.cache_directory)
+        self.assertEqual([cache.contains(report["cache_key"]) for report in reports], [False, True, True])
+        # the limits default to the main settings
+        settings = preprocess.load_settings(self.settings_path)
+        settings.main_settings.snapshot_plan_cache_max_entries = 5
+        cache = preprocess.create_snapshot_plan_cache(self.cache_directory, settings)
+        self.assertEqual(cache.max_entries, 5)
+        self.assertEqual(cache.max_size_bytes, settings.main_settings.snapshot_plan_cache_max_size_mb * 1024 * 1024)
+        self.assertEqual(preprocess.create_snapshot_plan_cache(self.cache_directory, settings, 10).max_entries, 10)
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            preprocess.load_settings(self.settings_path, trigger="Missing Trigger")
+        missing_file_path = os.path.join(self.gcode_directory, "missing.gcode")
+        reports = self.run_preprocessor([missing_file_path])
+        self.assertFalse(reports[0]["success"])
+        self.assertEqual(reports[0]["file_path"], missing_file_path)
+
+
+class TestBackgroundPreprocessingWorker(unittest.TestCase):
+    def setUp(self):
+        self.started_file_paths = []
+        self.started_event = threading.Event()
+        self.release_event = threading.Event()
+        self.worker = BackgroundPreprocessingWorker(self.get_timelapse_settings, None)
+        self.worker.start()
+
+    def tearDown(self):
+        self.release_event.set()
+
+    def get_timelapse_settings(self, gcode_file_path):
+        # blocks until released, as if the file were being processed
+        self.started_file_paths.append(gcode_file_path)
+        self.started_event.set()
+        self.release_event.wait()
+        return {"success": False}
+
+    def test_cancel_when_idle(self):
+        self.assertTrue(self.worker.cancel(timeout=0))
+
+    def test_cancel_waits_for_the_current_file(self):
+        self.worker.add("first.gcode")
+        self.assertTrue(self.started_event.wait(5))
+        # the file is still being processed
+        self.assertFalse(self.worker.cancel(timeout=0.1))
+        threading.Timer(0.1, self.release_event.set).start()
+        self.assertTrue(self.worker.cancel(timeout=5))
+        self.assertTrue(self.release_event.is_set())
+
+    def test_queued_files_are_skipped(self):
+        self.worker.add("first.gcode")
+        self.assertTrue(self.started_event.wait(5))
+        self.worker.add("second.gcode")
+        self.assertFalse(self.worker.cancel(timeout=0))
+        self.release_event.set()
+        self.assertTrue(self.worker.cancel(timeout=5))
+        self.started_event.clear()
+        self.worker.add("third.gcode")
+        self.assertTrue(self.started_event.wait(5))
+        self.assertEqual(self.started_file_paths, ["first.gcode", "third.gcode"])
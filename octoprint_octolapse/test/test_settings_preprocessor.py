@@ -0,0 +1,141 @@
+# coding=utf-8
+##################################################################################
+# Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+# Copyright (C) 2023  Brad Hochgesang
+##################################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see the following:
+# https://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+#
+# You can contact the author either through the git-hub repository, or at the
+# following email address: FormerLurker@pm.me
+##################################################################################
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from itertools import islice
+from octoprint_octolapse.settings_preprocessor import RegexDefinition, RegexDispatcher, ReverseBlockReader
+import GcodePositionProcessor
+
+
+class TestRegexDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.definitions = [
+            RegexDefinition(u"general_setting", u"^; (?P<key>[^,]*?) = (?P<val>.*)"),
+            RegexDefinition(u"layer_height", u"^; layer_height = (?P<val>.*)$"),
+            RegexDefinition(u"version", r";\sgenerated\sby\s(?P<ver>.*)$"),
+        ]
+        self.dispatcher = RegexDispatcher(self.definitions)
+
+    def test_first_definition_wins(self):
+        regex_definition, match = self.dispatcher.match(u"; layer_height = 0.2")
+        self.assertIs(regex_definition, self.definitions[0])
+        self.assertEqual(match.group(u"key", u"val"), (u"layer_height", u"0.2"))
+        self.assertEqual(match.group(u"val"), u"0.2")
+
+    def test_unanchored_definition(self):
+        regex_definition, match = self.dispatcher.match(u"G1 X10 ; generated by Slicer 1.0")
+        self.assertIs(regex_definition, self.definitions[2])
+        self.assertEqual(match.group(u"ver"), u"Slicer 1.0")
+
+    def test_no_match(self):
+        self.assertEqual(self.dispatcher.match(u"G1 X10 Y10"), (None, None))
+        self.assertEqual(RegexDispatcher([]).match(u"; layer_height = 0.2"), (None, None))
+
+
+class TestReverseBlockReader(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.directory, "test.gcode")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, text, **kwargs):
+        with open(self.file_path, "wb") as gcode_file:
+            gcode_file.write(text)
+        lines = []
+        with ReverseBlockReader(self.file_path, **kwargs) as reader:
+            for line in reader:
+                lines.append((line, reader.position))
+        return lines
+
+    def test_read_lines(self):
+        expected = [(u"G1 X3", 14), (u"", 13), (u"G1 X2", 7), (u"G1 X1", 0)]
+        self.assertEqual(self.read(b"G1 X1\r\nG1 X2\n\nG1 X3\n", block_size=4), expected)
+        self.assertEqual(self.read(b"G1 X1\r\nG1 X2\n\nG1 X3"), expected)
+        self.assertEqual(self.read(b""), [])
+
+    def test_max_bytes(self):
+        text = b"G1 X1\nG1 X2\nG1 X3\n"
+        # the line cut off by the limit is skipped
+        self.assertEqual(self.read(text, max_bytes=8, block_size=3), [(u"G1 X3", 12)])
+        self.assertEqual(self.read(text, max_bytes=12, block_size=3), [(u"G1 X3", 12), (u"G1 X2", 6)])
+
+
+class TestHeaderAndTailLines(unittest.TestCase):
+    FILES = [
+        b"",
+        b"G1 X1",
+        b"G1 X1\n",
+        b"G1 X1\nG1 X2\nG1 X3\nG1 X4\nG1 X5\nG1 X6\n",
+        # no trailing newline
+        b"G1 X1\nG1 X2\nG1 X3\nG1 X4\nG1 X5\nG1 X6",
+        b"G1 X1\r\nG1 X2\r\n\r\nG1 X3\r\n",
+        b"G1 X1\r\nG1 X2\n\nG1 X3",
+        b"\n\n; comment\n\nG1 X1\n\n",
+    ]
+    # (max header lines, max tail lines, max tail bytes), including windows longer than the files
+    WINDOWS = [(2, 2, 0), (0, 3, 0), (3, 0, 0), (10, 10, 0), (100, 100, 0), (2, 10, 8), (2, 10, 13), (2, 10, 1000)]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.directory, "test.gcode")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_python_header_and_tail_lines(self, max_header_lines, max_tail_lines, max_tail_bytes):
+        # read the lines the same way as GcodeFileProcessor.process_forwards and process_reverse
+        with open(self.file_path, 'r') as f:
+            header_lines = [line.rstrip(u"\r\n") for line in islice(iter(f.readline, ''), max_header_lines)]
+        with ReverseBlockReader(self.file_path, max_bytes=max_tail_bytes) as reader:
+            tail_lines = list(islice(reader, max_tail_lines))
+        tail_lines.reverse()
+        return header_lines, tail_lines
+
+    def test_native_lines_match_python(self):
+        for text in TestHeaderAndTailLines.FILES:
+            with open(self.file_path, "wb") as gcode_file:
+                gcode_file.write(text)
+            for window in TestHeaderAndTailLines.WINDOWS:
+                header_lines, tail_lines = GcodePositionProcessor.GetHeaderAndTailLines(self.file_path, *window)
+                self.assertEqual(
+                    (header_lines, tail_lines), self.get_python_header_and_tail_lines(*window), (text, window)
+                )
+
+    def test_file_shorter_than_the_tail(self):
+        with open(self.file_path, "wb") as gcode_file:
+            gcode_file.write(b"G1 X1\nG1 X2\nG1 X3")
+        self.assertEqual(
+            GcodePositionProcessor.GetHeaderAndTailLines(self.file_path, 2, 10),
+            ([u"G1 X1", u"G1 X2"], [u"G1 X1", u"G1 X2", u"G1 X3"])
+        )
+
+    def test_missing_file(self):
+        self.assertRaises(
+            IOError, GcodePositionProcessor.GetHeaderAndTailLines, os.path.join(self.directory, "missing.gcode"), 1, 1
+        )
@@ -0,0 +1,544 @@
+# coding=utf-8
+##################################################################################
+# Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+# Copyright (C) 2023  Brad Hochgesang
+##################################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see the following:
+# https://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+#
+# You can contact the author either through the git-hub repository, or at the
+# following email address: FormerLurker@pm.me
+##################################################################################
+
+
+import logging
+import os
+import tempfile
+import unittest
+from octoprint_octolapse.log import LoggingConfigurator
+from octoprint_octolapse.settings import PrinterProfile, CuraExtruder
+from octoprint_octolapse.stabilization_gcode import SnapshotPlanList
+import GcodePositionProcessor
+
+
+class StabilizationPointGenerator(object):
+    def __init__(self, x=100.0, y=100.0):
+        self.x = x
+        self.y = y
+
+    def get_snapshot_position(self, x, y):
+        return {"x": self.x, "y": self.y}
+
+
+class SmartLayerTestCase(unittest.TestCase):
+    def setUp(self):
+        # each layer has one long extrusion that passes near the stabilization point half way through
+        lines = ["G21", "G90", "M83", "G28", "G92 E0"]
+        for layer in range(5):
+            lines.extend([
+                ";LAYER:{0}".format(layer),
+                "G0 F9000 Z{0:.1f}".format(0.2 * (layer + 1)),
+                "G0 F9000 X10 Y{0}".format(98 + layer),
+                "G1 F1800 X190 Y{0} E6".format(98 + layer),
+                "G1 X190 Y150 E1",
+            ])
+        gcode_file, self.gcode_file_path = tempfile.mkstemp(suffix=".gcode")
+        with os.fdopen(gcode_file, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+
+        printer = PrinterProfile()
+        printer.slicer_type = 'cura'
+        slicer_settings = printer.get_current_slicer_settings()
+        slicer_settings.layer_height = 0.2
+        extruder = CuraExtruder()
+        extruder.retraction_amount = 1
+        extruder.retraction_retract_speed = 40
+        extruder.speed_travel = 150
+        slicer_settings.extruders = [extruder]
+        self.position_args = printer.get_position_args(printer.get_overridable_profile_settings(False, {
+            "volume": {
+                "width": 200, "depth": 200, "height": 200, "origin": "lowerleft", "formFactor": "rectangular",
+                "custom_box": False
+            }
+        }))
+
+    def tearDown(self):
+        os.remove(self.gcode_file_path)
+
+    def get_stabilization_args(self, progress=None, gcode_generator=None):
+        stabilization_args = {
+            'height_increment': 0,
+            'notification_period_seconds': 1,
+            'on_progress_received': lambda *args: True,
+            'file_path': self.gcode_file_path,
+            'gcode_generator': gcode_generator or StabilizationPointGenerator(),
+            'x_stabilization_disabled': False,
+            'y_stabilization_disabled': False,
+            'allow_snapshot_commands': False,
+            'snapshot_command': ''
+        }
+        if progress is not None:
+            stabilization_args['progress'] = progress
+        return stabilization_args
+
+    @staticmethod
+    def get_smart_layer_args(trigger_type=0, split_extrusions=False):
+        return {
+            'trigger_type': trigger_type,
+            'snap_to_print_high_quality': False,
+            'snap_to_print_smooth': False,
+            'snap_to_print_split_extrusions': split_extrusions
+        }
+
+    def get_snapshot_plans(self, split_extrusions=False, progress=None):
+        results = GcodePositionProcessor.GetSnapshotPlans_SmartLayer(
+            self.position_args,
+            self.get_stabilization_args(progress),
+            self.get_smart_layer_args(split_extrusions=split_extrusions)
+        )
+        return SnapshotPlanList(results[0])
+
+
+class TestSplitExtrusions(SmartLayerTestCase):
+
+    def test_split_disabled(self):
+        plans = self.get_snapshot_plans(False)
+        self.assertEqual(len(plans), 5)
+        for plan in plans:
+            self.assertEqual(plan.start_command.gcode, plan.triggering_command.gcode)
+            self.assertIsNone(plan.end_command)
+
+    def test_split_enabled(self):
+        plans = self.get_snapshot_plans(True)
+        self.assertEqual(len(plans), 5)
+        for layer, plan in enumerate(plans):
+            y = 98 + layer
+            self.assertEqual(plan.triggering_command.gcode, "G1 F1800 X190 Y{0} E6".format(y))
+            self.assertEqual(plan.start_command.gcode, "G1 X100.000 Y{0}.000 E3.00000 F1800.000".format(y))
+            self.assertEqual(plan.end_command.gcode, "G1 X190.000 Y{0}.000 E3.00000 F1800.000".format(y))
+            self.assertAlmostEqual(plan.initial_position.x, 100)
+            self.assertAlmostEqual(plan.initial_position.y, y)
+
+
+class TestSnapshotPlanPreview(SmartLayerTestCase):
+    def test_preview_disabled(self):
+        progress = GcodePositionProcessor.StabilizationProgress()
+        self.get_snapshot_plans(progress=progress)
+        self.assertEqual(progress.get_preview_plans(), [])
+        self.assertEqual(progress.preview_plans_dropped, 0)
+
+    def test_preview_queue_is_bounded(self):
+        progress = GcodePositionProcessor.StabilizationProgress(preview_capacity=2)
+        plans = self.get_snapshot_plans(progress=progress)
+        # nothing reads the preview during the stabilization, so only the first plans fit in the queue
+        preview_plans = SnapshotPlanList(progress.get_preview_plans())
+        self.assertEqual(len(preview_plans), 2)
+        self.assertEqual(progress.preview_plans_dropped, 3)
+        for index, plan in enumerate(preview_plans):
+            self.assertEqual(plan.to_dict(), plans[index].to_dict())
+        # reading the preview empties the queue
+        self.assertEqual(progress.get_preview_plans(), [])
+
+    def test_negative_preview_capacity(self):
+        self.assertRaises(ValueError, GcodePositionProcessor.StabilizationProgress, preview_capacity=-1)
+
+
+class StabilizationPointSequence(object):
+    def __init__(self, points):
+        self.points = points
+        self.index = 0
+
+    def get_snapshot_position(self, x, y):
+        point = self.points[self.index % len(self.points)]
+        self.index += 1
+        return {"x": point[0], "y": point[1]}
+
+
+class TestLayerCandidates(SmartLayerTestCase):
+    # fast, compatibility and high quality
+    TRIGGER_TYPES = (1, 2, 3)
+
+    def setUp(self):
+        super(TestLayerCandidates, self).setUp()
+        # Every layer has travels and extrusions spread over the bed.  The even layers have features and a faster
+        # infill, and the odd layers have neither features nor retractions, so the fast, compatibility and high
+        # quality triggers select different positions.  There are enough lines for several keyframes.
+        lines = ["G21", "G90", "M83", "G28", "G92 E0"]
+        for layer in range(40):
+            lines.extend([
+                ";LAYER:{0}".format(layer),
+                "G0 F9000 Z{0:.1f}".format(0.2 * (layer + 1)),
+            ])
+            has_features = layer % 2 == 0
+            if has_features:
+                lines.append(";TYPE:WALL-INNER")
+            for index in range(24):
+                if index % 4 == 0:
+                    lines.append("G0 F9000 X{0} Y{1}".format(
+                        20 + (layer * 37 + index * 53) % 160, 20 + (layer * 59 + index * 31) % 160
+                    ))
+                lines.append("G1 F1800 X{0} Y{1} E0.5".format(
+                    20 + (layer * 17 + index * 29) % 160, 20 + (layer * 23 + index * 41) % 160
+                ))
+            if has_features:
+                lines.append(";TYPE:FILL")
+                for index in range(6):
+                    lines.append("G1 F3000 X{0} Y{1} E0.5".format(
+                        20 + (layer * 13 + index * 67) % 160, 20 + (layer * 29 + index * 19) % 160
+                    ))
+                lines.extend([
+                    "G1 F2400 E-1",
+                    "G0 F9000 X{0} Y{1}".format(20 + (layer * 71) % 160, 20 + (layer * 43) % 160),
+                    "G1 F2400 E1",
+                ])
+        with open(self.gcode_file_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+
+    def record_layer_candidates(self, trigger_type, stabilization_args=None):
+        smart_layer_args = self.get_smart_layer_args(trigger_type)
+        smart_layer_args['record_layer_candidates'] = True
+        results = GcodePositionProcessor.GetSnapshotPlans_SmartLayer(
+            self.position_args, stabilization_args or self.get_stabilization_args(), smart_layer_args
+        )
+        # the layer candidates are added to the end of the results
+        self.assertEqual(len(results), 8)
+        return results[7]
+
+    def get_candidate_results(self, layer_candidates, trigger_type, stabilization_args=None):
+        return GcodePositionProcessor.GetSnapshotPlans_SmartLayerCandidates(
+            layer_candidates, self.position_args, stabilization_args or self.get_stabilization_args(),
+            self.get_smart_layer_args(trigger_type)
+        )
+
+    @staticmethod
+    def get_plan_dicts(results):
+        return [plan.to_dict() for plan in SnapshotPlanList(results[0])]
+
+    def assert_results_equal(self, results, expected_results):
+        self.assertIsNotNone(results)
+        self.assertTrue(results[0])
+        self.assertEqual(self.get_plan_dicts(results), self.get_plan_dicts(expected_results))
+        # everything but the seconds elapsed
+        self.assertEqual(results[2:], expected_results[2:])
+
+    def test_trigger_types_select_different_plans(self):
+        plans = [
+            self.get_plan_dicts(GcodePositionProcessor.GetSnapshotPlans_SmartLayer(
+                self.position_args, self.get_stabilization_args(), self.get_smart_layer_args(trigger_type)
+            ))
+            for trigger_type in TestLayerCandidates.TRIGGER_TYPES
+        ]
+        self.assertNotEqual(plans[0], plans[1])
+        self.assertNotEqual(plans[0], plans[2])
+        self.assertNotEqual(plans[1], plans[2])
+
+    def test_plans_match_processing_the_file(self):
+        for recorded_trigger_type in TestLayerCandidates.TRIGGER_TYPES:
+            layer_candidates = self.record_layer_candidates(recorded_trigger_type)
+            self.assertIsInstance(layer_candidates, bytes)
+            for trigger_type in TestLayerCandidates.TRIGGER_TYPES:
+                expected_results = GcodePositionProcessor.GetSnapshotPlans_SmartLayer(
+                    self.position_args, self.get_stabilization_args(), self.get_smart_layer_args(trigger_type)
+                )
+                self.assert_results_equal(self.get_candidate_results(layer_candidates, trigger_type), expected_results)
+
+    def test_stabilization_point_changed(self):
+        layer_candidates = self.record_layer_candidates(2)
+        for point in ((50.0, 50.0), (150.0, 30.0), (0.0, 200.0)):
+            for trigger_type in TestLayerCandidates.TRIGGER_TYPES:
+                stabilization_args = self.get_stabilization_args(gcode_generator=StabilizationPointGenerator(*point))
+                expected_results = GcodePositionProcessor.GetSnapshotPlans_SmartLayer(
+                    self.position_args, stabilization_args, self.get_smart_layer_args(trigger_type)
+                )
+                stabilization_args = self.get_stabilization_args(gcode_generator=StabilizationPointGenerator(*point))
+                self.assert_results_equal(
+                    self.get_candidate_results(layer_candidates, trigger_type, stabilization_args), expected_results
+                )
+
+    def test_stabilization_point_changes_after_each_plan(self):
+        points = [(30.0, 40.0), (170.0, 60.0), (90.0, 180.0), (100.0, 100.0), (10.0, 10.0)]
+        layer_candidates = self.record_layer_candidates(
+            1, self.get_stabilization_args(gcode_generator=StabilizationPointSequence(points[1:]))
+        )
+        for trigger_type in TestLayerCandidates.TRIGGER_TYPES:
+            expected_results = GcodePositionProcessor.GetSnapshotPlans_SmartLayer(
+                self.position_args,
+                self.get_stabilization_args(gcode_generator=StabilizationPointSequence(points)),
+                self.get_smart_layer_args(trigger_type)
+            )
+            stabilization_args = self.get_stabilization_args(gcode_generator=StabilizationPointSequence(points))
+            self.assert_results_equal(
+                self.get_candidate_results(layer_candidates, trigger_type, stabilization_args), expected_results
+            )
+
+    def test_height_increment_changed(self):
+        layer_candidates = self.record_layer_candidates(2)
+        stabilization_args = self.get_stabilization_args()
+        stabilization_args['height_increment'] = 0.4
+        self.assertIsNone(self.get_candidate_results(layer_candidates, 2, stabilization_args))
+
+    def test_file_changed(self):
+        layer_candidates = self.record_layer_candidates(2)
+        with open(self.gcode_file_path, 'w') as f:
+            f.write("G21\nG90\n")
+        self.assertIsNone(self.get_candidate_results(layer_candidates, 2))
+
+    def test_snap_to_print_is_not_recorded(self):
+        self.assertIsNone(self.record_layer_candidates(0))
+
+    def test_snap_to_print_is_not_created(self):
+        layer_candidates = self.record_layer_candidates(2)
+        self.assertIsNone(self.get_candidate_results(layer_candidates, 0))
+
+
+class TestCheckpoints(SmartLayerTestCase):
+    def setUp(self):
+        super(TestCheckpoints, self).setUp()
+        # long enough to be cancelled part way through, which is checked every 2000 lines
+        lines = ["G21", "G90", "M83", "G28", "G92 E0"]
+        for layer in range(100):
+            lines.extend([
+                ";LAYER:{0}".format(layer),
+                "G0 F9000 Z{0:.1f}".format(0.2 * (layer + 1)),
+            ])
+            for index in range(30):
+                lines.append("G1 F1800 X{0} Y{1} E0.5".format(10 + index * 6, 50 + (layer * 7 + index * 13) % 100))
+        with open(self.gcode_file_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        self.checkpoint_file_path = self.gcode_file_path + ".checkpoint"
+
+    def tearDown(self):
+        if os.path.exists(self.checkpoint_file_path):
+            os.remove(self.checkpoint_file_path)
+        super(TestCheckpoints, self).tearDown()
+
+    def run_stabilization(self, trigger_type, cancel=False):
+        progress = GcodePositionProcessor.StabilizationProgress()
+        if cancel:
+            progress.cancel()
+        stabilization_args = self.get_stabilization_args(progress)
+        stabilization_args['checkpoint_file_path'] = self.checkpoint_file_path
+        return GcodePositionProcessor.GetSnapshotPlans_SmartLayer(
+            self.position_args, stabilization_args, self.get_smart_layer_args(trigger_type)
+        )
+
+    def assert_results_equal(self, results, expected_results):
+        self.assertEqual(
+            [plan.to_dict() for plan in SnapshotPlanList(results[0])],
+            [plan.to_dict() for plan in SnapshotPlanList(expected_results[0])]
+        )
+        # everything but the seconds elapsed
+        self.assertEqual(results[2:], expected_results[2:])
+
+    def test_resume(self):
+        for trigger_type in (0, 2, 3):
+            expected_results = GcodePositionProcessor.GetSnapshotPlans_SmartLayer(
+                self.position_args, self.get_stabilization_args(), self.get_smart_layer_args(trigger_type)
+            )
+            self.assertFalse(os.path.exists(self.checkpoint_file_path))
+            results = self.run_stabilization(trigger_type, cancel=True)
+            # processing stopped at the first cancellation check
+            self.assertEqual(results[3], 2000)
+            self.assertTrue(os.path.exists(self.checkpoint_file_path))
+            results = self.run_stabilization(trigger_type)
+            self.assert_results_equal(results, expected_results)
+            # the checkpoint is removed once the whole file has been processed
+            self.assertFalse(os.path.exists(self.checkpoint_file_path))
+
+    def test_checkpoint_with_other_settings_is_ignored(self):
+        self.run_stabilization(2, cancel=True)
+        self.assertTrue(os.path.exists(self.checkpoint_file_path))
+        expected_results = GcodePositionProcessor.GetSnapshotPlans_SmartLayer(
+            self.position_args, self.get_stabilization_args(), self.get_smart_layer_args(3)
+        )
+        self.assert_results_equal(self.run_stabilization(3), expected_results)
+        self.assertFalse(os.path.exists(self.checkpoint_file_path))
+
+    def test_invalid_checkpoint_is_ignored(self):
+        with open(self.checkpoint_file_path, 'wb') as f:
+            f.write(b"not a checkpoint")
+        expected_results = GcodePositionProcessor.GetSnapshotPlans_SmartLayer(
+            self.position_args, self.get_stabilization_args(), self.get_smart_layer_args(3)
+        )
+        self.assert_results_equal(self.run_stabilization(3), expected_results)
+
+
+class TestProcessingThreads(SmartLayerTestCase):
+    def setUp(self):
+        super(TestProcessingThreads, self).setUp()
+        # about 1MB, so that the file is split into several chunks when there is more than one processing thread
+        lines = ["G21", "G90", "M83", "G28", "G92 E0"]
+        for layer in range(240):
+            lines.extend([
+                ";LAYER:{0}".format(layer),
+                "G0 F9000 Z{0:.1f}".format(0.2 * (layer + 1)),
+            ])
+            for index in range(200):
+                lines.append("G1 F1800 X{0} Y{1} E0.5".format(
+                    10 + (layer * 11 + index * 7) % 180, 10 + (layer * 7 + index * 13) % 180
+                ))
+        with open(self.gcode_file_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        self.assertGreater(os.path.getsize(self.gcode_file_path), 4 * 256 * 1024)
+        self.checkpoint_file_path = self.gcode_file_path + ".checkpoint"
+
+    def tearDown(self):
+        if os.path.exists(self.checkpoint_file_path):
+            os.remove(self.checkpoint_file_path)
+        super(TestProcessingThreads, self).tearDown()
+
+    def run_stabilization(self, trigger_type, processing_threads, progress=None, checkpoint=False):
+        stabilization_args = self.get_stabilization_args(progress)
+        stabilization_args['processing_threads'] = processing_threads
+        if checkpoint:
+            stabilization_args['checkpoint_file_path'] = self.checkpoint_file_path
+        return GcodePositionProcessor.GetSnapshotPlans_SmartLayer(
+            self.position_args, stabilization_args, self.get_smart_layer_args(trigger_type)
+        )
+
+    def assert_results_equal(self, results, expected_results):
+        # the plans include the file line numbers and file positions
+        self.assertEqual(
+            [plan.to_dict() for plan in SnapshotPlanList(results[0])],
+            [plan.to_dict() for plan in SnapshotPlanList(expected_results[0])]
+        )
+        # everything but the seconds elapsed
+        self.assertEqual(results[2:], expected_results[2:])
+
+    def test_threads_match_single_thread(self):
+        for trigger_type in (0, 2, 3):
+            expected_results = self.run_stabilization(trigger_type, 1)
+            self.assertTrue(expected_results[0])
+            self.assert_results_equal(self.run_stabilization(trigger_type, 4), expected_results)
+
+    def test_resume_with_threads(self):
+        for trigger_type in (0, 2, 3):
+            expected_results = self.run_stabilization(trigger_type, 1)
+            for processing_threads in (1, 4):
+                progress = GcodePositionProcessor.StabilizationProgress()
+                progress.cancel()
+                results = self.run_stabilization(trigger_type, processing_threads, progress, checkpoint=True)
+                self.assertLess(results[3], expected_results[3])
+                self.assertTrue(os.path.exists(self.checkpoint_file_path))
+                # the rest of the file is still larger than a chunk, so it is split between the threads on resume
+                results = self.run_stabilization(trigger_type, 4, checkpoint=True)
+                self.assert_results_equal(results, expected_results)
+                self.assertFalse(os.path.exists(self.checkpoint_file_path))
+
+
+class TestLineEndings(SmartLayerTestCase):
+    def setUp(self):
+        super(TestLineEndings, self).setUp()
+        self.lines = ["G21", "G90", "M83", "G28", "G92 E0"]
+        for layer in range(5):
+            self.lines.extend([
+                ";LAYER:{0}".format(layer),
+                "G0 F9000 Z{0:.1f}".format(0.2 * (layer + 1)),
+                "G0 F9000 X10 Y{0}".format(98 + layer),
+                "G1 F1800 X190 Y{0} E6".format(98 + layer),
+            ])
+
+    def get_results(self, lines, line_ending="\n", end_with_newline=True):
+        with open(self.gcode_file_path, 'wb') as f:
+            f.write(line_ending.join(lines).encode())
+            if end_with_newline:
+                f.write(line_ending.encode())
+        return GcodePositionProcessor.GetSnapshotPlans_SmartLayer(
+            self.position_args, self.get_stabilization_args(), self.get_smart_layer_args()
+        )
+
+    @staticmethod
+    def get_plan_dicts(results):
+        return [plan.to_dict() for plan in SnapshotPlanList(results[0])]
+
+    def assert_crlf_matches_lf(self, lines):
+        lf_results = self.get_results(lines)
+        crlf_results = self.get_results(lines, "\r\n")
+        lf_plans = self.get_plan_dicts(lf_results)
+        crlf_plans = self.get_plan_dicts(crlf_results)
+        # the file positions are after the line, so each line ending adds a byte
+        for plan in crlf_plans:
+            for position in (plan, plan["initial_position"]):
+                position["file_position"] -= position["file_line_number"]
+        self.assertEqual(crlf_plans, lf_plans)
+        self.assertEqual(crlf_results[2:], lf_results[2:])
+        return lf_plans
+
+    def test_crlf_matches_lf(self):
+        plans = self.assert_crlf_matches_lf(self.lines)
+        self.assertEqual(len(plans), 5)
+
+    def test_stop_snapshots_with_crlf(self):
+        # stop taking snapshots after the first two layers
+        lines = self.lines[:13] + ["@OCTOLAPSE STOP-SNAPSHOTS"] + self.lines[13:]
+        plans = self.assert_crlf_matches_lf(lines)
+        self.assertEqual([plan["file_line_number"] for plan in plans], [9, 13])
+
+    def test_empty_file(self):
+        results = self.get_results([], end_with_newline=False)
+        self.assertEqual(len(results[0]), 0)
+        # lines and gcodes processed
+        self.assertEqual(results[2:4], (0, 0))
+
+    def test_last_line_without_newline(self):
+        expected_plans = self.get_plan_dicts(self.get_results(self.lines))
+        # the last plan is for the last line, so its position is the end of the file
+        self.assertEqual(expected_plans[-1]["file_line_number"], len(self.lines))
+        self.assertEqual(expected_plans[-1]["file_position"], os.path.getsize(self.gcode_file_path))
+        plans = self.get_plan_dicts(self.get_results(self.lines, end_with_newline=False))
+        # like std::istream::tellg, the position after a last line without a newline is -1
+        self.assertEqual(plans[-1]["file_position"], -1)
+        expected_plans[-1]["file_position"] = -1
+        expected_plans[-1]["initial_position"]["file_position"] = -1
+        self.assertEqual(plans, expected_plans)
+
+
+class LogRecordCollector(logging.Handler):
+    def __init__(self):
+        super(LogRecordCollector, self).__init__(logging.WARNING)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestMalformedCommands(SmartLayerTestCase):
+    def setUp(self):
+        super(TestMalformedCommands, self).setUp()
+        self.logger = LoggingConfigurator().get_logger("octoprint_octolapse.gcode_parser")
+        self.log_level = self.logger.level
+        self.logger.setLevel(logging.WARNING)
+        self.collector = LogRecordCollector()
+        self.logger.addHandler(self.collector)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.collector)
+        self.logger.setLevel(self.log_level)
+        super(TestMalformedCommands, self).tearDown()
+
+    def test_warning_contains_only_the_line(self):
+        # lines in a mapped file are not null terminated, so the warnings must stop at the end of the line
+        # a tab after T is accepted as a T command, but the parameter can't be extracted
+        for malformed_line in ("@OCTOLAPSE", "T\t1"):
+            with open(self.gcode_file_path, 'w') as f:
+                f.write("G21\n{0}\nG1 X10 Y10 ; the rest of the file\n".format(malformed_line))
+                f.write("G1 X20 Y20\n" * 1000)
+            self.collector.messages = []
+            GcodePositionProcessor.GetSnapshotPlans_SmartLayer(
+                self.position_args, self.get_stabilization_args(), self.get_smart_layer_args()
+            )
+            self.assertTrue(self.collector.messages, malformed_line)
+            self.assertTrue(self.collector.messages[-1].endswith(": " + malformed_line), self.collector.messages[-1])
+            for message in self.collector.messages:
+                self.assertNotIn("the rest of the file", message)
@@ -0,0 +1,120 @@
+# coding=utf-8
+##################################################################################
+# Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+# Copyright (C) 2023  Brad Hochgesang
+##################################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see the following:
+# https://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+#
+# You can contact the author either through the git-hub repository, or at the
+# following email address: FormerLurker@pm.me
+##################################################################################
+
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from octoprint_octolapse.benchmark.preprocessing import get_timelapse_settings
+from octoprint_octolapse.snapshot_plan_cache import SnapshotPlanCache, CachedSnapshotPlans
+from octoprint_octolapse.stabilization_preprocessing import StabilizationPreprocessingThread
+
+
+class TestSnapshotPlanCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = SnapshotPlanCache(os.path.join(self.directory, "cache"))
+        self.gcode_file_path = os.path.join(self.directory, "test.gcode")
+        with open(self.gcode_file_path, "w") as gcode_file:
+            gcode_file.write("G1 X10 Y10\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @staticmethod
+    def create_plans(name):
+        return CachedSnapshotPlans([name], 1.5, 10, 11, 0, [], [])
+
+    def test_round_trip(self):
+        key = self.cache.get_key(self.gcode_file_path, SnapshotPlanCache.get_fingerprint({"a": 1}))
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, self.create_plans("plan"))
+        cached_plans = self.cache.get(key)
+        self.assertEqual(cached_plans.snapshot_plans, ["plan"])
+        self.assertEqual(cached_plans.lines_processed, 11)
+        self.cache.clear()
+        self.assertIsNone(self.cache.get(key))
+
+    def test_key(self):
+        fingerprint = SnapshotPlanCache.get_fingerprint({"a": 1, "b": 2})
+        self.assertEqual(fingerprint, SnapshotPlanCache.get_fingerprint({"b": 2, "a": 1}))
+        self.assertNotEqual(fingerprint, SnapshotPlanCache.get_fingerprint({"a": 1, "b": 3}))
+        key = self.cache.get_key(self.gcode_file_path, fingerprint)
+        self.assertNotEqual(key, self.cache.get_key(self.gcode_file_path, SnapshotPlanCache.get_fingerprint({})))
+        # every plugin version has its own entries
+        other_version_cache = SnapshotPlanCache(os.path.join(self.directory, "cache"), plugin_version="0.0.1")
+        self.assertNotEqual(key, other_version_cache.get_key(self.gcode_file_path, fingerprint))
+        # changing the file changes the key
+        with open(self.gcode_file_path, "a") as gcode_file:
+            gcode_file.write("G1 X20 Y20\n")
+        self.assertNotEqual(key, self.cache.get_key(self.gcode_file_path, fingerprint))
+        self.assertIsNone(self.cache.get_key(os.path.join(self.directory, "missing.gcode"), fingerprint))
+
+    def test_corrupt_entry(self):
+        key = self.cache.get_key(self.gcode_file_path, SnapshotPlanCache.get_fingerprint({}))
+        self.cache.put(key, self.create_plans("plan"))
+        with open(self.cache._get_cache_file_path(key), "wb") as cache_file:
+            cache_file.write(b"not a pickle")
+        self.assertIsNone(self.cache.get(key))
+        self.assertFalse(os.path.exists(self.cache._get_cache_file_path(key)))
+
+    def test_least_recently_used_eviction(self):
+        self.cache.max_entries = 2
+        keys = [self.cache.get_key(self.gcode_file_path, SnapshotPlanCache.get_fingerprint(i)) for i in range(3)]
+        self.cache.put(keys[0], self.create_plans("0"))
+        self.cache.put(keys[1], self.create_plans("1"))
+        # make the first entry the most recently used
+        os.utime(self.cache._get_cache_file_path(keys[1]), (1, 1))
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.cache.put(keys[2], self.create_plans("2"))
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertIsNotNone(self.cache.get(keys[2]))
+
+    def test_size_limit(self):
+        self.cache.max_size_bytes = 1
+        keys = [self.cache.get_key(self.gcode_file_path, SnapshotPlanCache.get_fingerprint(i)) for i in range(2)]
+        self.cache.put(keys[0], self.create_plans("0"))
+        self.cache.put(keys[1], self.create_plans("1"))
+        # the most recent entry is always kept
+        self.assertIsNone(self.cache.get(keys[0]))
+        self.assertIsNotNone(self.cache.get(keys[1]))
+
+    def get_preprocessor_key(self, timelapse_settings):
+        preprocessor = StabilizationPreprocessingThread(
+            timelapse_settings, None, None, None, threading.Event(), None, snapshot_plan_cache=self.cache
+        )
+        return preprocessor.snapshot_plan_cache_key
+
+    def test_preprocessor_key(self):
+        timelapse_settings = get_timelapse_settings(self.gcode_file_path, {}, "layer", 0)
+        settings = timelapse_settings["settings"]
+        # clones of the same profiles have the same key, even though their nested settings are different objects
+        key = self.get_preprocessor_key(dict(timelapse_settings, settings=settings.clone()))
+        self.assertIsNotNone(key)
+        self.assertEqual(key, self.get_preprocessor_key(dict(timelapse_settings, settings=settings.clone())))
+        settings_clone = settings.clone()
+        settings_clone.profiles.current_trigger().smart_layer_trigger_type = 1
+        self.assertNotEqual(key, self.get_preprocessor_key(dict(timelapse_settings, settings=settings_clone)))
@@ -0,0 +1,55 @@
+# coding=utf-8
+##################################################################################
+# Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+# Copyright (C) 2023  Brad Hochgesang
+##################################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see the following:
+# https://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+#
+# You can contact the author either through the git-hub repository, or at the
+# following email address: FormerLurker@pm.me
+##################################################################################
+
+
+import pickle
+import unittest
+from octoprint_octolapse.stabilization_gcode import SnapshotPlan, SnapshotPlanList
+
+
+class TestSnapshotPlanList(unittest.TestCase):
+    def setUp(self):
+        # snapshot plan tuples in the format returned by the GcodePositionProcessor
+        self.cpp_snapshot_plans = [
+            (
+                10, 8, 100, 5.0, 1.0, None, None, None,
+                [("travel", 1.0, 2.0, None, None, 6000.0), ("snapshot", None, None, None, None, None)], None, None
+            ),
+            (20, 17, 200, 6.0, 2.0, None, None, None, [], None, None),
+        ]
+        self.plans = SnapshotPlanList(self.cpp_snapshot_plans)
+
+    def test_access(self):
+        self.assertEqual(len(self.plans), 2)
+        self.assertEqual(self.plans.get_file_gcode_numbers(), [8, 17])
+        plan = self.plans[0]
+        self.assertIsInstance(plan, SnapshotPlan)
+        self.assertEqual(plan.file_line_number, 10)
+        self.assertEqual([step.action for step in plan.steps], ["travel", "snapshot"])
+        self.assertEqual(self.plans[-1].file_gcode_number, 17)
+        self.assertEqual([x.file_position for x in self.plans], [100, 200])
+        self.assertRaises(IndexError, lambda: self.plans[2])
+
+    def test_pickle(self):
+        plans = pickle.loads(pickle.dumps(self.plans))
+        self.assertEqual([x.to_dict() for x in plans], [x.to_dict() for x in self.plans])
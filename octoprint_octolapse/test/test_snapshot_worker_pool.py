@@ -0,0 +1,159 @@
+# coding=utf-8
+##################################################################################
+# Octolapse - A plugin for OctoPrint used for making stabilized timelapse videos.
+# Copyright (C) 2023  Brad Hochgesang
+##################################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see the following:
+# https://github.com/FormerLurker/Octolapse/blob/master/LICENSE
+#
+# You can contact the author either through the git-hub repository, or at the
+# following email address: FormerLurker@pm.me
+##################################################################################
+
+import threading
+import unittest
+from unittest import mock
+from octoprint_octolapse.snapshot import SnapshotWorkerPool, SnapshotThread, SnapshotJobInfo, CaptureSnapshot
+from octoprint_octolapse.timelapse import Timelapse, TimelapseState
+
+
+class FakePrinter(object):
+    def set_job_on_hold(self, value):
+        pass
+
+
+class FakeCaptureSnapshot(object):
+    SnapshotsTotal = 1
+    ErrorsTotal = 0
+
+
+class HungJob(SnapshotThread):
+    def __init__(self, release_event, job_type="snapshot"):
+        job_info = SnapshotJobInfo.__new__(SnapshotJobInfo)
+        job_info.camera = mock.Mock()
+        job_info.camera.name = "Hung Camera"
+        job_info.camera_guid = "camera"
+        job_info.job_type = job_type
+        job_info.delay_seconds = 0
+        job_info.timeout_seconds = 0
+        super(HungJob, self).__init__(job_info)
+        self.release_event = release_event
+
+    def run(self):
+        self.release_event.wait()
+
+
+class TestSnapshotWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = SnapshotWorkerPool()
+        self.pool.warm_up(["camera"])
+
+    def tearDown(self):
+        self.pool.shutdown(wait=False)
+
+    def create_timelapse(self, on_snapshot_start, on_snapshot_end):
+        timelapse = Timelapse.__new__(Timelapse)
+        timelapse._snapshot_worker_pool = self.pool
+        timelapse._snapshot_start_callback = on_snapshot_start
+        timelapse._snapshot_complete_callback = on_snapshot_end
+        timelapse._take_timelapse_snapshot_precalculated = lambda: {
+            "success": True, "error": "", "snapshot_payload": None
+        }
+        timelapse._most_recent_snapshot_payload = None
+        timelapse._state = TimelapseState.TakingSnapshot
+        timelapse._capture_snapshot = FakeCaptureSnapshot()
+        timelapse._octoprint_printer = FakePrinter()
+        timelapse._stabilization_signal = threading.Event()
+        timelapse.is_realtime = True
+        timelapse.job_on_hold = True
+        return timelapse
+
+    def test_acquire_snapshot_starts_no_thread(self):
+        started = threading.Event()
+        completed = []
+        completed_event = threading.Event()
+
+        def on_snapshot_end(payload):
+            completed.append(payload)
+            completed_event.set()
+
+        timelapse = self.create_timelapse(started.set, on_snapshot_end)
+        with mock.patch.object(threading.Thread, "start") as start:
+            timelapse.acquire_snapshot_precalculated(mock.Mock(gcode="G1 X10"))
+            self.assertTrue(started.wait(5))
+            self.assertTrue(completed_event.wait(5))
+            start.assert_not_called()
+        self.assertEqual(completed[0]["snapshot_count"], 1)
+        self.assertFalse(timelapse.job_on_hold)
+        self.assertEqual(timelapse._state, TimelapseState.WaitingForTrigger)
+
+    def test_workers_are_daemon_threads(self):
+        # a hung job must not keep the interpreter from exiting
+        workers = [thread for thread in threading.enumerate() if thread.name.startswith("octolapse-")]
+        self.assertTrue(workers)
+        for thread in workers:
+            self.assertTrue(thread.daemon, thread.name)
+
+    def test_tasks_run_in_order(self):
+        results = []
+        submitted = [self.pool.submit("camera", results.append, index) for index in range(10)]
+        for future in submitted:
+            self.assertIsNone(future.result(5))
+        self.assertEqual(results, list(range(10)))
+
+    def test_task_exception_is_set_on_the_future(self):
+        def raise_exception():
+            raise ValueError("task error")
+        self.assertRaises(ValueError, self.pool.submit("camera", raise_exception).result, 5)
+
+    def test_callback_exception_is_logged(self):
+        def raise_exception():
+            raise Exception("callback error")
+        # the exception is logged rather than raised from the future
+        self.assertIsNone(self.pool.run_callback(raise_exception).result(5))
+
+    def test_hung_job_releases_its_lane(self):
+        release_event = threading.Event()
+        try:
+            job = HungJob(release_event)
+            job.start_in_pool(self.pool, "camera")
+            job.join(timeout=0.1)
+            self.assertIsNotNone(job.snapshot_thread_error)
+            self.assertEqual(job.snapshot_thread_error.error_type, "snapshot-job-hung")
+            # the next job runs on a new worker instead of waiting for the hung job
+            self.assertIsNone(self.pool.submit("camera", lambda: None).result(5))
+        finally:
+            release_event.set()
+
+    def test_scripts_do_not_wait_for_the_camera(self):
+        capture_snapshot = CaptureSnapshot.__new__(CaptureSnapshot)
+        capture_snapshot.worker_pool = self.pool
+        release_event = threading.Event()
+        try:
+            # the camera's lane is busy downloading a snapshot
+            capture_snapshot._start_job(HungJob(release_event))
+            for job_type in ("before-snapshot", "after-snapshot"):
+                script_release_event = threading.Event()
+                script_release_event.set()
+                script_job = HungJob(script_release_event, job_type)
+                capture_snapshot._start_job(script_job)
+                script_job.join(timeout=5)
+                self.assertIsNone(script_job.snapshot_thread_error)
+        finally:
+            release_event.set()
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestSnapshotWorkerPool)
+    unittest.TextTestRunner(verbosity=3).run(suite)
@@ -28,6 +28,7 @@ from octoprint_octolapse.stabilization_gcode import SnapshotGcode
 from octoprint_octolapse.position import Position
 from octoprint_octolapse.settings import OctolapseSettings
 from octoprint_octolapse.timelapse import Timelapse, TimelapseState
+from octoprint_octolapse import utility
 
 
 class OctoprintTestPrinter(object):
@@ -1411,3 +1412,95 @@ class TestTimelapse(unittest.TestCase):
 if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(TestTimelapse)
     nittest.TextTestRunner(verbosity=3).run(suite)
+
+
+class FakeMainSettings(object):
+    show_position_changes = True
+    show_printer_state_changes = True
+    show_extruder_state_changes = True
+    show_trigger_state_changes = True
+
+
+class FakeSettings(object):
+    main_settings = FakeMainSettings()
+
+
+class FakePos(object):
+    def to_extruder_state_dict(self):
+        return {"e": 0}
+
+
+class FakePosition(object):
+    def __init__(self):
+        self.state_version = 0
+        self.x = 0
+        self.current_pos = FakePos()
+
+    def move_to(self, x):
+        self.x = x
+        self.state_version += 1
+
+    def to_position_dict(self):
+        return {"x": self.x}
+
+    def to_state_dict(self):
+        return {"is_homed": True}
+
+
+class FakeTriggers(object):
+    name = "Test"
+    state_version = 0
+
+    def state_to_list(self):
+        return [{"type": "layer", "is_waiting": False}]
+
+
+class TestTimelapseStateMessages(unittest.TestCase):
+    def setUp(self):
+        self.messages = []
+        self.timelapse = Timelapse.__new__(Timelapse)
+        self.timelapse.get_current_octolapse_settings = lambda: FakeSettings()
+        self.timelapse._settings = FakeSettings()
+        self.timelapse._state_changed_callback = self.messages.append
+        self.timelapse._state_delta_encoder = utility.StateDeltaEncoder()
+        self.timelapse.full_state_message_period_seconds = 30
+        self.timelapse._last_full_state_message_time = 0
+        self.timelapse._last_state_changed_message_time = 0
+        self.timelapse._sent_position_state_version = None
+        self.timelapse._sent_trigger_state_version = None
+        self.timelapse.is_realtime = True
+        self.timelapse._position = FakePosition()
+        self.timelapse._triggers = FakeTriggers()
+
+    def send_state_changed_message(self):
+        # the messages are rate limited
+        self.timelapse._last_state_changed_message_time = 0
+        self.timelapse._send_state_changed_message()
+
+    def test_only_changes_are_sent(self):
+        self.send_state_changed_message()
+        self.assertFalse(self.messages[0]["is_delta"])
+        self.assertEqual(self.messages[0]["position"], {"x": 0})
+
+        self.timelapse._position.move_to(1)
+        self.send_state_changed_message()
+        self.assertEqual(len(self.messages), 2)
+        self.assertTrue(self.messages[1]["is_delta"])
+        self.assertEqual(self.messages[1]["position"], {"x": 1})
+        self.assertIsNone(self.messages[1]["printer_state"])
+        self.assertIsNone(self.messages[1]["trigger_state"])
+
+    def test_full_state_resets_the_changes(self):
+        self.send_state_changed_message()
+        self.timelapse._position.move_to(1)
+        self.send_state_changed_message()
+        # a full state is sent to the clients by another path before the next state changed message
+        self.timelapse._position.move_to(2)
+        self.assertEqual(self.timelapse.to_state_dict()["position"], {"x": 2})
+
+        # moving back to the last position sent in a state changed message must still be sent
+        self.timelapse._position.move_to(1)
+        self.send_state_changed_message()
+        self.assertEqual(len(self.messages), 3)
+        self.assertEqual(self.messages[2]["position"], {"x": 1})
+        self.assertEqual(self.messages[2]["printer_state"], {"is_homed": True})
@@ -21,11 +21,15 @@
 # following email address: FormerLurker@pm.me
 ##################################################################################
 
+import json
+import os
 import unittest
 from tempfile import NamedTemporaryFile
 
+import octoprint_octolapse
 import octoprint_octolapse.trigger as trigger
-from octoprint_octolapse.settings import OctolapseSettings
+from octoprint_octolapse.position import Position
+from octoprint_octolapse.settings import OctolapseSettings, PrinterProfile, TriggerProfile, CuraExtruder
 
 
 class TestTrigger(unittest.TestCase):
@@ -156,6 +160,152 @@ class TestTrigger(unittest.TestCase):
         self.assertFalse(trigger.is_in_position(restrictions, 10.5, 10, self.PrinterTolerance))
 
 
+
+class TestLayerTriggerUpdateRequired(unittest.TestCase):
+    def setUp(self):
+        default_settings_path = os.path.join(
+            os.path.dirname(octoprint_octolapse.__file__), "data",
+            octoprint_octolapse.OctolapsePlugin.get_default_settings_filename()
+        )
+        with open(default_settings_path, 'r') as settings_file:
+            self.Settings = OctolapseSettings.create_from_iterable(
+                octoprint_octolapse.__version__, json.load(settings_file)
+            )
+        self.Printer = PrinterProfile()
+        self.Printer.slicer_type = 'cura'
+        slicer_settings = self.Printer.get_current_slicer_settings()
+        slicer_settings.layer_height = 0.2
+        extruder = CuraExtruder()
+        extruder.retraction_amount = 1
+        extruder.retraction_retract_speed = 40
+        extruder.speed_travel = 150
+        slicer_settings.extruders = [extruder]
+        self.Settings.profiles.printers[self.Printer.guid] = self.Printer
+        self.Settings.profiles.current_printer_profile_guid = self.Printer.guid
+        trigger_profile = TriggerProfile()
+        trigger_profile.trigger_type = TriggerProfile.TRIGGER_TYPE_REAL_TIME
+        trigger_profile.trigger_subtype = TriggerProfile.LAYER_TRIGGER_TYPE
+        trigger_profile.layer_trigger_height = 0
+        trigger_profile.require_zhop = False
+        trigger_profile.extruder_state_requirements_enabled = False
+        self.Settings.profiles.triggers[trigger_profile.guid] = trigger_profile
+        self.Settings.profiles.current_trigger_profile_guid = trigger_profile.guid
+        self.OverridableSettings = self.Printer.get_overridable_profile_settings(False, {
+            "volume": {
+                "width": 200, "depth": 200, "height": 200, "origin": "lowerleft", "formFactor": "rectangular",
+                "custom_box": False
+            }
+        })
+
+    @staticmethod
+    def get_gcodes():
+        gcodes = ["G21", "G90", "M83", "G28", "G92 E0"]
+        for layer in range(4):
+            gcodes.extend([
+                ";LAYER:{0}".format(layer),
+                "G1 E1 F2400",
+                "G0 F9000 Z{0:.1f}".format(0.2 * (layer + 1)),
+                "G0 F9000 X10 Y10",
+                "M106 S255",
+                "G1 F1800 X190 Y10 E6",
+                "G1 X190 Y190 E6 ; perimeter",
+                "G0 X100 Y100",
+                "G1 E-1 F2400",
+            ])
+        return gcodes
+
+    def get_triggered_lines(self, queue_gcodes):
+        position = Position(self.Printer, None, self.OverridableSettings)
+        layer_trigger = trigger.LayerTrigger(self.Settings)
+        triggered_lines = []
+        for line_number, gcode in enumerate(self.get_gcodes(), 1):
+            if queue_gcodes and position.can_queue_gcode(gcode) and not layer_trigger.is_update_required(gcode):
+                position.queue_gcode(gcode, line_number)
+                continue
+            position.update(gcode, line_number)
+            layer_trigger.update(position)
+            if layer_trigger.is_triggered(0):
+                triggered_lines.append(line_number)
+        return triggered_lines
+
+    def test_is_update_required(self):
+        layer_trigger = trigger.LayerTrigger(self.Settings)
+        # moves that cannot extrude or change the height, and other commands, cannot change the layer
+        self.assertFalse(layer_trigger.is_update_required("G0 X10 Y10"))
+        self.assertFalse(layer_trigger.is_update_required("G1 X10 Y10 F1800 ; Edge"))
+        self.assertFalse(layer_trigger.is_update_required("M106 S255"))
+        self.assertTrue(layer_trigger.is_update_required("G1 X10 Y10 E1"))
+        self.assertTrue(layer_trigger.is_update_required("G0 Z0.4"))
+        self.assertTrue(layer_trigger.is_update_required("G11"))
+        self.assertTrue(layer_trigger.is_update_required("@OCTOLAPSE STOP-SNAPSHOTS"))
+        # unrecognized commands are always processed
+        self.assertTrue(layer_trigger.is_update_required("SNAP"))
+
+        # every gcode must be processed while waiting
+        layer_trigger.get_state(0).is_waiting = True
+        self.assertTrue(layer_trigger.is_update_required("G0 X10 Y10"))
+
+    def test_queued_gcodes_trigger_on_the_same_lines(self):
+        expected = self.get_triggered_lines(False)
+        self.assertEqual(4, len(expected))
+        self.assertEqual(expected, self.get_triggered_lines(True))
+
+
+class TestTriggerStateHistory(unittest.TestCase):
+    def test_states_are_reused(self):
+        history = trigger.TriggerStateHistory(trigger.LayerTriggerState, 3)
+        self.assertEqual(history.count(), 0)
+        self.assertIsNone(history.get(0))
+
+        created_states = set()
+        for layer in range(10):
+            state = history.next_state()
+            created_states.add(id(state))
+            state.layer = layer
+            history.push(state)
+            self.assertIs(history.get(0), state)
+
+        # only the preallocated states were used
+        self.assertEqual(len(created_states), 4)
+        self.assertEqual(history.count(), 3)
+        self.assertEqual([history.get(index).layer for index in range(3)], [9, 8, 7])
+        self.assertIsNone(history.get(3))
+
+    def test_next_state_does_not_change_current_state(self):
+        history = trigger.TriggerStateHistory(trigger.LayerTriggerState, 2)
+        first_state = history.next_state()
+        first_state.layer = 1
+        first_state.is_waiting = True
+        history.push(first_state)
+
+        state = history.next_state()
+        # the layer carries over from the previous state, but the wait state does not
+        self.assertEqual(state.layer, 1)
+        self.assertFalse(state.is_waiting)
+        self.assertFalse(state.is_equal(history.get(0)))
+        state.is_waiting = True
+        self.assertTrue(state.is_equal(history.get(0)))
+        self.assertIs(history.get(0), first_state)
+
+    def test_push_copies_external_states(self):
+        history = trigger.TriggerStateHistory(trigger.TimerTriggerState, 2)
+        external_state = trigger.TimerTriggerState()
+        external_state.trigger_start_time = 10.0
+        history.push(external_state)
+        self.assertIsNot(history.get(0), external_state)
+        self.assertEqual(history.get(0).trigger_start_time, 10.0)
+
+    def test_flags(self):
+        state = trigger.LayerTriggerState()
+        self.assertEqual(state.get_flags(), 0)
+        state.is_triggered = True
+        state.is_height_change_wait = True
+        self.assertEqual(
+            state.get_flags(),
+            trigger.TriggerState.FLAG_IS_TRIGGERED | trigger.LayerTriggerState.FLAG_IS_HEIGHT_CHANGE_WAIT
+        )
+
+
 if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(TestTrigger)
     unittest.TextTestRunner(verbosity=3).run(suite)
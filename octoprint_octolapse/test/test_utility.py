@@ -268,6 +268,25 @@ class TestUtility(unittest.TestCase):
             except:
                 pass
         self.assertEqual(plugin_version, fallback_version)
+    def test_state_delta_encoder(self):
+        """Test that only changed state values are encoded after the first state."""
+        encoder = utility.StateDeltaEncoder()
+        self.assertEqual(encoder.encode("position", {"x": 1, "y": 2}), {"x": 1, "y": 2})
+        self.assertIsNone(encoder.encode("position", {"x": 1, "y": 2}))
+        self.assertEqual(encoder.encode("position", {"x": 1, "y": 3, "z": 4}), {"y": 3, "z": 4})
+        # disabled states are forgotten, so the full state is sent when they are enabled again
+        self.assertIsNone(encoder.encode("position", None))
+        self.assertEqual(encoder.encode("position", {"x": 1, "y": 3}), {"x": 1, "y": 3})
+
+        triggers = [{"type": "layer", "is_waiting": False, "layer": 1}]
+        self.assertEqual(encoder.encode_list("triggers", triggers, "type"), triggers)
+        self.assertIsNone(encoder.encode_list("triggers", [dict(triggers[0])], "type"))
+        triggers[0]["layer"] = 2
+        self.assertEqual(encoder.encode_list("triggers", triggers, "type"), [{"type": "layer", "layer": 2}])
+
+        encoder.reset()
+        self.assertEqual(encoder.encode("position", {"x": 1, "y": 3}), {"x": 1, "y": 3})
+
 
 if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(TestUtility)
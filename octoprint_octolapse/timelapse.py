@@ -23,6 +23,7 @@
 from __future__ import unicode_literals
 import threading
 import time
+import bisect
 import uuid
 # remove unused usings
 # from six import iteritems, string_types
@@ -31,16 +32,17 @@ import uuid
 import queue as queue
 import os
 import octoprint_octolapse.utility as utility
-from octoprint_octolapse.stabilization_gcode import SnapshotGcodeGenerator, SnapshotGcode
+from octoprint_octolapse.stabilization_gcode import SnapshotGcodeGenerator, SnapshotGcode, SnapshotPlanList
 from octoprint_octolapse.gcode_commands import Commands, Response
 from octoprint_octolapse.gcode_processor import ParsedCommand
 from octoprint_octolapse.position import Position
 from octoprint_octolapse.settings import PrinterProfile, OctolapseSettings
-from octoprint_octolapse.snapshot import CaptureSnapshot, SnapshotJobInfo, SnapshotError
+from octoprint_octolapse.snapshot import CaptureSnapshot, SnapshotJobInfo, SnapshotError, SnapshotWorkerPool
 from octoprint_octolapse.trigger import Triggers
 import octoprint_octolapse.error_messages as error_messages
 import octoprint_octolapse.stabilization_preprocessing as preprocessing
 from octoprint_octolapse.gcode_processor import GcodeProcessor
+from octoprint_octolapse.hook_metrics import HookMetrics
 # create the module level logger
 from octoprint_octolapse.log import LoggingConfigurator
 
@@ -68,6 +70,7 @@ class Timelapse(object):
     ):
         # config variables - These don't change even after a reset
         self.state_update_period_seconds = 1
+        self.full_state_message_period_seconds = 30
         self._data_folder = data_folder
         self._temporary_folder = get_current_octolapse_settings().main_settings.get_temporary_directory(self._data_folder)
         self.get_current_octolapse_settings = get_current_octolapse_settings
@@ -91,6 +94,15 @@ class Timelapse(object):
         self._triggers = None
         self._print_end_status = "Unknown"
         self._last_state_changed_message_time = 0
+        # Only the state values that changed since the last message are sent, see _send_state_changed_message
+        self._state_delta_encoder = utility.StateDeltaEncoder()
+        self._sent_position_state_version = None
+        self._sent_trigger_state_version = None
+        self._last_full_state_message_time = 0
+        # latency histograms for the gcode hooks, reset when each timelapse starts
+        self.hook_metrics = HookMetrics()
+        # worker threads used to take snapshots, started when each timelapse starts
+        self._snapshot_worker_pool = SnapshotWorkerPool()
         # Settings that may be different after StartTimelapse is called
 
         self._octoprint_printer_profile = None
@@ -132,6 +144,8 @@ class Timelapse(object):
         self._current_file_line = 0
 
         self.snapshot_plans = None  # type: [preprocessing.SnapshotPlan]
+        # the file_gcode_number of each snapshot plan, in the same (ascending) order as snapshot_plans
+        self._snapshot_plan_file_lines = []
         self.current_snapshot_plan_index = 0
         self.current_snapshot_plan = None  # type: preprocessing.SnapshotPlan
         self.is_realtime = True
@@ -169,6 +183,7 @@ class Timelapse(object):
         )
         # we must supply the settings first!  Else reset won't work properly.
         self._reset()
+        self.hook_metrics.reset()
         # in case the settings have been destroyed and recreated
         self._settings = settings
         # ToDo:  all cloning should be removed after this point.  We already have a settings object copy.
@@ -178,10 +193,18 @@ class Timelapse(object):
         self._stabilization = self._settings.profiles.current_stabilization()
         self._trigger_profile = self._settings.profiles.current_trigger()
         self.snapshot_plans = snapshot_plans
+        self._snapshot_plan_file_lines = []
         self.current_snapshot_plan = None
         self.current_snapshot_plan_index = 0
         # set the current snapshot plan if we have any
         if self.snapshot_plans is not None and len(self.snapshot_plans) > 0:
+            # the plans are searched by line number, so make sure they are in file order.  A SnapshotPlanList is
+            # already sorted, and creates each plan only when it is needed.
+            if isinstance(self.snapshot_plans, SnapshotPlanList):
+                self._snapshot_plan_file_lines = self.snapshot_plans.get_file_gcode_numbers()
+            else:
+                self.snapshot_plans = sorted(self.snapshot_plans, key=lambda plan: plan.file_gcode_number)
+                self._snapshot_plan_file_lines = [plan.file_gcode_number for plan in self.snapshot_plans]
             self.current_snapshot_plan = self.snapshot_plans[self.current_snapshot_plan_index]
         # if we have at least one snapshot plan, we must have preprocessed, so set is_realtime to false.
         self.is_realtime = self.snapshot_plans is None
@@ -210,7 +233,16 @@ class Timelapse(object):
             self.send_gcode_for_camera,
             self._new_thumbnail_available_callback,
             self._on_post_processing_error_callback,
-
+            worker_pool=self._snapshot_worker_pool
+        )
+        # Start the snapshot worker threads now so they aren't created while the job is on hold
+        active_cameras = self._settings.profiles.active_cameras()
+        self._snapshot_worker_pool.warm_up(
+            [current_camera.guid for current_camera in active_cameras],
+            [
+                current_camera.guid for current_camera in active_cameras
+                if current_camera.on_before_snapshot_script or current_camera.on_after_snapshot_script
+            ]
         )
 
         self._position = Position(
@@ -519,6 +551,9 @@ class Timelapse(object):
 
             if self._settings is not None:
                 if self.is_realtime:
+                    # The clients replace their state with this one, so the state changed messages can't be based on
+                    # the previously sent state anymore.  The next one will contain the full state.
+                    self._reset_state_delta_encoder()
                     if self._position is not None:
                         position_dict = self._position.to_position_dict()
                         printer_state_dict = self._position.to_state_dict()
@@ -620,6 +655,10 @@ class Timelapse(object):
         if self._state != TimelapseState.Idle:
             self.end_timelapse("COMPLETED")
 
+    def shutdown(self):
+        # stop the snapshot worker threads without waiting for any running snapshot jobs
+        self._snapshot_worker_pool.shutdown(wait=False)
+
     def on_print_ended(self):
         self.snapshot_plans = []
 
@@ -627,6 +666,8 @@ class Timelapse(object):
         self._print_end_status = print_status
         try:
             if self._state != TimelapseState.Idle:
+                if self._current_job_info is not None:
+                    self.hook_metrics.save(self._temporary_folder, self._current_job_info.JobGuid)
                 # See if there are enough snapshots to start renderings
                 snapshot_count, error_count = self.get_snapshot_count()
                 if snapshot_count > 1:
@@ -710,12 +751,21 @@ class Timelapse(object):
         ):
             logger.verbose("Queuing: %s", command_string)
 
+        phase_start = HookMetrics.now()
         if self.is_realtime:
             return_value = self.process_realtime_gcode(command_string, tags)
-            parsed_command = self._position.current_pos.parsed_command
+            self.hook_metrics.record(HookMetrics.PROCESS_REALTIME_GCODE, phase_start)
+            # queued gcodes are never altered, so there is no need to flush the position queue here
+            parsed_command = (
+                None if self._position.has_queued_gcodes() else self._position.current_pos.parsed_command
+            )
         else:
-            parsed_command = GcodeProcessor.parse(command_string)
-            return_value = self.process_pre_calculated_gcode(parsed_command, tags)
+            return_value = self.process_pre_calculated_gcode(command_string, tags)
+            # Parsing is expensive, so only parse commands that might be altered below
+            parsed_command = None
+            if self._test_mode_enabled or gcode == "G92":
+                parsed_command = GcodeProcessor.parse(command_string)
+            self.hook_metrics.record(HookMetrics.PROCESS_PRE_CALCULATED_GCODE, phase_start)
 
         # notify any callbacks
         self._send_state_changed_message()
@@ -748,62 +798,84 @@ class Timelapse(object):
         return None
 
     def set_next_snapshot_plan(self):
+        self._set_snapshot_plan_index(self.current_snapshot_plan_index + 1)
+
+    def _set_snapshot_plan_index(self, index):
         self.current_snapshot_plan = None
-        self.current_snapshot_plan_index += 1
+        self.current_snapshot_plan_index = index
         if len(self.snapshot_plans) > self.current_snapshot_plan_index:
             self.current_snapshot_plan = self.snapshot_plans[self.current_snapshot_plan_index]
 
-    def process_pre_calculated_gcode(self, parsed_command, tags):
-        if not {'plugin:octolapse', 'snapshot_gcode'}.issubset(tags) and 'source:file' in tags:
-            if self.current_snapshot_plan is None:
-                return None
-            current_file_line = self.get_current_file_line(tags)
+    def process_pre_calculated_gcode(self, command_string, tags):
+        if (
+            self.current_snapshot_plan is None or
+            'source:file' not in tags or
+            {'plugin:octolapse', 'snapshot_gcode'}.issubset(tags)
+        ):
+            return None
+        # check_current_line_number has already verified the line number, so we don't need to search the tags.
+        current_file_line = self._current_file_line
+        plan_file_line = self.current_snapshot_plan.file_gcode_number
+        if current_file_line < plan_file_line:
+            # Nearly every line will end up here.
+            return None
+        if current_file_line > plan_file_line:
             # skip plans if we need to in case any were missed.
-            if self.current_snapshot_plan.file_gcode_number < current_file_line:
-                while (
-                    self.current_snapshot_plan.file_gcode_number < current_file_line and
-                    len(self.snapshot_plans) > self.current_snapshot_plan_index
-                ):
-                    self.set_next_snapshot_plan()
+            self._set_snapshot_plan_index(
+                bisect.bisect_left(
+                    self._snapshot_plan_file_lines, current_file_line, self.current_snapshot_plan_index
+                )
+            )
+            if self.current_snapshot_plan is None or self.current_snapshot_plan.file_gcode_number != current_file_line:
+                return None
 
-            if (
-                self._state == TimelapseState.WaitingForTrigger
-                and self._octoprint_printer.is_printing()
-                and self.current_snapshot_plan.file_gcode_number == current_file_line
-            ):
-                # time to take a snapshot!
-                if self.current_snapshot_plan.triggering_command.gcode != parsed_command.gcode:
-                    logger.error(
-                        "The snapshot plan position (gcode number: %s, gcode:%s, line number: %s) does not match the actual position (gcode number: %s, gcode: %s)!  "
-                        "Aborting Snapshot, moving to next plan.",
-                        self.current_snapshot_plan.file_gcode_number,
-                        self.current_snapshot_plan.triggering_command.gcode,
-                        self.current_snapshot_plan.file_line_number,
-                        current_file_line,
-                        parsed_command.gcode
-                    )
-                    self.set_next_snapshot_plan()
-                    return None
+        if (
+            self._state == TimelapseState.WaitingForTrigger
+            and self._octoprint_printer.is_printing()
+            and self.get_current_file_line(tags) == current_file_line
+        ):
+            # time to take a snapshot!
+            parsed_command = GcodeProcessor.parse(command_string)
+            if self.current_snapshot_plan.triggering_command.gcode != parsed_command.gcode:
+                logger.error(
+                    "The snapshot plan position (gcode number: %s, gcode:%s, line number: %s) does not match the actual position (gcode number: %s, gcode: %s)!  "
+                    "Aborting Snapshot, moving to next plan.",
+                    self.current_snapshot_plan.file_gcode_number,
+                    self.current_snapshot_plan.triggering_command.gcode,
+                    self.current_snapshot_plan.file_line_number,
+                    current_file_line,
+                    parsed_command.gcode
+                )
+                self.set_next_snapshot_plan()
+                return None
 
-                if self._octoprint_printer.set_job_on_hold(True):
-                    logger.debug("Setting job-on-hold lock.")
-                    # this was set to 'False' earlier.  Why?
-                    self.job_on_hold = True
-                    # We are triggering, take a snapshot
-                    self._state = TimelapseState.TakingSnapshot
-
-                    # take the snapshot on a new thread, making sure to set a signal so we know when it is finished
-                    if not self._stabilization_signal.is_set():
-                        self._stabilization_signal.clear()
-                    thread = threading.Thread(
-                        target=self.acquire_snapshot_precalculated, args=[parsed_command]
-                    )
-                    thread.daemon = True
-                    thread.start()
-                    # suppress the current command, we'll send it later
-                    return None,
+            if self._octoprint_printer.set_job_on_hold(True):
+                logger.debug("Setting job-on-hold lock.")
+                # this was set to 'False' earlier.  Why?
+                self.job_on_hold = True
+                # We are triggering, take a snapshot
+                self._state = TimelapseState.TakingSnapshot
+
+                # take the snapshot on a new thread, making sure to set a signal so we know when it is finished
+                if not self._stabilization_signal.is_set():
+                    self._stabilization_signal.clear()
+                self._snapshot_worker_pool.submit(
+                    SnapshotWorkerPool.ORCHESTRATOR_LANE, self.acquire_snapshot_precalculated, parsed_command
+                )
+                # suppress the current command, we'll send it later
+                return None,
         return None
 
+    def _can_queue_gcode(self, gcode, tags):
+        return (
+            tags is not None and
+            'source:file' in tags and
+            not self._test_mode_enabled and
+            self._state == TimelapseState.WaitingForTrigger and
+            self._position.can_queue_gcode(gcode) and
+            not self._triggers.is_update_required(gcode)
+        )
+
     def process_realtime_gcode(self, gcode, tags):
         # a flag indicating that we should suppress the command (prevent it from being sent to the printer)
         suppress_command = False
@@ -815,6 +887,11 @@ class Timelapse(object):
             # get the position state in case it has changed
             # if there has been a position or extruder state change, inform any listener
             file_line_number = self.get_current_file_line(tags)
+            if self._can_queue_gcode(gcode, tags):
+                # Nothing will be inspected after this gcode is processed, so it can be sent to the
+                # position processor later in a batch.
+                self._position.queue_gcode(gcode, file_line_number=file_line_number)
+                return None
             self._position.update(gcode, file_line_number=file_line_number)
             parsed_command = self._position.current_pos.parsed_command
 
@@ -839,14 +916,16 @@ class Timelapse(object):
                         if self._octoprint_printer.set_job_on_hold(True):
                             logger.debug("Setting job-on-hold lock.")
                             self.job_on_hold = True
-                            thread = threading.Thread(target=self.acquire_position, args=[parsed_command])
-                            thread.daemon = True
-                            thread.start()
+                            self._snapshot_worker_pool.submit(
+                                SnapshotWorkerPool.ORCHESTRATOR_LANE, self.acquire_position, parsed_command
+                            )
                             return None,
                     elif (self._state == TimelapseState.WaitingForTrigger
                           and self._octoprint_printer.is_printing()):
                         # update the triggers with the current position
+                        phase_start = HookMetrics.now()
                         self._triggers.update(self._position)
+                        self.hook_metrics.record(HookMetrics.TRIGGERS_UPDATE, phase_start)
 
                         # see if at least one trigger is triggering
                         _first_triggering = self.get_first_triggering()
@@ -869,11 +948,11 @@ class Timelapse(object):
                                 # is finished
                                 if not self._stabilization_signal.is_set():
                                     self._stabilization_signal.clear()
-                                thread = threading.Thread(
-                                    target=self.acquire_snapshot_precalculated, args=[parsed_command]
+                                self._snapshot_worker_pool.submit(
+                                    SnapshotWorkerPool.ORCHESTRATOR_LANE,
+                                    self.acquire_snapshot_precalculated,
+                                    parsed_command
                                 )
-                                thread.daemon = True
-                                thread.start()
 
                                 # undo the position update since we'll be suppressing this command
                                 #self._position.undo_update()
@@ -1108,9 +1187,8 @@ class Timelapse(object):
         try:
             logger.info("About to take a snapshot.  Triggering Command: %s", parsed_command.gcode)
             if self._snapshot_start_callback is not None:
-                snapshot_callback_thread = threading.Thread(target=self._snapshot_start_callback)
-                snapshot_callback_thread.daemon = True
-                snapshot_callback_thread.start()
+                # the job is on hold, so notify from the worker pool rather than starting a thread
+                self._snapshot_worker_pool.run_callback(self._snapshot_start_callback)
 
             # take the snapshot
             self._most_recent_snapshot_payload = self._take_timelapse_snapshot_precalculated()
@@ -1224,55 +1302,69 @@ class Timelapse(object):
             if self._state_changed_callback is not None:
 
                 def send_real_time_change_message():
-                    trigger_change_list = None
+                    main_settings = self.get_current_octolapse_settings().main_settings
+                    current_time = time.time()
+                    # Periodically send the full state in case a client missed a change
+                    is_delta = (
+                        self._last_full_state_message_time + self.full_state_message_period_seconds > current_time
+                    )
+                    if not is_delta:
+                        self._reset_state_delta_encoder()
+                        self._last_full_state_message_time = current_time
+
+                    extruder_change_dict = None
                     position_change_dict = None
                     printer_state_change_dict = None
-                    extruder_change_dict = None
                     trigger_changes_dict = None
 
-                    # Get the changes
-                    if self.get_current_octolapse_settings().main_settings.show_trigger_state_changes:
-                        trigger_change_list = self._triggers.state_to_list()
-                    if self.get_current_octolapse_settings().main_settings.show_position_changes:
-                        position_change_dict = self._position.to_position_dict()
-
-                    update_printer_state = (
-                        self.get_current_octolapse_settings().main_settings.show_printer_state_changes
-                    )
-
-                    if update_printer_state:
-                        printer_state_change_dict = self._position.to_state_dict()
-                    if self.get_current_octolapse_settings().main_settings.show_extruder_state_changes:
-                        extruder_change_dict = self._position.current_pos.to_extruder_state_dict()
+                    # Only build the position dicts if the position has changed since the last message
+                    if self._position.state_version != self._sent_position_state_version:
+                        self._sent_position_state_version = self._position.state_version
+                        position_change_dict = self._state_delta_encoder.encode(
+                            "position",
+                            self._position.to_position_dict() if main_settings.show_position_changes else None
+                        )
+                        printer_state_change_dict = self._state_delta_encoder.encode(
+                            "printer_state",
+                            self._position.to_state_dict() if main_settings.show_printer_state_changes else None
+                        )
+                        extruder_change_dict = self._state_delta_encoder.encode(
+                            "extruder",
+                            (
+                                self._position.current_pos.to_extruder_state_dict()
+                                if main_settings.show_extruder_state_changes else None
+                            )
+                        )
 
-                    # if there are any state changes, send them
-                    if (
-                        position_change_dict is not None
-                        or printer_state_change_dict is not None
-                        or extruder_change_dict is not None
-                        or trigger_change_list is not None
-                    ):
-                        if trigger_change_list is not None and len(trigger_change_list) > 0:
+                    # Only build the trigger dicts if a trigger state has changed since the last message
+                    if self._triggers.state_version != self._sent_trigger_state_version:
+                        self._sent_trigger_state_version = self._triggers.state_version
+                        trigger_change_list = self._state_delta_encoder.encode_list(
+                            "triggers",
+                            self._triggers.state_to_list() if main_settings.show_trigger_state_changes else None,
+                            "type"
+                        )
+                        if trigger_change_list is not None:
                             trigger_changes_dict = {
                                 "name": self._triggers.name,
                                 "triggers": trigger_change_list
                             }
-                    change_dict = {
-
-                        "trigger_type": "real-time",
-                        "extruder": extruder_change_dict,
-                        "position": position_change_dict,
-                        "printer_state": printer_state_change_dict,
-                        "trigger_state": trigger_changes_dict
-                    }
 
+                    # if there are any state changes, send them
                     if (
-                        change_dict["extruder"] is not None
-                        or change_dict["position"] is not None
-                        or change_dict["printer_state"] is not None
-                        or change_dict["trigger_state"] is not None
+                        extruder_change_dict is not None
+                        or position_change_dict is not None
+                        or printer_state_change_dict is not None
+                        or trigger_changes_dict is not None
                     ):
-                        self._state_changed_callback(change_dict)
+                        self._state_changed_callback({
+                            "trigger_type": "real-time",
+                            "is_delta": is_delta,
+                            "extruder": extruder_change_dict,
+                            "position": position_change_dict,
+                            "printer_state": printer_state_change_dict,
+                            "trigger_state": trigger_changes_dict
+                        })
 
                 def send_pre_calculated_change_message():
                     if not self.get_current_octolapse_settings().main_settings.show_snapshot_plan_information:
@@ -1301,6 +1393,12 @@ class Timelapse(object):
             # no need to re-raise, callbacks won't be notified, however.
             logger.exception("Failed to send state change message.")
 
+    def _reset_state_delta_encoder(self):
+        # the next state changed message will contain the full state
+        self._state_delta_encoder.reset()
+        self._sent_position_state_version = None
+        self._sent_trigger_state_version = None
+
     def _is_trigger_waiting(self):
         # make sure we're in a state that could want to check for triggers
         if not self._state == TimelapseState.WaitingForTrigger:
@@ -1321,11 +1419,7 @@ class Timelapse(object):
                 "snapshot_payload": snapshot_payload["snapshot_payload"],
             }
 
-            snapshot_complete_callback_thread = threading.Thread(
-                target=self._snapshot_complete_callback, args=[payload]
-            )
-            snapshot_complete_callback_thread.daemon = True
-            snapshot_complete_callback_thread.start()
+            self._snapshot_worker_pool.run_callback(self._snapshot_complete_callback, payload)
 
     def _render_timelapse(self, print_end_state):
         if self.was_started:
@@ -1349,6 +1443,7 @@ class Timelapse(object):
         self.CommandIndex = -1
 
         self._last_state_changed_message_time = 0
+        self._reset_state_delta_encoder()
         self._current_job_info = None
         self._snapshotGcodes = None
         self._positionRequestAttempts = 0
@@ -22,8 +22,9 @@
 ##################################################################################
 from __future__ import unicode_literals
 import time
-from octoprint_octolapse.position import ExtruderTriggers
+from octoprint_octolapse.position import ExtruderTriggers, Position
 from octoprint_octolapse.settings import *
+from octoprint_octolapse.gcode_processor import GcodeProcessor
 
 # create the module level logger
 from octoprint_octolapse.log import LoggingConfigurator
@@ -37,6 +38,10 @@ class Triggers(object):
 
     def __init__(self, settings):
         self._triggers = []
+        # when True, the triggers are evaluated by the GcodePositionProcessor
+        self._is_native = False
+        # incremented whenever a trigger state changes, so that unchanged states need not be sent to the client
+        self.state_version = 0
         self.reset()
         self._settings = settings
         self.name = "Unknown"
@@ -46,6 +51,8 @@ class Triggers(object):
 
     def reset(self):
         self._triggers = []
+        self._is_native = False
+        self.state_version += 1
 
     def create(self):
         self.reset()
@@ -63,15 +70,41 @@ class Triggers(object):
         elif trigger_profile.trigger_subtype == TriggerProfile.TIMER_TRIGGER_TYPE:
             self._triggers.append(TimerTrigger(self._settings))
 
+        # Evaluate the triggers within the position processor if we can.
+        try:
+            self._is_native = bool(
+                GcodeProcessor.initialize_triggers([trigger.get_native_args() for trigger in self._triggers])
+            )
+        except Exception as e:
+            logger.exception("Unable to create the native triggers, falling back to python triggers.")
+            self._is_native = False
+
     def resume(self):
+        if self._is_native:
+            self._update_native_states_in_place(GcodeProcessor.resume_triggers())
+            return
         for trigger in self._triggers:
             if type(trigger) == TimerTrigger:
                 trigger.resume()
+        self.state_version += 1
 
     def pause(self):
+        if self._is_native:
+            self._update_native_states_in_place(GcodeProcessor.pause_triggers())
+            return
         for trigger in self._triggers:
             if type(trigger) == TimerTrigger:
                 trigger.pause()
+        self.state_version += 1
+
+    def _update_native_states_in_place(self, native_states):
+        self.state_version += 1
+        if not native_states:
+            return
+        for current_trigger, native_state in zip(self._triggers, native_states):
+            state = current_trigger.get_state(0)
+            if state is not None:
+                state.update_from_native(native_state, state.in_path_position)
 
     def update(self, position):
         # the previous command (not just the current) MUST have homed positions else
@@ -80,6 +113,13 @@ class Triggers(object):
         #    return
         ## Note:  I think we need to add waits to handle the above
         """Update all triggers and return any that are triggering"""
+        if self._is_native:
+            try:
+                self._update_native(position)
+                return None
+            except Exception as e:
+                logger.exception("Failed to update the native snapshot triggers.")
+                return None
         try:
             # Loop through all of the active current_triggers
             for current_trigger in self._triggers:
@@ -91,11 +131,42 @@ class Triggers(object):
                 elif isinstance(current_trigger, LayerTrigger):
                     current_trigger.update(position)
                 # see if the current trigger is triggering, indicting that a snapshot should be taken
+            if self.has_changed():
+                self.state_version += 1
         except Exception as e:
             logger.exception("Failed to update the snapshot triggers.")
 
         return None
 
+    def is_update_required(self, gcode):
+        """Returns True if any trigger must be updated after the supplied gcode is processed.  If False, the
+        gcode may be queued by the position tracker instead of being processed immediately."""
+        for current_trigger in self._triggers:
+            if current_trigger.is_update_required(gcode):
+                return True
+        return False
+
+    def _update_native(self, position):
+        # The position restrictions are calculated in python, so send them along
+        if position.has_restricted_position:
+            is_in_position = position.previous_pos.is_in_position
+            in_path_position = position.current_pos.in_path_position
+        else:
+            is_in_position = True
+            in_path_position = False
+        native_states = GcodeProcessor.update_triggers(is_in_position, bool(in_path_position))
+        if native_states is None:
+            # Nothing has changed, which is by far the most common case
+            for current_trigger in self._triggers:
+                current_trigger.set_unchanged()
+            return
+        self.state_version += 1
+        for current_trigger, native_state in zip(self._triggers, native_states):
+            if native_state is None:
+                current_trigger.set_unchanged()
+            else:
+                current_trigger.apply_native_state(native_state, in_path_position)
+
     def get_first_triggering(self, index, trigger_type):
         if len(self._triggers) < 1:
             return False
@@ -142,17 +213,74 @@ class Triggers(object):
 
 
 class TriggerState(object):
+    # Trigger states are preallocated by TriggerStateHistory and reused in place, so use slots to keep them small
+    __slots__ = [
+        'is_triggered', 'trigger_type', 'is_in_position', 'in_path_position', 'is_waiting', 'is_home_position_wait',
+        'is_waiting_on_zhop', 'is_waiting_on_extruder', 'has_changed', 'has_definite_position',
+        'is_waiting_for_definite_position'
+    ]
+
+    # Bits used to pack the boolean state values for change detection (see get_flags)
+    FLAG_IS_TRIGGERED = 1
+    FLAG_IS_IN_POSITION = 1 << 1
+    FLAG_IS_WAITING = 1 << 2
+    FLAG_IS_HOME_POSITION_WAIT = 1 << 3
+    FLAG_IS_WAITING_ON_ZHOP = 1 << 4
+    FLAG_IS_WAITING_ON_EXTRUDER = 1 << 5
+    FLAG_HAS_DEFINITE_POSITION = 1 << 6
+
     def __init__(self, state=None):
-        self.is_triggered = False if state is None else state.is_triggered
-        self.trigger_type = None if state is None else state.trigger_type
-        self.is_in_position = False if state is None else state.is_in_position
-        self.in_path_position = False if state is None else state.in_path_position
-        self.is_waiting = False if state is None else state.is_waiting
-        self.is_home_position_wait = False if state is None else state.is_home_position_wait
-        self.is_waiting_on_zhop = False if state is None else state.is_waiting_on_zhop
-        self.is_waiting_on_extruder = False if state is None else state.is_waiting_on_extruder
-        self.has_changed = False if state is None else state.has_changed
-        self.has_definite_position = False if state is None else state.has_definite_position
+        self.clear()
+        if state is not None:
+            self.copy_from_previous(state)
+
+    def clear(self):
+        self.is_triggered = False
+        self.trigger_type = None
+        self.is_in_position = False
+        self.in_path_position = False
+        self.is_waiting = False
+        self.is_home_position_wait = False
+        self.is_waiting_on_zhop = False
+        self.is_waiting_on_extruder = False
+        self.has_changed = False
+        self.has_definite_position = False
+        self.is_waiting_for_definite_position = False
+
+    def copy_from(self, state):
+        self.is_triggered = state.is_triggered
+        self.trigger_type = state.trigger_type
+        self.is_in_position = state.is_in_position
+        self.in_path_position = state.in_path_position
+        self.is_waiting = state.is_waiting
+        self.is_home_position_wait = state.is_home_position_wait
+        self.is_waiting_on_zhop = state.is_waiting_on_zhop
+        self.is_waiting_on_extruder = state.is_waiting_on_extruder
+        self.has_changed = state.has_changed
+        self.has_definite_position = state.has_definite_position
+        self.is_waiting_for_definite_position = state.is_waiting_for_definite_position
+
+    def copy_from_previous(self, state):
+        """Initializes this state from the previous state before an update."""
+        self.copy_from(state)
+
+    def get_flags(self):
+        flags = 0
+        if self.is_triggered:
+            flags |= TriggerState.FLAG_IS_TRIGGERED
+        if self.is_in_position:
+            flags |= TriggerState.FLAG_IS_IN_POSITION
+        if self.is_waiting:
+            flags |= TriggerState.FLAG_IS_WAITING
+        if self.is_home_position_wait:
+            flags |= TriggerState.FLAG_IS_HOME_POSITION_WAIT
+        if self.is_waiting_on_zhop:
+            flags |= TriggerState.FLAG_IS_WAITING_ON_ZHOP
+        if self.is_waiting_on_extruder:
+            flags |= TriggerState.FLAG_IS_WAITING_ON_EXTRUDER
+        if self.has_definite_position:
+            flags |= TriggerState.FLAG_HAS_DEFINITE_POSITION
+        return flags
 
     def to_dict(self, trigger):
         return {
@@ -177,19 +305,77 @@ class TriggerState(object):
         self.trigger_type = None
         self.has_changed = False
 
+    # Indexes into the state tuples returned by the GcodePositionProcessor trigger functions.  These must match
+    # realtime_trigger::to_py_tuple.
+    NATIVE_TRIGGER_TYPES = [None, Triggers.TRIGGER_TYPE_DEFAULT, Triggers.TRIGGER_TYPE_IN_PATH]
+    NATIVE_TRIGGER_COUNT_INDEX = 18
+    NATIVE_SNAPSHOTS_ENABLED_INDEX = 19
+
+    def update_from_native(self, native_state, in_path_position):
+        self.is_triggered = native_state[0]
+        self.trigger_type = TriggerState.NATIVE_TRIGGER_TYPES[native_state[1]]
+        self.is_in_position = native_state[2]
+        # use the python in path position, which includes the intersections
+        self.in_path_position = in_path_position if native_state[3] else False
+        self.is_waiting = native_state[4]
+        self.is_home_position_wait = native_state[5]
+        self.is_waiting_on_zhop = native_state[6]
+        self.is_waiting_on_extruder = native_state[7]
+        self.has_definite_position = native_state[8]
+
     def is_equal(self, state):
-        if (state is not None
-                and self.is_triggered == state.is_triggered
-                and self.trigger_type == state.trigger_type
-                and self.is_in_position == state.is_in_position
-                and self.in_path_position == state.in_path_position
-                and self.is_waiting == state.is_waiting
-                and self.is_home_position_wait == state.is_home_position_wait
-                and self.is_waiting_on_zhop == state.is_waiting_on_zhop
-                and self.is_waiting_on_extruder == state.is_waiting_on_extruder
-                and self.has_definite_position == state.has_definite_position):
-            return True
-        return False
+        # in_path_position may hold the path intersections, so it can't be packed into the flags
+        return (
+            state is not None
+            and self.get_flags() == state.get_flags()
+            and self.trigger_type == state.trigger_type
+            and self.in_path_position == state.in_path_position
+        )
+
+
+class TriggerStateHistory(object):
+    """A preallocated ring buffer of trigger states.  The states are reused in place rather than being created for
+    every update, so long prints do not generate a steady stream of garbage."""
+    __slots__ = ['_states', '_max_states', '_head', '_count']
+
+    def __init__(self, create_state, max_states):
+        # one additional state is used as scratch space for next_state
+        self._states = [create_state() for _ in range(max_states + 1)]
+        self._max_states = max_states
+        self._head = 0
+        self._count = 0
+
+    def count(self):
+        return self._count
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
+
+    def get(self, index):
+        if index >= self._count:
+            return None
+        return self._states[(self._head + index) % len(self._states)]
+
+    def next_state(self):
+        """Returns the scratch state, initialized from the current state.  It will not become the current state until
+        it is passed to push, so get(0) can still be used for change detection."""
+        state = self._states[(self._head - 1) % len(self._states)]
+        current_state = self.get(0)
+        if current_state is None:
+            state.clear()
+        else:
+            state.copy_from_previous(current_state)
+        return state
+
+    def push(self, state):
+        next_index = (self._head - 1) % len(self._states)
+        scratch_state = self._states[next_index]
+        if state is not scratch_state:
+            scratch_state.copy_from(state)
+        self._head = next_index
+        if self._count < self._max_states:
+            self._count += 1
 
 
 class Trigger(object):
@@ -199,8 +385,7 @@ class Trigger(object):
         self.printer = self._settings.profiles.current_printer()
         self.trigger_profile = self._settings.profiles.current_trigger()
         self.type = 'Trigger'
-        self._state_history = []
-        self._max_states = max_states
+        self._state_history = TriggerStateHistory(self.create_state, max_states)
         self.extruder_triggers = None
         self.trigger_count = 0
         self.snapshots_enabled = True
@@ -213,21 +398,69 @@ class Trigger(object):
             elif "START-SNAPSHOTS" in parsed_command.parameters:
                 self.snapshots_enabled = True
 
+    def is_update_required(self, gcode):
+        # by default every gcode can change the trigger state
+        return True
+
+    def get_native_args(self):
+        """Returns the args used to create the native version of this trigger (see Triggers.create)."""
+        extruder_triggers = None
+        if self.trigger_profile.extruder_state_requirements_enabled:
+            extruder_triggers = tuple(
+                None if value is None else TriggerProfile.get_extruder_trigger_value(value)
+                for value in [
+                    self.trigger_profile.trigger_on_extruding_start,
+                    self.trigger_profile.trigger_on_extruding,
+                    self.trigger_profile.trigger_on_primed,
+                    self.trigger_profile.trigger_on_retracting_start,
+                    self.trigger_profile.trigger_on_retracting,
+                    self.trigger_profile.trigger_on_partially_retracted,
+                    self.trigger_profile.trigger_on_retracted,
+                    self.trigger_profile.trigger_on_deretracting_start,
+                    self.trigger_profile.trigger_on_deretracting,
+                    self.trigger_profile.trigger_on_deretracted
+                ]
+            )
+        return {
+            "type": self.type,
+            "require_zhop": self.trigger_profile.require_zhop,
+            "height_increment": None,
+            "interval_seconds": None,
+            "extruder_triggers": extruder_triggers,
+            "snapshot_command_gcode": self.printer.get_snapshot_command_gcode()
+        }
+
+    def create_state(self):
+        return TriggerState()
+
+    def apply_native_state(self, native_state, in_path_position):
+        state = self.next_state()
+        state.update_from_native(native_state, in_path_position)
+        state.has_changed = not state.is_equal(self.get_state(0))
+        self.trigger_count = native_state[TriggerState.NATIVE_TRIGGER_COUNT_INDEX]
+        self.snapshots_enabled = native_state[TriggerState.NATIVE_SNAPSHOTS_ENABLED_INDEX]
+        self.add_state(state)
+
+    def set_unchanged(self):
+        state = self.get_state(0)
+        if state is not None:
+            state.has_changed = False
+
     def name(self):
         return self.trigger_profile.name + " Trigger"
 
+    def next_state(self):
+        """Returns a state initialized from the current state that can be updated and then passed to add_state."""
+        return self._state_history.next_state()
+
     def add_state(self, state):
-        self._state_history.insert(0, state)
-        while len(self._state_history) > self._max_states:
-            del self._state_history[self._max_states - 1]
+        self._state_history.push(state)
 
     def count(self):
-        return len(self._state_history)
+        return self._state_history.count()
 
     def get_state(self, index):
-        if self.count() > index:
-            return self._state_history[index]
-        return None
+        return self._state_history.get(index)
 
     def is_triggered(self, index):
         state = self.get_state(index)
@@ -269,6 +502,8 @@ class Trigger(object):
 
 
 class GcodeTriggerState(TriggerState):
+    __slots__ = []
+
     def to_dict(self, trigger):
         super_dict = super(GcodeTriggerState, self).to_dict(trigger)
         current_dict = {
@@ -287,6 +522,7 @@ class GcodeTrigger(Trigger):
         self.type = "gcode"
         self.require_zhop = self.trigger_profile.require_zhop
         self.snapshot_command = octolapse_settings.profiles.current_printer().snapshot_command
+        self._snapshot_command_cmd = Position.get_command(self.snapshot_command or "")
         if self.trigger_profile.extruder_state_requirements_enabled:
             self.extruder_triggers = ExtruderTriggers(
                 self.trigger_profile.trigger_on_extruding_start,
@@ -328,7 +564,23 @@ class GcodeTrigger(Trigger):
         )
 
         # add an initial state
-        self.add_state(GcodeTriggerState())
+        self.add_state(self.next_state())
+
+    def create_state(self):
+        return GcodeTriggerState()
+
+    def is_update_required(self, gcode):
+        state = self.get_state(0)
+        if state is None or state.is_waiting:
+            return True
+        # only the snapshot command and octolapse commands can start waiting.  Anything we
+        # can't identify (SNAP, for example) is also treated as a possible snapshot command.
+        cmd = Position.get_command(gcode)
+        return (
+            cmd is None or
+            cmd == PrinterProfile.OCTOLAPSE_COMMAND or
+            cmd == self._snapshot_command_cmd
+        )
 
     def update(self, position):
         super(GcodeTrigger, self).update(position)
@@ -336,15 +588,9 @@ class GcodeTrigger(Trigger):
         """If the provided command matches the trigger command, sets is_triggered to true, else false"""
         try:
 
-            # get the last state to use as a starting point for the update
-            # if there is no state, this will return the default state
-            state = self.get_state(0)
-            if state is None:
-                # create a new object, it's our first state!
-                state = GcodeTriggerState()
-            else:
-                # create a copy so we aren't working on the original
-                state = GcodeTriggerState(state)
+            # get a state initialized from the last state to use as a starting point for the update.
+            # The state is reused from the history, so no new objects are created here.
+            state = self.next_state()
             # reset any variables that must be reset each update
             state.reset_state()
 
@@ -428,16 +674,53 @@ class GcodeTrigger(Trigger):
 
 
 class LayerTriggerState(TriggerState):
-    def __init__(self, state=None):
-        # call parent constructor
-        super(LayerTriggerState, self).__init__()
-        self.current_increment = 0 if state is None else state.current_increment
-        self.is_layer_change_wait = False if state is None else state.is_layer_change_wait
-        self.is_height_change = False if state is None else state.is_height_change
-        self.is_height_change_wait = False if state is None else state.is_height_change_wait
-        self.layer = 0 if state is None else state.layer
+    __slots__ = [
+        'current_increment', 'is_layer_change_wait', 'is_height_change', 'is_height_change_wait', 'layer',
+        'is_layer_change'
+    ]
+
+    FLAG_IS_LAYER_CHANGE_WAIT = 1 << 7
+    FLAG_IS_HEIGHT_CHANGE = 1 << 8
+    FLAG_IS_HEIGHT_CHANGE_WAIT = 1 << 9
+
+    def clear(self):
+        super(LayerTriggerState, self).clear()
+        self.current_increment = 0
+        self.is_layer_change_wait = False
+        self.is_height_change = False
+        self.is_height_change_wait = False
+        self.layer = 0
         self.is_layer_change = False
 
+    def copy_from(self, state):
+        super(LayerTriggerState, self).copy_from(state)
+        self.current_increment = state.current_increment
+        self.is_layer_change_wait = state.is_layer_change_wait
+        self.is_height_change = state.is_height_change
+        self.is_height_change_wait = state.is_height_change_wait
+        self.layer = state.layer
+        self.is_layer_change = state.is_layer_change
+
+    def copy_from_previous(self, state):
+        # only the layer tracking values carry over from the previous state
+        TriggerState.clear(self)
+        self.current_increment = state.current_increment
+        self.is_layer_change_wait = state.is_layer_change_wait
+        self.is_height_change = state.is_height_change
+        self.is_height_change_wait = state.is_height_change_wait
+        self.layer = state.layer
+        self.is_layer_change = False
+
+    def get_flags(self):
+        flags = super(LayerTriggerState, self).get_flags()
+        if self.is_layer_change_wait:
+            flags |= LayerTriggerState.FLAG_IS_LAYER_CHANGE_WAIT
+        if self.is_height_change:
+            flags |= LayerTriggerState.FLAG_IS_HEIGHT_CHANGE
+        if self.is_height_change_wait:
+            flags |= LayerTriggerState.FLAG_IS_HEIGHT_CHANGE_WAIT
+        return flags
+
     def to_dict(self, trigger):
         super_dict = super(LayerTriggerState, self).to_dict(trigger)
         current_dict = {
@@ -456,16 +739,21 @@ class LayerTriggerState(TriggerState):
         self.is_height_change = False
         self.is_layer_change = False
 
+    def update_from_native(self, native_state, in_path_position):
+        super(LayerTriggerState, self).update_from_native(native_state, in_path_position)
+        self.current_increment = native_state[9]
+        self.is_layer_change_wait = native_state[10]
+        self.is_height_change = native_state[11]
+        self.is_height_change_wait = native_state[12]
+        self.layer = native_state[13]
+        self.is_layer_change = native_state[14]
+
     def is_equal(self, state):
-        if (super(LayerTriggerState, self).is_equal(state)
-                and self.is_home_position_wait == state.is_home_position_wait
-                and self.current_increment == state.current_increment
-                and self.is_layer_change_wait == state.is_layer_change_wait
-                and self.is_height_change == state.is_height_change
-                and self.is_height_change_wait == state.is_height_change_wait
-                and self.layer == state.layer):
-            return True
-        return False
+        return (
+            super(LayerTriggerState, self).is_equal(state)
+            and self.current_increment == state.current_increment
+            and self.layer == state.layer
+        )
 
 
 class LayerTrigger(Trigger):
@@ -520,21 +808,41 @@ class LayerTrigger(Trigger):
             self.trigger_profile.layer_trigger_height,
             self.trigger_profile.require_zhop
         )
-        self.add_state(LayerTriggerState())
+        self.add_state(self.next_state())
+
+    def create_state(self):
+        return LayerTriggerState()
+
+    # Commands that can extrude, deretract or change the height, and so can cause a layer change
+    _layer_change_commands = ["G0", "G1", "G2", "G3", "G10", "G11"]
+
+    def is_update_required(self, gcode):
+        state = self.get_state(0)
+        if state is None or state.is_waiting:
+            return True
+        cmd = Position.get_command(gcode)
+        if cmd is None or cmd == PrinterProfile.OCTOLAPSE_COMMAND:
+            return True
+        if cmd not in LayerTrigger._layer_change_commands:
+            return False
+        if cmd in ["G10", "G11"]:
+            return True
+        # a move can only change the layer if it changes the height or the extruder position
+        parameters = gcode.split(";", 1)[0].upper()
+        return "E" in parameters or "Z" in parameters
+
+    def get_native_args(self):
+        native_args = super(LayerTrigger, self).get_native_args()
+        native_args["height_increment"] = self.height_increment
+        return native_args
 
     def update(self, position):
         """Updates the layer monitor position.  x, y and z may be absolute, but e must always be relative"""
         super(LayerTrigger, self).update(position)
         try:
-            # get the last state to use as a starting point for the update
-            # if there is no state, this will return the default state
-            state = self.get_state(0)
-            if state is None:
-                # create a new object, it's our first state!
-                state = LayerTriggerState()
-            else:
-                # create a copy so we aren't working on the original
-                state = LayerTriggerState(state)
+            # get a state initialized from the last state to use as a starting point for the update.
+            # The state is reused from the history, so no new objects are created here.
+            state = self.next_state()
 
             # reset any variables that must be reset each update
             state.reset_state()
@@ -679,12 +987,26 @@ class LayerTrigger(Trigger):
 
 
 class TimerTriggerState(TriggerState):
-    def __init__(self, state=None):
-        # call parent constructor
-        super(TimerTriggerState, self).__init__()
-        self.seconds_to_trigger = None if state is None else state.seconds_to_trigger
-        self.trigger_start_time = None if state is None else state.trigger_start_time
-        self.pause_time = None if state is None else state.pause_time
+    __slots__ = ['seconds_to_trigger', 'trigger_start_time', 'pause_time']
+
+    def clear(self):
+        super(TimerTriggerState, self).clear()
+        self.seconds_to_trigger = None
+        self.trigger_start_time = None
+        self.pause_time = None
+
+    def copy_from(self, state):
+        super(TimerTriggerState, self).copy_from(state)
+        self.seconds_to_trigger = state.seconds_to_trigger
+        self.trigger_start_time = state.trigger_start_time
+        self.pause_time = state.pause_time
+
+    def copy_from_previous(self, state):
+        # only the timer values carry over from the previous state
+        TriggerState.clear(self)
+        self.seconds_to_trigger = state.seconds_to_trigger
+        self.trigger_start_time = state.trigger_start_time
+        self.pause_time = state.pause_time
 
     def to_dict(self, trigger):
         super_dict = super(TimerTriggerState, self).to_dict(trigger)
@@ -697,6 +1019,12 @@ class TimerTriggerState(TriggerState):
         current_dict.update(super_dict)
         return current_dict
 
+    def update_from_native(self, native_state, in_path_position):
+        super(TimerTriggerState, self).update_from_native(native_state, in_path_position)
+        self.seconds_to_trigger = native_state[15]
+        self.trigger_start_time = native_state[16]
+        self.pause_time = native_state[17]
+
     def is_equal(self, state):
         if (super(TimerTriggerState, self).is_equal(state)
                 and self.seconds_to_trigger == state.seconds_to_trigger
@@ -759,8 +1087,7 @@ class TimerTrigger(Trigger):
         )
 
         # add initial state
-        initial_state = TimerTriggerState()
-        self.add_state(initial_state)
+        self.add_state(self.next_state())
 
     def pause(self):
         state = self.get_state(0)
@@ -791,18 +1118,33 @@ class TimerTrigger(Trigger):
             state.trigger_start_time = new_last_trigger_time
             state.pause_time = None
 
+    def create_state(self):
+        return TimerTriggerState()
+
+    def get_native_args(self):
+        native_args = super(TimerTrigger, self).get_native_args()
+        native_args["interval_seconds"] = self.interval_seconds
+        return native_args
+
+    def is_update_required(self, gcode):
+        state = self.get_state(0)
+        if (
+            state is None or
+            state.is_waiting or
+            state.trigger_start_time is None or
+            state.pause_time is not None or
+            time.time() - state.trigger_start_time >= self.interval_seconds
+        ):
+            return True
+        cmd = Position.get_command(gcode)
+        return cmd is None or cmd == PrinterProfile.OCTOLAPSE_COMMAND
+
     def update(self, position):
         super(TimerTrigger, self).update(position)
         try:
-            # get the last state to use as a starting point for the update
-            # if there is no state, this will return the default state
-            state = self.get_state(0)
-            if state is None:
-                # create a new object, it's our first state!
-                state = TimerTriggerState()
-            else:
-                # create a copy so we aren't working on the original
-                state = TimerTriggerState(state)
+            # get a state initialized from the last state to use as a starting point for the update.
+            # The state is reused from the history, so no new objects are created here.
+            state = self.next_state()
             # reset any variables that must be reset each update
             state.reset_state()
             state.is_triggered = False
@@ -995,6 +995,59 @@ class SafeDict(dict):
         return '{' + key + '}'
 
 
+class StateDeltaEncoder(object):
+    """Remembers the most recently sent state dicts so that only the values that have changed since then need to be
+    sent.  The first time a state is encoded (or after reset/forget is called) the full dict is returned."""
+
+    def __init__(self):
+        self._sent_states = {}
+
+    def reset(self):
+        self._sent_states = {}
+
+    def forget(self, name):
+        self._sent_states.pop(name, None)
+
+    @staticmethod
+    def get_changes(previous_dict, current_dict):
+        if previous_dict is None:
+            return current_dict
+        changes = {}
+        for key, value in current_dict.items():
+            if key not in previous_dict or previous_dict[key] != value:
+                changes[key] = value
+        return changes
+
+    def encode(self, name, current_dict):
+        """Returns the values in current_dict that have changed since the last call with the same name, or None if
+        nothing has changed."""
+        if current_dict is None:
+            self.forget(name)
+            return None
+        changes = StateDeltaEncoder.get_changes(self._sent_states.get(name), current_dict)
+        self._sent_states[name] = current_dict
+        return changes or None
+
+    def encode_list(self, name, current_dicts, key):
+        """Encodes a list of dicts that are identified by the value of key, which is included with every change.
+        Returns None if nothing has changed."""
+        if current_dicts is None:
+            self.forget(name)
+            return None
+        previous_dicts = self._sent_states.get(name, {})
+        sent_dicts = {}
+        changes = []
+        for current_dict in current_dicts:
+            current_key = current_dict[key]
+            current_changes = StateDeltaEncoder.get_changes(previous_dicts.get(current_key), current_dict)
+            if current_changes:
+                current_changes[key] = current_key
+                changes.append(current_changes)
+            sent_dicts[current_key] = current_dict
+        self._sent_states[name] = sent_dicts
+        return changes or None
+
+
 # retry utility adapted from https://www.peterbe.com/plog/best-practice-with-retries-with-requests
 def requests_retry_session(
     retries=3,
@@ -19,7 +19,7 @@ plugin_author = "Brad Hochgesang"
 plugin_author_email = "FormerLurker@pm.me"
 plugin_url = "https://github.com/FormerLurker/Octolapse"
 plugin_license = "AGPLv3"
-plugin_requires = ["pillow>=9.3,<11", "sarge", "six", "OctoPrint>=1.4.0", "psutil", "file_read_backwards", "setuptools>=6.0", "awesome-slugify>=1.6.5,<1.7"]
+plugin_requires = ["pillow>=9.3,<11", "sarge", "six", "OctoPrint>=1.4.0", "psutil", "setuptools>=6.0", "awesome-slugify>=1.6.5,<1.7"]
 
 # --------------------------------------------------------------------------------------------------------------------
 # More advanced options that you usually shouldn't have to touch follow after this point
@@ -31,7 +31,8 @@ plugin_additional_data = [
     'data/lib/c/*.cpp',
     'data/lib/c/*.h',
     'data/webcam_types/*',
-    'data/fonts/*'
+    'data/fonts/*',
+    'benchmark/*.json'
 ]
 plugin_additional_packages = ['octoprint_octolapse_setuptools']
 plugin_ignored_packages = []
@@ -68,11 +69,17 @@ class build_ext_subclass(build_ext):
 plugin_ext_sources = [
     'octoprint_octolapse/data/lib/c/gcode_position_processor.cpp',
     'octoprint_octolapse/data/lib/c/gcode_parser.cpp',
+    'octoprint_octolapse/data/lib/c/gcode_chunk_reader.cpp',
+    'octoprint_octolapse/data/lib/c/gcode_line_scanner.cpp',
+    'octoprint_octolapse/data/lib/c/stabilization_progress.cpp',
+    'octoprint_octolapse/data/lib/c/snapshot_plan_list.cpp',
     'octoprint_octolapse/data/lib/c/gcode_position.cpp',
     'octoprint_octolapse/data/lib/c/parsed_command.cpp',
     'octoprint_octolapse/data/lib/c/parsed_command_parameter.cpp',
     'octoprint_octolapse/data/lib/c/position.cpp',
     'octoprint_octolapse/data/lib/c/python_helpers.cpp',
+    'octoprint_octolapse/data/lib/c/python_position.cpp',
+    'octoprint_octolapse/data/lib/c/realtime_trigger.cpp',
     'octoprint_octolapse/data/lib/c/snapshot_plan.cpp',
     'octoprint_octolapse/data/lib/c/snapshot_plan_step.cpp',
     'octoprint_octolapse/data/lib/c/stabilization.cpp',
@@ -83,7 +90,8 @@ plugin_ext_sources = [
     'octoprint_octolapse/data/lib/c/utilities.cpp',
     'octoprint_octolapse/data/lib/c/trigger_position.cpp',
     'octoprint_octolapse/data/lib/c/gcode_comment_processor.cpp',
-    'octoprint_octolapse/data/lib/c/extruder.cpp'
+    'octoprint_octolapse/data/lib/c/extruder.cpp',
+    'octoprint_octolapse/data/lib/c/binary_serialization.cpp'
 ]
 cpp_gcode_parser = Extension(
     'GcodePositionProcessor',
@@ -93,7 +101,10 @@ cpp_gcode_parser = Extension(
 
 additional_setup_parameters = {
     "ext_modules": [cpp_gcode_parser],
-    "cmdclass": {"build_ext": build_ext_subclass}
+    "cmdclass": {"build_ext": build_ext_subclass},
+    "entry_points": {
+        "console_scripts": ["octolapse-preprocess = octoprint_octolapse.preprocess:main"]
+    }
 }
 
 # Ensure OctoPrint's setuptools is available